@@ -0,0 +1,131 @@
+!
+!   Copyright or Copr. Mines Paristech, France - Mark NOBLE, Alexandrine GESRET
+!   FTeik3d_2.0.f90 - First release Aug 2011
+!   Include_FTeik2d.f - Local operators of FTeik2d (fteik2d.f90)
+!
+!   FTeik3d has been written by:
+!     - Mark Noble <mark.noble@mines-paristech.fr>
+!     - Alexandrine Gesret <alexandrine.gesret@mines-paristech.fr>
+!
+!   This software is a computer program (subroutine) whose purpose is to
+!   compute traveltimes in a 3D heterogenious velocity model by solving
+!   by finite difference approximation the Eikonal equation. This package
+!   is written in fortran 90 and is composed of 4 elements, the functions
+!   "t_ana", "t_anad", the subroutine "FTeik3d_2" and an include file
+!   "include_FT3d_2".
+!
+!   This software is governed by the CeCILL-C license under French law and
+!   abiding by the rules of distribution of free software.  You can  use,
+!   modify and/ or redistribute the software under the terms of the CeCILL-C
+!   license as circulated by CEA, CNRS and INRIA at the following URL
+!   "http://www.cecill.info".
+!
+!   As a counterpart to the access to the source code and  rights to copy,
+!   modify and redistribute granted by the license, users are provided only
+!   with a limited warranty  and the software's author,  the holder of the
+!   economic rights,  and the successive licensors  have only  limited
+!   liability.
+!
+!   In this respect, the user's attention is drawn to the risks associated
+!   with loading,  using,  modifying and/or developing or reproducing the
+!   software by the user in light of its specific status of free software,
+!   that may mean  that it is complicated to manipulate,  and  that  also
+!   therefore means  that it is reserved for developers  and  experienced
+!   professionals having in-depth computer knowledge. Users are therefore
+!   encouraged to load and test the software's suitability as regards their
+!   requirements in conditions enabling the security of their systems and/or
+!   data to be ensured and,  more generally, to use and operate it in the
+!   same conditions as regards security.
+!
+!   The fact that you are presently reading this means that you have had
+!   knowledge of the CeCILL-C license and that you accept its terms.
+!   For more information, see the file COPYRIGHT-GB or COPYRIGHT-FR.
+!
+!________________________________________________________________________
+!
+!Local Operators 1D and 2D
+!
+! define index of velocity nodes to use, don't touch!
+!____________________________________________________
+    i1=i-sgnvz
+    j1=j-sgnvx
+!
+! Get local times of surrounding points
+!______________________________________
+    tv = dble( tt(i-sgntz,j) )
+    te = dble( tt(i,j-sgntx) )
+    tev = dble( tt(i-sgntz,j-sgntx) )
+!
+! check time to see when to switch to plane approximation
+!________________________________________________________
+    tmin=min(tv,te)
+!
+! get analytical solution, if using pertubation
+!______________________________________________
+    if (tmin <= eps .or. kk < 1) then
+      t0c = t_anad2d(tzc,txc,i,j,dz,dx,zsa,xsa,vzero)
+!
+! Convert times into pertubations
+!________________________________
+      tauv = tv - t_ana2d(i-sgntz,j,dz,dx,zsa,xsa,vzero)
+      taue = te - t_ana2d(i,j-sgntx,dz,dx,zsa,xsa,vzero)
+      tauev = tev - t_ana2d(i-sgntz,j-sgntx,dz,dx,zsa,xsa,vzero)
+    endif
+!
+! 1D operators, (refracted times),set times to BIG
+!_________________________________________________
+    t1d=Big
+    t1=Big ; t2=Big
+!
+!V plane
+!_______
+    vref = 1.d0 / dble( max( vel(i1,max(j-1,1)),vel(i1,min(j,nx-1)) ))
+    t1= tv + dz * vref
+!
+!WE plane
+!________
+    vref = 1.d0 / dble( max( vel(max(i-1,1),j1),vel(min(i,nz-1),j1) ))
+    t2= te + dx * vref
+!
+! End of 1D operators (just take smallest time)
+!______________________________________________
+    t1d=min(t1,t2)
+!
+!2D operator
+!___________
+    t2d=Big
+!
+!ZX (VE) plane
+!_____________
+    vref=1.d0 / dble( vel(i1,j1) )
+!
+! Check condition and the choose between plane or spherical approximation
+!________________________________________________________________________
+    if ( (tv < te+dx*vref) .and. (te < tv+dz*vref) ) then
+      if (tmin > eps .or. kk > 0) then
+        ta=tev+te-tv
+        tb=tev-te+tv
+        t2d=((tb*dz2i+ta*dx2i)+sqrt(4.d0*(vref**2.d0)*(dz2i+dx2i) &
+            - dz2i*dx2i*(ta-tb)**2.d0))/(dz2i+dx2i)
+      else
+        ta = tauev+taue-tauv   ! X
+        tb = tauev-taue+tauv   ! Z
+        apoly=dz2i+dx2i
+        bpoly=4.d0 *(sgnrx*txc*dxi+sgnrz*tzc*dzi)-2.d0*(ta*dx2i + tb*dz2i)
+        cpoly=((ta**2)*dx2i)+((tb**2)*dz2i) &
+              -4.d0*(sgnrx*txc*dxi*ta+sgnrz*tzc*dzi*tb)+4.d0*(vzero**2-vref**2)
+        dpoly=(bpoly**2)-4.d0*apoly*cpoly
+        if (dpoly >= 0.d0) then
+          t2d=(sqrt(dpoly)-bpoly)/2.d0/apoly+t0c
+        endif
+        if ((t2d-tv <0.d0 .or. t2d-te <0.d0))t2d=Big
+      endif
+    endif
+!
+! Choose shortest path of 1 and 2d times
+!_______________________________________
+    t1 = min(dble(tt(i,j)),t1d,t2d)
+    tt(i,j)=sngl(t1)
+!
+! End of Calculation for this sweep
+!__________________________________
@@ -32,38 +32,53 @@ int main( int argc, char *argv[]) // argc : Number of arguments, argv : the argu
     MPI_Finalize();                         // ...
     exit(0);                                // ... and we terminate!
   }
+  computeStationStencils(&config);        // Compute the interpolation of the travel times of each shot at the stations
   if (config.buildPrior)                  //
     buildPrior(&config);                  // Build the prior features
   generate_profiles_from_prior(&config);  // Generate config.nPriorProfiles profiles from a priori space in config.outputDir/priorCurvesXXX/
+  if (config.waveletParameterization && config.waveletSynthesis)
+    buildSynthesisOperators(&config);     // Precompute the profiles given by each parameter (used instead of the inverse wavelet transforms)
   if (config.analyticalRun)               // If we perform an analytical run :
     createDataset(&config);               // ... create the arrival-times from the real profile
   Run run;                                // Create the run, it will contain all the chains
   run = init_run(&config);                // Initialize it (fill it with chains of initialized states)
-  writeStatus(&run,&config);              // Create the data files (chainI.XXX.dat) and write the first line on it.
-  write_config(&run,&config);             // Create a file config.XXX.dat and write the configuration parameters on it
+  if (config.restartFile.empty()) {
+    writeStatus(&run,&config);            // Create the data files (chainI.XXX.dat) and write the first line on it.
+    write_config(&run,&config);           // Create a file config.XXX.dat and write the configuration parameters on it
+  }
+  else                                    // If the run restarts (the checkpoint is given as argument)...
+    readCheckpoint(&run,&config);         // ... its state is read from the checkpoint and the output files are put back as they were
+  installSignalHandlers();                // SIGUSR1 flushes the output files, SIGTERM and SIGINT stop the run cleanly (see writeFiles)
 
   //**********************************************  End of initialization : *****************************************************//
 
-  for (int n=0;n < config.nit;n++) { // Loop on the iterations
+  for (int n=config.firstIteration;n < config.nit && !run.stopped;n++) { // Loop on the iterations (until the end or a signal)
     printEvolution(n,&run,&config);
-    for (int i=config.nbt-1;i>=0;i--) { // Loop on the different temperatures chains
-      if (i == config.nbt-1) {              // If we consider the highest T chain...
-       // priorIteration(run.chains[i],&config);              // (...we perform an iteration on the prior.)
-        iterationMHindependent(run.chains[i],&config);      // ...we perform an independent sampler transition.
-      }
-      else {                                // Otherwise, if we consider the low temperature chains...
-        double p=Random();
-        if (p < (1-config.pee))                             // _with probability 1-pee we perform a classical MH transition.
-          iterationMH(run.chains[i],&config);               // Iteration Metropolis Hasting
-        else                                                // _with probability pee we suggest an IR-swap.
-          importanceSamplingSwap(&run,i,&config);           // ImportanceSamplingSwap
+    if (config.parallelChains)                // The energies of the chains are computed at the same time...
+      parallelIteration(&run,&config);        // ... (PARALLEL_CHAINS > 0)
+    else {
+      for (int i=config.nbt-1;i>=0;i--) { // Loop on the different temperatures chains
+        if (i == config.nbt-1) {              // If we consider the highest T chain...
+         // priorIteration(run.chains[i],&config);              // (...we perform an iteration on the prior.)
+          iterationMHindependent(run.chains[i],&config);      // ...we perform an independent sampler transition.
+        }
+        else {                                // Otherwise, if we consider the low temperature chains...
+          double p=Random();
+          if (p < (1-config.pee))                             // _with probability 1-pee we perform a classical MH transition.
+            iterationMH(run.chains[i],&config);               // Iteration Metropolis Hasting
+          else                                                // _with probability pee we suggest an IR-swap.
+            importanceSamplingSwap(&run,i,&config);           // ImportanceSamplingSwap
+        }
+        // updateAverageProfiles(run.chains[i],&config,n+1);  // Old version: Update the average, variance and quantiles profiles (n+1 because we have to count the profile created during initialization)
       }
-      // updateAverageProfiles(run.chains[i],&config,n+1);  // Old version: Update the average, variance and quantiles profiles (n+1 because we have to count the profile created during initialization)
     }
+    pruneHistory(&run,&config,n);             // Apply the history policy (remove the previous states that are not kept)
+    updateBestModels(&run,&config);           // Put the new states in the list of the best models
     updateAverageProfiles(&run,&config,n+1);  // Update the average, variance and quantiles profiles (n+1 because we have to count the profile created during initialization)
     updateSCI(&run,n);          // Add a new line to SCI (importance weights (cumulative sum) and normalization coefficients)
     writeFiles(&run,&config,n); // Write informations on files
   }
+  closeOutputFiles(&run);      // Flush and close the files the run appended lines to
   summary(&run,&config);       // Display a summary of the run
   write_summary(&run,&config); // Write a summary of the run at the end of the file config.XXX.dat
   printTime(&config);          // Print the final time
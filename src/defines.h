@@ -13,11 +13,24 @@
 #define TINYVAL 1E-8           // To test if 2 values are different we do : fabs(a-b) > TINYVAL. Coordinates must be >> TINYVAL
 #define TMIN 1                 // Min temperature
 #define NAME_OF_CONFIGURATION_FILE "config.cfg"
+#define NAME_OF_WISDOM_FILE "fftw.wisdom" // FFT plans measured with WAVELET_CONVOLUTION = 2, kept from one run to another
 #define TRESH 50               // Max and min values are computed from iteration TRESH
 #define MAX_DIFF_TO_BE_OK 2 // Tolerance to determine if we are precise enough with the eikonal. We set the velocity to 1 and we check that
 // we obtain the correct distance between sources and receivers.
+#define MOVE_MH 0              // Moves of the chains during an iteration (see parallelIteration) : MH transition,
+#define MOVE_OUT_OF_DOMAIN 1   //   MH transition out of the prior domain,
+#define MOVE_IR_SWAP 2         //   importance sampling swap
+#define HISTORY_STREAM 1       // Stream of the random number generator used to fill the reservoirs of states (HISTORY_POLICY = 2)
 #define PREC 128               // Precision for exponential comparisons
 #define RND MPFR_RNDU          // Rounding
+#define NPY_HEADER_SIZE 128    // Size (in bytes) of the header of the .npy files of the run store. Fixed to be able to rewrite it in place
+#define CHAINS_HEADER_SIZE 64  // Size (in bytes) of the header of the chains history file of the run store (runStoreXXX/chains.bin)
+#define CHECKPOINT_VERSION 4   // Version of the format of the checkpoints (see writeCheckpoint in filesAndControl.cpp)
+#define RNG_STREAMS 256        // Number of streams of the random number generator (STREAMS in rngs.cpp)
+#define OUTPUT_BUFFER_SIZE 1048576 // Size (in bytes) of the buffer of each file the run appends lines to (see outputFile in filesAndControl.cpp)
+#define SIGNAL_FLUSH 1         // Actions requested by the signals caught (see catchSignal) : flush the output files (SIGUSR1),
+#define SIGNAL_STOP 2          //   flush them, write a checkpoint and stop the run (SIGTERM, SIGINT)
+#define SYNTHESIS_REFRESH 100  // Incremental updates of the synthesized profiles of a chain before they are computed entirely again (WAVELET_SYNTHESIS = 1)
 /*U round toward plus infinity
 D round toward minus infinity
 Y round away from zero
@@ -28,6 +41,8 @@ N round to nearest (with ties to even)
 
 extern "C" {void fteik_(double *vel, double *times,int *nz,int *nx,int *ny,float *zsin,float *xsin,float *ysin,float *dzin,float *dxin,float *dyin,int *nsweep,float *epsin);}
                               // Fortran subroutine for the Eikonal
+extern "C" {void fteik2d_(double *vel, double *times,int *nz,int *nx,float *zsin,float *xsin,float *dzin,float *dxin,int *nsweep,float *epsin);}
+                              // Fortran subroutine for the 2D Eikonal (EIKONAL_MODE = 1)
 
 // Wavelet used for the inversion:
 #define NUMBER_OF_WAVELETS 5
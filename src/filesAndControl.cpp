@@ -13,6 +13,10 @@
 #include <errno.h>  // To detect mathematical errors
 #include <algorithm>    // std::min_element, std::max_element
 #include <iterator>
+#include <sys/stat.h>
+#include <unistd.h>     // truncate
+#include <dirent.h>     // opendir (see writeBestProfiles)
+#include <signal.h>     // sigaction (see installSignalHandlers)
 #include "functions.h"
 #include "structures.h"
 #include "defines.h"
@@ -140,6 +144,16 @@ void write_config(const Run* run, const Configuration* config)
     }
     else
       file << std::endl << "Layers based parameterization" << std::endl;
+    if (config->waveletParameterization) {
+      if (config->waveletConvolution == 0)
+        file << "  Convolutions of the inverse wavelet transforms : direct (FFT for the filters longer than 32 taps)" << std::endl;
+      else if (config->waveletConvolution == 1)
+        file << "  Convolutions of the inverse wavelet transforms : FFT" << std::endl;
+      else
+        file << "  Convolutions of the inverse wavelet transforms : FFT with measured plans (" << NAME_OF_WISDOM_FILE << ")" << std::endl;
+      if (config->waveletSynthesis)
+        file << "  Profiles computed with the synthesis operators (full product every " << SYNTHESIS_REFRESH << " updates)" << std::endl;
+    }
     file << "  Number of parameters : " << config->data.minParameters[0].size();
     if (config->useAllWavelets and config->waveletParameterization)
       file << " plus the wavelet type.";
@@ -184,15 +198,47 @@ void write_config(const Run* run, const Configuration* config)
     file << "  zminGlob: " << config->data.zminGridGlob << "  zmaxGlob: " << config->data.zminGridGlob+(config->data.nzFilt-1)*config->data.dzFilt << std::endl;
     file << "  Number of sweeps : " << config->nSweeps << std::endl;
     file << "  EPSIN : " << config-> epsin << std::endl;
+    if (config->eikonalMode == 1)
+      file << "  Eikonal : 2D (depth,offset)  nr: " << config->data.nr << "  dr: " << config->data.dr << std::endl;
+    else
+      file << "  Eikonal : 3D" << std::endl;
+    file << "  Eikonal threads per process : " << config->eikonalThreads << std::endl;
+    file << "  Travel times cache size : " << config->timesCacheSize << std::endl;
 
     file << std::endl << "O U T P U T  P A R A M E T E R S" << std::endl << std::endl;
     file << "  Output directory : " << config->outputDir << std::endl;
+    if (config->writeRunStore)
+      file << "  Binary run store : " << config->runStoreDir << std::endl;
     file << "  Quantile chosen : " << config->qp << std::endl;
+    if (config->quantileEstimator == 0)
+      file << "  Quantile estimator : sort of the whole history" << std::endl;
+    else if (config->quantileEstimator == 1)
+      file << "  Quantile estimator : sorted history" << std::endl;
+    else
+      file << "  Quantile estimator : sketch (relative accuracy " << config->quantileAccuracy << ")" << std::endl;
+    if (config->weightsAccumulator == 0)
+      file << "  Weighted averages and variances : log-sum-exp accumulators (long double)" << std::endl;
+    else if (config->weightsAccumulator == 1)
+      file << "  Weighted averages and variances : MPFR accumulators (" << PREC << " bits)" << std::endl;
+    else
+      file << "  Weighted averages and variances : log-sum-exp accumulators compared with MPFR accumulators (" << PREC << " bits)" << std::endl;
+    file << "  Lines appended flushed every " << config->flushIterations << " iterations";
+    if (config->flushSeconds > 0)
+      file << " or " << config->flushSeconds << " s";
+    file << ", profiles rewritten every " << config->iterationsAverages << " iterations" << std::endl;
     
     file << std::endl << "C O N F I G  O F  T H E  A L G O R I T H M" << std::endl << std::endl;    
     file << "  Number of different temperatures : " << config->nbt << std::endl;
+    if (config->parallelChains)
+      file << "  Energies of the chains computed at the same time on " << config->parallelChains << " threads" << std::endl;
     file << "  Temperature max : " << config->tmax << std::endl;
     file << "  Number of iterations " << config->nit << std::endl;
+    if (config->historyPolicy == 1)
+      file << "  History : one state in " << config->historyThinning << " kept" << std::endl;
+    else if (config->historyPolicy == 2)
+      file << "  History : reservoir of " << config->historySize << " states" << std::endl;
+    if (config->checkpointIterations > 0)
+      file << "  Checkpoint (checkpoint." << config->code << ".bin) every " << config->checkpointIterations << " iterations" << std::endl;
     file << "  Probability of allowing swapping : " << config->pee << std::endl;
     file << "  Number of components to modify in a MH iteration as a function of T : " << std::endl;
     for (int i=0;i<(int)(config->nc.size());i++)
@@ -320,22 +366,144 @@ void printEvolution(const int n, const Run* run, const Configuration* config)
       std::cout << std::endl << "********************** MAIN LOOP ***********************" << std::endl << std::endl;
     else {
       std::cout << "ITERATION NUMBER : " << n << " / " << config->nit << " (" << (double)n*100.0/((double)config->nit) << " %)"<< std::endl;
+      std::cout << "  Memory used by the history : " << historyMemory(run,config)/1048576.0 << " MB (" << run->chains[0]->states.size() << " states kept by chain 0)" << std::endl;
+      if (config->weightsAccumulator == 2)
+        std::cout << "  Weighted statistics : maximum relative difference between log-sum-exp and MPFR : " << run->accumulatorsDifference << std::endl;
     }
   }
 }
 
 void writeFiles(Run* run, Configuration* config, int n)
-// Write informations on files
+// Write informations on files. The lines appended are buffered (see outputFile) : they are flushed every FLUSH_ITERATIONS iterations or
+// FLUSH_SECONDS seconds, before the checkpoints and at the end of the run. The profiles files are rewritten every ITERATIONS_AVERAGES iterations
 {
+  int action=requestedAction(config); // Action requested by the signals caught during the iteration (see catchSignal)
+  if (action == SIGNAL_STOP)
+    run->stopped=true;
+  bool lastIteration=(n == config->nit-1 || run->stopped);
+  bool profiles=((n+1)%config->iterationsAverages == 0 || lastIteration); // Are the profiles files rewritten at this iteration?
   writeSCI(run,config);    // Write the Importance Weights matrix SCI in a file (sci.XXX.dat)
   writeStats(run,config);  // Write the actual statistics of the run in files (statsI.XXX.dat) 
   writeStatus(run,config); // Write the status of the chains in files (paramsChainI.XXX.dat)
-  writeAverages(run,config);  // Write the average, variance and quantiles profiles on files
+  if (profiles)
+    writeAverages(run,config);  // Write the average, variance and quantiles profiles on files
   if (n%config->iterationsBestProfiles == 0 && n > 1)
     writeBestProfiles(run,config); // Write the best profiles on files
-  writeMinMaxProfiles(run,config); // Update min and max velocities explored, write it on file 
+  writeMinMaxProfiles(run,config,profiles); // Update min and max velocities explored, write it on file
   if (config->computeResiduals && n%config->iterationsResiduals == 0 && n>1)
     computeResidualsForBestModel(run,config);
+  bool checkpoint=(config->checkpointIterations > 0 && ((n+1)%config->checkpointIterations == 0 || run->stopped));
+  if (checkpoint || lastIteration || action == SIGNAL_FLUSH || n+1-run->lastFlush >= config->flushIterations ||
+      (config->flushSeconds > 0 && difftime(time(NULL),run->lastFlushTime) >= config->flushSeconds))
+    flushOutputFiles(run,n+1); // The checkpoint records the sizes of the files
+  if (checkpoint)
+    writeCheckpoint(run,config,n+1); // Save the state of the run (it can restart from the iteration n+1)
+  if (run->stopped && config->mpiConfig.rank == 0)
+    std::cout << "Run stopped by a signal at the end of the iteration " << n << std::endl;
+}
+
+volatile sig_atomic_t signalAction = 0; // Action requested by the signals caught (see catchSignal)
+
+void catchSignal(int signal)
+// Signal handler : the action requested is only recorded, it is done at the end of the iteration (see writeFiles)
+{
+  int action=(signal == SIGUSR1) ? SIGNAL_FLUSH : SIGNAL_STOP;
+  if (action > signalAction)
+    signalAction=action;
+}
+
+void installSignalHandlers()
+// Catch SIGUSR1 (flush the output files), SIGTERM and SIGINT (flush them, write a checkpoint if CHECKPOINT_ITERATIONS > 0 and stop the
+// run). A second SIGTERM or SIGINT terminates the program immediately
+{
+  struct sigaction handler;
+  memset(&handler,0,sizeof(handler));
+  handler.sa_handler=catchSignal;
+  sigemptyset(&handler.sa_mask);
+  handler.sa_flags=SA_RESTART;
+  sigaction(SIGUSR1,&handler,NULL);
+  handler.sa_flags=SA_RESTART | SA_RESETHAND;
+  sigaction(SIGTERM,&handler,NULL);
+  sigaction(SIGINT,&handler,NULL);
+}
+
+int requestedAction(const Configuration* config)
+// Return the action requested by the signals caught since the last call (0 : none). With MPI the processes do the strongest one requested
+{
+  int action=signalAction;
+  if (signalAction == SIGNAL_FLUSH) // (SIGNAL_STOP is kept)
+    signalAction=0;
+  #ifdef PAR
+    if (config->mpiConfig.nb_process > 1) {
+      int localAction=action;
+      MPI_Allreduce(&localAction,&action,1,MPI_INT,MPI_MAX,MPI_COMM_WORLD);
+    }
+  #endif
+  return action;
+}
+
+OutputFile* outputFile(Run* run, const std::string& name_of_file, int nColumns)
+// Return the file name_of_file the run appends lines to. It is opened (created if it does not exist) the first time with a buffer of
+// OUTPUT_BUFFER_SIZE bytes and stays open until closeOutputFiles. nColumns > 0 : .npy file of nColumns values per line, its header is
+// updated when the file is flushed (see flushOutputFile). 0 : text file or chains history (see append_chains_history)
+{
+  std::map<std::string,OutputFile>::iterator it=run->outputFiles.find(name_of_file);
+  if (it != run->outputFiles.end())
+    return &it->second;
+  OutputFile* output=&run->outputFiles[name_of_file]; // (The elements of a map are never moved : the buffer stays in place)
+  output->file=fopen(name_of_file.c_str(),"r+b"); // Open the file if it exists...
+  if (output->file == NULL)
+    output->file=fopen(name_of_file.c_str(),"w+b");     // ... otherwise create it
+  if (output->file == NULL) {
+    std::cout << "Unable to open file "+name_of_file << std::endl;
+    exit(0);
+  }
+  output->buffer.resize(OUTPUT_BUFFER_SIZE);
+  setvbuf(output->file,&output->buffer[0],_IOFBF,output->buffer.size());
+  output->nColumns=nColumns;
+  output->nLines=0;
+  fseek(output->file,0,SEEK_END);
+  if (nColumns > 0) {
+    long size = ftell(output->file);
+    long lineSize = (long)(nColumns*sizeof(double));
+    if (size > NPY_HEADER_SIZE)
+      output->nLines = (size-NPY_HEADER_SIZE)/lineSize; // (If a line has been partially written it will be overwritten)
+    else
+      write_npy_header(output->file,0,nColumns);
+    fseek(output->file,NPY_HEADER_SIZE+output->nLines*lineSize,SEEK_SET);
+  }
+  return output;
+}
+
+void flushOutputFile(OutputFile* output)
+// Write the lines buffered in the file. The header of a .npy file is rewritten after them : it never counts more lines than the file contains
+{
+  fflush(output->file);
+  if (output->nColumns > 0) {
+    rewind(output->file);
+    write_npy_header(output->file,(int)output->nLines,output->nColumns);
+    fseek(output->file,NPY_HEADER_SIZE+output->nLines*output->nColumns*(long)sizeof(double),SEEK_SET);
+    fflush(output->file);
+  }
+}
+
+void flushOutputFiles(Run* run, int n)
+// Flush all the files the run appends lines to (n is the number of iterations done)
+{
+  for (std::map<std::string,OutputFile>::iterator it=run->outputFiles.begin();it!=run->outputFiles.end();++it)
+    flushOutputFile(&it->second);
+  run->lastFlush=n;
+  run->lastFlushTime=time(NULL);
+}
+
+void closeOutputFiles(Run* run)
+// Flush and close all the files the run appends lines to
+{
+  for (std::map<std::string,OutputFile>::iterator it=run->outputFiles.begin();it!=run->outputFiles.end();++it) {
+    flushOutputFile(&it->second);
+    fclose(it->second.file);
+  }
+  run->outputFiles.clear();
 }
 
 void writeStatus(Run* run,Configuration* config)
@@ -350,12 +518,28 @@ void writeStatus(Run* run,Configuration* config)
       ii << i;
       std::string file; // To store the name of the file
       file = config->outputDir+"chain"+ii.str()+"."+config->code+".dat" ;  // We will obtain /home/abottero/chain.321.dat for example
-      FILE* fx=fopen(file.c_str(),"a"); // Create the file if it does not exist and open it
+      FILE* fx=outputFile(run,file,0)->file; // Create the file if it does not exist and open it (the first time)
       for(int k=0; k<(int)run->chains[i]->states.back().params.size();k++) { // Loop on all the parameters
         fprintf(fx,"%6.4f ",run->chains[i]->states.back().params[k]); // Write each parameter
       }
       fprintf(fx,"%6.4f\n",run->chains[i]->states.back().E); // Write the energy at the end of the line
-      fclose(fx); // Close the file
+    }
+    if (config->writeRunStore) // Same lines in double precision in the chains history of the run store
+      append_chains_history(run,config);
+    if (config->writeRunStore && config->writeProfilesHistory) { // Current profiles of the chains (see utils/quantiles.py)
+      for(int i=0; i<(int)run->chains.size();i++) { // Loop on all the chains
+        std::ostringstream ii; // Store i as a string
+        ii << i;
+        std::vector<double> lineP,lineS;
+        for(int iz=0;iz<config->data.nzFilt-1;iz++) {
+          lineP.push_back(run->chains[i]->profilesP[iz].back());
+          if(config->swaves)
+            lineS.push_back(run->chains[i]->profilesS[iz].back());
+        }
+        append_npy_line(run,&lineP,config->runStoreDir+"profilesP"+ii.str()+".npy");
+        if(config->swaves)
+          append_npy_line(run,&lineS,config->runStoreDir+"profilesS"+ii.str()+".npy");
+      }
     }
   }
 }
@@ -367,9 +551,8 @@ void writeSwap(Run* run,Configuration* config)
   if (config->mpiConfig.rank == 0) {   // (In case of parallel implementation just one process has to create files)
     std::string file; // To store the name of the file
     file = config->outputDir+"ll."+config->code+".dat" ;  // We will obtain /home/abottero/ll.321.dat for example
-    FILE* ll=fopen(file.c_str(),"a"); // Create the file if it does not exist and open it 
+    FILE* ll=outputFile(run,file,0)->file; // Create the file if it does not exist and open it (the first time)
     fprintf(ll,"%d %d %d\n",run->swapHist.back().idxState,run->swapHist.back().idxChain,run->swapHist.back().sp);
-    fclose(ll); // Close the file
   }
 }
 
@@ -380,11 +563,16 @@ void writeSCI(Run* run,Configuration* config)
   if (config->mpiConfig.rank == 0) {   // (In case of parallel implementation just one process has to create files)
     std::string file; // To store the name of the file
     file = config->outputDir+"sci."+config->code+".dat";  // We will obtain /home/abottero/sci.321.dat for example
-    FILE* sci=fopen(file.c_str(),"a"); // Create the file if it does not exist and open it 
+    FILE* sci=outputFile(run,file,0)->file; // Create the file if it does not exist and open it (the first time)
     for(unsigned int k=0;k<run->chains.size()-1;k++)
-      fprintf(sci,"%Le ",run->SCI.back()[k]);
+      fprintf(sci,"%Le ",run->SCI[k].back());
     fprintf(sci,"\n");
-    fclose(sci); // Close the file
+    if (config->writeRunStore) {
+      std::vector<double> line;
+      for(unsigned int k=0;k<run->chains.size()-1;k++)
+        line.push_back((double)run->SCI[k].back());
+      append_npy_line(run,&line,config->runStoreDir+"sci.npy");
+    }
   }
 }
 
@@ -400,9 +588,20 @@ void writeStats(Run* run,Configuration* config)
       ii << i;
       std::string file; // To store the name of the file
       file = config->outputDir+"stats"+ii.str()+"."+config->code+".dat"; // We will obtain /home/abottero/stats1.321.dat for example
-      FILE* stats=fopen(file.c_str(),"a"); // Create the file if it does not exist and open it 
+      FILE* stats=outputFile(run,file,0)->file; // Create the file if it does not exist and open it (the first time)
       fprintf(stats,"%d %d %d %d %d %d %f %f\n",run->chains[i]->at,run->chains[i]->rt,run->chains[i]->od,run->chains[i]->ps,run->chains[i]->as,run->chains[i]->rs,(double)run->chains[i]->at*100/(run->chains[i]->at+run->chains[i]->rt),(double)run->chains[i]->as*100/run->chains[i]->ps);
-      fclose(stats); // Close the file
+      if (config->writeRunStore) {
+        std::vector<double> line;
+        line.push_back(run->chains[i]->at);
+        line.push_back(run->chains[i]->rt);
+        line.push_back(run->chains[i]->od);
+        line.push_back(run->chains[i]->ps);
+        line.push_back(run->chains[i]->as);
+        line.push_back(run->chains[i]->rs);
+        line.push_back((double)run->chains[i]->at*100/(run->chains[i]->at+run->chains[i]->rt));
+        line.push_back((double)run->chains[i]->as*100/run->chains[i]->ps);
+        append_npy_line(run,&line,config->runStoreDir+"stats"+ii.str()+".npy");
+      }
     }
   }
 }
@@ -419,7 +618,7 @@ void printStatus(Run* run,Configuration* config,int view)
       std::cout << "-----------" << std::endl;
       std::cout << "_Chain["<< i <<"] : " << std::endl;
       std::cout << std::endl;
-      std::cout << "  Length of the chain : "<< run->chains[i]->states.size() << std::endl;
+      std::cout << "  Length of the chain : "<< run->chains[i]->iterations.back()+1 << " (" << run->chains[i]->states.size() << " states kept)" << std::endl;
       std::cout << "  Temperature : "<< run->chains[i]->T << std::endl;
       std::cout << "  Number of components to modify at each step : "<< run->chains[i]->nc << std::endl << std::endl;
       std::cout <<"Three last steps : "<< std::endl ;
@@ -442,9 +641,9 @@ void printStatus(Run* run,Configuration* config,int view)
       std::cout << "-----------" << std::endl;
     }
   //  std::cout << "Last 5 lines of the matrix of importance weights :" << std::endl;
-  //  for(unsigned int i=run->SCI.size()-5; i<run->SCI.size();i++) {
+  //  for(unsigned int i=run->SCI[0].size()-5; i<run->SCI[0].size();i++) {
   //      for(unsigned int k=0;k<run->chains.size()-1;k++) {
-  //          std::cout << run->SCI[i][k] << " ";
+  //          std::cout << run->SCI[k][i] << " ";
   //      }
   //      std::cout <<  std::endl;
   //  }
@@ -470,6 +669,13 @@ void summary(Run* run, const Configuration* config)
       std::cout << "Probability of swapping : : " << (double)run->chains[i]->as*100/run->chains[i]->ps << " % " <<std::endl;
       std::cout << "-----------" << std::endl;
     }
+    if (config->timesCacheSize > 0) {
+      long lookups=config->timesCache.hits+config->timesCache.misses;
+      std::cout << "Travel times cache : " << config->timesCache.hits << " hits, " << config->timesCache.misses << " misses";
+      if (lookups > 0)
+        std::cout << " (" << (double)config->timesCache.hits*100/lookups << " % of the eikonal computations avoided)";
+      std::cout << std::endl;
+    }
     std::cout << "***************************** "<< std::endl << std::endl;
   }
 }
@@ -499,6 +705,15 @@ void write_summary(const Run* run, const Configuration* config)
       file << "    Probability of swapping : : " << (double)run->chains[i]->as*100/run->chains[i]->ps << " % " <<std::endl;
       file << std::endl << std::endl;
     }
+    if (config->timesCacheSize > 0) {
+      long lookups=config->timesCache.hits+config->timesCache.misses;
+      file << "  Travel times cache : " << config->timesCache.hits << " hits, " << config->timesCache.misses << " misses";
+      if (lookups > 0)
+        file << " (" << (double)config->timesCache.hits*100/lookups << " % of the eikonal computations avoided)";
+      file << std::endl;
+    }
+    if (config->weightsAccumulator == 2)
+      file << "  Weighted statistics : maximum relative difference between log-sum-exp and MPFR : " << run->accumulatorsDifference << std::endl;
     file << std::endl;
     time_t t=time(NULL);
     if (t == -1) { // Sometimes time() returns -1
@@ -526,6 +741,10 @@ void writeAverages(const Run* run, const Configuration* config)
     }
     fileGlobalAverage.close(); 
     fileGlobalVar.close(); 
+    if (config->writeRunStore) {
+      write_two_columns_npy_file(&config->data.zFiltp,&run->averageP,config->runStoreDir+"globalAverageP.npy");
+      write_two_columns_npy_file(&config->data.zFiltp,&run->varP,config->runStoreDir+"globalVarP.npy");
+    }
     if(config->swaves) {
       strFileGlobalVar = config->outputDir+"globalVarS."+config->code+".dat";   // We will obtain /home/abottero/globalVarS.451.dat for example
       strFileGlobalVarVpVs = config->outputDir+"globalVarVpVs."+config->code+".dat";   // We will obtain /home/abottero/globalVarVpVs.451.dat for example
@@ -539,6 +758,11 @@ void writeAverages(const Run* run, const Configuration* config)
       fileGlobalAverage.close(); 
       fileGlobalVar.close();
       fileGlobalVarVpVs.close();
+      if (config->writeRunStore) {
+        write_two_columns_npy_file(&config->data.zFiltp,&run->averageS,config->runStoreDir+"globalAverageS.npy");
+        write_two_columns_npy_file(&config->data.zFiltp,&run->varS,config->runStoreDir+"globalVarS.npy");
+        write_two_columns_npy_file(&config->data.zFiltp,&run->varVpVs,config->runStoreDir+"globalVarVpVs.npy");
+      }
     }
     for(int i=0; i<(int)run->chains.size();i++) { // Loop on all the chains
       std::ostringstream ii;   // Store i as a string
@@ -551,7 +775,7 @@ void writeAverages(const Run* run, const Configuration* config)
       std::ofstream fileAverage(strFileAverage.c_str()),fileVar(strFileVar.c_str()),fileQinf(strFileQinf.c_str()),fileQsup(strFileQsup.c_str()); 
       for (int iz=0;iz<config->data.nzFilt-1;iz++) { // Loop on the values
         fileAverage << config->data.zFiltp[iz] << " " << run->chains[i]->averageP[iz] << std::endl;
-        fileVar << config->data.zFiltp[iz] << " " << run->chains[i]->varP[iz]/((double)((int)run->chains[i]->profilesP[iz].size()-1)) << std::endl;
+        fileVar << config->data.zFiltp[iz] << " " << run->chains[i]->varP[iz]/((double)run->chains[i]->iterations.back()) << std::endl;
         fileQinf << config->data.zFiltp[iz] << " " << run->chains[i]->qInfP[iz] << std::endl;
         fileQsup << config->data.zFiltp[iz] << " " << run->chains[i]->qSupP[iz] << std::endl;
       }
@@ -559,6 +783,15 @@ void writeAverages(const Run* run, const Configuration* config)
       fileVar.close(); 
       fileQinf.close(); 
       fileQsup.close(); 
+      if (config->writeRunStore) {
+        std::vector<double> var;
+        for (int iz=0;iz<config->data.nzFilt-1;iz++)
+          var.push_back(run->chains[i]->varP[iz]/((double)run->chains[i]->iterations.back()));
+        write_two_columns_npy_file(&config->data.zFiltp,&run->chains[i]->averageP,config->runStoreDir+"averageP"+ii.str()+".npy");
+        write_two_columns_npy_file(&config->data.zFiltp,&var,config->runStoreDir+"varP"+ii.str()+".npy");
+        write_two_columns_npy_file(&config->data.zFiltp,&run->chains[i]->qInfP,config->runStoreDir+"qInfP"+ii.str()+".npy");
+        write_two_columns_npy_file(&config->data.zFiltp,&run->chains[i]->qSupP,config->runStoreDir+"qSupP"+ii.str()+".npy");
+      }
       
       if(config->swaves) {
         strFileAverage = config->outputDir+"averageS"+ii.str()+"."+config->code+".dat"; // We will obtain /home/abottero/averageS0.451.dat for example
@@ -568,7 +801,7 @@ void writeAverages(const Run* run, const Configuration* config)
         std::ofstream fileAverageS(strFileAverage.c_str()),fileVarS(strFileVar.c_str()),fileQinfS(strFileQinf.c_str()),fileQsupS(strFileQsup.c_str()); 
         for (int iz=0;iz<config->data.nzFilt-1;iz++) { // Loop on the values
           fileAverageS << config->data.zFiltp[iz] << " " << run->chains[i]->averageS[iz] << std::endl;
-          fileVarS << config->data.zFiltp[iz] << " " << run->chains[i]->varS[iz]/((double)((int)run->chains[i]->profilesS[iz].size()-1))  << std::endl;
+          fileVarS << config->data.zFiltp[iz] << " " << run->chains[i]->varS[iz]/((double)run->chains[i]->iterations.back())  << std::endl;
           fileQinfS << config->data.zFiltp[iz] << " " << run->chains[i]->qInfS[iz] << std::endl;
           fileQsupS << config->data.zFiltp[iz] << " " << run->chains[i]->qSupS[iz] << std::endl;
         }
@@ -576,80 +809,121 @@ void writeAverages(const Run* run, const Configuration* config)
         fileVarS.close(); 
         fileQinfS.close(); 
         fileQsupS.close();       
+        if (config->writeRunStore) {
+          std::vector<double> var;
+          for (int iz=0;iz<config->data.nzFilt-1;iz++)
+            var.push_back(run->chains[i]->varS[iz]/((double)run->chains[i]->iterations.back()));
+          write_two_columns_npy_file(&config->data.zFiltp,&run->chains[i]->averageS,config->runStoreDir+"averageS"+ii.str()+".npy");
+          write_two_columns_npy_file(&config->data.zFiltp,&var,config->runStoreDir+"varS"+ii.str()+".npy");
+          write_two_columns_npy_file(&config->data.zFiltp,&run->chains[i]->qInfS,config->runStoreDir+"qInfS"+ii.str()+".npy");
+          write_two_columns_npy_file(&config->data.zFiltp,&run->chains[i]->qSupS,config->runStoreDir+"qSupS"+ii.str()+".npy");
+        }
       }
     }
   }
 }
 
-void writeBestProfiles(Run* run, const Configuration* config)
-// Write the best profiles on files 
-// TODO : This could be far more optimized!
+bool lowerEnergy(const BestModel& model1, const BestModel& model2)
+// Order of the heap of the best models (run->bestModels) : the model of highest energy is on top
 {
-  std::vector<double>::const_iterator EmaxIt = std::max_element(run->bestE.begin(), run->bestE.end());
-  std::vector<double> temp_profileP, temp_profileS;
-  double Emax = *EmaxIt;
-  int EmaxIdx = (int)(EmaxIt - run->bestE.begin());
-  for(int i=0; i<(int)run->chains.size();i++) { // Loop on all the chains
-  // std::cout << std::endl << "Chain " << i << ":" << std::endl;
-    for(int j=0; j<(int)run->chains[i]->states.size();j++) { // Loop on all the states
-    //  std::cout << run->chains[i]->states[j].E*run->chains[i]->T << " ";
-      bool alreadyContained = false;
-      for (unsigned int k=0; k<run->bestE.size();k++) {
-        if (fabs(run->bestE[k]-run->chains[i]->states[j].E*run->chains[i]->T)<TINYVAL)
-          alreadyContained = true;
-      }
-      if(!alreadyContained) { // run->bestE does not contains the state's energy
-        if((int)run->bestE.size() < config->nBestProfiles) { // If size of run->bestE is smaller that config->nBestProfile
-          run->bestE.push_back(run->chains[i]->states[j].E*run->chains[i]->T);
-          run->idxE.push_back(j);
-          run->chainBestE.push_back(i);
-          EmaxIt = std::min_element(run->bestE.begin(), run->bestE.end());
-          Emax = *EmaxIt; 
-          EmaxIdx = (int)(EmaxIt - run->bestE.begin());
-        }
-        else if (run->chains[i]->states[j].E*run->chains[i]->T < Emax) { // If this state's energy is greater than the ones stored
-          run->bestE[EmaxIdx] = run->chains[i]->states[j].E*run->chains[i]->T;
-          run->idxE[EmaxIdx]=j;
-          run->chainBestE[EmaxIdx]=i;
-          EmaxIt = std::max_element(run->bestE.begin(), run->bestE.end());
-          Emax = *EmaxIt; 
-          EmaxIdx = (int)(EmaxIt - run->bestE.begin());
-        }
-      }
-    }
-  //  std::cout << std::endl;
+  return model1.E < model2.E;
+}
+
+void considerBestModel(Run* run, const Configuration* config, int i, int j)
+// Put the j th state kept by the chain i in the list of the best models (run->bestModels) if it is better than one of them and if its
+// energy is not already in it. The list is a heap whose first element is the worst of the best models : most states are rejected by
+// comparing them to it, and replacing it costs O(log(N_BEST_PROFILES))
+{
+  std::vector<BestModel>* bestModels=&run->bestModels;
+  double E = run->chains[i]->states[j].E*run->chains[i]->T;
+  bool full = ((int)bestModels->size() >= std::max(config->nBestProfiles,1)); // The best model is always kept (see computeResidualsForBestModel)
+  if (full && E >= bestModels->front().E) // This state's energy is greater than the ones stored
+    return;
+  for (unsigned int l=0; l<bestModels->size();l++) {
+    if (fabs((*bestModels)[l].E-E)<TINYVAL) // bestModels already contains the state's energy
+      return;
   }
- // std::cout << "Best energies :" << std::endl;
-  int status;
-  if (config->mpiConfig.rank == 0) {
-    status = system("rm -f best*.dat"); // To remove the old files (this is not optimum at all) TODO
-    if(status != 0) {
-      std::cout << "Error while deleting best profiles files" << std::endl;
-      exit(1);
-    }
+  if (full) { // The worst of the best models is removed
+    std::pop_heap(bestModels->begin(),bestModels->end(),lowerEnergy);
+    bestModels->pop_back();
   }
-  for (unsigned int k=0; k<run->bestE.size();k++) { // Loop on the best models
-  //  std::cout << run->bestE[k] << " (chain : " << run->chainBestE[k] << " idx : " << run->idxE[k] << ")  ";
-    temp_profileP.clear();
-    temp_profileS.clear();
-    for (int iz=0;iz<config->data.nzFilt-1;iz++) {
-      temp_profileP.push_back(run->chains[run->chainBestE[k]]->profilesP[iz][run->idxE[k]]);
-      if(config->swaves)
-        temp_profileS.push_back(run->chains[run->chainBestE[k]]->profilesS[iz][run->idxE[k]]);
-    }
-    if (config->mpiConfig.rank == 0) {   // (In case of parallel implementation just one process has to create files)
-      std::ostringstream iiChain, iiIdx, iiE;   // Store as strings
-      iiChain << run->chainBestE[k];
-      iiIdx << run->idxE[k];
-      iiE << run->bestE[k];
-      std::string nameP = config->outputDir+"bestPprofile.chain"+iiChain.str()+".idx"+iiIdx.str()+".E"+iiE.str()+"."+config->code+".dat"; 
-      write_two_columns_file(&config->data.zFiltp,&temp_profileP, nameP);
-      if(config->swaves) {
-        std::string nameS = config->outputDir+"bestSprofile.chain"+iiChain.str()+".idx"+iiIdx.str()+".E"+iiE.str()+"."+config->code+".dat"; 
-        write_two_columns_file(&config->data.zFiltp,&temp_profileS, nameS);
-      }
+  BestModel model;
+  model.E=E;
+  model.idx=run->chains[i]->iterations[j];
+  model.chain=i;
+  bestModels->push_back(model);
+  BestModel* added=&bestModels->back();
+  added->profileP.resize(config->data.nzFilt-1);
+  if (config->swaves)
+    added->profileS.resize(config->data.nzFilt-1);
+  for (int iz=0;iz<config->data.nzFilt-1;iz++) { // The profiles are copied : the state may be removed from the history later (see pruneHistory)
+    added->profileP[iz]=run->chains[i]->profilesP[iz][j];
+    if(config->swaves)
+      added->profileS[iz]=run->chains[i]->profilesS[iz][j];
+  }
+  std::push_heap(bestModels->begin(),bestModels->end(),lowerEnergy);
+}
+
+void updateBestModels(Run* run, const Configuration* config)
+// Put the states just added to the chains in the list of the best models (see considerBestModel). Must be called after pruneHistory
+{
+  for(int i=0; i<(int)run->chains.size();i++) // Loop on all the chains
+    considerBestModel(run,config,i,(int)run->chains[i]->states.size()-1);
+}
+
+int bestModel(const Run* run)
+// Give the position of the best model in run->bestModels
+{
+  int best=0;
+  for (int k=1; k<(int)run->bestModels.size();k++) {
+    if (run->bestModels[k].E < run->bestModels[best].E)
+      best=k;
+  }
+  return best;
+}
+
+bool isBestProfileFile(const std::string& name, const Configuration* config)
+// Tell if the file name is a best profile written by writeBestProfiles
+{
+  std::string end="."+config->code+".dat";
+  return (name.compare(0,12,"bestPprofile") == 0 || name.compare(0,12,"bestSprofile") == 0) && name.size() > end.size() &&
+         name.compare(name.size()-end.size(),end.size(),end) == 0;
+}
+
+void writeBestProfiles(const Run* run, const Configuration* config)
+// Write the best profiles on files (bestPprofile.chainI.idxJ.EX.XXX.dat) and remove the files of the models that are not among them anymore.
+// The best models are kept up to date at each iteration (see updateBestModels) : it does not depend on the length of the history
+{
+  if (config->mpiConfig.rank != 0 || config->nBestProfiles < 1) // (In case of parallel implementation just one process has to create files)
+    return;
+  std::vector<std::string> names; // Names of the files of the best models
+  for (unsigned int k=0; k<run->bestModels.size();k++) { // Loop on the best models
+    const BestModel* model=&run->bestModels[k];
+    std::ostringstream iiChain, iiIdx, iiE;   // Store as strings
+    iiChain << model->chain;
+    iiIdx << model->idx;
+    iiE << model->E;
+    std::string nameP = "bestPprofile.chain"+iiChain.str()+".idx"+iiIdx.str()+".E"+iiE.str()+"."+config->code+".dat";
+    write_two_columns_file(&config->data.zFiltp,&model->profileP,config->outputDir+nameP);
+    names.push_back(nameP);
+    if(config->swaves) {
+      std::string nameS = "bestSprofile.chain"+iiChain.str()+".idx"+iiIdx.str()+".E"+iiE.str()+"."+config->code+".dat";
+      write_two_columns_file(&config->data.zFiltp,&model->profileS,config->outputDir+nameS);
+      names.push_back(nameS);
     }
   }
+  DIR* directory=opendir(config->outputDir.c_str()); // The old files are removed
+  if (directory == NULL) {
+    std::cout << "Error while deleting best profiles files" << std::endl;
+    exit(1);
+  }
+  struct dirent* entry;
+  while ((entry=readdir(directory)) != NULL) {
+    std::string name=entry->d_name;
+    if (isBestProfileFile(name,config) && std::find(names.begin(),names.end(),name) == names.end())
+      remove((config->outputDir+name).c_str());
+  }
+  closedir(directory);
 }
 
 void computeResidualsForBestModel(Run* run, Configuration* config)
@@ -657,34 +931,17 @@ void computeResidualsForBestModel(Run* run, Configuration* config)
 {
   if (config->mpiConfig.rank == 0) 
     std::cout << "Recomputing forward problem (in serial) for best model..." << std::endl;    
-  int temp_nBestProfiles=config->nBestProfiles;
-  config->nBestProfiles=1; // If the user have set 0 the following would not work
-  writeBestProfiles(run, config); // Store the properties of the best profile in run->bestE[k],run->idxE[k], run->chainBestE[k]
-  // write the best profile on a file
-  std::vector<double> bestProfileP, bestProfileS;
-  std::vector<double>::const_iterator EminIt = std::min_element(run->bestE.begin(), run->bestE.end());
-  int EminIdx = (int)(EminIt - run->bestE.begin()); // Index of the minimum energy
-  // double Emin = *EminIt;
-  for (int iz=0;iz<config->data.nzFilt-1;iz++) {
-    bestProfileP.push_back(run->chains[run->chainBestE[EminIdx]]->profilesP[iz][run->idxE[EminIdx]]);
-    if(config->swaves)
-      bestProfileS.push_back(run->chains[run->chainBestE[EminIdx]]->profilesS[iz][run->idxE[EminIdx]]);
-  }
-  VelocityModel velModel;
-  velModel.nx=config->data.nx; velModel.ny=config->data.ny; velModel.nz=config->data.nzFilt;
-  velModel.dx=config->data.dx; velModel.dy=config->data.dy; velModel.dz=config->data.dzFilt;
-  calculateShiftForEachShot(&velModel,config);
-  //velModel.xmin = config->data.xminGrid; velModel.ymin = config->data.yminGrid; velModel.zmin = config->data.zminGrid;
-  velModel.velP= new tab3d<double>(velModel.nz-1,velModel.nx-1,velModel.ny-1,-1.0); // Create a (nz-1,nx-1,ny-1) mesh and initialize every cell at -1 
+  writeBestProfiles(run, config); // Write the best profiles on files
+  const BestModel* best=&run->bestModels[bestModel(run)]; // The best model is always kept, even if N_BEST_PROFILES = 0
+  std::vector<double> bestProfileP=best->profileP, bestProfileS=best->profileS;
+  Workspace* workspace=run->chains[best->chain]->workspace; // The grids of the chain of the best model are reused
+  VelocityModel* velModel=&workspace->velModel;
  // Copy the file content into the velocity model (extend the 1D profile to obtain a 3D profile).
-  meshing(&bestProfileP,&velModel,false); // Extend this profile on the whole mesh 
+  meshing(&bestProfileP,velModel,false); // Extend this profile on the whole mesh 
   if (config->swaves) {
-    velModel.velS= new tab3d<double>(velModel.nz-1,velModel.nx-1,velModel.ny-1,-1.0); // Create a (nz-1,nx-1,ny-1) mesh and initialize every cell at -1 
     // Copy the file content into the velocity model (extend the 1D profile to obtain a 3D profile).
-    meshing(&bestProfileS,&velModel,true); // Extend this profile on the whole mesh
+    meshing(&bestProfileS,velModel,true); // Extend this profile on the whole mesh
   } 
-  tab3d<double> tt3dP(config->data.nzFilt,config->data.nx,config->data.ny,-1.0); // Will contain the P waves arrival times. Initialize every cell at -1.0 
-  tab3d<double> tt3dS(config->data.nzFilt,config->data.nx,config->data.ny,-1.0); // TODO : this is declared even if swaves == false -> change that
 //  double E=0.0;
   ArrivalTimes arrivalTimes;
   int numberOfShots = (int)config->data.coordShots.size();
@@ -699,34 +956,28 @@ void computeResidualsForBestModel(Run* run, Configuration* config)
   else
     numberOfEikonalToCompute = numberOfShots;
   
-  std::vector<double> arrivalTimesPforCurrentShot,arrivalTimesSforCurrentShot;
+  std::vector<double> profiles=modelProfiles(velModel,config); // Its travel times may be in the cache (see lookupTimes)
+  if (!lookupTimes(&profiles,0,1,&arrivalTimes,config)) { // Not in the cache : we run the eikonal (all the shots on each process)
+    if(config->mpiConfig.rank == 0) {
+      std::cout << "       Parameters of the Eikonal: " << std::endl;
+      std::cout << "         nz: " << workspace->times[0]->get_nz() << " ny: " << workspace->times[0]->get_ny() << " nx: " << workspace->times[0]->get_nx() << std::endl;
+      std::cout << "         dz: " << velModel->dz << " dy: " << velModel->dy << " dx: " << velModel->dx << std::endl;
+      std::cout << "         zmin: " << velModel->zmin[0] << " ymin: " << velModel->ymin[0] << " xmin: " << velModel->xmin[0] << std::endl;
+      std::cout << "         nsweep: " << config->nSweeps << " epsin: " << config->epsin << std::endl;
+    }
+    computeArrivalTimes(workspace,config,0,1,&arrivalTimes); // Calculate the travel times everywhere on the mesh for every shot
+    storeTimes(&profiles,0,1,&arrivalTimes,config);
+  }
   for(int i=0;i<numberOfEikonalToCompute;i++) { // Loop on the shots
     if (i<numberOfShots) { // P waves
-      if(config->verbose2 && config->mpiConfig.rank == 0)
-        std::cout << "     Eikonal computing for best P wave velocity profile, shot number " << i+1 << " on " << numberOfShots << " ..."<< std::endl;
       indexP.push_back(i); 
-      eikonal3d(&tt3dP,&velModel,config,i,false);
-      //Calculate the P waves travel times everywhere on the mesh (put them on tt3dP) for the shot number i
-      if(i==0 && config->mpiConfig.rank == 0) {
-        std::cout << "       Parameters of the Eikonal: " << std::endl;
-        std::cout << "         nz: " << tt3dP.get_nz() << " ny: " << tt3dP.get_ny() << " nx: " << tt3dP.get_nx() << std::endl;
-        std::cout << "         dz: " << velModel.dz << " dy: " << velModel.dy << " dx: " << velModel.dx << std::endl;
-        std::cout << "         zmin: " << velModel.zmin[i] << " ymin: " << velModel.ymin[i] << " xmin: " << velModel.xmin[i] << std::endl;
-        std::cout << "         nsweep: " << config->nSweeps << " epsin: " << config->epsin << std::endl;
-      }
-      arrivalTimesPforCurrentShot.clear();
-      for(int j=0;j<numberOfStations;j++) {
-        arrivalTimes.timesP.push_back(getTime(&tt3dP,config->data.coordStations[j],&velModel,i));
-        arrivalTimesPforCurrentShot.push_back(getTime(&tt3dP,config->data.coordStations[j],&velModel,i));
-      }
-      // (above) Save the arrival times at the receivers for the shot calculated by this proc
       if (config->recalculateT0) {
         t0=0.0;
         int nUsedP=0; // Number of travel times used for P waves (some data travel times can be < 0, meaning that we don't know them)
-        for(int k=0;k<(int)arrivalTimesPforCurrentShot.size();k++) { // Calculation of t0
+        for(int k=0;k<numberOfStations;k++) { // Calculation of t0
           int idxP=i*numberOfStations+k; // index of that arrival time in the data file (picked first arrival times)
           if (config->data.times.timesP[idxP] > 0.0) {
-            t0+=config->data.times.timesP[idxP]-arrivalTimesPforCurrentShot[k];
+            t0+=config->data.times.timesP[idxP]-arrivalTimes.timesP[idxP];
             nUsedP++;
           }
         }
@@ -737,23 +988,14 @@ void computeResidualsForBestModel(Run* run, Configuration* config)
       }
     } 
     else { // S waves
-      if(config->verbose2 && config->mpiConfig.rank == 0)
-        std::cout << "     Eikonal computing for best S wave velocity profile, shot number " << i+1-numberOfShots << " on " << numberOfShots << " ..."<< std::endl;
       indexS.push_back(i-numberOfShots);
-      eikonal3d(&tt3dS,&velModel,config,i-numberOfShots,true);
-      arrivalTimesSforCurrentShot.clear();
-      // Calculate the S waves travel times everywhere on the mesh (put them on tt3dS) for the shot number i
-      for(int j=0;j<numberOfStations;j++) {
-        arrivalTimes.timesS.push_back(getTime(&tt3dS,config->data.coordStations[j],&velModel,i-numberOfShots));
-        arrivalTimesSforCurrentShot.push_back(getTime(&tt3dS,config->data.coordStations[j],&velModel,i-numberOfShots));
-      }
       if (config->recalculateT0) {
         t0=0.0;
         int nUsedS=0;  // Number of travel times used for S waves
-        for(int k=0;k<(int)arrivalTimesSforCurrentShot.size();k++) { // Calculation of t0
+        for(int k=0;k<numberOfStations;k++) { // Calculation of t0
           int idxS=(i-numberOfShots)*numberOfStations+k;
           if (config->data.times.timesS[idxS] > 0.0) {
-            t0+=config->data.times.timesS[idxS]-arrivalTimesSforCurrentShot[k];
+            t0+=config->data.times.timesS[idxS]-arrivalTimes.timesS[idxS];
             nUsedS++;
           }
         }
@@ -791,34 +1033,36 @@ void computeResidualsForBestModel(Run* run, Configuration* config)
        std::cout << "   t0S[" << idxShotS << "] = " << t0S[idxShotS] << "   ";
     std::cout << std::endl;
   }
-  E=(sumP+sumS+config->data.Ep)/(run->chains[run->chainBestE[EminIdx]]->T);
+  E=(sumP+sumS+config->data.Ep)/(run->chains[best->chain]->T);
     
-  //  E=(sumP+sumS+config->data.Ep)/(run->chains[run->chainBestE[EminIdx]]->T);
+  //  E=(sumP+sumS+config->data.Ep)/(run->chains[best->chain]->T);
   //  std::ostringstream ii;   // Store E as a string
   //  ii << E;
 
   if(config->mpiConfig.rank == 0) {
-    std::cout << "  Energy of the best model :" << E*run->chains[run->chainBestE[EminIdx]]->T << std::endl;
+    std::cout << "  Energy of the best model :" << E*run->chains[best->chain]->T << std::endl;
     if(config->swaves)
       write_two_columns_file(&arrivalTimes.timesP,&arrivalTimes.timesS, config->outputDir+"bestModelTimes."+config->code+".dat");
     else
       write_one_column_file(&arrivalTimes.timesP, config->outputDir+"bestModelTimes."+config->code+".dat");
+    if(config->writeRunStore) {
+      if(config->swaves)
+        write_two_columns_npy_file(&arrivalTimes.timesP,&arrivalTimes.timesS, config->runStoreDir+"bestModelTimes.npy");
+      else
+        write_one_column_npy_file(&arrivalTimes.timesP, config->runStoreDir+"bestModelTimes.npy");
+    }
   }
-  delete velModel.velP;
-  if(config->swaves) 
-    delete velModel.velS;
-  config->nBestProfiles=temp_nBestProfiles;
   if (config->mpiConfig.rank == 0) 
     std::cout << "Done !" << std::endl;
 }
 
-void writeMinMaxProfiles(Run* run, const Configuration* config)
-// Update min and max velocities explored by the run, write them on file
+void writeMinMaxProfiles(Run* run, const Configuration* config, bool write)
+// Update min and max velocities explored by the run, write them on file if write is true
 {
 
   if(config->verbose2 && config->mpiConfig.rank == 0)
     std::cout << "Updating max and min profiles investigated by the run... " << std::endl;
-  int it=run->chains[0]->profilesP[0].size()-1;
+  int it=run->chains[0]->iterations.back();
   
   //************** Update MIN and MAX profiles *****************//
   double lastPvel = 0.0, lastSvel=0.0;
@@ -838,7 +1082,7 @@ void writeMinMaxProfiles(Run* run, const Configuration* config)
           run->chains[i]->minS[iz] = lastSvel;
       }
     }
-    if (config->mpiConfig.rank == 0) {   // (In case of parallel implementation just one process has to create files)
+    if (config->mpiConfig.rank == 0 && write) {   // (In case of parallel implementation just one process has to create files)
       // ************** write them on files ***************** //
       std::ostringstream ii;   // Store i as a string
       ii << i;
@@ -848,6 +1092,14 @@ void writeMinMaxProfiles(Run* run, const Configuration* config)
         write_two_columns_file(&config->data.zFiltp,&run->chains[i]->maxS, config->outputDir+"maxS."+ii.str()+"."+config->code+".dat");
         write_two_columns_file(&config->data.zFiltp,&run->chains[i]->minS, config->outputDir+"minS."+ii.str()+"."+config->code+".dat");
       }
+      if(config->writeRunStore) {
+        write_two_columns_npy_file(&config->data.zFiltp,&run->chains[i]->maxP, config->runStoreDir+"maxP."+ii.str()+".npy");
+        write_two_columns_npy_file(&config->data.zFiltp,&run->chains[i]->minP, config->runStoreDir+"minP."+ii.str()+".npy");
+        if(config->swaves) {
+          write_two_columns_npy_file(&config->data.zFiltp,&run->chains[i]->maxS, config->runStoreDir+"maxS."+ii.str()+".npy");
+          write_two_columns_npy_file(&config->data.zFiltp,&run->chains[i]->minS, config->runStoreDir+"minS."+ii.str()+".npy");
+        }
+      }
     }
   }
   std::vector<double> minPforThisDepth,maxPforThisDepth,minSforThisDepth,maxSforThisDepth;
@@ -877,13 +1129,21 @@ void writeMinMaxProfiles(Run* run, const Configuration* config)
       run->maxS[iz] = run->chains[0]->maxS[iz];  
     }
   }
-  if (config->mpiConfig.rank == 0) {   // (In case of parallel implementation just one process has to create files)
+  if (config->mpiConfig.rank == 0 && write) {   // (In case of parallel implementation just one process has to create files)
     write_two_columns_file(&config->data.zFiltp,&run->maxP, config->outputDir+"maxP."+config->code+".dat");
     write_two_columns_file(&config->data.zFiltp,&run->minP, config->outputDir+"minP."+config->code+".dat");
     if(config->swaves) {
       write_two_columns_file(&config->data.zFiltp,&run->maxS, config->outputDir+"maxS."+config->code+".dat");
       write_two_columns_file(&config->data.zFiltp,&run->minS, config->outputDir+"minS."+config->code+".dat");
     }
+    if(config->writeRunStore) {
+      write_two_columns_npy_file(&config->data.zFiltp,&run->maxP, config->runStoreDir+"maxP.npy");
+      write_two_columns_npy_file(&config->data.zFiltp,&run->minP, config->runStoreDir+"minP.npy");
+      if(config->swaves) {
+        write_two_columns_npy_file(&config->data.zFiltp,&run->maxS, config->runStoreDir+"maxS.npy");
+        write_two_columns_npy_file(&config->data.zFiltp,&run->minS, config->runStoreDir+"minS.npy");
+      }
+    }
   }
   if(config->verbose2 && config->mpiConfig.rank == 0)
     std::cout << "Done!" << std::endl << std::endl;
@@ -951,3 +1211,552 @@ void write_four_columns_file(const std::vector<int>* column1, const std::vector<
   }
 }
 
+
+void write_npy_header(FILE* file, const int nLines, const int nColumns)
+// Write the header of a .npy file (NumPy binary format) containing nLines x nColumns doubles. It is always NPY_HEADER_SIZE long
+// so that it can be rewritten in place when lines are appended (see append_npy_line). If nColumns == 1 the array is 1D (like np.loadtxt)
+{
+  char header[NPY_HEADER_SIZE];
+  int one = 1;
+  char byteOrder = '>';
+  if (*(char*)&one == 1) // Little endian machine
+    byteOrder = '<';
+  memset(header,' ',NPY_HEADER_SIZE);
+  memcpy(header,"\x93NUMPY\x01\x00",8); // Magic string and version of the format (1.0)
+  header[8] = (char)((NPY_HEADER_SIZE-10) & 0xff); // Length of the header dictionary (little endian unsigned short)
+  header[9] = (char)((NPY_HEADER_SIZE-10) >> 8);
+  int n;
+  if (nColumns == 1)
+    n = sprintf(header+10,"{'descr': '%cf8', 'fortran_order': False, 'shape': (%d,), }",byteOrder,nLines);
+  else
+    n = sprintf(header+10,"{'descr': '%cf8', 'fortran_order': False, 'shape': (%d, %d), }",byteOrder,nLines,nColumns);
+  header[10+n] = ' '; // Remove the '\0' added by sprintf, the dictionary is padded with spaces...
+  header[NPY_HEADER_SIZE-1] = '\n'; // ... and terminated by a newline
+  fwrite(header,sizeof(char),NPY_HEADER_SIZE,file);
+}
+
+void write_npy_file(const std::vector<double>* values, const int nColumns, const std::string name_of_file)
+// Write a .npy file from a vector containing the values line by line (nColumns values per line)
+{
+  FILE* file=fopen(name_of_file.c_str(),"wb");
+  if (file == NULL) {
+    std::cout << "Unable to open file "+name_of_file << std::endl;
+    exit(0);
+  }
+  write_npy_header(file,(int)(*values).size()/nColumns,nColumns);
+  if (!(*values).empty())
+    fwrite(&(*values)[0],sizeof(double),(*values).size(),file);
+  fclose(file);
+}
+
+void write_one_column_npy_file(const std::vector<double>* column, const std::string name_of_file)
+// Write a vector into a one column .npy file
+{
+  write_npy_file(column,1,name_of_file);
+}
+
+void write_two_columns_npy_file(const std::vector<double>* column1, const std::vector<double>* column2, const std::string name_of_file)
+// Write a two columns .npy file from two vectors of the same size
+{
+  if ((*column1).size() != (*column2).size())
+    std::cout << "Impossible to create the file : "+name_of_file+" -> the two columns don't have the same size" << std::endl;
+  std::vector<double> values;
+  for (unsigned int i = 0; i < (*column1).size() && i < (*column2).size(); i++) { // Loop on the lines
+    values.push_back((*column1)[i]);
+    values.push_back((*column2)[i]);
+  }
+  write_npy_file(&values,2,name_of_file);
+}
+
+void append_npy_line(Run* run, const std::vector<double>* line, const std::string name_of_file)
+// If it does not exist, creates the .npy file. Writes a new line at the end of it. Its header is updated when it is flushed (see flushOutputFile)
+{
+  OutputFile* output=outputFile(run,name_of_file,(int)(*line).size());
+  fwrite(&(*line)[0],sizeof(double),(*line).size(),output->file);
+  output->nLines++;
+}
+
+void write_chains_header(FILE* file, const Configuration* config)
+// Write the header of the chains history file. It is always CHAINS_HEADER_SIZE long :
+// magic string "IMCHAINS", then version, npu, nbt and swaves as 4 bytes integers (machine byte order) and the type of the values
+// as a NumPy dtype string ("<f8" or ">f8", it gives also the byte order of the integers). The rest is filled with zeros
+{
+  char header[CHAINS_HEADER_SIZE];
+  int one = 1;
+  char byteOrder = '>';
+  if (*(char*)&one == 1) // Little endian machine
+    byteOrder = '<';
+  memset(header,0,CHAINS_HEADER_SIZE);
+  memcpy(header,"IMCHAINS",8);
+  int values[4] = {1,config->npu,config->nbt,config->swaves}; // Version of the format, npu, nbt, swaves
+  memcpy(header+8,values,sizeof(values));
+  sprintf(header+24,"%cf8",byteOrder);
+  fwrite(header,sizeof(char),CHAINS_HEADER_SIZE,file);
+}
+
+void append_chains_history(Run* run, const Configuration* config)
+// If it does not exist, creates the chains history file (runStoreXXX/chains.bin). Writes the current state of all the chains at the
+// end of it. After the header the file is a C ordered array of doubles of shape (number of iterations, nbt, number of parameters + 1) :
+// for each iteration and each chain the parameters and then the energy. The number of iterations is given by the size of the file
+{
+  std::string name_of_file = config->runStoreDir+"chains.bin";
+  bool opened = (run->outputFiles.find(name_of_file) != run->outputFiles.end());
+  FILE* file=outputFile(run,name_of_file,0)->file; // Open the file (the first time) at its end
+  std::vector<double> line;
+  for(int i=0; i<(int)run->chains.size();i++) { // Loop on all the chains
+    line.insert(line.end(),run->chains[i]->states.back().params.begin(),run->chains[i]->states.back().params.end());
+    line.push_back(run->chains[i]->states.back().E);
+  }
+  if (!opened) { // The file has just been opened
+    long size = ftell(file);
+    long lineSize = (long)(line.size()*sizeof(double));
+    if (size < CHAINS_HEADER_SIZE) {
+      rewind(file);
+      write_chains_header(file,config);
+      size = CHAINS_HEADER_SIZE;
+    }
+    long nLines = (size-CHAINS_HEADER_SIZE)/lineSize; // (If a line has been partially written it will be overwritten)
+    fseek(file,CHAINS_HEADER_SIZE+nLines*lineSize,SEEK_SET);
+  }
+  fwrite(&line[0],sizeof(double),line.size(),file);
+}
+
+template <typename T> void write_checkpoint_vector(FILE* file, const std::vector<T>* values)
+// Write a vector in a checkpoint : its size then its values
+{
+  int n=(int)values->size();
+  fwrite(&n,sizeof(int),1,file);
+  if (n > 0)
+    fwrite(&(*values)[0],sizeof(T),n,file);
+}
+
+template <typename T> void write_checkpoint_vectors(FILE* file, const std::vector<std::vector<T> >* values)
+// Write a vector of vectors in a checkpoint
+{
+  int n=(int)values->size();
+  fwrite(&n,sizeof(int),1,file);
+  for (int k=0;k<n;k++)
+    write_checkpoint_vector(file,&(*values)[k]);
+}
+
+void read_checkpoint_values(FILE* file, void* values, size_t size, size_t n, const Configuration* config)
+// Read n values of "size" bytes in the checkpoint. Terminate if it is not possible
+{
+  if (n > 0 && fread(values,size,n,file) != n) {
+    std::cout << "Error while reading the checkpoint " << config->restartFile << " (incomplete file?)" << std::endl;
+    std::cout << "Terminating..." << std::endl;
+    exit(0);
+  }
+}
+
+template <typename T> void read_checkpoint_vector(FILE* file, std::vector<T>* values, const Configuration* config)
+// Read a vector written by write_checkpoint_vector
+{
+  int n;
+  read_checkpoint_values(file,&n,sizeof(int),1,config);
+  values->resize(n);
+  if (n > 0)
+    read_checkpoint_values(file,&(*values)[0],sizeof(T),n,config);
+}
+
+template <typename T> void read_checkpoint_vectors(FILE* file, std::vector<std::vector<T> >* values, const Configuration* config)
+// Read a vector of vectors written by write_checkpoint_vectors
+{
+  int n;
+  read_checkpoint_values(file,&n,sizeof(int),1,config);
+  values->resize(n);
+  for (int k=0;k<n;k++)
+    read_checkpoint_vector(file,&(*values)[k],config);
+}
+
+void write_checkpoint_mpfr(FILE* file, mpfr_srcptr value)
+// Write a mpfr number in a checkpoint. It is written in base 16 with all its digits : it is read back exactly
+{
+  mpfr_out_str(file,16,0,value,RND);
+  fputc('\n',file);
+}
+
+void read_checkpoint_mpfr(FILE* file, mpfr_t value, const Configuration* config)
+// Read a mpfr number written by write_checkpoint_mpfr (value must have been initialized)
+{
+  if (mpfr_inp_str(value,file,16,RND) == 0) {
+    std::cout << "Error while reading the checkpoint " << config->restartFile << " (incomplete file?)" << std::endl;
+    std::cout << "Terminating..." << std::endl;
+    exit(0);
+  }
+  int c=fgetc(file); // End of line
+  if (c != '\n')
+    ungetc(c,file);
+}
+
+void write_checkpoint_sketches(FILE* file, const std::vector<QuantileSketch>* sketches)
+// Write the quantile sketches of a chain in a checkpoint
+{
+  int n=(int)sketches->size();
+  fwrite(&n,sizeof(int),1,file);
+  for (int k=0;k<n;k++) {
+    std::vector<int> keys;
+    std::vector<long> counts;
+    for (std::map<int,long>::const_iterator it=(*sketches)[k].buckets.begin();it!=(*sketches)[k].buckets.end();++it) {
+      keys.push_back(it->first);
+      counts.push_back(it->second);
+    }
+    fwrite(&(*sketches)[k].count,sizeof(long),1,file);
+    write_checkpoint_vector(file,&keys);
+    write_checkpoint_vector(file,&counts);
+  }
+}
+
+void read_checkpoint_sketches(FILE* file, std::vector<QuantileSketch>* sketches, const Configuration* config)
+// Read the quantile sketches written by write_checkpoint_sketches
+{
+  int n;
+  read_checkpoint_values(file,&n,sizeof(int),1,config);
+  sketches->resize(n);
+  for (int k=0;k<n;k++) {
+    std::vector<int> keys;
+    std::vector<long> counts;
+    read_checkpoint_values(file,&(*sketches)[k].count,sizeof(long),1,config);
+    read_checkpoint_vector(file,&keys,config);
+    read_checkpoint_vector(file,&counts,config);
+    (*sketches)[k].buckets.clear();
+    for (int l=0;l<(int)keys.size() && l<(int)counts.size();l++)
+      (*sketches)[k].buckets[keys[l]]=counts[l];
+  }
+}
+
+std::vector<std::string> appendedFiles(const Configuration* config)
+// Return the names of the output files to which the run appends a line at each iteration (or at each swap for ll.XXX.dat)
+{
+  std::vector<std::string> files;
+  files.push_back(config->outputDir+"ll."+config->code+".dat");
+  files.push_back(config->outputDir+"sci."+config->code+".dat");
+  if (config->writeRunStore) {
+    files.push_back(config->runStoreDir+"chains.bin");
+    files.push_back(config->runStoreDir+"sci.npy");
+  }
+  for (int i=0;i<config->nbt;i++) {
+    std::ostringstream ii; // Store i as a string
+    ii << i;
+    files.push_back(config->outputDir+"chain"+ii.str()+"."+config->code+".dat");
+    files.push_back(config->outputDir+"stats"+ii.str()+"."+config->code+".dat");
+    if (config->writeRunStore) {
+      files.push_back(config->runStoreDir+"stats"+ii.str()+".npy");
+      if (config->writeProfilesHistory) {
+        files.push_back(config->runStoreDir+"profilesP"+ii.str()+".npy");
+        if (config->swaves)
+          files.push_back(config->runStoreDir+"profilesS"+ii.str()+".npy");
+      }
+    }
+  }
+  return files;
+}
+
+void writeCheckpoint(const Run* run, const Configuration* config, int n)
+// Save the state of the run at the end of the iteration n-1 in OUTPUT_FILES/XXX/checkpoint.XXX.bin (the run can restart from it : see
+// readCheckpoint). It contains the chains (states kept, statistics, profiles, quantiles, accumulators of the averages), the importance
+// weights, the best models, the states of the random number generators and the sizes of the files the run appends lines to. The file
+// is written beside and then renamed : a run stopped while it is written keeps its previous checkpoint. The files the run appends lines to
+// must have been flushed (see writeFiles)
+{
+  if (config->mpiConfig.rank != 0) // (In case of parallel implementation just one process has to create files)
+    return;
+  std::string name_of_file=config->outputDir+"checkpoint."+config->code+".bin";
+  std::string name_of_temporary_file=name_of_file+".tmp";
+  FILE* file=fopen(name_of_temporary_file.c_str(),"wb");
+  if (file == NULL) {
+    std::cout << "Unable to open file "+name_of_temporary_file << std::endl;
+    exit(0);
+  }
+  // Header : the run and the iteration it restarts from
+  fwrite("IMCHECKP",sizeof(char),8,file);
+  int header[3]={CHECKPOINT_VERSION,config->seed,n};
+  fwrite(header,sizeof(int),3,file);
+  std::vector<char> code(config->code.begin(),config->code.end());
+  write_checkpoint_vector(file,&code);
+  int structure[8]={config->npu,config->nbt,config->data.nzFilt,config->swaves,config->nWavelets,config->historyPolicy,config->quantileEstimator,
+                    config->weightsAccumulator};
+  fwrite(structure,sizeof(int),8,file);
+  // Random number generators
+  long seeds[RNG_STREAMS];
+  for (int stream=0;stream<RNG_STREAMS;stream++) {
+    SelectStream(stream);
+    GetSeed(&seeds[stream]);
+  }
+  SelectStream(0);
+  fwrite(seeds,sizeof(long),RNG_STREAMS,file);
+  long draws=numberOfRandDraws();
+  fwrite(&draws,sizeof(long),1,file);
+  // Chains
+  for (int i=0;i<config->nbt;i++) {
+    const Chain* chain=run->chains[i];
+    int nStates=(int)chain->states.size();
+    fwrite(&nStates,sizeof(int),1,file);
+    for (int k=0;k<nStates;k++) {
+      write_checkpoint_vector(file,&chain->states[k].params);
+      fwrite(&chain->states[k].wavelet,sizeof(int),1,file);
+      fwrite(&chain->states[k].E,sizeof(double),1,file);
+    }
+    write_checkpoint_vector(file,&chain->iterations);
+    int counters[6]={chain->at,chain->rt,chain->od,chain->ps,chain->as,chain->rs};
+    fwrite(counters,sizeof(int),6,file);
+    write_checkpoint_vector(file,&chain->accProba);
+    write_checkpoint_vector(file,&chain->swapProba);
+    write_checkpoint_vectors(file,&chain->profilesP);
+    write_checkpoint_vectors(file,&chain->profilesS);
+    write_checkpoint_vectors(file,&chain->sortedProfilesP);
+    write_checkpoint_vectors(file,&chain->sortedProfilesS);
+    write_checkpoint_sketches(file,&chain->sketchP);
+    write_checkpoint_sketches(file,&chain->sketchS);
+    const std::vector<double>* vectors[]={&chain->maxP,&chain->maxS,&chain->minP,&chain->minS,&chain->averageP,&chain->varP,&chain->qInfP,
+                                          &chain->qSupP,&chain->averageS,&chain->varS,&chain->qInfS,&chain->qSupS,&chain->weightedAverageP,
+                                          &chain->weightedAverageS,&chain->weightedVarP,&chain->weightedVarS,&chain->weightedVarVpVs};
+    for (int k=0;k<(int)(sizeof(vectors)/sizeof(vectors[0]));k++)
+      write_checkpoint_vector(file,vectors[k]);
+    write_checkpoint_mpfr(file,chain->sumOfweights);
+    for (int iz=0;iz<config->data.nzFilt-1;iz++) {
+      write_checkpoint_mpfr(file,chain->dotProductP[iz]);
+      write_checkpoint_mpfr(file,chain->dotProductVarP[iz]);
+      if (config->swaves) {
+        write_checkpoint_mpfr(file,chain->dotProductS[iz]);
+        write_checkpoint_mpfr(file,chain->dotProductVarS[iz]);
+        write_checkpoint_mpfr(file,chain->dotProductVarVpVs[iz]);
+      }
+    }
+    long double scaledSums[2]={chain->logScale,chain->scaledSumOfWeights};
+    fwrite(scaledSums,sizeof(long double),2,file);
+    const std::vector<long double>* scaledDotProducts[]={&chain->scaledDotProductP,&chain->scaledDotProductS,&chain->scaledDotProductVarP,
+                                                         &chain->scaledDotProductVarS,&chain->scaledDotProductVarVpVs};
+    for (int k=0;k<(int)(sizeof(scaledDotProducts)/sizeof(scaledDotProducts[0]));k++)
+      write_checkpoint_vector(file,scaledDotProducts[k]);
+    // Last profiles synthesized (WAVELET_SYNTHESIS = 1) : they are updated incrementally, the rounding errors depend on them
+    const Workspace* workspace=chain->workspace;
+    int synthesis[2]={workspace->synthesisWavelet,workspace->synthesisUpdates};
+    fwrite(synthesis,sizeof(int),2,file);
+    write_checkpoint_vector(file,&workspace->synthesisParams);
+    write_checkpoint_vector(file,&workspace->synthesisP);
+    write_checkpoint_vector(file,&workspace->synthesisS);
+  }
+  // Run
+  write_checkpoint_vectors(file,&run->SCI);
+  write_checkpoint_vector(file,&run->swapHist);
+  const std::vector<double>* vectors[]={&run->maxP,&run->maxS,&run->minP,&run->minS,&run->averageP,&run->averageS,&run->varP,&run->varS,
+                                        &run->varVpVs};
+  for (int k=0;k<(int)(sizeof(vectors)/sizeof(vectors[0]));k++)
+    write_checkpoint_vector(file,vectors[k]);
+  fwrite(&run->accumulatorsDifference,sizeof(double),1,file);
+  int nBestModels=(int)run->bestModels.size(); // (In the order of the heap)
+  fwrite(&nBestModels,sizeof(int),1,file);
+  for (int k=0;k<nBestModels;k++) {
+    const BestModel* model=&run->bestModels[k];
+    int origin[2]={model->idx,model->chain};
+    fwrite(&model->E,sizeof(double),1,file);
+    fwrite(origin,sizeof(int),2,file);
+    write_checkpoint_vector(file,&model->profileP);
+    write_checkpoint_vector(file,&model->profileS);
+  }
+  long cache[2]={config->timesCache.hits,config->timesCache.misses};
+  fwrite(cache,sizeof(long),2,file);
+  // Sizes (and headers) of the files the run appends to : the lines written after the checkpoint are removed when the run restarts
+  std::vector<std::string> files=appendedFiles(config);
+  for (int k=0;k<(int)files.size();k++) {
+    struct stat fileStatus;
+    long size=0;
+    if (stat(files[k].c_str(),&fileStatus) == 0)
+      size=(long)fileStatus.st_size;
+    std::vector<char> fileHeader(std::min(size,(long)NPY_HEADER_SIZE));
+    if (size > 0) {
+      FILE* appendedFile=fopen(files[k].c_str(),"rb");
+      if (appendedFile == NULL || fread(&fileHeader[0],sizeof(char),fileHeader.size(),appendedFile) != fileHeader.size())
+        fileHeader.clear();
+      if (appendedFile != NULL)
+        fclose(appendedFile);
+    }
+    fwrite(&size,sizeof(long),1,file);
+    write_checkpoint_vector(file,&fileHeader);
+  }
+  if (fclose(file) != 0 || rename(name_of_temporary_file.c_str(),name_of_file.c_str()) != 0) {
+    std::cout << "Error while writing the checkpoint "+name_of_file << std::endl;
+    exit(0);
+  }
+  if (config->verbose1)
+    std::cout << "Checkpoint written : " << name_of_file << " (iteration " << n << ")" << std::endl;
+}
+
+FILE* open_checkpoint(Configuration* config)
+// Open the checkpoint config->restartFile and read its header : the code, the seed and the iteration of the run (config->firstIteration)
+{
+  FILE* file=fopen(config->restartFile.c_str(),"rb");
+  if (file == NULL) {
+    std::cout << "Impossible to open the checkpoint " << config->restartFile << std::endl;
+    std::cout << "Terminating..." << std::endl;
+    exit(0);
+  }
+  char magic[8];
+  int header[3]; // Version of the format, seed, iteration
+  read_checkpoint_values(file,magic,sizeof(char),8,config);
+  read_checkpoint_values(file,header,sizeof(int),3,config);
+  if (memcmp(magic,"IMCHECKP",8) != 0 || header[0] != CHECKPOINT_VERSION) {
+    std::cout << config->restartFile << " is not a checkpoint of this version of the program" << std::endl;
+    std::cout << "Terminating..." << std::endl;
+    exit(0);
+  }
+  std::vector<char> code;
+  read_checkpoint_vector(file,&code,config);
+  config->code=std::string(code.begin(),code.end());
+  config->seed=header[1];
+  config->firstIteration=header[2];
+  return file;
+}
+
+void readCheckpointHeader(Configuration* config)
+// Read the code, the seed and the iteration of the run in the checkpoint config->restartFile
+{
+  fclose(open_checkpoint(config));
+}
+
+void readCheckpoint(Run* run, Configuration* config)
+// Restore the state of the run saved in the checkpoint config->restartFile (see writeCheckpoint). The run must have been initialized with
+// the same configuration. The lines written in the output files after the checkpoint are removed : the run goes on as if it had not stopped
+{
+  FILE* file=open_checkpoint(config);
+  int structure[8]; // npu, nbt, nzFilt, swaves, nWavelets, historyPolicy, quantileEstimator, weightsAccumulator
+  read_checkpoint_values(file,structure,sizeof(int),8,config);
+  if (structure[0] != config->npu || structure[1] != config->nbt || structure[2] != config->data.nzFilt || structure[3] != config->swaves ||
+      structure[4] != config->nWavelets || structure[5] != config->historyPolicy || structure[6] != config->quantileEstimator ||
+      structure[7] != config->weightsAccumulator) {
+    std::cout << "The configuration does not match the checkpoint " << config->restartFile << " : NPU, NBT, NZFILT (grid), SWAVES, ";
+    std::cout << "USE_ALL_WAVELETS, HISTORY_POLICY, QUANTILE_ESTIMATOR and WEIGHTS_ACCUMULATOR must be those of the run" << std::endl;
+    std::cout << "Terminating..." << std::endl;
+    exit(0);
+  }
+  // Random number generators
+  long seeds[RNG_STREAMS];
+  read_checkpoint_values(file,seeds,sizeof(long),RNG_STREAMS,config);
+  for (int stream=0;stream<RNG_STREAMS;stream++) {
+    SelectStream(stream);
+    PutSeed(seeds[stream]);
+  }
+  SelectStream(0);
+  long draws;
+  read_checkpoint_values(file,&draws,sizeof(long),1,config);
+  replayRand(config->seed,draws);
+  // Chains
+  for (int i=0;i<config->nbt;i++) {
+    Chain* chain=run->chains[i];
+    int nStates;
+    read_checkpoint_values(file,&nStates,sizeof(int),1,config);
+    chain->states.resize(nStates);
+    for (int k=0;k<nStates;k++) {
+      read_checkpoint_vector(file,&chain->states[k].params,config);
+      read_checkpoint_values(file,&chain->states[k].wavelet,sizeof(int),1,config);
+      read_checkpoint_values(file,&chain->states[k].E,sizeof(double),1,config);
+    }
+    read_checkpoint_vector(file,&chain->iterations,config);
+    int counters[6];
+    read_checkpoint_values(file,counters,sizeof(int),6,config);
+    chain->at=counters[0];
+    chain->rt=counters[1];
+    chain->od=counters[2];
+    chain->ps=counters[3];
+    chain->as=counters[4];
+    chain->rs=counters[5];
+    read_checkpoint_vector(file,&chain->accProba,config);
+    read_checkpoint_vector(file,&chain->swapProba,config);
+    read_checkpoint_vectors(file,&chain->profilesP,config);
+    read_checkpoint_vectors(file,&chain->profilesS,config);
+    read_checkpoint_vectors(file,&chain->sortedProfilesP,config);
+    read_checkpoint_vectors(file,&chain->sortedProfilesS,config);
+    read_checkpoint_sketches(file,&chain->sketchP,config);
+    read_checkpoint_sketches(file,&chain->sketchS,config);
+    std::vector<double>* vectors[]={&chain->maxP,&chain->maxS,&chain->minP,&chain->minS,&chain->averageP,&chain->varP,&chain->qInfP,
+                                    &chain->qSupP,&chain->averageS,&chain->varS,&chain->qInfS,&chain->qSupS,&chain->weightedAverageP,
+                                    &chain->weightedAverageS,&chain->weightedVarP,&chain->weightedVarS,&chain->weightedVarVpVs};
+    for (int k=0;k<(int)(sizeof(vectors)/sizeof(vectors[0]));k++)
+      read_checkpoint_vector(file,vectors[k],config);
+    read_checkpoint_mpfr(file,chain->sumOfweights,config);
+    for (int iz=0;iz<config->data.nzFilt-1;iz++) {
+      read_checkpoint_mpfr(file,chain->dotProductP[iz],config);
+      read_checkpoint_mpfr(file,chain->dotProductVarP[iz],config);
+      if (config->swaves) {
+        read_checkpoint_mpfr(file,chain->dotProductS[iz],config);
+        read_checkpoint_mpfr(file,chain->dotProductVarS[iz],config);
+        read_checkpoint_mpfr(file,chain->dotProductVarVpVs[iz],config);
+      }
+    }
+    long double scaledSums[2];
+    read_checkpoint_values(file,scaledSums,sizeof(long double),2,config);
+    chain->logScale=scaledSums[0];
+    chain->scaledSumOfWeights=scaledSums[1];
+    std::vector<long double>* scaledDotProducts[]={&chain->scaledDotProductP,&chain->scaledDotProductS,&chain->scaledDotProductVarP,
+                                                   &chain->scaledDotProductVarS,&chain->scaledDotProductVarVpVs};
+    for (int k=0;k<(int)(sizeof(scaledDotProducts)/sizeof(scaledDotProducts[0]));k++)
+      read_checkpoint_vector(file,scaledDotProducts[k],config);
+    Workspace* workspace=chain->workspace;
+    int synthesis[2];
+    read_checkpoint_values(file,synthesis,sizeof(int),2,config);
+    workspace->synthesisWavelet=synthesis[0];
+    workspace->synthesisUpdates=synthesis[1];
+    read_checkpoint_vector(file,&workspace->synthesisParams,config);
+    read_checkpoint_vector(file,&workspace->synthesisP,config);
+    read_checkpoint_vector(file,&workspace->synthesisS,config);
+  }
+  // Run
+  read_checkpoint_vectors(file,&run->SCI,config);
+  read_checkpoint_vector(file,&run->swapHist,config);
+  std::vector<double>* vectors[]={&run->maxP,&run->maxS,&run->minP,&run->minS,&run->averageP,&run->averageS,&run->varP,&run->varS,
+                                  &run->varVpVs};
+  for (int k=0;k<(int)(sizeof(vectors)/sizeof(vectors[0]));k++)
+    read_checkpoint_vector(file,vectors[k],config);
+  read_checkpoint_values(file,&run->accumulatorsDifference,sizeof(double),1,config);
+  run->lastFlush=config->firstIteration;
+  int nBestModels;
+  read_checkpoint_values(file,&nBestModels,sizeof(int),1,config);
+  run->bestModels.resize(nBestModels);
+  for (int k=0;k<nBestModels;k++) {
+    BestModel* model=&run->bestModels[k];
+    int origin[2];
+    read_checkpoint_values(file,&model->E,sizeof(double),1,config);
+    read_checkpoint_values(file,origin,sizeof(int),2,config);
+    model->idx=origin[0];
+    model->chain=origin[1];
+    read_checkpoint_vector(file,&model->profileP,config);
+    read_checkpoint_vector(file,&model->profileS,config);
+  }
+  long cache[2];
+  read_checkpoint_values(file,cache,sizeof(long),2,config);
+  config->timesCache.hits=cache[0];
+  config->timesCache.misses=cache[1];
+  // Output files : they are put back in the state they had at the checkpoint
+  std::vector<std::string> files=appendedFiles(config);
+  for (int k=0;k<(int)files.size();k++) {
+    long size;
+    std::vector<char> fileHeader;
+    read_checkpoint_values(file,&size,sizeof(long),1,config);
+    read_checkpoint_vector(file,&fileHeader,config);
+    if (config->mpiConfig.rank != 0) // (In case of parallel implementation just one process modifies the files)
+      continue;
+    struct stat fileStatus;
+    if (size == 0) // The file did not exist yet
+      remove(files[k].c_str());
+    else if (stat(files[k].c_str(),&fileStatus) != 0 || (long)fileStatus.st_size < size)
+      std::cout << "Warning : " << files[k] << " is shorter than at the checkpoint, some of its lines are missing" << std::endl;
+    else if (truncate(files[k].c_str(),(off_t)size) == 0 && !fileHeader.empty()) { // (The header of a .npy file counts its lines)
+      FILE* appendedFile=fopen(files[k].c_str(),"r+b");
+      if (appendedFile != NULL) {
+        fwrite(&fileHeader[0],sizeof(char),fileHeader.size(),appendedFile);
+        fclose(appendedFile);
+      }
+    }
+  }
+  fclose(file);
+  if (config->mpiConfig.rank == 0) {
+    std::string conf(config->outputDir+"config."+config->code+".dat");
+    std::ofstream confFile(conf.c_str(), std::ios::app); // Open the file and put the cursor at the end
+    char buffer[80];
+    convertTime(buffer, config->startTime);
+    confFile << std::endl << "Restarted from iteration " << config->firstIteration << " (" << config->restartFile << ") : " << buffer << std::endl;
+    confFile.close();
+    std::cout << "The run " << config->code << " restarts from iteration " << config->firstIteration << std::endl << std::endl;
+  }
+}
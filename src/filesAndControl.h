@@ -13,6 +13,20 @@ void printEvolution(const int n, const Run* run,const Configuration* config);
 // Print the iteration number n. TODO : add a % done and at when the run will finish.
 void writeFiles(Run* run, Configuration* config, int n);
 // Write informations on files
+void catchSignal(int signal);
+// Signal handler : the action requested is only recorded, it is done at the end of the iteration (see writeFiles)
+void installSignalHandlers();
+// Catch SIGUSR1 (flush the output files), SIGTERM and SIGINT (flush them, write a checkpoint if CHECKPOINT_ITERATIONS > 0 and stop the run)
+int requestedAction(const Configuration* config);
+// Return the action requested by the signals caught since the last call (0 : none, SIGNAL_FLUSH or SIGNAL_STOP)
+OutputFile* outputFile(Run* run, const std::string& name_of_file, int nColumns);
+// Return the file name_of_file the run appends lines to. It is opened the first time and stays open until closeOutputFiles
+void flushOutputFile(OutputFile* output);
+// Write the lines buffered in the file (and the header of a .npy file)
+void flushOutputFiles(Run* run, int n);
+// Flush all the files the run appends lines to (n is the number of iterations done)
+void closeOutputFiles(Run* run);
+// Flush and close all the files the run appends lines to
 void writeStatus(Run* run,Configuration* config);
 // If it does not exist, creates the data files (chainI.XXX.dat). Writes a new line on it.
 void writeSwap(Run* run,Configuration* config);
@@ -30,12 +44,22 @@ void write_summary(const Run* run,const Configuration* config);
 // Write a summary of the run at the end of the file config.XXX.dat
 void writeAverages(const Run* run, const Configuration* config);       
 // Write the average, variance and quantiles profiles on files
-void writeBestProfiles(Run* run, const Configuration* config);
-// Write the best profiles on files
+bool lowerEnergy(const BestModel& model1, const BestModel& model2);
+// Order of the heap of the best models (run->bestModels) : the model of highest energy is on top
+void considerBestModel(Run* run, const Configuration* config, int i, int j);
+// Put the j th state kept by the chain i in the list of the best models if it is better than one of them
+void updateBestModels(Run* run, const Configuration* config);
+// Put the states just added to the chains in the list of the best models. Must be called after pruneHistory
+int bestModel(const Run* run);
+// Give the position of the best model in run->bestModels
+bool isBestProfileFile(const std::string& name, const Configuration* config);
+// Tell if the file name is a best profile written by writeBestProfiles
+void writeBestProfiles(const Run* run, const Configuration* config);
+// Write the best profiles on files and remove the files of the models that are not among them anymore
 void computeResidualsForBestModel(Run* run, Configuration* config);
 // Recompute the eikonal (in serial) for the best model and save the residuals on a file
-void writeMinMaxProfiles(Run* run, const Configuration* config); 
-// Update min and max velocities explored by the run, write them on file
+void writeMinMaxProfiles(Run* run, const Configuration* config, bool write);
+// Update min and max velocities explored by the run, write them on file if write is true
 void write_one_column_file(const std::vector<double>* column, const std::string name_of_file);
 // Write a a vector into a column file
 void write_two_columns_file(const std::vector<double>* column1, const std::vector<double>* column2, const std::string name_of_file);
@@ -44,5 +68,39 @@ void write_three_columns_file(const std::vector<int>* column1, const std::vector
 // Write a three columns file from three vectors of the same size -> just used for prior features
 void write_four_columns_file(const std::vector<int>* column1, const std::vector<double>* column2, const std::vector<double>* column3, const std::vector<double>* column4, const std::string name_of_file);
 // Write a four columns file from four vectors of the same size
+void write_npy_header(FILE* file, const int nLines, const int nColumns);
+// Write the header of a .npy file (NumPy binary format) containing nLines x nColumns doubles. It is always NPY_HEADER_SIZE long
+void write_npy_file(const std::vector<double>* values, const int nColumns, const std::string name_of_file);
+// Write a .npy file from a vector containing the values line by line (nColumns values per line)
+void write_one_column_npy_file(const std::vector<double>* column, const std::string name_of_file);
+// Write a vector into a one column .npy file
+void write_two_columns_npy_file(const std::vector<double>* column1, const std::vector<double>* column2, const std::string name_of_file);
+// Write a two columns .npy file from two vectors of the same size
+void append_npy_line(Run* run, const std::vector<double>* line, const std::string name_of_file);
+// If it does not exist, creates the .npy file. Writes a new line at the end of it (its header is updated when it is flushed)
+void write_chains_header(FILE* file, const Configuration* config);
+// Write the header of the chains history file (npu, nbt, swaves and type of the values). It is CHAINS_HEADER_SIZE long
+void append_chains_history(Run* run, const Configuration* config);
+// If it does not exist, creates the chains history file (runStoreXXX/chains.bin). Writes the current state of all the chains at the end of it
+void read_checkpoint_values(FILE* file, void* values, size_t size, size_t n, const Configuration* config);
+// Read n values of "size" bytes in the checkpoint. Terminate if it is not possible
+void write_checkpoint_mpfr(FILE* file, mpfr_srcptr value);
+// Write a mpfr number in a checkpoint. It is written in base 16 with all its digits : it is read back exactly
+void read_checkpoint_mpfr(FILE* file, mpfr_t value, const Configuration* config);
+// Read a mpfr number written by write_checkpoint_mpfr (value must have been initialized)
+void write_checkpoint_sketches(FILE* file, const std::vector<QuantileSketch>* sketches);
+// Write the quantile sketches of a chain in a checkpoint
+void read_checkpoint_sketches(FILE* file, std::vector<QuantileSketch>* sketches, const Configuration* config);
+// Read the quantile sketches written by write_checkpoint_sketches
+std::vector<std::string> appendedFiles(const Configuration* config);
+// Return the names of the output files to which the run appends a line at each iteration (or at each swap for ll.XXX.dat)
+void writeCheckpoint(const Run* run, const Configuration* config, int n);
+// Save the state of the run at the end of the iteration n-1 in OUTPUT_FILES/XXX/checkpoint.XXX.bin (the run can restart from it)
+FILE* open_checkpoint(Configuration* config);
+// Open the checkpoint config->restartFile and read its header : the code, the seed and the iteration of the run (config->firstIteration)
+void readCheckpointHeader(Configuration* config);
+// Read the code, the seed and the iteration of the run in the checkpoint config->restartFile
+void readCheckpoint(Run* run, Configuration* config);
+// Restore the state of the run saved in the checkpoint config->restartFile. The lines written in the output files after it are removed
 
 #endif /* FILESANDCONTROL_H_ */
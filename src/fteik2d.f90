@@ -0,0 +1,384 @@
+!
+!   Copyright or Copr. Mines Paristech, France - Mark NOBLE, Alexandrine GESRET
+!   FTeik3d_2.0.f90 - First release Aug 2011
+!   fteik2d.f90 - 2D version of FTeik (same operators without the y axis) used for the horizontally layered models
+!   (axisymmetric eikonal, see EIKONAL_MODE in config.cfg)
+! 
+!   FTeik3d has been written by:
+!     - Mark Noble <mark.noble@mines-paristech.fr>
+!     - Alexandrine Gesret <alexandrine.gesret@mines-paristech.fr>
+! 
+!   This software is a computer program (subroutine) whose purpose is to
+!   compute traveltimes in a 3D heterogenious velocity model by solving
+!   by finite difference approximation the Eikonal equation. This package
+!   is written in fortran 90 and is composed of 4 elements, the functions
+!   "t_ana", "t_anad", the subroutine "FTeik" and an include file
+!   "include_FTeik3d_2".
+! 
+!   This software is governed by the CeCILL-C license under French law and
+!   abiding by the rules of distribution of free software.  You can  use,
+!   modify and/ or redistribute the software under the terms of the CeCILL-C
+!   license as circulated by CEA, CNRS and INRIA at the following URL
+!   "http://www.cecill.info".
+! 
+!   As a counterpart to the access to the source code and  rights to copy,
+!   modify and redistribute granted by the license, users are provided only
+!   with a limited warranty  and the software's author,  the holder of the
+!   economic rights,  and the successive licensors  have only  limited
+!   liability.
+! 
+!   In this respect, the user's attention is drawn to the risks associated
+!   with loading,  using,  modifying and/or developing or reproducing the
+!   software by the user in light of its specific status of free software,
+!   that may mean  that it is complicated to manipulate,  and  that  also
+!   therefore means  that it is reserved for developers  and  experienced
+!   professionals having in-depth computer knowledge. Users are therefore
+!   encouraged to load and test the software's suitability as regards their
+!   requirements in conditions enabling the security of their systems and/or
+!   data to be ensured and,  more generally, to use and operate it in the
+!   same conditions as regards security.
+! 
+!   The fact that you are presently reading this means that you have had
+!   knowledge of the CeCILL-C license and that you accept its terms.
+!   For more information, see the file COPYRIGHT-GB or COPYRIGHT-FR.
+!
+!________________________________________________________________________
+!            ARGUMENTS REQUIRED TO CALL THE SUBROUTINE FTeik2d
+!     call FTeik2d(vel,tt,nz,nx,zsin,xsin,dzin,dxin,nsweep,epsin)
+!
+!     WARNING        :Time field array and velocity field array do not have
+!                     the same dimension. Velocities are defined at center of
+!                     cell, whereas times are computed on the corners.
+!
+!     integer - nz,nx  :Dimensions of the time field array tt
+!                           tt(nz,nx)
+!                           No dimension may be lower than 3.
+!
+!     integer - dzin,dxin :Mesh spacing along the 2 axis
+!
+!     real - tt                :Travel time field array: tt(nz,nx)
+!
+!     real - vel               :Velocity field array: vel(nz-1,nx-1)
+!
+!     real - zsin,xsin :Point source coordinates referred expressed in meters
+!                         Licit ranges: [0.0,(nz-1.)*dz][0.0,(nx-1.)*dx]
+!
+!     integer - nsweep         :Number of sweeps over model. 1 is in general enough
+!
+!     real - epsin :  radius in number of grid points arround source where then
+!                     spherical approximation will be used
+!
+!     In a horizontally layered model the rays stay in the vertical plane containing
+!     the source and the receiver : the times in 3D are the times of this 2D problem
+!     with x the horizontal offset.
+!________________________________________________________________________
+!
+subroutine FTeik2d(vel,tt,nz,nx,zsin,xsin,dzin,dxin,nsweep,epsin)
+
+   implicit none
+!
+! Parameter for double precision
+!_______________________________
+   integer,parameter   :: PRES=kind(1.d0)
+!
+! Size of traveltime map
+!_______________________
+   integer,intent(in)   ::   nz,nx
+!
+! Number of sweeps to do
+!_______________________
+   integer,intent(in)   ::   nsweep
+   real,intent(in)   ::   dzin,dxin
+   real,intent(in)   ::   zsin,xsin
+   real,intent(in)   ::   epsin
+
+   real*8,intent(out),dimension(nz,nx)   ::   tt
+   real*8,intent(in),dimension(nz-1,nx-1)   ::   vel
+
+!!!!!!!!
+   real(kind=PRES) :: t_ana2d,t_anad2d
+
+   integer   ::   i,j,kk,i1,j1
+
+   real(kind=PRES), parameter   ::   Big = 99999.d0
+
+   real(kind=PRES)   ::   dz,dx
+   real(kind=PRES)   ::   zsrc,xsrc,zsa,xsa
+   real(kind=PRES)   ::   eps,tmin
+   integer   ::   zsi,xsi
+   integer   ::   sgntz,sgntx,sgnvz,sgnvx
+
+   real(kind=PRES)   :: vzero,vref
+   real(kind=PRES)   :: t1d,t2d,t1,t2,ta,tb
+   real(kind=PRES)   :: tv,te,tev
+   real(kind=PRES)   :: tauv,taue,tauev
+
+   real(kind=PRES)   ::   dzi,dxi,dz2i,dx2i
+
+   real(kind=PRES)   ::   sgnrz,sgnrx
+   real(kind=PRES)   ::   t0c,tzc,txc
+   real(kind=PRES)   ::   apoly,bpoly,cpoly,dpoly
+
+!
+!  Check grid size
+!_________________
+   if (nz < 3 .or. nx < 3) goto 993
+!
+!  Check grid spacing
+!____________________
+   dz=dble(dzin) ; dx=dble(dxin)
+   if (dz <= 0. .or. dx <= 0.) goto 994
+!
+! Check sweep
+!____________
+   if (nsweep < 0) goto 995
+!
+! Check velocity field
+!_____________________
+   if (minval(vel) <= 0.) goto 992
+!
+! Check source position
+!______________________
+   zsrc=dble(zsin) ; xsrc=dble(xsin)
+   if ( zsrc < 0.d0 .or. zsrc > (dfloat(nz-1)*dz) ) goto 990
+   if ( xsrc < 0.d0 .or. xsrc > (dfloat(nx-1)*dx) ) goto 990
+!
+! Convert src pos to grid position
+!_________________________________
+   zsa = (zsrc/dz)+1.d0 ; xsa=(xsrc / dx)+1.d0
+!
+! Trick to handle edges simply for source
+!________________________________________
+   if ( zsa == 1.d0 ) zsa=zsa + 0.0001d0
+   if ( zsa >= nz ) zsa=zsa - 0.0001d0
+   if ( xsa == 1.d0 ) xsa=xsa + 0.0001d0
+   if ( xsa >= nx ) xsa=xsa - 0.0001d0
+!
+!  Grid points to initialise source
+!__________________________________
+   zsi = int(zsa)
+   xsi = int(xsa)
+   vzero=1.d0 / dble(vel(zsi,xsi))
+!
+! Set spherical approximation radius, convert grid number to time
+!________________________________________________________________
+   eps=dble(epsin)
+   if (int(eps) > min(nz,nx)) goto 996
+   eps = eps * vzero * dble(min(dz,dx))
+!
+! Set traveltime map to BIG value
+!________________________________
+   tt=Big
+!
+! Initialise points around source
+!________________________________
+
+   tt(zsi,xsi) = sngl( t_ana2d(zsi,xsi,dz,dx,zsa,xsa,vzero) )
+   tt(zsi+1,xsi) = sngl( t_ana2d(zsi+1,xsi,dz,dx,zsa,xsa,vzero) )
+   tt(zsi,xsi+1) = sngl( t_ana2d(zsi,xsi+1,dz,dx,zsa,xsa,vzero) )
+   tt(zsi+1,xsi+1) = sngl( t_ana2d(zsi+1,xsi+1,dz,dx,zsa,xsa,vzero) )
+!
+! Pre-calculate a few constants concerning mesh spacing
+!______________________________________________________
+    dzi = 1.d0 /dz
+    dxi = 1.d0 /dx
+    dz2i = 1.d0 / (dz**2)
+    dx2i = 1.d0 / (dx**2)
+!
+! Set sweep variable to 0 for first run kk=0
+  kk=0
+!
+! First sweeping: Top->Bottom ; West->East
+! Set direction variables
+!________________________________________________________
+    sgntz=1 ; sgntx=1
+    sgnvz=1 ; sgnvx=1
+    sgnrz=dfloat(sgntz) ; sgnrx=dfloat(sgntx)
+
+    do j = max(2,xsi),nx
+    do i = max(2,zsi),nz
+         include 'Include_FTeik2d.f'
+    enddo
+    enddo
+!
+! Second sweeping: Top->Bottom; East->West
+! Set direction variables
+!________________________________________________________
+    sgntz=1 ; sgntx=-1
+    sgnvz=1 ; sgnvx=0
+    sgnrz=dfloat(sgntz) ; sgnrx=dfloat(sgntx)
+
+    do j = xsi+1,1,-1
+    do i = max(2,zsi),nz
+         include 'Include_FTeik2d.f'
+    enddo
+    enddo
+!
+! Third sweeping: Bottom->Top ; West->East
+! Set direction variables
+!________________________________________________________
+    sgntz=-1 ; sgntx=1
+    sgnvz=0 ; sgnvx=1
+    sgnrz=dfloat(sgntz) ; sgnrx=dfloat(sgntx)
+
+    do j = max(2,xsi),nx
+    do i = zsi+1,1,-1
+         include 'Include_FTeik2d.f'
+    enddo
+    enddo
+!
+! Fourth sweeping: Bottom->Top; East->West
+! Set direction variables
+!________________________________________________________
+    sgntz=-1 ; sgntx=-1
+    sgnvz=0 ; sgnvx=0
+    sgnrz=dfloat(sgntz) ; sgnrx=dfloat(sgntx)
+
+    do j = xsi+1,1,-1
+    do i = zsi+1,1,-1
+         include 'Include_FTeik2d.f'
+    enddo
+    enddo
+! End of first run
+!
+!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+!
+! Ready to do at least one global sweep
+   do kk = 1,nsweep
+!
+! First sweeping: Top->Bottom ; West->East
+!________________________________________________________
+    sgntz=1 ; sgntx=1
+    sgnvz=1 ; sgnvx=1
+
+    do j = 2,nx
+    do i = 2,nz
+         include 'Include_FTeik2d.f'
+    enddo
+    enddo
+!
+! Second sweeping: Top->Bottom; East->West
+!________________________________________________________
+    sgntz=1 ; sgntx=-1
+    sgnvz=1 ; sgnvx=0
+
+    do j = nx-1,1,-1
+    do i = 2,nz
+         include 'Include_FTeik2d.f'
+    enddo
+    enddo
+!
+! Third sweeping: Bottom->Top ; West->East
+!________________________________________________________
+    sgntz=-1 ; sgntx=1
+    sgnvz=0 ; sgnvx=1
+
+    do j = 2,nx
+    do i = nz-1,1,-1
+         include 'Include_FTeik2d.f'
+    enddo
+    enddo
+!
+! Fourth sweeping: Bottom->Top; East->West
+!________________________________________________________
+    sgntz=-1 ; sgntx=-1
+    sgnvz=0 ; sgnvx=0
+
+    do j = nx-1,1,-1
+    do i = nz-1,1,-1
+         include 'Include_FTeik2d.f'
+    enddo
+    enddo
+!
+! End loop for global sweeps
+enddo
+!
+   return
+!
+990   continue
+      write(*,'(/)')
+      write(*,'(''=================================================='')')
+      write(*,'(5x,''ERROR FTeik2d, source out of bounds '')')
+      write(*,'(''=================================================='')')
+      stop
+!
+992   continue
+      write(*,'(/)')
+      write(*,'(''=================================================='')')
+      write(*,'(5x,''ERROR FTeik2d, Velocities are strange '')')
+      write(*,'(''=================================================='')')
+      stop
+
+993   continue
+      write(*,'(/)')
+      write(*,'(''=================================================='')')
+      write(*,'(5x,''ERROR FTeik2d, Grid size nz,nx too small '')')
+      write(*,'(''=================================================='')')
+      stop
+
+994   continue
+      write(*,'(/)')
+      write(*,'(''================================================='')')
+      write(*,'(5x,''ERROR FTeik2d, Grid spacing dz,dx too small '')')
+      write(*,'(''================================================='')')
+      stop
+
+995   continue
+      write(*,'(/)')
+      write(*,'(''================================================='')')
+      write(*,'(5x,''ERROR FTeik2d, Sweep number wrong '')')
+      write(*,'(''================================================='')')
+      stop
+
+996   continue
+      write(*,'(/)')
+      write(*,'(''================================================='')')
+      write(*,'(5x,''ERROR FTeik2d, epsin bigger than model '')')
+      write(*,'(''================================================='')')
+      stop
+
+!
+end subroutine FTeik2d
+!
+!
+! Functions to calculate analytical times in homgeneous model
+ real(kind=kind(1.d0)) function t_ana2d(i,j,dz,dx,zsa,xsa,vzero)
+
+    implicit none
+
+    integer,parameter  :: PRES=kind(1.d0)
+    integer, intent(in)  :: i,j
+
+    real(kind=PRES),intent(in)  :: dz,dx,zsa,xsa,vzero
+
+    t_ana2d =vzero*(((dfloat(i)-zsa)*dz)**2.+((dfloat(j)-xsa)*dx)**2.)**0.5
+
+ end function t_ana2d
+!
+!
+!
+! Functions to calculate analytical times in homgeneous model, + derivative of times
+ real(kind=kind(1.d0)) function t_anad2d(tzc,txc,i,j,dz,dx,zsa,xsa,vzero)
+
+    implicit none
+
+    integer,parameter  :: PRES=kind(1.d0)
+    integer, intent(in)  :: i,j
+
+    real(kind=PRES),intent(in)  :: dz,dx,zsa,xsa,vzero
+    real(kind=PRES)  :: d0
+    real(kind=PRES),intent(out)   :: tzc,txc
+
+    d0=((dfloat(i)-zsa)*dz)**2.+((dfloat(j)-xsa)*dx)**2.
+
+    t_anad2d = vzero * (d0**0.5)
+
+    if ( d0 > 0.d0) then
+      tzc = (d0**(-0.5)) *(dfloat(i)-zsa)*dz * vzero
+      txc = (d0**(-0.5)) *(dfloat(j)-xsa)*dx * vzero
+    else
+      tzc = 0.d0
+      txc = 0.d0
+    endif
+
+ end function t_anad2d
@@ -14,6 +14,9 @@
 #include "wavelet2s.h"
 #include <fftw3.h>
 #include <mpfr.h>
+#ifdef _OPENMP
+  #include <omp.h>
+#endif
 #include "functions.h"
 #include "structures.h"
 #include "defines.h"
@@ -22,9 +25,10 @@
 #include "generalFunctions.h"
 #include "filesAndControl.h"
 
-double getTime(tab3d<double>* tt3d,Coordinate coord,VelocityModel* velModel, int ishot)
-// Give the time at coord even if it is not on a point of the grid
+Stencil makeStencil(Coordinate coord, VelocityModel* velModel, int ishot, int nz, int nx, int ny)
+// Give the corners and the weights used to interpolate at coord a travel times grid (of size (nz,nx,ny)) of the shot ishot
 {
+  Stencil stencil;
   double Z=(coord.z-velModel->zmin[ishot])/velModel->dz +1.0; // Z=zin/dzin+1.
   double X=(coord.x-velModel->xmin[ishot])/velModel->dx +1.0; // X=xin/dxin+1.
   double Y=(coord.y-velModel->ymin[ishot])/velModel->dy +1.0; // Y=yin/dyin+1.
@@ -32,52 +36,121 @@ double getTime(tab3d<double>* tt3d,Coordinate coord,VelocityModel* velModel, int
   int kz=iz+1, kx=ix+1, ky=iy+1;
   double dz1=Z-(double)(iz+1),dx1=X-(double)(ix+1),dy1=Y-(double)(iy+1);
   double dz2=1.0-dz1,dx2=1.0-dx1,dy2=1.0-dy1;
-  double t = dz2 * dx2 * dy2 * tt3d->get(iz,ix,iy)
-        +  dz1 * dx2 * dy2 * tt3d->get(kz,ix,iy)
-        +  dz2 * dx1 * dy2 * tt3d->get(iz,kx,iy)
-        +  dz2 * dx2 * dy1 * tt3d->get(iz,ix,ky)
-        +  dz2 * dx1 * dy1 * tt3d->get(iz,kx,ky)
-        +  dz1 * dx2 * dy1 * tt3d->get(kz,ix,ky)
-        +  dz1 * dx1 * dy2 * tt3d->get(kz,kx,iy)
-        +  dz1 * dx1 * dy1 * tt3d->get(kz,kx,ky);
-//    std::cout << std::endl << "Get time at : " << std::endl;
-//    std::cout << "xin : " << coord.x << " - " << velModel->xmin[ishot] << " = " << coord.x - velModel->xmin[ishot] << std::endl;
-//    std::cout << "yin : " << coord.y << " - " << velModel->ymin[ishot] << " = " << coord.y - velModel->ymin[ishot] << std::endl;
-//    std::cout << "zin : " << coord.z << " - " << velModel->zmin[ishot] << " = " << coord.z - velModel->zmin[ishot] << std::endl;
-//    std::cout << "X : " << X << " Y " << Y << " Z " << Z << std::endl;
-//    std::cout << "ix : " << ix << " iy " << iy << " iz " << iz << std::endl;
-//    std::cout << "kx : " << kx << " ky " << ky << " kz " << kz << std::endl;
-//    std::cout << "dx1 : " << dx1 << " dy1 : " << dy1 << " dz1 : " << dz1 << std::endl;
-//    std::cout << "dx2 : " << dx2 << " dy2 : " << dy2 << " dz2 : " << dz2 << std::endl;
-//    std::cout << "Times in the corners " << std::endl;
-//    std::cout << "000 : " << tt3d->get(iz,ix,iy) << std::endl;
-//    std::cout << "100 : " << tt3d->get(iz,kx,iy) << std::endl;
-//    std::cout << "010 : " << tt3d->get(iz,ix,ky) << std::endl;
-//    std::cout << "110 : " << tt3d->get(iz,kx,ky) << std::endl;
-//    std::cout << "001 : " << tt3d->get(kz,ix,iy) << std::endl;
-//    std::cout << "101 : " << tt3d->get(kz,kx,iy) << std::endl;
-//    std::cout << "011 : " << tt3d->get(kz,ix,ky) << std::endl;
-//    std::cout << "111 : " << tt3d->get(kz,kx,ky) << std::endl;
-//    double minValue = tt3d->get(0,0,0);
-//    double maxValue = tt3d->get(0,0,0);
-//    for ( int i = 0; i < tt3d->get_nx(); i++) {
-//      for ( int j = 0; j < tt3d->get_ny(); j++) {
-//        for (int k = 0; k < tt3d->get_nz(); k++) {
-//          if (tt3d->get(k,i,j) < minValue)
-//            minValue = tt3d->get(k,i,j);
-//          else if(tt3d->get(k,i,j) > maxValue)
-//            maxValue = tt3d->get(k,i,j);
-//        }
-//      }
-//    }
-//   
-//    std::cout << "min : " << minValue << std::endl;
-//    std::cout << "max : " << maxValue << std::endl;
-//    std::cout.precision(PREC);
-//    std::cout << " ---> t = " << t << std::endl;
+  int cz[8]={iz,kz,iz,iz,iz,kz,kz,kz}, cx[8]={ix,ix,kx,ix,kx,ix,kx,kx}, cy[8]={iy,iy,iy,ky,ky,ky,iy,ky}; // Same order as the sum in getTime
+  double weight[8]={dz2*dx2*dy2,dz1*dx2*dy2,dz2*dx1*dy2,dz2*dx2*dy1,dz2*dx1*dy1,dz1*dx2*dy1,dz1*dx1*dy2,dz1*dx1*dy1};
+  for(int k=0;k<8;k++) {
+    if (cz[k] < 0 || cz[k] >= nz || cx[k] < 0 || cx[k] >= nx || cy[k] < 0 || cy[k] >= ny) { // Out of the grid (the time is 0 there, see tab3d::get)
+      stencil.index[k]=0;
+      stencil.weight[k]=0.0;
+    }
+    else {
+      stencil.index[k]=cy[k]*nx*nz+cx[k]*nz+cz[k]; // Same layout as tab3d
+      stencil.weight[k]=weight[k];
+    }
+  }
+  return stencil;
+}
+
+double applyStencil(tab3d<double>* tt3d, Stencil* stencil)
+// Give the time interpolated with the stencil
+{
+  const double* values=tt3d->get_values();
+  double t=0.0;
+  for(int k=0;k<8;k++)
+    t+=stencil->weight[k]*values[stencil->index[k]];
   return t;
 }
 
+Stencil makeAxisymmetricStencil(Coordinate coord, VelocityModel* velModel, int ishot, Configuration* config)
+// Give the corners and the weights used to interpolate at coord the 2D travel times grid (depth,offset) of the shot ishot (EIKONAL_MODE = 1)
+{
+  Stencil stencil;
+  int nz=velModel->nz, nr=velModel->nx;
+  double r=sqrt(pow(coord.x-config->data.coordShots[ishot].x,2.0)+pow(coord.y-config->data.coordShots[ishot].y,2.0)); // Offset
+  double Z=(coord.z-velModel->zmin[ishot])/velModel->dz +1.0;
+  double R=(r+velModel->dx)/velModel->dx +1.0; // The first column of the grid is at offset -dr
+  int iz=std::min(std::max((int)floor(Z)-1,0),nz-2), ir=std::min((int)floor(R)-1,nr-2);
+  double dz1=Z-(double)(iz+1),dr1=R-(double)(ir+1);
+  double dz2=1.0-dz1,dr2=1.0-dr1;
+  int cz[4]={iz,iz+1,iz,iz+1}, cr[4]={ir,ir,ir+1,ir+1};
+  double weight[4]={dz2*dr2,dz1*dr2,dz2*dr1,dz1*dr1};
+  for(int k=0;k<8;k++) {
+    stencil.index[k]=0;
+    stencil.weight[k]=0.0;
+  }
+  for(int k=0;k<4;k++) {
+    stencil.index[k]=cr[k]*nz+cz[k]; // Same layout as tab3d (ny = 1)
+    stencil.weight[k]=weight[k];
+  }
+  return stencil;
+}
+
+double getTime(tab3d<double>* tt3d,Coordinate coord,VelocityModel* velModel, int ishot)
+// Give the time at coord even if it is not on a point of the grid
+{
+  Stencil stencil=makeStencil(coord,velModel,ishot,tt3d->get_nz(),tt3d->get_nx(),tt3d->get_ny());
+  return applyStencil(tt3d,&stencil);
+}
+
+void gridOfWorkspace(VelocityModel* velModel, Configuration* config)
+// Set the size of the grids used by energy() : (nzFilt,nx,ny) or (nzFilt,nr) if EIKONAL_MODE = 1 (the y axis is then a single cell)
+{
+  velModel->nz=config->data.nzFilt; velModel->dz=config->data.dzFilt;
+  if (config->eikonalMode == 1) {
+    velModel->nx=config->data.nr; velModel->ny=2;
+    velModel->dx=config->data.dr; velModel->dy=config->data.dr;
+  }
+  else {
+    velModel->nx=config->data.nx; velModel->ny=config->data.ny;
+    velModel->dx=config->data.dx; velModel->dy=config->data.dy;
+  }
+}
+
+void computeStationStencils(Configuration* config)
+// Compute once for all the stencils used to interpolate the travel times of each shot at the stations (config->data.stencils).
+// The grids used by energy() and their shifts (see calculateShiftForEachShot) are the same during the whole run. Compute also
+// config->data.tableOfShot : with EIKONAL_MODE = 1 the shots at the same depth have the same travel times table
+{
+  VelocityModel velModel;
+  gridOfWorkspace(&velModel,config);
+  calculateShiftForEachShot(&velModel,config);
+  config->data.stencils.clear();
+  config->data.tableOfShot.clear();
+  for(int ishot=0;ishot<(int)config->data.coordShots.size();ishot++) {
+    std::vector<Stencil> stencilsOfShot;
+    for(int j=0;j<(int)config->data.coordStations.size();j++) {
+      if (config->eikonalMode == 1)
+        stencilsOfShot.push_back(makeAxisymmetricStencil(config->data.coordStations[j],&velModel,ishot,config));
+      else
+        stencilsOfShot.push_back(makeStencil(config->data.coordStations[j],&velModel,ishot,velModel.nz,velModel.nx,velModel.ny));
+    }
+    config->data.stencils.push_back(stencilsOfShot);
+    int table=ishot;
+    if (config->eikonalMode == 1) {
+      for(int jshot=0;jshot<ishot;jshot++) {
+        if (config->data.coordShots[jshot].z == config->data.coordShots[ishot].z) {
+          table=jshot;
+          break;
+        }
+      }
+    }
+    config->data.tableOfShot.push_back(table);
+  }
+}
+
+void gatherTimes(tab3d<double>* tt3d, std::vector<Stencil>* stencils, double* times)
+// Write in times[0], times[1]... the travel times of tt3d interpolated at the stations (stencils : config->data.stencils[ishot])
+{
+  const double* values=tt3d->get_values();
+  for(int j=0;j<(int)stencils->size();j++) {
+    const Stencil& stencil=(*stencils)[j];
+    double t=0.0;
+    for(int k=0;k<8;k++)
+      t+=stencil.weight[k]*values[stencil.index[k]];
+    times[j]=t;
+  }
+}
+
 double getDistance(Coordinate coord1,Coordinate coord2)
 // Returns the distance between two points
 {
@@ -182,6 +255,106 @@ void InverseWaveletTransform(std::vector<double>* filteredProfile, const std::ve
   }
 }
 
+void buildSynthesisOperators(Configuration* config)
+// Compute the synthesis operators of the wavelets (WAVELET_SYNTHESIS = 1) : the column j of config->synthesisP[wavelet] (or synthesisS) is the
+// downsampled profile given by the parameter j alone equal to 1. The inverse wavelet transform and the downsampling being linear, the profile of
+// any parameters is then the sum of the columns weighted by the parameters (see synthesizeProfiles). The columns are restricted to their support
+{
+  if (config->verbose1 && config->mpiConfig.rank == 0)
+    std::cout << "Building the synthesis operators..." << std::endl;
+  for (int wavelet = 0; wavelet < config->nWavelets; wavelet++) { // Loop on the wavelets used
+    int nParams=(int)config->data.indexParameters[wavelet].size();
+    int numberOfCoeffsKept=nParams;
+    if(config->swaves) // If we are working with swaves, the first parameters are for P waves coefficients
+      numberOfCoeffsKept=(int)((double)nParams/2.0);
+    std::vector<double> params(nParams,0.0);
+    SynthesisOperator synthesisP,synthesisS;
+    for (int j=0;j<nParams;j++) { // Loop on the parameters
+      bool sWaves=(j >= numberOfCoeffsKept);
+      std::vector<double> filteredProfile;
+      params[j]=1.0;
+      InverseWaveletTransform(&filteredProfile,&params,config,wavelet,sWaves);
+      params[j]=0.0;
+      std::vector<double> column=downSampleProfile(filteredProfile,config->data.zp,config->data.zFiltp);
+      int first=0,last=(int)column.size();
+      while (first < last && column[first] == 0.0)
+        first++;
+      while (last > first && column[last-1] == 0.0)
+        last--;
+      SynthesisOperator* synthesis = sWaves ? &synthesisS : &synthesisP;
+      synthesis->first.push_back(first);
+      synthesis->columns.push_back(std::vector<double>(column.begin()+first,column.begin()+last));
+    }
+    config->synthesisP.push_back(synthesisP);
+    config->synthesisS.push_back(synthesisS);
+    for(int i=0;i<(int)config->coeffsP[wavelet].size();i++) // We put back the coefficients used by InverseWaveletTransform to zero
+      config->coeffsP[wavelet][i]=0.0;
+    for(int i=0;i<(int)config->coeffsS[wavelet].size();i++)
+      config->coeffsS[wavelet][i]=0.0;
+  }
+  if (config->verbose1 && config->mpiConfig.rank == 0)
+    std::cout << "Done !" << std::endl << std::endl;
+}
+
+void addSynthesisColumn(std::vector<double>* profile, const SynthesisOperator* synthesis, int j, double factor)
+// Add factor times the column j of the synthesis operator to the downsampled profile
+{
+  const std::vector<double>* column=&synthesis->columns[j];
+  if (column->empty()) // The parameter has no effect on the profile
+    return;
+  double* values=&(*profile)[synthesis->first[j]];
+  for (int iz=0;iz<(int)column->size();iz++)
+    values[iz]+=factor*(*column)[iz];
+}
+
+void synthesizeProfiles(Workspace* workspace, const State* state, const Configuration* config)
+// Compute the downsampled profiles of the state in workspace->synthesisP (and synthesisS) with the synthesis operators of its wavelet. If the
+// state differs from the parameters of the last profiles synthesized by a few components only (ex : the nc components modified by a MH
+// iteration) the profiles are updated with the columns of these components. They are computed entirely every SYNTHESIS_REFRESH updates so that
+// the rounding errors do not accumulate
+{
+  int nParams=(int)state->params.size();
+  int numberOfCoeffsKept=nParams;
+  if(config->swaves) // If we are working with swaves, the first parameters are for P waves coefficients
+    numberOfCoeffsKept=(int)((double)nParams/2.0);
+  const SynthesisOperator* synthesisP=&config->synthesisP[state->wavelet];
+  const SynthesisOperator* synthesisS=&config->synthesisS[state->wavelet];
+  std::vector<int> modified; // Parameters that have changed since the last profiles synthesized
+  bool incremental=(state->wavelet == workspace->synthesisWavelet && workspace->synthesisUpdates < SYNTHESIS_REFRESH);
+  if (incremental) {
+    for (int j=0;j<nParams;j++) {
+      if (state->params[j] != workspace->synthesisParams[j])
+        modified.push_back(j);
+    }
+    incremental=(2*(int)modified.size() <= nParams); // Otherwise it is as fast to compute the profiles entirely
+  }
+  if (incremental) {
+    for (int k=0;k<(int)modified.size();k++) {
+      int j=modified[k];
+      double delta=state->params[j]-workspace->synthesisParams[j];
+      if (j < numberOfCoeffsKept)
+        addSynthesisColumn(&workspace->synthesisP,synthesisP,j,delta);
+      else
+        addSynthesisColumn(&workspace->synthesisS,synthesisS,j-numberOfCoeffsKept,delta);
+    }
+    workspace->synthesisUpdates++;
+  }
+  else {
+    workspace->synthesisP.assign(config->data.nzFilt-1,0.0);
+    if (config->swaves)
+      workspace->synthesisS.assign(config->data.nzFilt-1,0.0);
+    for (int j=0;j<nParams;j++) {
+      if (j < numberOfCoeffsKept)
+        addSynthesisColumn(&workspace->synthesisP,synthesisP,j,state->params[j]);
+      else
+        addSynthesisColumn(&workspace->synthesisS,synthesisS,j-numberOfCoeffsKept,state->params[j]);
+    }
+    workspace->synthesisUpdates=0;
+  }
+  workspace->synthesisParams=state->params;
+  workspace->synthesisWavelet=state->wavelet;
+}
+
 void InverseLayerTransform(std::vector<double>* filteredProfile, const std::vector<double>* params, Configuration* config, bool sWaves)
 // Calculate the P or S waves velocity profile corresponding to the layers params (P waves : sWaves=false)
 {
@@ -253,17 +426,26 @@ void meshing(std::vector<double>* profile, VelocityModel* velModel, bool swaves)
   }
 }
 
-void makeVel(VelocityModel* velModel, State* state, Configuration* config)
-// Build the velocity model corresponding to the parameters of the state : this will have to be change each time we change the problem.
+void makeVel(Workspace* workspace, State* state, Configuration* config)
+// Build the velocity model corresponding to the parameters of the state in the workspace : this will have to be change each time we change the problem.
 {
   if(config->verbose1 && config->mpiConfig.rank == 0)
     std::cout << "        makeVel in..." << std::endl;
-  std::vector<double> filteredProfileP;
-  if (config->waveletParameterization)
-    InverseWaveletTransform(&filteredProfileP,&(state->params), config, state->wavelet, false); // Calculate the P waves velocity profile corresponding to the wavelet coefficients (nz-1 points)
-  else
-    InverseLayerTransform(&filteredProfileP,&(state->params), config, false); // Calculate the P waves velocity profile corresponding to the layers coefficients (nz-1 points)
-  std::vector<double> downSampledPvel = downSampleProfile(filteredProfileP,config->data.zp,config->data.zFiltp); // downSampledPvel Contains the down sampled filtered velocity model !! It will have a size nzFilt-1
+  VelocityModel* velModel=&workspace->velModel;
+  bool synthesis=(config->waveletParameterization && config->waveletSynthesis);
+  if (synthesis)
+    synthesizeProfiles(workspace,state,config); // Calculate the downsampled profiles with the synthesis operators (nzFilt-1 points)
+  std::vector<double> downSampledPvel;
+  if (synthesis)
+    downSampledPvel = workspace->synthesisP;
+  else {
+    std::vector<double> filteredProfileP;
+    if (config->waveletParameterization)
+      InverseWaveletTransform(&filteredProfileP,&(state->params), config, state->wavelet, false); // Calculate the P waves velocity profile corresponding to the wavelet coefficients (nz-1 points)
+    else
+      InverseLayerTransform(&filteredProfileP,&(state->params), config, false); // Calculate the P waves velocity profile corresponding to the layers coefficients (nz-1 points)
+    downSampledPvel = downSampleProfile(filteredProfileP,config->data.zp,config->data.zFiltp); // downSampledPvel Contains the down sampled filtered velocity model !! It will have a size nzFilt-1
+  }
   for(int i=0; i < (int)downSampledPvel.size(); i++) {
     if(downSampledPvel[i]<=0.0) {// A velocity can't be < 0 ! If it is the case...
       downSampledPvel[i] = 0.01; // We put the velocity to 0.01m/s on this point -> the travel times will be huge and the model will be rejected
@@ -272,12 +454,17 @@ void makeVel(VelocityModel* velModel, State* state, Configuration* config)
   }
   meshing(&downSampledPvel,velModel,false); // Extend this profile on the whole mesh
   if(config->swaves) {
-    std::vector<double> filteredProfileS;
-    if (config->waveletParameterization)
-      InverseWaveletTransform(&filteredProfileS,&(state->params), config, state->wavelet, true); // Calculate the S waves velocity profile corresponding to the wavelet coefficients (nz-1 points)
-    else
-      InverseLayerTransform(&filteredProfileS,&(state->params), config, true); // Calculate the S waves velocity profile corresponding to the layers coefficients (nz-1 points)
-    std::vector<double> downSampledSvel = downSampleProfile(filteredProfileS,config->data.zp,config->data.zFiltp); // downSampledSvel Contains the down sampled filtered velocity model !! It will have a size nzFilt-1
+    std::vector<double> downSampledSvel;
+    if (synthesis)
+      downSampledSvel = workspace->synthesisS;
+    else {
+      std::vector<double> filteredProfileS;
+      if (config->waveletParameterization)
+        InverseWaveletTransform(&filteredProfileS,&(state->params), config, state->wavelet, true); // Calculate the S waves velocity profile corresponding to the wavelet coefficients (nz-1 points)
+      else
+        InverseLayerTransform(&filteredProfileS,&(state->params), config, true); // Calculate the S waves velocity profile corresponding to the layers coefficients (nz-1 points)
+      downSampledSvel = downSampleProfile(filteredProfileS,config->data.zp,config->data.zFiltp); // downSampledSvel Contains the down sampled filtered velocity model !! It will have a size nzFilt-1
+    }
     for(int i=0; i < (int)downSampledSvel.size(); i++) {
       if(downSampledSvel[i]<=0.0) {// A velocity can't be < 0 ! If it is the case...
         std::cout << "Negative S wave velocity generated... (downSampledSvel[" << i << "] = " << downSampledSvel[i] << ")" << std::endl;
@@ -320,129 +507,305 @@ void eikonal3d(tab3d<double>* tt3d, const VelocityModel* velModel,const Configur
     std::cout << "      Eikonal solver out..." << std::endl;
 }
 
-double energy(State* state,Chain* chain,Configuration* config)
-// Give the energy of a state in a given chain (we need to give the chain to get the temperature)
-// T0 is calculated just using P waves TODO
+void eikonal2d(tab3d<double>* tt2d, const VelocityModel* velModel,const Configuration* config, int shotNumber, bool sWaves)
+// Calculate the P or S waves travel times of the shot number i on the 2D grid (depth,offset) of size (nzFilt,nr) (EIKONAL_MODE = 1). The
+// model is horizontally layered : the times only depend on the depth and on the offset from the shot
+{
+  if(config->verbose2 && config->mpiConfig.rank == 0)
+    std::cout << "      2D eikonal solver in..." << std::endl;
+  int nr = tt2d->get_nx(), nz = tt2d->get_nz();
+  float dzin = velModel->dz, drin = velModel->dx;
+  int nsweep = config->nSweeps;
+  float epsin = config->epsin ;
+  float zsin=(float)config->data.coordShots[shotNumber].z-(float)velModel->zmin[shotNumber];
+  float rsin=drin; // The first column of the grid is at offset -dr
+  if(sWaves==true)
+    fteik2d_(velModel->velS->get_values(),tt2d->get_values(),&nz,&nr,&zsin,&rsin,&dzin,&drin,&nsweep,&epsin); // Call to Fortran function
+  else
+    fteik2d_(velModel->velP->get_values(),tt2d->get_values(),&nz,&nr,&zsin,&rsin,&dzin,&drin,&nsweep,&epsin); // Call to Fortran function
+  if(config->verbose2 && config->mpiConfig.rank == 0)
+    std::cout << "      2D eikonal solver out..." << std::endl;
+}
+
+void eikonal(tab3d<double>* tt, const VelocityModel* velModel,const Configuration* config, int shotNumber, bool sWaves)
+// Calculate the travel times of the shot number i on the grids of the workspace with the solver chosen (EIKONAL_MODE)
+{
+  if (config->eikonalMode == 1)
+    eikonal2d(tt,velModel,config,shotNumber,sWaves);
+  else
+    eikonal3d(tt,velModel,config,shotNumber,sWaves);
+}
+
+Workspace* createWorkspace(Configuration* config)
+// Allocate the velocity and travel times grids used by energy() and compute the shift of the grid for each shot. Each chain has its own
+// workspace : the grids are allocated once for the whole run instead of once per energy computation
+{
+  Workspace* workspace = new Workspace;
+  VelocityModel* velModel = &workspace->velModel;
+  gridOfWorkspace(velModel,config); // (nzFilt,nx,ny) or (nzFilt,nr,1) if EIKONAL_MODE = 1
+  calculateShiftForEachShot(velModel,config);
+  int nyTimes = config->eikonalMode == 1 ? 1 : velModel->ny; // The 2D travel times grid is (nzFilt,nr,1)
+  velModel->velP= new tab3d<double>(velModel->nz-1,velModel->nx-1,velModel->ny-1,-1);  // Create a (nz-1,nx-1,ny-1) mesh and initialize every cell at -1
+  velModel->velS= NULL;
+  if (config->swaves)
+    velModel->velS= new tab3d<double>(velModel->nz-1,velModel->nx-1,velModel->ny-1,-1);  // Create a (nz-1,nx-1,ny-1) mesh and initialize every cell at -1
+  for(int thread=0;thread<config->eikonalThreads;thread++) // One travel times grid per thread
+    workspace->times.push_back(new tab3d<double>(velModel->nz,velModel->nx,nyTimes,-1.0));
+  workspace->synthesisWavelet = -1; // No profiles synthesized yet (see synthesizeProfiles)
+  workspace->synthesisUpdates = 0;
+  return workspace;
+}
+
+void freeWorkspace(Workspace* workspace)
+// Free the memory allocated by createWorkspace
+{
+  delete workspace->velModel.velP;
+  delete workspace->velModel.velS;
+  for(int thread=0;thread<(int)workspace->times.size();thread++)
+    delete workspace->times[thread];
+  delete workspace;
+}
+
+unsigned long profilesKey(std::vector<double>* profiles)
+// Give a hash (FNV-1a) of the values of the profiles
+{
+  unsigned long key=14695981039346656037UL;
+  const unsigned char* bytes=(const unsigned char*)&(*profiles)[0];
+  for(int i=0;i<(int)(profiles->size()*sizeof(double));i++) {
+    key^=bytes[i];
+    key*=1099511628211UL;
+  }
+  return key;
+}
+
+std::vector<double> modelProfiles(VelocityModel* velModel, Configuration* config)
+// Give the P (and S) profiles of a 1D velocity model (vertical line (:,0,0)). They identify its travel times in the cache
+{
+  std::vector<double> profiles;
+  for(int iz=0;iz<config->data.nzFilt-1;iz++)
+    profiles.push_back(velModel->velP->get(iz,0,0));
+  if(config->swaves) {
+    for(int iz=0;iz<config->data.nzFilt-1;iz++)
+      profiles.push_back(velModel->velS->get(iz,0,0));
+  }
+  return profiles;
+}
+
+bool lookupTimes(std::vector<double>* profiles, int firstEikonal, int eikonalStep, ArrivalTimes* arrivalTimes, Configuration* config)
+// Look for the travel times of the model described by profiles in the cache (eikonals firstEikonal, firstEikonal+eikonalStep... see
+// energy()). If they are found they are copied in arrivalTimes, the entry becomes the most recently used and true is returned
+{
+  if (config->timesCacheSize <= 0)
+    return false;
+  bool found=false;
+  #pragma omp critical(timesCache) // (The chains can be evaluated at the same time, see energies)
+  {
+    TimesCache* cache=&config->timesCache;
+    std::map<unsigned long,std::list<CachedTimes>::iterator>::iterator it=cache->index.find(profilesKey(profiles));
+    if (it == cache->index.end() || it->second->profiles != *profiles || it->second->firstEikonal != firstEikonal
+        || it->second->eikonalStep != eikonalStep) // (Two models can have the same key)
+      cache->misses++;
+    else {
+      cache->entries.splice(cache->entries.begin(),cache->entries,it->second); // Move the entry at the beginning of the list
+      *arrivalTimes=it->second->times;
+      cache->hits++;
+      found=true;
+    }
+  }
+  return found;
+}
+
+void storeTimes(std::vector<double>* profiles, int firstEikonal, int eikonalStep, ArrivalTimes* arrivalTimes, Configuration* config)
+// Put the travel times of the model described by profiles in the cache. The least recently used entry is removed if the cache is full
+{
+  if (config->timesCacheSize <= 0)
+    return;
+  CachedTimes entry;
+  entry.key=profilesKey(profiles);
+  entry.profiles=*profiles;
+  entry.firstEikonal=firstEikonal;
+  entry.eikonalStep=eikonalStep;
+  entry.times=*arrivalTimes;
+  #pragma omp critical(timesCache) // (The chains can be evaluated at the same time, see energies)
+  {
+    TimesCache* cache=&config->timesCache;
+    std::map<unsigned long,std::list<CachedTimes>::iterator>::iterator it=cache->index.find(entry.key);
+    if (it != cache->index.end()) { // Another model with the same key : it is replaced
+      cache->entries.erase(it->second);
+      cache->index.erase(it);
+    }
+    cache->entries.push_front(entry);
+    cache->index[entry.key]=cache->entries.begin();
+    if ((int)cache->entries.size() > config->timesCacheSize) {
+      cache->index.erase(cache->entries.back().key);
+      cache->entries.pop_back();
+    }
+  }
+}
+
+void computeArrivalTimes(Workspace* workspace, Configuration* config, int firstEikonal, int eikonalStep, ArrivalTimes* arrivalTimes)
+// Compute the travel times at the stations of the eikonals firstEikonal, firstEikonal+eikonalStep... (0 to numberOfShots-1 : P waves
+// of each shot, then S waves) in the velocity model of the workspace. They are stored shot after shot in arrivalTimes. The eikonals are
+// spread over config->eikonalThreads threads, each thread uses its own travel times grid. With EIKONAL_MODE = 1 the shots at the same
+// depth share one eikonal
 {
-  if(config->verbose1 && config->mpiConfig.rank == 0)
-    std::cout << "Computing energy..." << std::endl;
-  double E=0.0;
-  ArrivalTimes arrivalTimes;
   int numberOfShots = (int)config->data.coordShots.size();
   int numberOfStations = (int)config->data.coordStations.size();
-  VelocityModel velModel;
-  velModel.nx=config->data.nx; velModel.ny=config->data.ny; velModel.nz=config->data.nzFilt;
-  velModel.dx=config->data.dx; velModel.dy=config->data.dy; velModel.dz=config->data.dzFilt;
-  calculateShiftForEachShot(&velModel,config);
-  //velModel.xmin = config->data.xminGrid; velModel.ymin = config->data.yminGrid; velModel.zmin = config->data.zminGrid;
-  velModel.velP= new tab3d<double>(velModel.nz-1,velModel.nx-1,velModel.ny-1,-1);  // Create a (nz-1,nx-1,ny-1) mesh and initialize every cell at -1
-  if (config->swaves)
-    velModel.velS= new tab3d<double>(velModel.nz-1,velModel.nx-1,velModel.ny-1,-1);  // Create a (nz-1,nx-1,ny-1) mesh and initialize every cell at -1
-  makeVel(&velModel,state,config); // Build the velocity model corresponding to the parameters of the state for P waves
+  int numberOfEikonals = config->swaves ? 2*numberOfShots : numberOfShots;
+  std::vector<int> position(numberOfEikonals,-1); // Position of the times of each eikonal in arrivalTimes->timesP or timesS
+  int nP=0, nS=0;
+  std::vector<int> jobs; // Eikonals actually solved (one per travel times table)
+  std::vector<std::vector<int> > eikonalsOfJob; // Eikonals whose times are read in the table of each job
+  for(int i=firstEikonal;i<numberOfEikonals;i+=eikonalStep) {
+    bool sWaves = i >= numberOfShots;
+    position[i] = sWaves ? (nS++)*numberOfStations : (nP++)*numberOfStations;
+    int job = config->data.tableOfShot[sWaves ? i-numberOfShots : i]+(sWaves ? numberOfShots : 0);
+    int n = (int)(std::find(jobs.begin(),jobs.end(),job)-jobs.begin());
+    if (n == (int)jobs.size()) {
+      jobs.push_back(job);
+      eikonalsOfJob.push_back(std::vector<int>());
+    }
+    eikonalsOfJob[n].push_back(i);
+  }
+  arrivalTimes->timesP.assign(nP*numberOfStations,0.0);
+  arrivalTimes->timesS.assign(nS*numberOfStations,0.0);
+  #pragma omp parallel for schedule(dynamic) num_threads(config->eikonalThreads)
+  for(int n=0;n<(int)jobs.size();n++) {
+    int thread=0;
+    #ifdef _OPENMP
+      thread=omp_get_thread_num();
+    #endif
+    tab3d<double>* tt=workspace->times[thread];
+    bool sWaves = jobs[n] >= numberOfShots;
+    int shot = sWaves ? jobs[n]-numberOfShots : jobs[n];
+    if(config->verbose2)
+      std::cout << "     Eikonal " << (sWaves ? "S" : "P") << " for shot number " << shot+1 << " on " << numberOfShots << " ..."<< std::endl;
+    eikonal(tt,&workspace->velModel,config,shot,sWaves); // Calculate the travel times everywhere on the mesh for this shot
+    for(int k=0;k<(int)eikonalsOfJob[n].size();k++) { // Save the arrival times at the receivers
+      int i=eikonalsOfJob[n][k];
+      if (sWaves)
+        gatherTimes(tt,&config->data.stencils[i-numberOfShots],&arrivalTimes->timesS[position[i]]);
+      else
+        gatherTimes(tt,&config->data.stencils[i],&arrivalTimes->timesP[position[i]]);
+    }
+  }
+}
+
+void buildModel(State* state,Chain* chain,Configuration* config)
+// Build the velocity model of a state in the workspace of the chain and save its profiles into chain->profilesP and chain->profilesS
+{
+  VelocityModel* velModel=&chain->workspace->velModel; // The grids and the shifts of the shots are allocated/computed once (see createWorkspace)
+  makeVel(chain->workspace,state,config); // Build the velocity model corresponding to the parameters of the state for P waves
   // We save the profile into chain->profilesP and chain->profilesS
   for(int iz=0;iz<config->data.nzFilt-1;iz++) {
-    chain->profilesP[iz].push_back(velModel.velP->get(iz,1,1)); // Let us save the vertical line : (:,1,1) the velocity is 1D anyway
+    chain->profilesP[iz].push_back(velModel->velP->get(iz,0,0)); // Let us save the vertical line : (:,0,0) the velocity is 1D anyway
     if(config->swaves)
-      chain->profilesS[iz].push_back(velModel.velS->get(iz,1,1)); // Let us save the vertical line : (:,1,1) the velocity is 1D anyway
+      chain->profilesS[iz].push_back(velModel->velS->get(iz,0,0)); // Let us save the vertical line : (:,0,0) the velocity is 1D anyway
   }
   if (chain->maxP.size() > 0)
     updateMinMaxProfiles(chain,config); // Update min and max velocities investigated
+}
 
-  if(config->test==1) // We don't enter the Eikonal, we generate random energies uniformly distributed between config->minEtest and config->maxEtest
-    E=Uniform(config->minEtest,config->maxEtest);
-  else {
-    tab3d<double> tt3dP(config->data.nzFilt,config->data.nx,config->data.ny,-1.0);
-    tab3d<double> tt3dS(config->data.nzFilt,config->data.nx,config->data.ny,-1.0); // TODO : this is declared even if swaves == false -> change that
-    double sumP=0.0, sumS=0.0, totalSumP=0.0, totalSumS=0.0;
-    std::vector<int> indexP, indexS;
-    std::vector<double> t0P,t0S;
-    double t0=0.0;   // Origin time of the shot (if config->recalculateT0 == 1 we will recalculate it)
-    int numberOfEikonalToCompute = 0;
+void residuals(Chain* chain,Configuration* config, double* sumP, double* sumS)
+// Give the sums of the squared residuals (divided by 2 sigma^2) of the P and S waves travel times computed by this process in the
+// velocity model of the workspace of the chain (see buildModel). The sums of all the processes give the energy
+// T0 is calculated just using P waves TODO
+{
+  ArrivalTimes arrivalTimes;
+  int numberOfShots = (int)config->data.coordShots.size();
+  int numberOfStations = (int)config->data.coordStations.size();
+  VelocityModel* velModel=&chain->workspace->velModel;
+  *sumP=0.0;
+  *sumS=0.0;
+  std::vector<int> indexP, indexS;
+  std::vector<double> t0P,t0S;
+  double t0=0.0;   // Origin time of the shot (if config->recalculateT0 == 1 we will recalculate it)
+  int numberOfEikonalToCompute = 0;
 
-    if(config->swaves) 
-      numberOfEikonalToCompute = 2*numberOfShots;
-    else
-      numberOfEikonalToCompute = numberOfShots;
-      
-    #ifdef PAR
-      MPI_Barrier(MPI_COMM_WORLD);
-    #endif      
-    std::vector<double> arrivalTimesPforCurrentShot,arrivalTimesSforCurrentShot;
-    for(int i=config->mpiConfig.rank;i<numberOfEikonalToCompute;i+=config->mpiConfig.nb_process) { // Loop on the eikonal to compute (spread them over all processors)
-      if (i<numberOfShots) { // This eikonal is for P waves
-        if(config->verbose2)
-          std::cout << "     Eikonal P for shot number " << i+1 << " on " << numberOfShots << " ..."<< std::endl;
-        indexP.push_back(i); // Save in indexP the index of the shot calculated
-        eikonal3d(&tt3dP,&velModel,config,i,false); // Calculate the P waves travel times everywhere on the mesh (put them on tt3dP) for the shot number calculated
-        arrivalTimesPforCurrentShot.clear();
-        for(int j=0;j<numberOfStations;j++) {
-          arrivalTimes.timesP.push_back(getTime(&tt3dP,config->data.coordStations[j],&velModel,i));
-          arrivalTimesPforCurrentShot.push_back(getTime(&tt3dP,config->data.coordStations[j],&velModel,i));
-        }
-        // (above) Save the arrival times at the receivers for the shot calculated by this proc
-        if (config->recalculateT0) {
-          t0=0.0;
-          int nUsedP=0;  // Number of travel times used for P waves (some data travel times can be < 0, meaning that we don't know them)
-          for(int k=0;k<(int)arrivalTimesPforCurrentShot.size();k++) { // Calculation of t0
-            int idxP=i*numberOfStations+k;
-            if (config->data.times.timesP[idxP] > 0.0) {
-              t0+=config->data.times.timesP[idxP]-arrivalTimesPforCurrentShot[k];//arrivalTimes.timesP[k];
-              nUsedP++;
-            }
+  if(config->swaves) 
+    numberOfEikonalToCompute = 2*numberOfShots;
+  else
+    numberOfEikonalToCompute = numberOfShots;
+    
+  std::vector<double> profiles; // The velocity model is 1D : its profiles identify its travel times
+  if (config->timesCacheSize > 0)
+    profiles=modelProfiles(velModel,config);
+  if (!lookupTimes(&profiles,config->mpiConfig.rank,config->mpiConfig.nb_process,&arrivalTimes,config)) { // Not in the cache : we run the eikonal
+    computeArrivalTimes(chain->workspace,config,config->mpiConfig.rank,config->mpiConfig.nb_process,&arrivalTimes); // Spread over the processors
+    storeTimes(&profiles,config->mpiConfig.rank,config->mpiConfig.nb_process,&arrivalTimes,config);
+  }
+  for(int i=config->mpiConfig.rank;i<numberOfEikonalToCompute;i+=config->mpiConfig.nb_process) { // Loop on the shots calculated by this proc
+    if (i<numberOfShots) { // P waves
+      indexP.push_back(i); // Save in indexP the index of the shot calculated
+      if (config->recalculateT0) {
+        int first=((int)indexP.size()-1)*numberOfStations; // Position of the first arrival time of this shot in arrivalTimes.timesP
+        t0=0.0;
+        int nUsedP=0;  // Number of travel times used for P waves (some data travel times can be < 0, meaning that we don't know them)
+        for(int k=0;k<numberOfStations;k++) { // Calculation of t0
+          int idxP=i*numberOfStations+k;
+          if (config->data.times.timesP[idxP] > 0.0) {
+            t0+=config->data.times.timesP[idxP]-arrivalTimes.timesP[first+k];
+            nUsedP++;
           }
-          t0P.push_back(t0/nUsedP);
         }
-        else {
-          t0P.push_back(0.0);
-        }
-      } // At this point each processor has calculated the travel times and the t0 corresponding to some shots
-      else { // S waves
-        if(config->verbose2)
-          std::cout << "     Eikonal S for shot number " << i+1-numberOfShots << " on " << numberOfShots << " ..."<< std::endl;
-        indexS.push_back(i-numberOfShots);
-        eikonal3d(&tt3dS,&velModel,config,i-numberOfShots,true); 
-        // Calculate the S waves travel times everywhere on the mesh (put them on tt3dS) for the shot number i
-        arrivalTimesSforCurrentShot.clear();
-        for(int j=0;j<numberOfStations;j++) {
-          arrivalTimes.timesS.push_back(getTime(&tt3dS,config->data.coordStations[j],&velModel,i-numberOfShots));
-          arrivalTimesSforCurrentShot.push_back(getTime(&tt3dS,config->data.coordStations[j],&velModel,i-numberOfShots));
-        }
-        if (config->recalculateT0) {
-          t0=0.0;
-          int nUsedS=0;  // Number of travel times used for S waves
-          for(int k=0;k<(int)arrivalTimesSforCurrentShot.size();k++) { // Calculation of t0
-            int idxS=(i-numberOfShots)*numberOfStations+k;
-            if (config->data.times.timesS[idxS] > 0.0) {
-              t0+=config->data.times.timesS[idxS]-arrivalTimesSforCurrentShot[k]; //arrivalTimes.timesS[k];
-              nUsedS++;
-            }
+        t0P.push_back(t0/nUsedP);
+      }
+      else {
+        t0P.push_back(0.0);
+      }
+    } // At this point each processor has the travel times and the t0 corresponding to some shots
+    else { // S waves
+      indexS.push_back(i-numberOfShots);
+      if (config->recalculateT0) {
+        int first=((int)indexS.size()-1)*numberOfStations; // Position of the first arrival time of this shot in arrivalTimes.timesS
+        t0=0.0;
+        int nUsedS=0;  // Number of travel times used for S waves
+        for(int k=0;k<numberOfStations;k++) { // Calculation of t0
+          int idxS=(i-numberOfShots)*numberOfStations+k;
+          if (config->data.times.timesS[idxS] > 0.0) {
+            t0+=config->data.times.timesS[idxS]-arrivalTimes.timesS[first+k];
+            nUsedS++;
           }
-          t0S.push_back(t0/nUsedS);
-        }
-        else {
-          t0S.push_back(0.0);
         }
+        t0S.push_back(t0/nUsedS);
       }
-    }
-    double diffP=0.0,diffS=0.0;
-    for(int k=0;k<(int)arrivalTimes.timesP.size();k++) { // Loop on the P wave travel times calculated by this proc
-      int idxP=indexP[(int)floor(k/numberOfStations)]*numberOfStations+k-numberOfStations*(int)floor(k/numberOfStations); // Position corresponding to that travel time in the data file (picked first arrival times)
-      int idxShotP = (int)floor(k/numberOfStations); // index of the shot (for that proc)
-      if (config->data.times.timesP[idxP] > 0.0)
-        diffP = config->data.times.timesP[idxP]-(t0P[idxShotP]+arrivalTimes.timesP[k]);
-      sumP+=pow(diffP/config->data.sigmaP,2.0)/2.0; // sum of the squares of the differences between the P wave first arrival times and the data
-    }
-    if(config->swaves) { 
-      for(int k=0;k<(int)arrivalTimes.timesS.size();k++) { // Loop on the S wave travel times calculated
-        int idxS=indexS[(int)floor(k/numberOfStations)]*numberOfStations+k-numberOfStations*(int)floor(k/numberOfStations); // index of the arrival time corresponding to the one calculated
-        int idxShotS = (int)floor(k/numberOfStations); // index of the shot (for that proc)
-        if (config->data.times.timesS[idxS] > 0.0)
-          diffS = config->data.times.timesS[idxS]-(t0S[idxShotS]+arrivalTimes.timesS[k]);
-        sumS+=pow(diffS/config->data.sigmaS,2.0)/2.0; // sum of the squares of the differences between the P wave first arrival times
+      else {
+        t0S.push_back(0.0);
       }
     }
+  }
+  double diffP=0.0,diffS=0.0;
+  for(int k=0;k<(int)arrivalTimes.timesP.size();k++) { // Loop on the P wave travel times calculated by this proc
+    int idxP=indexP[(int)floor(k/numberOfStations)]*numberOfStations+k-numberOfStations*(int)floor(k/numberOfStations); // Position corresponding to that travel time in the data file (picked first arrival times)
+    int idxShotP = (int)floor(k/numberOfStations); // index of the shot (for that proc)
+    if (config->data.times.timesP[idxP] > 0.0)
+      diffP = config->data.times.timesP[idxP]-(t0P[idxShotP]+arrivalTimes.timesP[k]);
+    *sumP+=pow(diffP/config->data.sigmaP,2.0)/2.0; // sum of the squares of the differences between the P wave first arrival times and the data
+  }
+  if(config->swaves) { 
+    for(int k=0;k<(int)arrivalTimes.timesS.size();k++) { // Loop on the S wave travel times calculated
+      int idxS=indexS[(int)floor(k/numberOfStations)]*numberOfStations+k-numberOfStations*(int)floor(k/numberOfStations); // index of the arrival time corresponding to the one calculated
+      int idxShotS = (int)floor(k/numberOfStations); // index of the shot (for that proc)
+      if (config->data.times.timesS[idxS] > 0.0)
+        diffS = config->data.times.timesS[idxS]-(t0S[idxShotS]+arrivalTimes.timesS[k]);
+      *sumS+=pow(diffS/config->data.sigmaS,2.0)/2.0; // sum of the squares of the differences between the P wave first arrival times
+    }
+  }
+}
+
+double energy(State* state,Chain* chain,Configuration* config)
+// Give the energy of a state in a given chain (we need to give the chain to get the temperature)
+{
+  if(config->verbose1 && config->mpiConfig.rank == 0)
+    std::cout << "Computing energy..." << std::endl;
+  double E=0.0;
+  buildModel(state,chain,config); // Build the velocity model of the state and save its profiles
+  if(config->test==1) // We don't enter the Eikonal, we generate random energies uniformly distributed between config->minEtest and config->maxEtest
+    E=Uniform(config->minEtest,config->maxEtest);
+  else {
+    double sumP=0.0, sumS=0.0, totalSumP=0.0, totalSumS=0.0;
+    residuals(chain,config,&sumP,&sumS); // Residuals of the travel times computed by this proc
     #ifdef PAR
-      MPI_Barrier(MPI_COMM_WORLD);
       MPI_Allreduce(&sumP,&totalSumP,1,MPI_DOUBLE,MPI_SUM,MPI_COMM_WORLD) ;
       if(config->swaves)
         MPI_Allreduce(&sumS,&totalSumS,1,MPI_DOUBLE,MPI_SUM,MPI_COMM_WORLD) ; 
@@ -457,12 +820,42 @@ double energy(State* state,Chain* chain,Configuration* config)
   }
   if(config->verbose1 && config->mpiConfig.rank == 0)
     std::cout << "End of function energy" << std::endl;
-  delete velModel.velP;
-  if (config->swaves)
-    delete velModel.velS;
   return E;
 }
 
+void energies(std::vector<State*>* states, std::vector<Chain*>* chains, Configuration* config)
+// Compute the energies of the states (*states)[k] in the chains (*chains)[k] at the same time (PARALLEL_CHAINS > 0). The velocity
+// models are built one after the other (the wavelet transforms use buffers of config), then the eikonals of the different chains are
+// computed on config->parallelChains threads (each chain has its own workspace) and the residuals of all the states are summed over the
+// processes in one reduction. The energies do not depend on the number of threads
+{
+  int numberOfStates = (int)states->size();
+  if(config->test==1) { // The energies are random : they are drawn one after the other
+    for(int k=0;k<numberOfStates;k++)
+      (*states)[k]->E=energy((*states)[k],(*chains)[k],config);
+    return;
+  }
+  for(int k=0;k<numberOfStates;k++)
+    buildModel((*states)[k],(*chains)[k],config); // Build the velocity model of the state and save its profiles
+  std::vector<double> sums(2*numberOfStates,0.0), totalSums(2*numberOfStates,0.0); // sumP and sumS of each state
+  #pragma omp parallel for schedule(dynamic) num_threads(config->parallelChains)
+  for(int k=0;k<numberOfStates;k++)
+    residuals((*chains)[k],config,&sums[2*k],&sums[2*k+1]); // Residuals of the travel times computed by this proc
+  #ifdef PAR
+    if (numberOfStates > 0)
+      MPI_Allreduce(&sums[0],&totalSums[0],2*numberOfStates,MPI_DOUBLE,MPI_SUM,MPI_COMM_WORLD);
+  #else
+    totalSums=sums;
+  #endif
+  for(int k=0;k<numberOfStates;k++) {
+    (*states)[k]->E=(totalSums[2*k]+totalSums[2*k+1]+config->data.Ep)/((*chains)[k]->T);
+    if (config->verbose1 && config->mpiConfig.rank == 0) {
+      std::cout << "      Energy of the trial state of chain " << (*chains)[k]->i+1 << " : " << (*states)[k]->E << "  (sumP : " << totalSums[2*k];
+      std::cout << "  sumS : " << totalSums[2*k+1] << "  Ep : " << config->data.Ep << ")  E*T : " << (*states)[k]->E*(*chains)[k]->T << ")" << std::endl;
+    }
+  }
+}
+
 std::vector<int> makeIndex(Chain* chain, Configuration* config)
 // Make the index of the parameters to modify
 // We could have done far better to deal with the static parameters but I was tired...
@@ -477,7 +870,7 @@ std::vector<int> makeIndex(Chain* chain, Configuration* config)
     varyingParams--;
   }
   for(int j=varyingParams;j>chain->nc;j--) { // At the end of the loop index contains a random series of nc indexes to modify
-    double r=((j-0.5)-(0+0.5))*rand()/(double)RAND_MAX+1;  // To draw randomly the parameter to modify : c
+    double r=((j-0.5)-(0+0.5))*countedRand()/(double)RAND_MAX+1;  // To draw randomly the parameter to modify : c
     int c = (int)(r < 0 ? r - 0.5 : r + 0.5);
       index.erase(index.begin()+c-1);   // Erase the c-1 element
   }
@@ -503,7 +896,7 @@ void priorIteration(Chain* chain,Configuration* config)
 	int nParams=(int)priorState.params.size(); // = NPU (or NPU*2)
 	std::vector<int> temp(nParams+1, 0.0);// Ex: temp=[0,0,0,0,0,0,0] of length nParams + 1
 	temp[0] = 1; // temp=[1,0,0,0,0,0,0]
-	std::random_shuffle(temp.begin(),temp.end()); // For example temp=[0,0,0,0,1,0,0]
+	std::random_shuffle(temp.begin(),temp.end(),countedRandIndex); // For example temp=[0,0,0,0,1,0,0]
 	for(int i=0;i<chain->nc;i++) {
 	  if (temp[i] == 1)// We modify the wavelet type
 		weMustModifyWavelet = true; // This is equivalent to a random draw without push back
@@ -511,7 +904,7 @@ void priorIteration(Chain* chain,Configuration* config)
 	if (weMustModifyWavelet) {
 	  if (config->verbose1 && config->mpiConfig.rank == 0)
 	    std::cout << "   The wavelet type is a parameter that will be modified!" << std::endl;
-	    priorState.wavelet = rand() % config->nWavelets; // Draw wavelet in the range 0 to config->nWavelets-1
+	    priorState.wavelet = countedRand() % config->nWavelets; // Draw wavelet in the range 0 to config->nWavelets-1
 	    chain->nc--;
 	    if (config->verbose2 && config->mpiConfig.rank == 0 && config->useAllWavelets)
 	      std::cout<< "     Wavelet drawn: " << config->listOfWavelets[priorState.wavelet] << "..." << std::endl;
@@ -531,21 +924,22 @@ void priorIteration(Chain* chain,Configuration* config)
     chain->nc++;
 }
 
-void iterationMHindependent(Chain* chain,Configuration* config)
-// Perform an independent MH iteration on the chain given (Often the highest temperature chain)
+void proposeIndependent(Chain* chain, State* trialState, Configuration* config)
+// Draw the trial state of an independent MH iteration on the chain given (Often the highest temperature chain) : the parameters
+// modified are drawn uniformly between their bounds
 // We could have done far better to deal with the static parameters but I was tired... TODO : add a function
 {
   if (config->verbose1 && config->mpiConfig.rank == 0) {
     std::cout << "***** Iteration on chain " << chain->i+1 << " on " << config->nbt << " (Temperature : "<< config->T[chain->i] << ") ***** " << std::endl;
     std::cout<< "--> Independent Metropolis Hasting iteration proposed... " << std::endl;
   } 
-  State trialState=chain->states.back(); // Copy the actual state into the trial one. chain->states.back() is the actual state
+  *trialState=chain->states.back(); // Copy the actual state into the trial one. chain->states.back() is the actual state
   bool weMustModifyWavelet = false;
   if(config->useAllWavelets and config->waveletParameterization) {
-	int nParams=(int)trialState.params.size(); // = NPU (or NPU*2)
+	int nParams=(int)trialState->params.size(); // = NPU (or NPU*2)
 	std::vector<int> temp(nParams+1, 0.0);// Ex: temp=[0,0,0,0,0,0,0] of length nParams + 1
 	temp[0] = 1; // temp=[1,0,0,0,0,0,0]
-	std::random_shuffle(temp.begin(),temp.end()); // For example temp=[0,0,0,0,1,0,0]
+	std::random_shuffle(temp.begin(),temp.end(),countedRandIndex); // For example temp=[0,0,0,0,1,0,0]
 	for(int i=0;i<chain->nc;i++) {
 	  if (temp[i] == 1)// We modify the wavelet type
 		weMustModifyWavelet = true; // This is equivalent to a random draw without push back
@@ -553,71 +947,40 @@ void iterationMHindependent(Chain* chain,Configuration* config)
 	if (weMustModifyWavelet) {
 	  if (config->verbose1 && config->mpiConfig.rank == 0)
 	    std::cout << "   The wavelet type is a parameter that will be modified!" << std::endl;
-	    trialState.wavelet = rand() % config->nWavelets; // Draw wavelet in the range 0 to config->nWavelets-1
+	    trialState->wavelet = countedRand() % config->nWavelets; // Draw wavelet in the range 0 to config->nWavelets-1
 	    chain->nc--;
 	    if (config->verbose2 && config->mpiConfig.rank == 0 && config->useAllWavelets)
-	      std::cout<< "     Wavelet drawn: " << config->listOfWavelets[trialState.wavelet] << "..." << std::endl;
+	      std::cout<< "     Wavelet drawn: " << config->listOfWavelets[trialState->wavelet] << "..." << std::endl;
 	}
   }
   std::vector <int> index = makeIndex(chain,config); // Draw randomly which parameters will be modified
   for(int k=0;k<(int)index.size();k++) { // Loop on the number of parameters that we will modify
-    trialState.params[index[k]]=Uniform(config->data.minParameters[trialState.wavelet][index[k]],config->data.maxParameters[trialState.wavelet][index[k]]);
+    trialState->params[index[k]]=Uniform(config->data.minParameters[trialState->wavelet][index[k]],config->data.maxParameters[trialState->wavelet][index[k]]);
     if (config->verbose2 && config->mpiConfig.rank == 0 && 0) {
-      std::cout<< "Trial state param["<< index[k] <<"] : " << trialState.params[index[k]] << "   ";
-      std::cout<< "(Uniform between : "<< config->data.minParameters[trialState.wavelet][index[k]] <<" and " << config->data.maxParameters[trialState.wavelet][index[k]] << ") " << std::endl;
+      std::cout<< "Trial state param["<< index[k] <<"] : " << trialState->params[index[k]] << "   ";
+      std::cout<< "(Uniform between : "<< config->data.minParameters[trialState->wavelet][index[k]] <<" and " << config->data.maxParameters[trialState->wavelet][index[k]] << ") " << std::endl;
     }  
   }
-  trialState.E=energy(&trialState,chain,config); // Compute the forward problem for the trial model (add one line to the profiles)
-  if (config->verbose2 && config->mpiConfig.rank == 0) {
-    std::cout<< "trialState energy :" << trialState.E << std::endl;
-    std::cout<< "Last state energy :" << chain->states.back().E << std::endl;
-    std::cout<< "alpha :" << exp(chain->states.back().E-trialState.E) << std::endl;
-  }
-  double p=Random();  // Acceptance variable
-  long double alpha=exp(chain->states.back().E-trialState.E); // This is quite small usually. We don't need high precision
-  // Acceptance probability alpha=exp(E[n-1][i]-Ep)
-  if (p<alpha)  // We accept the transition
-  {
-    if (config->verbose1 && config->mpiConfig.rank == 0)
-      std::cout<< "Transition accepted" << std::endl<< std::endl;
-    chain->states.push_back(trialState);
-    chain->at++; // Number of accepted transitions
-  }
-  else // We keep the same model
-  {
-    if (config->verbose1 && config->mpiConfig.rank == 0)
-      std::cout<< "Transition rejected" << std::endl<< std::endl; 
-    chain->states.push_back(chain->states.back());
-    chain->rt++; // Number of rejected transitions
-    for(int iz=0;iz<config->data.nzFilt-1;iz++) {
-      chain->profilesP[iz].pop_back(); // We need to do that because when we calculate the energy trialState.E=energy(&trialState,chain,config) we pushed back the trial profile
-      chain->profilesP[iz].push_back(chain->profilesP[iz].back());
-      if(config->swaves) {
-        chain->profilesS[iz].pop_back(); // We need to do that because when we calculate the energy trialState.E=energy(&trialState,chain,config) we pushed back the trial profile
-        chain->profilesS[iz].push_back(chain->profilesS[iz].back());
-      }
-    }
-  }
   if(weMustModifyWavelet)
     chain->nc++;
 }
 
-void iterationMH(Chain* chain,Configuration* config)
-// Perform a classical MH iteration on the chain given.
+bool proposeMH(Chain* chain, State* trialState, Configuration* config)
+// Draw the trial state of a classical MH iteration on the chain given. Return false if it is out of the prior domain
 // We could have done far better to deal with the static parameters but I was tired... TODO : add a function
 {
   if (config->verbose1 && config->mpiConfig.rank == 0) {
     std::cout << "***** Iteration on chain " << chain->i+1 << " on " << config->nbt << " (Temperature : "<< config->T[chain->i] << ") ***** " << std::endl;
     std::cout<< "--> Metropolis Hasting iteration proposed... " << std::endl;
   }
-  State trialState=chain->states.back();
+  *trialState=chain->states.back();
   // Copy the actual state into the trial one. chain->states.back() is the actual state
   bool weMustModifyWavelet = false;
   if(config->useAllWavelets and config->waveletParameterization) {
-	int nParams=(int)trialState.params.size(); // = NPU (or NPU*2)
+	int nParams=(int)trialState->params.size(); // = NPU (or NPU*2)
 	std::vector<int> temp(nParams+1, 0.0);// Ex: temp=[0,0,0,0,0,0,0] of length nParams + 1
 	temp[0] = 1; // temp=[1,0,0,0,0,0,0]
-	std::random_shuffle(temp.begin(),temp.end()); // For example temp=[0,0,0,0,1,0,0]
+	std::random_shuffle(temp.begin(),temp.end(),countedRandIndex); // For example temp=[0,0,0,0,1,0,0]
 	for(int i=0;i<chain->nc;i++) {
 	  if (temp[i] == 1)// We modify the wavelet type
 		weMustModifyWavelet = true; // This is equivalent to a random draw without push back
@@ -625,10 +988,10 @@ void iterationMH(Chain* chain,Configuration* config)
 	if (weMustModifyWavelet) {
 	  if (config->verbose1 && config->mpiConfig.rank == 0)
 	    std::cout << "   The wavelet type is a parameter that will be modified!" << std::endl;
-	    trialState.wavelet = rand() % config->nWavelets; // Draw wavelet in the range 0 to config->nWavelets-1 // Change that! TODOTODO
+	    trialState->wavelet = countedRand() % config->nWavelets; // Draw wavelet in the range 0 to config->nWavelets-1 // Change that! TODOTODO
 	    chain->nc--;
 	    if (config->verbose2 && config->mpiConfig.rank == 0 && config->useAllWavelets)
-	      std::cout<< "     Wavelet drawn: " << config->listOfWavelets[trialState.wavelet] << "..." << std::endl;
+	      std::cout<< "     Wavelet drawn: " << config->listOfWavelets[trialState->wavelet] << "..." << std::endl;
 	}
   }
   std::vector <int> index;
@@ -642,65 +1005,131 @@ void iterationMH(Chain* chain,Configuration* config)
     // double sigma = chain->deltaParameters[wavelet][index[k]]*sqrt(chain->T/config->tmax);
     // double sigma = chain->deltaParameters[wavelet][index[k]]*pow((double)(chain->i+1)/(double)config->nbt,config->n);
     // double sigma = chain->deltaParameters[wavelet][index[k]]*sqrt(chain->T/config->tmax)*floor((double)config->nbt/(double)(chain->i+1));
-    sigma = chain->deltaParameters[trialState.wavelet][index[k]]; 
-    trialState.params[index[k]]=oldValue+Normal(0.0,sigma);
+    sigma = chain->deltaParameters[trialState->wavelet][index[k]]; 
+    trialState->params[index[k]]=oldValue+Normal(0.0,sigma);
     /////////////////////////////////////
     if (config->verbose2 && config->mpiConfig.rank == 0) {
-      std::cout<< "  Trial state param["<< index[k] <<"] : " << trialState.params[index[k]] << "   ";
+      std::cout<< "  Trial state param["<< index[k] <<"] : " << trialState->params[index[k]] << "   ";
       std::cout<< "  Last state param["<< index[k] <<"] : " << chain->states.back().params[index[k]] << "   ";
       std::cout<< "  (Gaussian centred in : " << oldValue << " and of delta : " << sigma << " )" << std::endl;
-      std::cout<< "  Need to be between : "<< config->data.minParameters[trialState.wavelet][index[k]] <<" and " << config->data.maxParameters[trialState.wavelet][index[k]] << std::endl;
+      std::cout<< "  Need to be between : "<< config->data.minParameters[trialState->wavelet][index[k]] <<" and " << config->data.maxParameters[trialState->wavelet][index[k]] << std::endl;
     } 
-    if (trialState.params[index[k]] > config->data.maxParameters[trialState.wavelet][index[k]] || trialState.params[index[k]] < config->data.minParameters[trialState.wavelet][index[k]])
+    if (trialState->params[index[k]] > config->data.maxParameters[trialState->wavelet][index[k]] || trialState->params[index[k]] < config->data.minParameters[trialState->wavelet][index[k]])
       outOfDomain=true;
   }
-  if (outOfDomain==false) { // We can iterate
-    trialState.E=energy(&trialState,chain,config); // Compute the forward problem for the trial model (add one line to the profiles)
-    double p=Random();  //Acceptance variable
-    long double alpha=exp(chain->states.back().E-trialState.E); // This is quite small usually, we don't need high precision
-    if (config->verbose2 && config->mpiConfig.rank == 0) {
-      std::cout<< "trialState energy :" << trialState.E << std::endl;
-      std::cout<< "Last state energy :" << chain->states.back().E << std::endl;
-      std::cout<< "alpha :" << alpha << std::endl;
-    }
-    // Acceptance probability alpha=exp(E[n-1][i]-Ep)
-    if (p<alpha) {  // We accept the transition
-      if (config->verbose1 && config->mpiConfig.rank == 0)
-         std::cout<< "Transition accepted" << std::endl<< std::endl;
-      chain->states.push_back(trialState);
-      chain->at++; // Number of accepted transitions
-    }
-    else { // We keep the same model
-      if (config->verbose1 && config->mpiConfig.rank == 0)
-        std::cout<< "Transition rejected" << std::endl<< std::endl;
-      chain->states.push_back(chain->states.back());
-      chain->rt++; // Number of rejected transitions
-      for(int iz=0;iz<config->data.nzFilt-1;iz++) {
-        chain->profilesP[iz].pop_back(); // We need to do that because when we calculate the energy trialState.E=energy(&trialState,chain,config) we pushed back the trial profile
-        chain->profilesP[iz].push_back(chain->profilesP[iz].back());
-        if(config->swaves) {
-          chain->profilesS[iz].pop_back(); // We need to do that because when we calculate the energy trialState.E=energy(&trialState,chain,config) we pushed back the trial profile
-          chain->profilesS[iz].push_back(chain->profilesS[iz].back());
-        }
-      }
-    }
+  if(weMustModifyWavelet)
+    chain->nc++;
+  return !outOfDomain;
+}
+
+void acceptOrReject(Chain* chain, State* trialState, Configuration* config)
+// Accept or reject the trial state of a MH iteration on the chain given. Its energy has been computed (and its profiles pushed back)
+{
+  double p=Random();  //Acceptance variable
+  long double alpha=exp(chain->states.back().E-trialState->E); // This is quite small usually, we don't need high precision
+  if (config->verbose2 && config->mpiConfig.rank == 0) {
+    std::cout<< "trialState energy :" << trialState->E << std::endl;
+    std::cout<< "Last state energy :" << chain->states.back().E << std::endl;
+    std::cout<< "alpha :" << alpha << std::endl;
+  }
+  // Acceptance probability alpha=exp(E[n-1][i]-Ep)
+  if (p<alpha) {  // We accept the transition
+    if (config->verbose1 && config->mpiConfig.rank == 0)
+       std::cout<< "Transition accepted" << std::endl<< std::endl;
+    chain->states.push_back(*trialState);
+    chain->at++; // Number of accepted transitions
   }
-  else { // Out of domain. We stay in the same state
+  else { // We keep the same model
     if (config->verbose1 && config->mpiConfig.rank == 0)
-      std::cout<< "Out Of Domain" << std::endl<< std::endl;
+      std::cout<< "Transition rejected" << std::endl<< std::endl;
     chain->states.push_back(chain->states.back());
-    chain->od++; // Number of "out of domain"
+    chain->rt++; // Number of rejected transitions
     for(int iz=0;iz<config->data.nzFilt-1;iz++) {
-      // Here we need to pop back a profile because we did not calculate the energy
+      chain->profilesP[iz].pop_back(); // We need to do that because when we calculate the energy trialState.E=energy(&trialState,chain,config) we pushed back the trial profile
       chain->profilesP[iz].push_back(chain->profilesP[iz].back());
       if(config->swaves) {
-        // Here we need to pop back a profile because we did not calculate the energy
+        chain->profilesS[iz].pop_back(); // We need to do that because when we calculate the energy trialState.E=energy(&trialState,chain,config) we pushed back the trial profile
         chain->profilesS[iz].push_back(chain->profilesS[iz].back());
       }
     }
   }
-  if(weMustModifyWavelet)
-    chain->nc++;
+}
+
+void stayOutOfDomain(Chain* chain, Configuration* config)
+// The trial state of a MH iteration is out of the prior domain : the chain stays in the same state (the energy is not computed)
+{
+  if (config->verbose1 && config->mpiConfig.rank == 0)
+    std::cout<< "Out Of Domain" << std::endl<< std::endl;
+  chain->states.push_back(chain->states.back());
+  chain->od++; // Number of "out of domain"
+  for(int iz=0;iz<config->data.nzFilt-1;iz++) {
+    // Here we need to pop back a profile because we did not calculate the energy
+    chain->profilesP[iz].push_back(chain->profilesP[iz].back());
+    if(config->swaves) {
+      // Here we need to pop back a profile because we did not calculate the energy
+      chain->profilesS[iz].push_back(chain->profilesS[iz].back());
+    }
+  }
+}
+
+void iterationMHindependent(Chain* chain,Configuration* config)
+// Perform an independent MH iteration on the chain given (Often the highest temperature chain)
+{
+  State trialState;
+  proposeIndependent(chain,&trialState,config); // Draw the trial state
+  trialState.E=energy(&trialState,chain,config); // Compute the forward problem for the trial model (add one line to the profiles)
+  acceptOrReject(chain,&trialState,config);
+}
+
+void iterationMH(Chain* chain,Configuration* config)
+// Perform a classical MH iteration on the chain given.
+{
+  State trialState;
+  if (proposeMH(chain,&trialState,config)) { // We can iterate
+    trialState.E=energy(&trialState,chain,config); // Compute the forward problem for the trial model (add one line to the profiles)
+    acceptOrReject(chain,&trialState,config);
+  }
+  else // Out of domain. We stay in the same state
+    stayOutOfDomain(chain,config);
+}
+
+void parallelIteration(Run* run, Configuration* config)
+// Perform an iteration on all the chains (PARALLEL_CHAINS > 0). The trial states of all the chains are drawn first, from the highest
+// temperature chain to the lowest. Their energies are computed at the same time (see energies). Then, in the same order, the
+// transitions are accepted or rejected and the IR-swaps are performed. The random numbers are drawn in the same order whatever the
+// number of threads, so the run only depends on the seed. (An IR-swap of the chain i only uses the states of the chain i+1 of the
+// previous iterations : the chains are independent within an iteration)
+{
+  std::vector<State> trialStates(config->nbt);
+  std::vector<int> moves(config->nbt,MOVE_MH);
+  std::vector<State*> states;  // Trial states whose energy has to be computed...
+  std::vector<Chain*> chains;  // ... and their chains
+  for (int i=config->nbt-1;i>=0;i--) { // Loop on the different temperatures chains
+    if (i == config->nbt-1)                               // If we consider the highest T chain...
+      proposeIndependent(run->chains[i],&trialStates[i],config); // ...we perform an independent sampler transition.
+    else {                                                // Otherwise, if we consider the low temperature chains...
+      double p=Random();
+      if (p < (1-config->pee)) {                          // _with probability 1-pee we perform a classical MH transition.
+        if (!proposeMH(run->chains[i],&trialStates[i],config))
+          moves[i]=MOVE_OUT_OF_DOMAIN;
+      }
+      else                                                // _with probability pee we suggest an IR-swap.
+        moves[i]=MOVE_IR_SWAP;
+    }
+    if (moves[i] == MOVE_MH) {
+      states.push_back(&trialStates[i]);
+      chains.push_back(run->chains[i]);
+    }
+  }
+  energies(&states,&chains,config); // Compute the forward problems of all the trial models at the same time
+  for (int i=config->nbt-1;i>=0;i--) { // Loop on the different temperatures chains
+    if (moves[i] == MOVE_MH)
+      acceptOrReject(run->chains[i],&trialStates[i],config);
+    else if (moves[i] == MOVE_OUT_OF_DOMAIN)
+      stayOutOfDomain(run->chains[i],config);
+    else
+      importanceSamplingSwap(run,i,config);
+  }
 }
 
 void importanceSamplingSwap(Run* run,int i,Configuration* config)
@@ -717,7 +1146,7 @@ void importanceSamplingSwap(Run* run,int i,Configuration* config)
   // We choose a higher temperature chain's state according to an IS (importance sampling) draw
   run->chains[i]->ps++;  // Swapping suggested
   int sp=pickastate2(run,i,config); // Pick a state of the i th chain of the run according to an IS (importance sampling) draw
-  int n=(int)run->chains[i]->states.size()-1; // Index of the last state of the chain i
+  int n=run->chains[i]->iterations.back(); // Iteration of the last state of the chain i
   double dT= 1/run->chains[i]->T-1/run->chains[i+1]->T;
   double dE=run->chains[i]->states.back().E*run->chains[i]->T-run->chains[i+1]->states[sp].E*run->chains[i+1]->T;  // ->states[n-1].E!
   long double alpha=exp(dT*dE); // Here high precision is not necessary because exp(-500)~0 and exp(500) ~ inf
@@ -755,8 +1184,8 @@ void importanceSamplingSwap(Run* run,int i,Configuration* config)
     */
     SwapFeatures swapFeatures;
     swapFeatures.idxChain=i; // Index of the chain which has swapped (0 : lowest temperature chain...)
-    swapFeatures.idxState=n; // Index of the state of the chain who has been swapped
-    swapFeatures.sp=sp;      // Index of the state of the higher temperature chain who has been chosen for the swap
+    swapFeatures.idxState=n; // Iteration of the state of the chain who has been swapped
+    swapFeatures.sp=run->chains[i+1]->iterations[sp]; // Iteration of the state of the higher temperature chain who has been chosen for the swap
     run->swapHist.push_back(swapFeatures); // Add the features of the swap to the swapping history off the run.
     writeSwap(run,config);
     // Writes a new line on the data file ll.XXX.dat. If it does not exist it is created. It will store the swapping history
@@ -779,31 +1208,14 @@ void importanceSamplingSwap(Run* run,int i,Configuration* config)
 
 int pickastate2(Run* run, int i, Configuration* config)
 // Pick a state of the i th chain of the run according to an IS (importance sampling) draw
+// The column run->SCI[i] is a cumulative sum (it is sorted) : the state picked is found by a binary search in O(log(n))
+// It has one line per state of the history of the chain i+1 (before the actual iteration)
 {
-  int r=0;
-  int n=(int)run->chains[i]->states.size();
-  long double p=(long double)Random()*(run->SCI[n-1][i]);
-
+  int n=(int)run->SCI[i].size();
+  long double p=(long double)Random()*(run->SCI[i][n-1]);
   // Draw a number between 0 and the importance weight of the i th chain's previous state  (p=Random()*SCI[n-1][l]);
-//  if (config->verbose1 && config->mpiConfig.rank == 0) {
-//    std::cout<< "run->SCI["<<n-1<<"][" << i<<"] : " << run->SCI[n-1][i] << std::endl<< std::endl;
-//    std::cout<< "p : "<< p << std::endl<< std::endl;
-//  }
-
-  for (int j=0;j<n;j++) {
-    if (p >run->SCI[j][i]) {
-//      if (config->verbose1 && config->mpiConfig.rank == 0) 
-//        std::cout<< "p > run->SCI["<< j << "][" << i<< "]    (" << run->SCI[j][i] << ")  ->  r++" << std::endl;
-      r++;
-    }
-    else {
-//      if (config->verbose1 && config->mpiConfig.rank == 0) 
-//        std::cout<< "p < run->SCI["<< j << "][" << i<< "]    (" << run->SCI[j][i] << ")  " << std::endl;
-    }
-  }
-//  if (config->verbose1 && config->mpiConfig.rank == 0) 
-//   std::cout<< "r to be returned : "<< r << std::endl;
-  return r;
+  // The state picked is the number of importance weights lower than p
+  return (int)(std::lower_bound(run->SCI[i].begin(),run->SCI[i].begin()+n,p)-run->SCI[i].begin());
 }
 
 void updateSCI(Run* run, int n)
@@ -812,12 +1224,86 @@ void updateSCI(Run* run, int n)
 // -> That would work until the -4500 < exponent < 4500
 // But after few iterations it is always true. But at the beginning this could cause a bug
 {
-  std::vector<long double> line(run->chains.size()-1);
   for (unsigned int j=0;j<run->chains.size()-1;j++) 
-    line[j]=run->SCI[n][j]+(long double)expl(run->chains[j+1]->states[n+1].E*(1-run->chains[j+1]->T/run->chains[j]->T));
+    run->SCI[j].push_back(run->SCI[j].back()+(long double)expl(run->chains[j+1]->states.back().E*(1-run->chains[j+1]->T/run->chains[j]->T)));
   //  line[j]=run->SCI[n][j]+exp(run->chains[j+1]->states[n+1].E*(1.-run->chains[j+1]->T/run->chains[j]->T));
   //SCI[n][j]=SCI[n-1][j]+exp(E[n][j+1]T[j+1]*(1/T[j+1]-1/T[j]));
-  run->SCI.push_back(line);
+}
+
+void removeFromHistory(Run* run, int i, int k, Configuration* config)
+// Remove the k th state kept by the chain i (it must not be its actual state). It has been proposed to the list of the best models when it
+// was added (see updateBestModels)
+{
+  Chain* chain=run->chains[i];
+  chain->states.erase(chain->states.begin()+k);
+  chain->iterations.erase(chain->iterations.begin()+k);
+  for(int iz=0;iz<config->data.nzFilt-1;iz++) {
+    chain->profilesP[iz].erase(chain->profilesP[iz].begin()+k);
+    if(config->swaves)
+      chain->profilesS[iz].erase(chain->profilesS[iz].begin()+k);
+  }
+  if (i > 0) { // The importance weights of the states of the chain i are in the column i-1 of SCI : it is summed again from k
+    std::vector<long double>* column=&run->SCI[i-1];
+    column->resize(chain->states.size()-1); // (The weight of the actual state is added by updateSCI)
+    for(int l=k;l<(int)column->size();l++)
+      (*column)[l]=(l > 0 ? (*column)[l-1] : 0.0)+(long double)expl(chain->states[l].E*(1-chain->T/run->chains[i-1]->T));
+  }
+}
+
+void pruneHistory(Run* run, Configuration* config, int n)
+// Apply the history policy (HISTORY_POLICY) at the end of the iteration n. The previous state of each chain has just become the last
+// state of its history :
+//   0 : it is kept (all the states are kept)
+//   1 : it is kept if its iteration is a multiple of HISTORY_THINNING
+//   2 : reservoir sampling. The history is a uniform sample of HISTORY_SIZE of the states of the chain : the state replaces a random
+//       state of the history with probability HISTORY_SIZE/(its iteration+1)
+// The states kept stay in the order of the iterations and the importance weights of the states kept are unchanged, the IR-swaps pick
+// the states among them. Must be called after the moves of all the chains and before updateSCI
+{
+  for(int i=0;i<config->nbt;i++) { // Loop on the chains
+    Chain* chain=run->chains[i];
+    chain->iterations.push_back(n+1); // Iteration of the state just added
+    if (config->historyPolicy == 0)
+      continue;
+    int last=(int)chain->states.size()-2; // Position of the previous state
+    int iteration=chain->iterations[last];
+    if (config->historyPolicy == 1) {
+      if (iteration%config->historyThinning != 0)
+        removeFromHistory(run,i,last,config);
+    }
+    else if (iteration >= config->historySize) { // The reservoir is full
+      SelectStream(HISTORY_STREAM); // (The draws of the chains are not modified)
+      int k=(int)(Random()*(iteration+1)); // Random position between 0 and iteration
+      SelectStream(0);
+      removeFromHistory(run,i,k < config->historySize ? k : last,config); // The k th state is replaced (or the new one is not kept)
+    }
+  }
+  if (config->historyPolicy != 0 && run->swapHist.size() > 1) // Only the last swap is used (see writeSwap)
+    run->swapHist.erase(run->swapHist.begin(),run->swapHist.end()-1);
+}
+
+double historyMemory(const Run* run, const Configuration* config)
+// Give an estimation of the memory (in bytes) used by the history of the run : states, profiles, quantiles and importance weights
+{
+  double memory=0.0;
+  for(int i=0;i<config->nbt;i++) { // Loop on the chains
+    const Chain* chain=run->chains[i];
+    memory+=chain->states.capacity()*sizeof(State)+chain->iterations.capacity()*sizeof(int);
+    for(int k=0;k<(int)chain->states.size();k++)
+      memory+=chain->states[k].params.capacity()*sizeof(double);
+    for(int iz=0;iz<config->data.nzFilt-1;iz++) {
+      memory+=(chain->profilesP[iz].capacity()+chain->sortedProfilesP[iz].capacity())*sizeof(double);
+      memory+=chain->sketchP[iz].buckets.size()*(sizeof(std::pair<int,long>)+32); // (32 : size of a node of the map)
+      if(config->swaves) {
+        memory+=(chain->profilesS[iz].capacity()+chain->sortedProfilesS[iz].capacity())*sizeof(double);
+        memory+=chain->sketchS[iz].buckets.size()*(sizeof(std::pair<int,long>)+32);
+      }
+    }
+  }
+  for(int i=0;i<(int)run->SCI.size();i++)
+    memory+=run->SCI[i].capacity()*sizeof(long double);
+  memory+=run->swapHist.capacity()*sizeof(SwapFeatures);
+  return memory;
 }
 
 void updateMinMaxProfiles(Chain* chain, Configuration* config)
@@ -918,6 +1404,119 @@ void updateMinMaxProfiles(Chain* chain, Configuration* config)
 
 //}
 
+void addToSketch(QuantileSketch* sketch, double value, double accuracy)
+// Add a (strictly positive) value to the sketch : the bucket k=ceil(log(value)/log(gamma)) with gamma=(1+accuracy)/(1-accuracy) is incremented
+{
+  double gamma = (1.0+accuracy)/(1.0-accuracy);
+  sketch->buckets[(int)ceil(log(value)/log(gamma))]++;
+  sketch->count++;
+}
+
+double sketchValue(const QuantileSketch* sketch, long rank, double accuracy)
+// Return an estimation of the value of rank "rank" (0 : lowest value) among the values added to the sketch. The value returned for the
+// bucket k, 2*gamma^k/(gamma+1), is at less than accuracy (relative error) from all the values of ]gamma^(k-1),gamma^k]
+{
+  double gamma = (1.0+accuracy)/(1.0-accuracy);
+  long n = 0;
+  if (rank < sketch->count/2) { // The values are counted from the lowest...
+    for (std::map<int,long>::const_iterator it=sketch->buckets.begin(); it!=sketch->buckets.end(); it++) {
+      n += it->second;
+      if (n > rank)
+        return 2.0*pow(gamma,it->first)/(gamma+1.0);
+    }
+  }
+  else { // ... or from the highest
+    for (std::map<int,long>::const_reverse_iterator it=sketch->buckets.rbegin(); it!=sketch->buckets.rend(); it++) {
+      n += it->second;
+      if (n >= sketch->count-rank)
+        return 2.0*pow(gamma,it->first)/(gamma+1.0);
+    }
+  }
+  return 0.0;
+}
+
+void updateQuantiles(const std::vector<double>* profile, int nValues, std::vector<double>* sortedProfile, QuantileSketch* sketch, double* qInf, double* qSup, const Configuration* config)
+// Compute the quantiles qInf and qSup of the history of the velocity at a given depth (profile) with the estimator chosen (QUANTILE_ESTIMATOR) :
+// 0 : the whole history is copied and sorted, 1 : the values added since the last call are inserted in sortedProfile (exact, no sort),
+// 2 : the values added since the last call are added to the sketch (bounded memory, relative error lower than QUANTILE_ACCURACY)
+// nValues is the number of values generated. profile only contains the values kept (see HISTORY_POLICY) but the last ones, added since
+// the last call, are always there. With HISTORY_POLICY > 0 the estimator 0 gives the quantiles of the values kept
+{
+  int nPoints=config->quantileEstimator == 0 ? (int)profile->size() : nValues; // Number of profiles generated
+  int nOut=nPoints*(1.0-config->qp); // Number of points out of the quantile
+  int idxInf=floor(nOut/2.0); // index of the lowest velocity on the quantile
+  int idxSup=nPoints-ceil(nOut/2.0); // index of the highest velocity on the quantile
+  if (idxSup > nPoints-1) // (nOut == 0 : the quantile contains all the points)
+    idxSup=nPoints-1;
+  if (config->quantileEstimator == 0) {
+    std::vector<double> sorted(*profile);
+    std::sort (sorted.begin(), sorted.end());  // We sort the values
+    *qInf=sorted[idxInf];
+    *qSup=sorted[idxSup];
+  }
+  else if (config->quantileEstimator == 1) {
+    for (int k=(int)profile->size()-(nValues-(int)sortedProfile->size());k<(int)profile->size();k++) // Binary search of the position of each new value
+      sortedProfile->insert(std::upper_bound(sortedProfile->begin(),sortedProfile->end(),(*profile)[k]),(*profile)[k]);
+    *qInf=(*sortedProfile)[idxInf];
+    *qSup=(*sortedProfile)[idxSup];
+  }
+  else {
+    for (long k=(long)profile->size()-(nValues-sketch->count);k<(long)profile->size();k++)
+      addToSketch(sketch,(*profile)[k],config->quantileAccuracy);
+    *qInf=sketchValue(sketch,idxInf,config->quantileAccuracy);
+    *qSup=sketchValue(sketch,idxSup,config->quantileAccuracy);
+  }
+}
+
+long double addWeight(Chain* chain, double exponent, const Configuration* config)
+// Add the weight exp(exponent) to the log-sum-exp accumulators of the chain. Return it divided by exp(chain->logScale). The scale is the
+// highest exponent met by the chain : the weights divided by it are lower than 1 and their sums can not overflow (the weights lower than
+// exp(logScale-11000) underflow to 0, they would not change the sums anyway)
+{
+  if (chain->scaledSumOfWeights == 0.0) // First weight : the sums are empty
+    chain->logScale=exponent;
+  else if (exponent > chain->logScale) { // The sums are rescaled to be divided by exp(exponent)
+    long double factor=expl(chain->logScale-exponent);
+    chain->scaledSumOfWeights*=factor;
+    for (int iz=0;iz<config->data.nzFilt-1;iz++) {
+      chain->scaledDotProductP[iz]*=factor;
+      chain->scaledDotProductVarP[iz]*=factor;
+      if (config->swaves) {
+        chain->scaledDotProductS[iz]*=factor;
+        chain->scaledDotProductVarS[iz]*=factor;
+        chain->scaledDotProductVarVpVs[iz]*=factor;
+      }
+    }
+    chain->logScale=exponent;
+  }
+  long double scaledWeight=expl(exponent-chain->logScale);
+  chain->scaledSumOfWeights+=scaledWeight;
+  return scaledWeight;
+}
+
+double accumulateWeighted(Run* run, Chain* chain, long double* scaledDotProduct, mpfr_t dotProduct, long double scaledWeight, mpfr_srcptr weight, double value, mpfr_t temp, const Configuration* config)
+// Add weight*value to the dot products given : the log-sum-exp one (scaledDotProduct, scaledWeight) and/or the MPFR one (dotProduct,
+// weight) depending on WEIGHTS_ACCUMULATOR. Return their ratio to the sum of the weights of the chain. With WEIGHTS_ACCUMULATOR = 2 the
+// log-sum-exp ratio is returned and its relative difference with the MPFR ratio updates run->accumulatorsDifference
+{
+  double ratio=0.0;
+  if (config->weightsAccumulator != 1) {
+    *scaledDotProduct+=scaledWeight*value;
+    ratio=(double)(*scaledDotProduct/chain->scaledSumOfWeights);
+  }
+  if (config->weightsAccumulator != 0) {
+    mpfr_mul_d(temp,weight,value,RND); // Perform temp = weight*value
+    mpfr_add(dotProduct,dotProduct,temp,RND); // Perform dotProduct = dotProduct + temp
+    mpfr_div(temp,dotProduct,chain->sumOfweights,RND); // Perform temp = dotProduct/sumOfweights
+    double reference=mpfr_get_d(temp,RND); // At this point temp shoud be big enough to be converted back to a double
+    if (config->weightsAccumulator == 1)
+      ratio=reference;
+    else if (ratio != reference)
+      run->accumulatorsDifference=std::max(run->accumulatorsDifference,fabs(ratio-reference)/std::max(fabs(ratio),fabs(reference)));
+  }
+  return ratio;
+}
+
 void updateAverageProfiles(Run* run,Configuration* config, int i)
 // Update the average, variance and quantiles profiles
 {
@@ -945,11 +1544,18 @@ def averager(newValue, weight):
 
 return averager
 
+The weight of the last state of a chain is exp(-E*T*(1-1/T)), for example exp(-15635.15) : far out of the range of the doubles. By
+default (WEIGHTS_ACCUMULATOR = 0) the sums are kept divided by exp(logScale) in long double, logScale being the highest exponent met
+by the chain (see addWeight). With WEIGHTS_ACCUMULATOR = 1 they are computed with MPFR numbers of PREC bits, with 2 both are computed
+and compared (see accumulateWeighted)
 */
-  double exponent = 0.0;
-  bool debug = false;
+  bool logSumExp = (config->weightsAccumulator != 1); // The log-sum-exp accumulators are used
+  bool useMpfr = (config->weightsAccumulator != 0);   // The MPFR accumulators are used
+  std::vector<double> exponents(config->nbt,0.0);     // Logarithms of the weights of the last states of the chains
+  std::vector<long double> scaledWeights(config->nbt,0.0); // The weights divided by exp(logScale) of their chain
   mpfr_t weight,temp,tempVpVs; // Declare three numbers coded with 256 bytes
-  mpfr_inits2 (PREC,weight,temp,tempVpVs,(mpfr_ptr) 0); // and initialize them with precision 256
+  if (useMpfr)
+    mpfr_inits2 (PREC,weight,temp,tempVpVs,(mpfr_ptr) 0); // and initialize them with precision 256
   // Initialize these vectors back to 0
   std::fill(run->averageP.begin(), run->averageP.end(), 0.0);
   std::fill(run->varP.begin(), run->varP.end(), 0.0);
@@ -959,219 +1565,77 @@ return averager
     std::fill(run->varVpVs.begin(), run->varVpVs.end(), 0.0);
   }
   for (int iChain=config->nbt-1;iChain>=0;iChain--) { // Loop on the chains
-    //std::cout << "Chain : " << iChain << " T:" << run->chains[iChain]->T << std::endl;
-    int nPoints,nOut,idxInf,idxSup;
+    Chain* chain=run->chains[iChain];
     std::vector<double> averageOldP, averageOldS;
-    std::vector<double> sortedProfilesP, sortedProfilesS;
-    exponent = -run->chains[iChain]->states.back().E*run->chains[iChain]->T*(1.0 - 1.0/run->chains[iChain]->T); // For example -15635.15
-    if (debug)
-      std::cout << "exponent: " << exponent << std::endl;
-      
-    std::string strExponent = to_string(exponent);
-    if (debug)
-      std::cout << "strexponent: " << strExponent << std::endl;
-
-    // Cstring:
-    char stringExponent[50];
-    std::strcpy( stringExponent, strExponent.c_str() );
-     
-    //const char* stringExponent = convertDoubleToChar(exponent); // For example "-15635.15"
-    if (debug) {
-      std::cout << "hum: " << strlen(stringExponent) << std::endl;
-      for( int k = 0 ; k <  (int)strlen(stringExponent) ; k ++ ){
-       	std::cout << stringExponent[k]; 
-	    }
-      std::cout << std::endl;
-    }
-    mpfr_set_str(temp,stringExponent,10,RND); // Variable where we store, value as a char*, decimal base, rounding option
-    mpfr_set_str(tempVpVs,stringExponent,10,RND); // Variable where we store, value as a char*, decimal base, rounding option
-    if (iChain == 0)
-      mpfr_init_set_d(weight,1.0,RND); // Set weight to 1
-    else
-      mpfr_exp(weight,temp,RND); // exp(-15635.15) : weight = exp(-run->chains[iChain]->states.back().E*run->chains[iChain]->T*(1.0 - 1.0/run->chains[iChain]->T));
-    mpfr_add(run->chains[iChain]->sumOfweights, run->chains[iChain]->sumOfweights, weight, RND); // run->chains[iChain]->sumOfweights = run->chains[iChain]->sumOfweights + weight;
-    if (debug) {
-      std::cout << "   Last state energy: " << run->chains[iChain]->states.back().E << std::endl;
-      std::cout << "   Temp: " << std::endl;
-      mpfr_out_str(stdout,10,PREC,temp,RND);
-      std::cout << std::endl;
-      std::cout << "   Weight: " << std::endl;
-      mpfr_out_str(stdout,10,PREC,weight,RND);
-      std::cout << std::endl;
-      std::cout << "   Sum of weights: " << std::endl;
-      mpfr_out_str(stdout,10,PREC,run->chains[iChain]->sumOfweights,RND);
-      std::cout << std::endl;
+    if (iChain > 0) // The weight of chain 0 (T = 1) is 1
+      exponents[iChain] = -chain->states.back().E*chain->T*(1.0 - 1.0/chain->T); // For example -15635.15
+    if (logSumExp)
+      scaledWeights[iChain]=addWeight(chain,exponents[iChain],config);
+    if (useMpfr) {
+      mpfr_set_d(temp,exponents[iChain],RND);
+      mpfr_exp(weight,temp,RND); // weight = exp(-run->chains[iChain]->states.back().E*run->chains[iChain]->T*(1.0 - 1.0/run->chains[iChain]->T));
+      mpfr_add(chain->sumOfweights, chain->sumOfweights, weight, RND); // run->chains[iChain]->sumOfweights = run->chains[iChain]->sumOfweights + weight;
     }
     for (int iz=0;iz<config->data.nzFilt-1;iz++) {
-      averageOldP.push_back(run->chains[iChain]->averageP[iz]);
+      averageOldP.push_back(chain->averageP[iz]);
       if(config->swaves)
-        averageOldS.push_back(run->chains[iChain]->averageS[iz]);
+        averageOldS.push_back(chain->averageS[iz]);
     }
-    //run->chains[iChain]->profilesP[iz].back() -> Current P waves velocity at depth z
+    //chain->profilesP[iz].back() -> Current P waves velocity at depth z
     for (int iz=0;iz<config->data.nzFilt-1;iz++) {
-      run->chains[iChain]->averageP[iz]=run->chains[iChain]->averageP[iz]+(run->chains[iChain]->profilesP[iz].back()-run->chains[iChain]->averageP[iz])/((double)i+1.0);
-	  if (iz == 5 and debug) {
-        std::cout << "  run->chains[iChain]->averageP[iz] " << run->chains[iChain]->averageP[iz] << std::endl;
-        std::cout << "  run->chains[iChain]->profilesP[iz].back() " << run->chains[iChain]->profilesP[iz].back() << std::endl;
-        std::cout << "  before run->chains[iChain]->varP[iz]: " << run->chains[iChain]->varP[iz] << std::endl;
-        std::cout << "  run->chains[iChain]->profilesP[iz].back()-averageOldP[iz]: " << run->chains[iChain]->profilesP[iz].back()-averageOldP[iz] << std::endl;
-        std::cout << "  run->chains[iChain]->profilesP[iz].back()-run->chains[iChain]->averageP[iz]: " << run->chains[iChain]->profilesP[iz].back()-run->chains[iChain]->averageP[iz] << std::endl;
-      }
-      run->chains[iChain]->varP[iz]=run->chains[iChain]->varP[iz]+(run->chains[iChain]->profilesP[iz].back()-averageOldP[iz])*(run->chains[iChain]->profilesP[iz].back()-run->chains[iChain]->averageP[iz]);
-	    if (iz == 5 and debug) {
-        std::cout << "  after run->chains[iChain]->varP[iz]: " << run->chains[iChain]->varP[iz] << std::endl;
-      }
-      nPoints=(int)run->chains[iChain]->profilesP[iz].size(); // Number of profiles generated
-      nOut=nPoints*(1.0-config->qp); // Number of points out of the quantile
-      idxInf=floor(nOut/2.0); // index of the lowest velocity on the quantile
-      idxSup=nPoints-ceil(nOut/2.0); // index of the highest velocity on the quantile
-      sortedProfilesP=run->chains[iChain]->profilesP[iz];
-      std::sort (sortedProfilesP.begin(), sortedProfilesP.end());  // We sort the values (after having used the last value!)
-      run->chains[iChain]->qInfP[iz]=sortedProfilesP[idxInf];
-      run->chains[iChain]->qSupP[iz]=sortedProfilesP[idxSup];
-      if (iz == 5 and debug) {
-         std::cout << "   Velocity value: " << run->chains[iChain]->profilesP[iz].back() << std::endl;
-         std::cout << "   Dot product: " << std::endl;
-         mpfr_out_str(stdout,10,PREC,run->chains[iChain]->dotProductP[iz],RND);
-         std::cout << std::endl;
-      }
-      mpfr_mul_d(temp,weight,run->chains[iChain]->profilesP[iz].back(),RND); // Perform temp = run->chains[iChain]->profilesP[iz].back()*weight;
-      mpfr_add(run->chains[iChain]->dotProductP[iz],run->chains[iChain]->dotProductP[iz],temp,RND); // Perform run->chains[iChain]->dotProductP[iz]=run->chains[iChain]->dotProductP[iz] + temp
-      if (iz == 5  and debug) {
-         std::cout << "   Dot product: " << std::endl;
-         mpfr_out_str(stdout,10,PREC,run->chains[iChain]->dotProductP[iz],RND);
-         std::cout << std::endl;
-        std::cout << "   Weighted average: " << run->chains[iChain]->weightedAverageP[iz] << std::endl;
-	  }
-	  mpfr_div(temp,run->chains[iChain]->dotProductP[iz],run->chains[iChain]->sumOfweights,RND); // Perform temp = run->chains[iChain]->dotProductP[iz]/run->chains[iChain]->sumOfweights
-	  // At this point temp shoud be big enough to be converted back to a double
-	  run->chains[iChain]->weightedAverageP[iz]=mpfr_get_d(temp,RND); // run->chains[iChain]->weightedAverageP[iz]=run->chains[iChain]->dotProductP[iz]/run->chains[iChain]->sumOfweights;
-      if (iz == 5  and debug)
-        std::cout << "   Weighted average: " << run->chains[iChain]->weightedAverageP[iz] << std::endl;
+      chain->averageP[iz]=chain->averageP[iz]+(chain->profilesP[iz].back()-chain->averageP[iz])/((double)i+1.0);
+      chain->varP[iz]=chain->varP[iz]+(chain->profilesP[iz].back()-averageOldP[iz])*(chain->profilesP[iz].back()-chain->averageP[iz]);
+      updateQuantiles(&chain->profilesP[iz],chain->iterations.back()+1,&chain->sortedProfilesP[iz],&chain->sketchP[iz],&chain->qInfP[iz],&chain->qSupP[iz],config);
+      chain->weightedAverageP[iz]=accumulateWeighted(run,chain,&chain->scaledDotProductP[iz],chain->dotProductP[iz],scaledWeights[iChain],weight,chain->profilesP[iz].back(),temp,config);
       if(config->swaves) {
-        run->chains[iChain]->averageS[iz]=run->chains[iChain]->averageS[iz]+(run->chains[iChain]->profilesS[iz].back()-run->chains[iChain]->averageS[iz])/((double)i+1.0);
-        run->chains[iChain]->varS[iz]=run->chains[iChain]->varS[iz]+(run->chains[iChain]->profilesS[iz].back()-averageOldS[iz])*(run->chains[iChain]->profilesS[iz].back()-run->chains[iChain]->averageS[iz]);
-        sortedProfilesS=run->chains[iChain]->profilesS[iz];
-        std::sort (sortedProfilesS.begin(), sortedProfilesS.end());  // We sort the values
-        run->chains[iChain]->qInfS[iz]=sortedProfilesS[idxInf];
-        run->chains[iChain]->qSupS[iz]=sortedProfilesS[idxSup];
-        mpfr_mul_d(temp,weight,run->chains[iChain]->profilesS[iz].back(),RND); // Perform temp = run->chains[iChain]->profilesS[iz].back()*weight;
-        mpfr_add(run->chains[iChain]->dotProductS[iz],run->chains[iChain]->dotProductS[iz],temp,RND); // Perform run->chains[iChain]->dotProductS[iz]=run->chains[iChain]->dotSroductP[iz] + temp
-        mpfr_div(temp,run->chains[iChain]->dotProductS[iz],run->chains[iChain]->sumOfweights,RND); // Perform temp = run->chains[iChain]->dotProductS[iz]/run->chains[iChain]->sumOfweights
-	    // At this point temp shoud be big enough to be converted back to a double
-	    run->chains[iChain]->weightedAverageS[iz]=mpfr_get_d(temp,RND); // run->chains[iChain]->weightedAverageS[iz]=run->chains[iChain]->dotProductS[iz]/run->chains[iChain]->sumOfweights;
+        chain->averageS[iz]=chain->averageS[iz]+(chain->profilesS[iz].back()-chain->averageS[iz])/((double)i+1.0);
+        chain->varS[iz]=chain->varS[iz]+(chain->profilesS[iz].back()-averageOldS[iz])*(chain->profilesS[iz].back()-chain->averageS[iz]);
+        updateQuantiles(&chain->profilesS[iz],chain->iterations.back()+1,&chain->sortedProfilesS[iz],&chain->sketchS[iz],&chain->qInfS[iz],&chain->qSupS[iz],config);
+        chain->weightedAverageS[iz]=accumulateWeighted(run,chain,&chain->scaledDotProductS[iz],chain->dotProductS[iz],scaledWeights[iChain],weight,chain->profilesS[iz].back(),temp,config);
       }
     }
-    // run->chains[iChain]->varP[iz]=run->chains[iChain]->varP[iz]/((int)run->chains[iChain]->ProfileP[iz].size()-1); -> Done when we write on files
-    // run->chains[iChain]->varS[iz]=run->chains[iChain]->varP[iz]/((int)run->chains[iChain]->ProfileS[iz].size()-1); -> Done when we write on files
+    // chain->varP[iz]=chain->varP[iz]/((int)chain->ProfileP[iz].size()-1); -> Done when we write on files
+    // chain->varS[iz]=chain->varP[iz]/((int)chain->ProfileS[iz].size()-1); -> Done when we write on files
    
     // std::plus adds together its two arguments: "run->averageP = run->averageP + run->chains[iChain]->weightedAverageP" :
-    if (debug) {
-      std::cout << "   run->averageP before: " << run->averageP[5] << std::endl;
-      std::cout << "   run->chains[iChain]->weightedAverageP: " << run->chains[iChain]->weightedAverageP[5] << std::endl;
-    }
-    std::transform (run->averageP.begin(), run->averageP.end(), run->chains[iChain]->weightedAverageP.begin(), run->averageP.begin(), std::plus<double>());
-    if (debug)
-      std::cout << "   run->averageP after: " << run->averageP[5] << std::endl;
+    std::transform (run->averageP.begin(), run->averageP.end(), chain->weightedAverageP.begin(), run->averageP.begin(), std::plus<double>());
     if(config->swaves)
-      std::transform (run->averageS.begin(), run->averageS.end(), run->chains[iChain]->weightedAverageS.begin(), run->averageS.begin(), std::plus<double>());
+      std::transform (run->averageS.begin(), run->averageS.end(), chain->weightedAverageS.begin(), run->averageS.begin(), std::plus<double>());
   }
   // We want to do: "run->averageP = run->averageP / config->nbt" :
-  if (debug)
-    std::cout << std::endl << "AVERAGE P " << run->averageP[5] << std::endl;
   std::transform(run->averageP.begin(), run->averageP.end(), run->averageP.begin(),std::bind1st(std::multiplies<double>(),1.0/config->nbt));
-  if (debug)
-    std::cout << "AVERAGE P " << run->averageP[5] << std::endl << std::endl;
   if(config->swaves)
     std::transform(run->averageS.begin(), run->averageS.end(), run->averageS.begin(),std::bind1st(std::multiplies<double>(),1.0/config->nbt));
   // COMPUTE VARIANCE : //
   for (int iChain=config->nbt-1;iChain>=0;iChain--) { // Loop on the chains
-    exponent = -run->chains[iChain]->states.back().E*run->chains[iChain]->T*(1.0 - 1.0/run->chains[iChain]->T); // For example -15635.15
-    if (debug)
-      std::cout << "exponent: " << exponent << std::endl;
-      
-    std::string strExponent = to_string(exponent);
-    if (debug)
-      std::cout << "strexponent: " << strExponent << std::endl;
-
-    // Cstring:
-    char stringExponent[50];
-    std::strcpy( stringExponent, strExponent.c_str() );
-    // char* stringExponent = convertDoubleToChar(exponent); // For example "-15635.15"
-    if (debug) {
-      std::cout << "hum: " << strlen(stringExponent) << std::endl;
-      for( int k = 0 ; k < (int)strlen(stringExponent) ; k ++ ){
-       	std::cout << stringExponent[k]; 
-	    }
-      std::cout << std::endl;
+    Chain* chain=run->chains[iChain];
+    if (useMpfr) {
+      mpfr_set_d(temp,exponents[iChain],RND);
+      mpfr_exp(weight,temp,RND);
     }
-    mpfr_set_str(temp,stringExponent,10,RND); // Variable where we store, value as a char*, decimal base, rounding option
-    if (iChain == 0)
-      mpfr_init_set_d(weight,1.0,RND); // Set weight to 1
-    else
-      mpfr_exp(weight,temp,RND); // exp(-15635.15) : weight = exp(-run->chains[iChain]->states.back().E*run->chains[iChain]->T*(1.0 - 1.0/run->chains[iChain]->T));
-    // weight = expl(-run->chains[iChain]->states.back().E*run->chains[iChain]->T*(1.0 - 1.0/run->chains[iChain]->T)); -> That would work until the -4500 < exponent < 4500
-    if (debug) {
-      std::cout << "Chain : " << iChain << " T:" << run->chains[iChain]->T << std::endl;
-      std::cout << "   Last state energy: " << run->chains[iChain]->states.back().E << std::endl;
-      std::cout << "   Temp: " << std::endl;
-      mpfr_out_str(stdout,10,PREC,temp,RND);
-      std::cout << std::endl;
-      std::cout << "   Weight: " << std::endl;
-      mpfr_out_str(stdout,10,PREC,weight,RND);
-      std::cout << std::endl;
-      std::cout << std::endl;
-      std::cout << "   Sum of weights: " << std::endl;
-      mpfr_out_str(stdout,10,PREC,run->chains[iChain]->sumOfweights,RND);
-      std::cout << std::endl;
-    }
-    // run->chains[iChain]->profilesP[iz].back() -> Current P waves velocity at depth z
+    // chain->profilesP[iz].back() -> Current P waves velocity at depth z
     for (int iz=0;iz<config->data.nzFilt-1;iz++) {
-      mpfr_mul_d(temp,weight,pow(run->chains[iChain]->profilesP[iz].back()-run->averageP[iz],2.0),RND); // Perform temp = weight*pow(run->chains[iChain]->profilesP[iz].back()-run->averageP[iz],2.0)
-      mpfr_add(run->chains[iChain]->dotProductVarP[iz],run->chains[iChain]->dotProductVarP[iz],temp,RND); // Perform run->chains[iChain]->dotProductVarP[iz]=run->chains[iChain]->dotProductVarP[iz] + temp
-      mpfr_div(temp,run->chains[iChain]->dotProductVarP[iz],run->chains[iChain]->sumOfweights,RND); // Perform temp = run->chains[iChain]->dotProductVarP[iz]/run->chains[iChain]->sumOfweights
-	  // At this point temp shoud be big enough to be converted back to a double
-      run->chains[iChain]->weightedVarP[iz]=mpfr_get_d(temp,RND); // run->chains[iChain]->weightedAverageP[iz]=run->chains[iChain]->dotProductP[iz]/run->chains[iChain]->sumOfweights;
+      chain->weightedVarP[iz]=accumulateWeighted(run,chain,&chain->scaledDotProductVarP[iz],chain->dotProductVarP[iz],scaledWeights[iChain],weight,pow(chain->profilesP[iz].back()-run->averageP[iz],2.0),temp,config);
       if(config->swaves) {
-        mpfr_mul_d(temp,weight,pow(run->chains[iChain]->profilesS[iz].back()-run->averageS[iz],2.0),RND); // Perform temp = weight*pow(run->chains[iChain]->profilesP[iz].back()-run->averageP[iz],2.0)
-        mpfr_mul_d(tempVpVs,weight,pow(run->chains[iChain]->profilesP[iz].back()/run->chains[iChain]->profilesS[iz].back()-run->averageP[iz]/run->averageS[iz],2.0),RND);
-        mpfr_add(run->chains[iChain]->dotProductVarS[iz],run->chains[iChain]->dotProductVarS[iz],temp,RND); // Perform run->chains[iChain]->dotProductVarP[iz]=run->chains[iChain]->dotProductVarP[iz] + temp
-        mpfr_add(run->chains[iChain]->dotProductVarVpVs[iz],run->chains[iChain]->dotProductVarVpVs[iz],tempVpVs,RND);
-        mpfr_div(temp,run->chains[iChain]->dotProductVarS[iz],run->chains[iChain]->sumOfweights,RND); // Perform temp = run->chains[iChain]->dotProductVarP[iz]/run->chains[iChain]->sumOfweights
-        mpfr_div(tempVpVs,run->chains[iChain]->dotProductVarVpVs[iz],run->chains[iChain]->sumOfweights,RND);
-	      // At this point temp shoud be big enough to be converted back to a double
-        run->chains[iChain]->weightedVarS[iz]=mpfr_get_d(temp,RND); // run->chains[iChain]->weightedAverageP[iz]=run->chains[iChain]->dotProductP[iz]/run->chains[iChain]->sumOfweights;
-        run->chains[iChain]->weightedVarVpVs[iz]=mpfr_get_d(tempVpVs,RND);
+        chain->weightedVarS[iz]=accumulateWeighted(run,chain,&chain->scaledDotProductVarS[iz],chain->dotProductVarS[iz],scaledWeights[iChain],weight,pow(chain->profilesS[iz].back()-run->averageS[iz],2.0),temp,config);
+        chain->weightedVarVpVs[iz]=accumulateWeighted(run,chain,&chain->scaledDotProductVarVpVs[iz],chain->dotProductVarVpVs[iz],scaledWeights[iChain],weight,pow(chain->profilesP[iz].back()/chain->profilesS[iz].back()-run->averageP[iz]/run->averageS[iz],2.0),tempVpVs,config);
       }
     }
     // std::plus adds together its two arguments: "run->varP = run->varP + run->chains[iChain]->weightedVarP;" :
-    if (debug)
-      std::cout << "   var " << run->varP[5] << std::endl;
-    std::transform (run->varP.begin(), run->varP.end(), run->chains[iChain]->weightedVarP.begin(), run->varP.begin(), std::plus<double>());
-    if (debug) {
-      std::cout << "   var " << run->varP[5] << std::endl;
-      std::cout << "   sqrt(var) " << sqrt(run->varP[5]) << std::endl;
-    }
+    std::transform (run->varP.begin(), run->varP.end(), chain->weightedVarP.begin(), run->varP.begin(), std::plus<double>());
     if(config->swaves) {
-      std::transform (run->varS.begin(), run->varS.end(), run->chains[iChain]->weightedVarS.begin(), run->varS.begin(), std::plus<double>());
-      std::transform (run->varVpVs.begin(), run->varVpVs.end(), run->chains[iChain]->weightedVarVpVs.begin(), run->varVpVs.begin(), std::plus<double>());
+      std::transform (run->varS.begin(), run->varS.end(), chain->weightedVarS.begin(), run->varS.begin(), std::plus<double>());
+      std::transform (run->varVpVs.begin(), run->varVpVs.end(), chain->weightedVarVpVs.begin(), run->varVpVs.begin(), std::plus<double>());
     }
   }
   // We want to do: "run->varP = run->varP / config->nbt" :
-  if (debug)
-    std::cout << std::endl << "VAR " << run->varP[5] << std::endl;
   std::transform(run->varP.begin(), run->varP.end(), run->varP.begin(),std::bind1st(std::multiplies<double>(),1.0/config->nbt));
-  if (debug) {
-    std::cout << "VAR " << run->varP[5] << std::endl << std::endl;
-    std::cout << "sqrt(VAR) " << sqrt(run->varP[5]) << std::endl << std::endl;
-  }
   if(config->swaves) {
     std::transform(run->varS.begin(), run->varS.end(), run->varS.begin(),std::bind1st(std::multiplies<double>(),1.0/config->nbt));
     std::transform(run->varVpVs.begin(), run->varVpVs.end(), run->varVpVs.begin(),std::bind1st(std::multiplies<double>(),1.0/config->nbt));
   }
-
-  mpfr_clear(weight);
-  mpfr_clear(temp);
+  if (useMpfr)
+    mpfr_clears(weight,temp,tempVpVs,(mpfr_ptr) 0);
 }
 
 void isThisConfigOk(VelocityModel* velModel, Configuration* config)
@@ -1237,6 +1701,7 @@ void finalizeRun(Run* run)
     delete[] run->chains[i]->dotProductVarP;
     delete[] run->chains[i]->dotProductS;
     delete[] run->chains[i]->dotProductVarS;
+    freeWorkspace(run->chains[i]->workspace);
     delete(run->chains[i]);          // Free the memory allocated for the chains
   // TODO mpfr_clear("all mpfr variables");
   }
@@ -3,8 +3,21 @@
 
 #include "structures.h"
 
+Stencil makeStencil(Coordinate coord, VelocityModel* velModel, int ishot, int nz, int nx, int ny);
+// Give the corners and the weights used to interpolate at coord a travel times grid (of size (nz,nx,ny)) of the shot ishot
+double applyStencil(tab3d<double>* tt3d, Stencil* stencil);
+// Give the time interpolated with the stencil
 double getTime(tab3d<double>* tt3d,Coordinate coord, VelocityModel* velModel, int ishot);
 // Give the time at coord even if it is not on a point of the grid
+Stencil makeAxisymmetricStencil(Coordinate coord, VelocityModel* velModel, int ishot, Configuration* config);
+// Give the corners and the weights used to interpolate at coord the 2D travel times grid (depth,offset) of the shot ishot (EIKONAL_MODE = 1)
+void gridOfWorkspace(VelocityModel* velModel, Configuration* config);
+// Set the size of the grids used by energy() : (nzFilt,nx,ny) or (nzFilt,nr) if EIKONAL_MODE = 1 (the y axis is then a single cell)
+void computeStationStencils(Configuration* config);
+// Compute once for all the stencils used to interpolate the travel times of each shot at the stations (config->data.stencils) and
+// config->data.tableOfShot : with EIKONAL_MODE = 1 the shots at the same depth have the same travel times table
+void gatherTimes(tab3d<double>* tt3d, std::vector<Stencil>* stencils, double* times);
+// Write in times[0], times[1]... the travel times of tt3d interpolated at the stations (stencils : config->data.stencils[ishot])
 double getDistance(Coordinate coord1,Coordinate coord2);
 // Returns the distance between two points
 void calculateShiftForEachShot(VelocityModel* velModel, Configuration* config);
@@ -31,34 +44,97 @@ If nzFilt > nz => upsample
 vp in intrapolated by a linear approximation */
 void InverseWaveletTransform(std::vector<double>* filteredLog, const std::vector<double>* coeffsToKeep, Configuration* config, int wavelet, bool sWaves);
 // Calculate the P or S waves velocity profile corresponding to the wavelet coefficients "coeffsToKeep" (P waves : sWaves=false)
+void buildSynthesisOperators(Configuration* config);
+// Compute the synthesis operators of the wavelets (WAVELET_SYNTHESIS = 1) : the column j of config->synthesisP[wavelet] (or synthesisS) is the
+// downsampled profile given by the parameter j alone equal to 1
+void addSynthesisColumn(std::vector<double>* profile, const SynthesisOperator* synthesis, int j, double factor);
+// Add factor times the column j of the synthesis operator to the downsampled profile
+void synthesizeProfiles(Workspace* workspace, const State* state, const Configuration* config);
+// Compute the downsampled profiles of the state in workspace->synthesisP (and synthesisS) with the synthesis operators. They are updated with
+// the columns of the parameters modified since the last profiles synthesized when there are few of them
 void InverseLayerTransform(std::vector<double>* filteredProfile, const std::vector<double>* params, Configuration* config, bool sWaves);
 // Calculate the P or S waves velocity profile corresponding to the layers params (P waves : sWaves=false)
 void meshing(std::vector<double>* profile, VelocityModel* velModel, bool swaves);
 // Extend the velocity profile on the whole mesh (coarsen the sampling)
+Workspace* createWorkspace(Configuration* config);
+// Allocate the velocity and travel times grids used by energy() and compute the shift of the grid for each shot
+void freeWorkspace(Workspace* workspace);
+// Free the memory allocated by createWorkspace
+unsigned long profilesKey(std::vector<double>* profiles);
+// Give a hash (FNV-1a) of the values of the profiles
+std::vector<double> modelProfiles(VelocityModel* velModel, Configuration* config);
+// Give the P (and S) profiles of a 1D velocity model (vertical line (:,0,0)). They identify its travel times in the cache
+bool lookupTimes(std::vector<double>* profiles, int firstEikonal, int eikonalStep, ArrivalTimes* arrivalTimes, Configuration* config);
+// Look for the travel times of the model described by profiles in the cache (eikonals firstEikonal, firstEikonal+eikonalStep... see
+// energy()). If they are found they are copied in arrivalTimes, the entry becomes the most recently used and true is returned
+void storeTimes(std::vector<double>* profiles, int firstEikonal, int eikonalStep, ArrivalTimes* arrivalTimes, Configuration* config);
+// Put the travel times of the model described by profiles in the cache. The least recently used entry is removed if the cache is full
+void computeArrivalTimes(Workspace* workspace, Configuration* config, int firstEikonal, int eikonalStep, ArrivalTimes* arrivalTimes);
+// Compute the travel times at the stations of the eikonals firstEikonal, firstEikonal+eikonalStep... (0 to numberOfShots-1 : P waves
+// of each shot, then S waves) in the velocity model of the workspace. The eikonals are spread over config->eikonalThreads threads
+void buildModel(State* state,Chain* chain,Configuration* config);
+// Build the velocity model of a state in the workspace of the chain and save its profiles into chain->profilesP and chain->profilesS
+void residuals(Chain* chain,Configuration* config, double* sumP, double* sumS);
+// Give the sums of the squared residuals of the P and S waves travel times computed by this process in the velocity model of the
+// workspace of the chain (see buildModel). The sums of all the processes give the energy
 double energy(State* state,Chain* chain, Configuration* config);
 // Give the energy of a state in a given chain (we need to give the chain to get the temperature)
-void makeVel(VelocityModel* velModel, State* state, const Configuration* config);
-// Build the velocity model corresponding to the parameters of the state
+void energies(std::vector<State*>* states, std::vector<Chain*>* chains, Configuration* config);
+// Compute the energies of the states (*states)[k] in the chains (*chains)[k] at the same time (on config->parallelChains threads)
+void makeVel(Workspace* workspace, State* state, Configuration* config);
+// Build the velocity model corresponding to the parameters of the state in the workspace
 void eikonal3d(tab3d<double>* tt3d,const VelocityModel* velModel,const Configuration* config, int shotNumber, bool sWaves);
 // Calculate the P or S waves (sWaves==false or sWaves==true) travel times corresponding to the shot number i the velocity model and
 // the geometric configuration stored in config. Call the fortran subroutine : FTeik3d.f90 which needs Include_FTeik3d_2.0.f
+void eikonal2d(tab3d<double>* tt2d, const VelocityModel* velModel,const Configuration* config, int shotNumber, bool sWaves);
+// Calculate the P or S waves travel times of the shot number i on the 2D grid (depth,offset) of size (nzFilt,nr) (EIKONAL_MODE = 1).
+// Call the fortran subroutine : fteik2d.f90 which needs Include_FTeik2d.f
+void eikonal(tab3d<double>* tt, const VelocityModel* velModel,const Configuration* config, int shotNumber, bool sWaves);
+// Calculate the travel times of the shot number i on the grids of the workspace with the solver chosen (EIKONAL_MODE)
 std::vector<int> makeIndex(Chain* chain, Configuration* config);
 // Make the index of the parameters to modify
 // We could have done far better to deal with the static parameters but I was tired...
 void priorIteration(Chain* chain,Configuration* config);
 // Perform an iteration in the prior
+void proposeIndependent(Chain* chain, State* trialState, Configuration* config);
+// Draw the trial state of an independent MH iteration on the chain given (Often the highest temperature chain)
+bool proposeMH(Chain* chain, State* trialState, Configuration* config);
+// Draw the trial state of a classical MH iteration on the chain given. Return false if it is out of the prior domain
+void acceptOrReject(Chain* chain, State* trialState, Configuration* config);
+// Accept or reject the trial state of a MH iteration on the chain given. Its energy has been computed (and its profiles pushed back)
+void stayOutOfDomain(Chain* chain, Configuration* config);
+// The trial state of a MH iteration is out of the prior domain : the chain stays in the same state (the energy is not computed)
 void iterationMHindependent(Chain* chain,Configuration* config);
 // Perform an independent MH iteration on the chain given (Often the highest temperature chain)
 void iterationMH(Chain* chain,Configuration* config);
 // Perform a classical MH iteration on the chain given.
+void parallelIteration(Run* run, Configuration* config);
+// Perform an iteration on all the chains (PARALLEL_CHAINS > 0) : the trial states of all the chains are drawn, their energies are
+// computed at the same time, then the transitions and the IR-swaps are performed from the highest temperature chain to the lowest
 void importanceSamplingSwap(Run* run, int i, Configuration* config);
 // IR swap iteration, i is the index of the chain considered
 int pickastate2(Run* run, int i, Configuration* config);
 // Pick a state of the i th chain of the run according to an IS (importance sampling) draw
 void updateSCI(Run* run, int n);
 // Add a new line to SCI (importance weights (cumulative sum) and normalization coefficients)
+void removeFromHistory(Run* run, int i, int k, Configuration* config);
+// Remove the k th state kept by the chain i (it must not be its actual state). It is proposed to the list of the best models first
+void pruneHistory(Run* run, Configuration* config, int n);
+// Apply the history policy (HISTORY_POLICY) at the end of the iteration n : keep or remove the previous state of each chain
+double historyMemory(const Run* run, const Configuration* config);
+// Give an estimation of the memory (in bytes) used by the history of the run : states, profiles, quantiles and importance weights
 void updateMinMaxProfiles(Chain* chain, Configuration* config);
 // Update in and max velocities investigated
+void addToSketch(QuantileSketch* sketch, double value, double accuracy);
+// Add a (strictly positive) value to the sketch
+double sketchValue(const QuantileSketch* sketch, long rank, double accuracy);
+// Return an estimation of the value of rank "rank" (0 : lowest value) among the values added to the sketch
+void updateQuantiles(const std::vector<double>* profile, int nValues, std::vector<double>* sortedProfile, QuantileSketch* sketch, double* qInf, double* qSup, const Configuration* config);
+// Compute the quantiles of the history of the velocity at a given depth with the estimator chosen (QUANTILE_ESTIMATOR)
+long double addWeight(Chain* chain, double exponent, const Configuration* config);
+// Add the weight exp(exponent) to the log-sum-exp accumulators of the chain. Return it divided by exp(chain->logScale)
+double accumulateWeighted(Run* run, Chain* chain, long double* scaledDotProduct, mpfr_t dotProduct, long double scaledWeight, mpfr_srcptr weight, double value, mpfr_t temp, const Configuration* config);
+// Add weight*value to the dot products given (see WEIGHTS_ACCUMULATOR) and return their ratio to the sum of the weights of the chain
 // void updateAverageProfiles(Chain* chain,Configuration* config, int i); old version
 // Update the average, variance and quantiles profiles
 void updateAverageProfiles(Run* run,Configuration* config, int i);
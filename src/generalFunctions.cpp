@@ -181,3 +181,33 @@ std::string to_string(double x)
   ss << x;
   return ss.str();
 }
+
+long randDraws = 0; // Number of calls to rand() since the seed has been planted (see countedRand)
+
+int countedRand()
+// Same as rand() but the draws are counted : the state of rand() can be restored by replaying them (see replayRand)
+{
+  randDraws++;
+  return rand();
+}
+
+int countedRandIndex(int n)
+// Return a random index between 0 and n-1 drawn with countedRand (for std::random_shuffle : same draws as its default generator)
+{
+  return countedRand() % n;
+}
+
+long numberOfRandDraws()
+// Return the number of calls to countedRand() since the seed has been planted
+{
+  return randDraws;
+}
+
+void replayRand(int seed, long nDraws)
+// Put rand() in the state it had after nDraws calls to countedRand() from the seed (used when a run restarts)
+{
+  srand(seed);
+  for (long k=0;k<nDraws;k++)
+    rand();
+  randDraws = nDraws;
+}
@@ -47,5 +47,13 @@ const char* convertDoubleToChar(double value);
 // From a double (ex:4561.54) return a char* (ex: "4561.54")
 std::string to_string(double x);
 // From a double (ex:4561.54) return a string
+int countedRand();
+// Same as rand() but the draws are counted : the state of rand() can be restored by replaying them (see replayRand)
+int countedRandIndex(int n);
+// Return a random index between 0 and n-1 drawn with countedRand (for std::random_shuffle : same draws as its default generator)
+long numberOfRandDraws();
+// Return the number of calls to countedRand() since the seed has been planted
+void replayRand(int seed, long nDraws);
+// Put rand() in the state it had after nDraws calls to countedRand() from the seed (used when a run restarts)
 
 #endif /* GENERALFUNCTIONS_H_ */
@@ -19,6 +19,9 @@
 #include "generalFunctions.h"
 #include "filesAndControl.h"
 #include "wavelet2s.h"
+#ifdef _OPENMP
+  #include <omp.h>
+#endif
 
 Configuration parameters_setting(int argc, char *argv[])
 // Initialize the configuration structure containing the config of the run, read the configuration file
@@ -48,6 +51,11 @@ Configuration parameters_setting(int argc, char *argv[])
   std::ostringstream startTime;   // Store a part of the starting time to distinguish files from different runs
   startTime << (int)config.startTime%1000; // -> gives 3 digit that will different each time we run the program
   config.code = startTime.str(); // Store these 3 digits on a string : config.code
+  config.firstIteration = 0;
+  if (argc > 1) { // The run restarts from the checkpoint given as argument (ex : ./bin/RealisticDataMCMC OUTPUT_FILES/XXX/checkpoint.XXX.bin)
+    config.restartFile = argv[1];
+    readCheckpointHeader(&config); // The code, the seed and the iteration of the run are those of the checkpoint
+  }
   char buffer[80];
   convertTime(buffer, config.startTime);
   if (config.mpiConfig.rank == 0) {
@@ -70,6 +78,9 @@ Configuration parameters_setting(int argc, char *argv[])
   }
   else
     config.nWavelets = sizeof(config.listOfWavelets)/sizeof(config.listOfWavelets[0]); // == NUMBER_OF_WAVELETS
+  set_convolution_mode(config.waveletConvolution); // Choose how the inverse wavelet transforms convolve (see convsynth in wavelet2s.cpp)
+  if (config.waveletConvolution == 2 && import_fft_wisdom(NAME_OF_WISDOM_FILE) && config.verbose1 && config.mpiConfig.rank == 0)
+    std::cout << "FFT plans measured by the previous runs loaded from " << NAME_OF_WISDOM_FILE << std::endl;
   std::vector<double> emptyVectorOfDouble;
   std::vector<int> emptyVectorOfInt;
   for (int wavelet = 0; wavelet < config.nWavelets; wavelet++) { // Loop on the wavelets used
@@ -97,8 +108,19 @@ Configuration parameters_setting(int argc, char *argv[])
       exit(1);
     }
   }
+  config.runStoreDir=config.outputDir+"runStore"+config.code+"/";
+  if (config.writeRunStore && config.mpiConfig.rank == 0) {
+    mkdir_command="mkdir -p "+config.runStoreDir;
+    status = system(mkdir_command.c_str());
+    if(status != 0) {
+      std::cout << "Error while creating "+config.runStoreDir+" (status = "<< status << ")" << std::endl;
+      exit(1);
+    }
+  }
   int seed=config.defaultSeed;
-  if (config.useDefaultSeed != 1 && config.mpiConfig.rank == 0)
+  if (!config.restartFile.empty()) // A run restarts with the seed it was initialized with (the initialization is the same)
+    seed=config.seed;
+  else if (config.useDefaultSeed != 1 && config.mpiConfig.rank == 0)
     seed=time(NULL);
   #ifdef PAR  
     MPI_Barrier(MPI_COMM_WORLD);
@@ -107,7 +129,7 @@ Configuration parameters_setting(int argc, char *argv[])
   #endif
   config.seed=seed;
   PlantSeeds(config.seed); // Seed initialization
-  srand(config.seed);      // Seed initialization (useless?)
+  srand(config.seed);      // Seed initialization of rand() (see countedRand)
   build_temperature_ladders(&config); // Build the temperature ladders (T[0]=1)
   if (config.verbose1 && config.mpiConfig.rank == 0)
     std::cout << "Configuration structure initialized" << std::endl;
@@ -126,6 +148,26 @@ void readConfFile(std::string nameOfConfFile, Configuration* config)
   //std::cout << std::endl;
   configFileParser::data::const_iterator iter;
   std::string tempNC,tempString;
+  config->writeRunStore = 1; // Default value (used if WRITE_RUN_STORE is not given in the configuration file)
+  config->writeProfilesHistory = 0; // Default value (used if WRITE_PROFILES_HISTORY is not given in the configuration file)
+  config->quantileEstimator = 2; // Default value (used if QUANTILE_ESTIMATOR is not given in the configuration file)
+  config->quantileAccuracy = 0.001; // Default value (used if QUANTILE_ACCURACY is not given in the configuration file)
+  config->weightsAccumulator = 0; // Default value (used if WEIGHTS_ACCUMULATOR is not given in the configuration file)
+  config->timesCacheSize = 0; // Default value (used if TIMES_CACHE_SIZE is not given in the configuration file)
+  config->eikonalMode = 0; // Default value (used if EIKONAL_MODE is not given in the configuration file)
+  config->eikonalThreads = 1; // Default value (used if EIKONAL_THREADS is not given in the configuration file)
+  config->parallelChains = 0; // Default value (used if PARALLEL_CHAINS is not given in the configuration file)
+  config->historyPolicy = 0; // Default value (used if HISTORY_POLICY is not given in the configuration file)
+  config->historyThinning = 10; // Default value (used if HISTORY_THINNING is not given in the configuration file)
+  config->historySize = 10000; // Default value (used if HISTORY_SIZE is not given in the configuration file)
+  config->checkpointIterations = 0; // Default value (used if CHECKPOINT_ITERATIONS is not given in the configuration file)
+  config->flushIterations = 100; // Default value (used if FLUSH_ITERATIONS is not given in the configuration file)
+  config->flushSeconds = 60; // Default value (used if FLUSH_SECONDS is not given in the configuration file)
+  config->iterationsAverages = 100; // Default value (used if ITERATIONS_AVERAGES is not given in the configuration file)
+  config->waveletConvolution = 0; // Default value (used if WAVELET_CONVOLUTION is not given in the configuration file)
+  config->waveletSynthesis = 0; // Default value (used if WAVELET_SYNTHESIS is not given in the configuration file)
+  config->timesCache.hits = 0;
+  config->timesCache.misses = 0;
   for (iter = myconfigdata.begin(); iter != myconfigdata.end(); iter++) {
     if (iter->first == "DATA_DIRECTORY")
       config->filesDir = iter->second;
@@ -145,6 +187,12 @@ void readConfFile(std::string nameOfConfFile, Configuration* config)
       config->df = atof(iter->second.c_str());
     if (iter->first == "QP")
       config->qp = atof(iter->second.c_str());
+    if (iter->first == "QUANTILE_ESTIMATOR")
+      config->quantileEstimator = atoi(iter->second.c_str());
+    if (iter->first == "QUANTILE_ACCURACY")
+      config->quantileAccuracy = atof(iter->second.c_str());
+    if (iter->first == "WEIGHTS_ACCUMULATOR")
+      config->weightsAccumulator = atoi(iter->second.c_str());
     if (iter->first == "WAVELET_PARAMETERIZATION")
       config->waveletParameterization = atoi(iter->second.c_str());
     if (iter->first == "USE_ALL_WAVELETS")
@@ -169,8 +217,28 @@ void readConfFile(std::string nameOfConfFile, Configuration* config)
       config->name_of_prior_features_file = iter->second;       
     if (iter->first == "NSWEEPS")
       config->nSweeps = atoi(iter->second.c_str());
+    if (iter->first == "TIMES_CACHE_SIZE")
+      config->timesCacheSize = atoi(iter->second.c_str());
     if (iter->first == "EPSIN")
       config->epsin = atof(iter->second.c_str());
+    if (iter->first == "EIKONAL_MODE")
+      config->eikonalMode = atoi(iter->second.c_str());
+    if (iter->first == "EIKONAL_THREADS")
+      config->eikonalThreads = atoi(iter->second.c_str());
+    if (iter->first == "PARALLEL_CHAINS")
+      config->parallelChains = atoi(iter->second.c_str());
+    if (iter->first == "HISTORY_POLICY")
+      config->historyPolicy = atoi(iter->second.c_str());
+    if (iter->first == "HISTORY_THINNING")
+      config->historyThinning = atoi(iter->second.c_str());
+    if (iter->first == "HISTORY_SIZE")
+      config->historySize = atoi(iter->second.c_str());
+    if (iter->first == "CHECKPOINT_ITERATIONS")
+      config->checkpointIterations = atoi(iter->second.c_str());
+    if (iter->first == "FLUSH_ITERATIONS")
+      config->flushIterations = atoi(iter->second.c_str());
+    if (iter->first == "FLUSH_SECONDS")
+      config->flushSeconds = atoi(iter->second.c_str());
     if (iter->first == "NBT")
       config->nbt = atoi(iter->second.c_str());
     if (iter->first == "TMAX")
@@ -185,6 +253,10 @@ void readConfFile(std::string nameOfConfFile, Configuration* config)
       config->wavelet = iter->second;
     if (iter->first == "NDWTS")
       config->ndwts = atoi(iter->second.c_str());
+    if (iter->first == "WAVELET_CONVOLUTION")
+      config->waveletConvolution = atoi(iter->second.c_str());
+    if (iter->first == "WAVELET_SYNTHESIS")
+      config->waveletSynthesis = atoi(iter->second.c_str());
     if (iter->first == "SWAVES")
       config->swaves = atoi(iter->second.c_str()); 
     if (iter->first == "VERBOSE1")
@@ -233,10 +305,16 @@ void readConfFile(std::string nameOfConfFile, Configuration* config)
       config->iterationsResiduals = atoi(iter->second.c_str());
     if (iter->first == "ITERATIONS_BEST_PROFILES")
       config->iterationsBestProfiles = atoi(iter->second.c_str());
+    if (iter->first == "ITERATIONS_AVERAGES")
+      config->iterationsAverages = atoi(iter->second.c_str());
     if (iter->first == "ONLY_CALCULATE_TIMES_FOR_FIRST_GUESS")
       config->calculateTimesForFirstGuess = atoi(iter->second.c_str());
     if (iter->first == "RESAMPLE")
       config->resample = atoi(iter->second.c_str());
+    if (iter->first == "WRITE_RUN_STORE")
+      config->writeRunStore = atoi(iter->second.c_str());
+    if (iter->first == "WRITE_PROFILES_HISTORY")
+      config->writeProfilesHistory = atoi(iter->second.c_str());
     if (iter->first == "NXVEC") {
       tempString = trim(iter->second);
       int nValGiven = std::count(tempString.begin(), tempString.end(), ',') + 1;
@@ -277,6 +355,79 @@ void readConfFile(std::string nameOfConfFile, Configuration* config)
       }
     }
   }  
+  if (config->quantileEstimator < 0 || config->quantileEstimator > 2) {
+      std::cout << "QUANTILE_ESTIMATOR must be 0, 1 or 2 (" << config->quantileEstimator << " given)" << std::endl;
+      std::cout << "Terminating..." << std::endl;
+      exit(0);
+  }
+  if (config->quantileEstimator == 2 && (config->quantileAccuracy <= 0.0 || config->quantileAccuracy >= 1.0)) {
+      std::cout << "QUANTILE_ACCURACY must be between 0 and 1 (" << config->quantileAccuracy << " given)" << std::endl;
+      std::cout << "Terminating..." << std::endl;
+      exit(0);
+  }
+  if (config->weightsAccumulator < 0 || config->weightsAccumulator > 2) {
+      std::cout << "WEIGHTS_ACCUMULATOR must be 0, 1 or 2 (" << config->weightsAccumulator << " given)" << std::endl;
+      std::cout << "Terminating..." << std::endl;
+      exit(0);
+  }
+  if (config->eikonalMode < 0 || config->eikonalMode > 1) {
+      std::cout << "EIKONAL_MODE must be 0 or 1 (" << config->eikonalMode << " given)" << std::endl;
+      std::cout << "Terminating..." << std::endl;
+      exit(0);
+  }
+  if (config->eikonalThreads < 0) {
+      std::cout << "EIKONAL_THREADS must be positive or 0 (" << config->eikonalThreads << " given)" << std::endl;
+      std::cout << "Terminating..." << std::endl;
+      exit(0);
+  }
+  if (config->eikonalThreads == 0) { // As many threads as OpenMP gives (OMP_NUM_THREADS or number of cores)
+    #ifdef _OPENMP
+      config->eikonalThreads = omp_get_max_threads();
+    #else
+      config->eikonalThreads = 1;
+    #endif
+  }
+  if (config->parallelChains < 0) {
+      std::cout << "PARALLEL_CHAINS must be positive or 0 (" << config->parallelChains << " given)" << std::endl;
+      std::cout << "Terminating..." << std::endl;
+      exit(0);
+  }
+  if (config->historyPolicy < 0 || config->historyPolicy > 2) {
+      std::cout << "HISTORY_POLICY must be 0, 1 or 2 (" << config->historyPolicy << " given)" << std::endl;
+      std::cout << "Terminating..." << std::endl;
+      exit(0);
+  }
+  if (config->historyThinning < 1 || config->historySize < 1) {
+      std::cout << "HISTORY_THINNING and HISTORY_SIZE must be strictly positive (" << config->historyThinning << " and " << config->historySize << " given)" << std::endl;
+      std::cout << "Terminating..." << std::endl;
+      exit(0);
+  }
+  if (config->checkpointIterations < 0) {
+      std::cout << "CHECKPOINT_ITERATIONS must be positive or 0 (" << config->checkpointIterations << " given)" << std::endl;
+      std::cout << "Terminating..." << std::endl;
+      exit(0);
+  }
+  if (config->flushIterations < 1 || config->flushSeconds < 0 || config->iterationsAverages < 1) {
+      std::cout << "FLUSH_ITERATIONS and ITERATIONS_AVERAGES must be strictly positive and FLUSH_SECONDS positive or 0 (" << config->flushIterations;
+      std::cout << ", " << config->iterationsAverages << " and " << config->flushSeconds << " given)" << std::endl;
+      std::cout << "Terminating..." << std::endl;
+      exit(0);
+  }
+  if (config->waveletConvolution < 0 || config->waveletConvolution > 2) {
+      std::cout << "WAVELET_CONVOLUTION must be 0, 1 or 2 (" << config->waveletConvolution << " given)" << std::endl;
+      std::cout << "Terminating..." << std::endl;
+      exit(0);
+  }
+  if (config->waveletSynthesis != 0 && config->waveletSynthesis != 1) {
+      std::cout << "WAVELET_SYNTHESIS must be 0 or 1 (" << config->waveletSynthesis << " given)" << std::endl;
+      std::cout << "Terminating..." << std::endl;
+      exit(0);
+  }
+  if (config->timesCacheSize < 0) {
+      std::cout << "TIMES_CACHE_SIZE must be positive or 0 (" << config->timesCacheSize << " given)" << std::endl;
+      std::cout << "Terminating..." << std::endl;
+      exit(0);
+  }
   if (std::count(tempNC.begin(), tempNC.end(), ',') < config->nbt-1) { 
       std::cout << std::count(tempNC.begin(), tempNC.end(), ',')+1 << " values of NC given while " << config->nbt;
       std::cout << " chains will run! " << std::endl;
@@ -827,7 +978,7 @@ void generate_profiles_from_prior(Configuration* config)
     std::vector<double> priorProfileP, priorProfileS;
     if (config->verbose2 && config->mpiConfig.rank == 0)
       std::cout << "  Profile " << i+1 << " :" << std::endl;
-    int wavelet = rand() % config->nWavelets; // Draw wavelet in the range 0 to config->nWavelets-1
+    int wavelet = countedRand() % config->nWavelets; // Draw wavelet in the range 0 to config->nWavelets-1
     if (config->verbose2 && config->mpiConfig.rank == 0 && config->useAllWavelets && config->waveletParameterization)
       std::cout<< "  Wavelet drawn: " << config->listOfWavelets[wavelet] << "..." << std::endl;
     for(int j=0;j<(int)config->data.minParameters[wavelet].size();j++) {  // Loop on the number of parameters that we will modify
@@ -960,6 +1111,26 @@ void designSmallGrid(Configuration* config)
   // nzFilt = config->nzfiltDefault
   //
   // --> Then calculate dx,dy and dzFilt
+  if (config->eikonalMode == 1 && !config->calculateTimesForFirstGuess)
+    designAxisymmetricGrid(config); // Calculate nr and dr
+}
+
+void designAxisymmetricGrid(Configuration* config)
+// Calculate nr and dr, the size of the 2D grid (depth,offset) used if EIKONAL_MODE = 1. It is as fine as the 3D grid and covers the
+// largest horizontal distance between a shot and a station. Its first column is at offset -dr : the shots are not on the edge of the grid
+{
+  double rmax=0.0; // Largest offset
+  for (int ishot=0;ishot<(int)config->data.coordShots.size();ishot++) {
+    for (int istat=0;istat<(int)config->data.coordStations.size();istat++) {
+      double r=sqrt(pow(config->data.coordStations[istat].x-config->data.coordShots[ishot].x,2.0)
+                    +pow(config->data.coordStations[istat].y-config->data.coordShots[ishot].y,2.0));
+      rmax=std::max(rmax,r);
+    }
+  }
+  config->data.dr=std::min(std::min(config->data.dx,config->data.dy),config->data.dzFilt);
+  config->data.nr=(int)ceil(rmax/config->data.dr)+3; // One column before the shot and one after the farthest station
+  if(config->verbose2 && config->mpiConfig.rank == 0)
+    std::cout << "  Axisymmetric grid : nr : " << config->data.nr << " dr : " << config->data.dr << " (largest offset : " << rmax << ")" << std::endl << std::endl;
 }
 
 void calculateTimesForFirstGuess(Configuration* config)
@@ -1058,12 +1229,18 @@ void calculateTimesForFirstGuess(Configuration* config)
         //arrivalTimes.timesS.push_back(getTime(&tt3dS,config->data.coordStations[j],&velModel,shotNumber)+0.01*shotNumber); // To create a synthetic case with false t0
     }
     delete velModel.velS;
-    if(config->mpiConfig.rank == 0)
+    if(config->mpiConfig.rank == 0) {
       write_two_columns_file(&arrivalTimes.timesP,&arrivalTimes.timesS, config->outputDir+"calculatedTimes."+config->code+".dat");
+      if (config->writeRunStore)
+        write_two_columns_npy_file(&arrivalTimes.timesP,&arrivalTimes.timesS, config->runStoreDir+"calculatedTimes.npy");
+    }
   }
   else {
-    if(config->mpiConfig.rank == 0)
+    if(config->mpiConfig.rank == 0) {
       write_one_column_file(&arrivalTimes.timesP, config->outputDir+"calculatedTimes."+config->code+".dat");
+      if (config->writeRunStore)
+        write_one_column_npy_file(&arrivalTimes.timesP, config->runStoreDir+"calculatedTimes.npy");
+    }
   }
   if(config->mpiConfig.rank == 0) {
     std::cout << std::endl << "Done !" << std::endl;
@@ -1374,12 +1551,18 @@ void createDataset(Configuration* config)
     }
     delete velModel.velS;
     config->data.times.timesS = arrivalTimes.timesS;
-    if(config->mpiConfig.rank == 0)
+    if(config->mpiConfig.rank == 0) {
       write_two_columns_file(&config->data.times.timesP,&config->data.times.timesS, config->outputDir+"calculatedTimes."+config->code+".dat");
+      if (config->writeRunStore)
+        write_two_columns_npy_file(&config->data.times.timesP,&config->data.times.timesS, config->runStoreDir+"calculatedTimes.npy");
+    }
   }
   else {
-    if(config->mpiConfig.rank == 0)
+    if(config->mpiConfig.rank == 0) {
       write_one_column_file(&config->data.times.timesP, config->outputDir+"calculatedTimes."+config->code+".dat");
+      if (config->writeRunStore)
+        write_one_column_npy_file(&config->data.times.timesP, config->runStoreDir+"calculatedTimes.npy");
+    }
     if(config->verbose1 && config->mpiConfig.rank == 0) {
       std::cout << "Done !" << std::endl;
       std::cout << "The calculated arrival times has been written in : "+config->outputDir+"calculatedTimes."+config->code+".dat";
@@ -1396,7 +1579,7 @@ State init_state(Configuration* config)
     state.params=std::vector<double>(config->npu*2); // Create a vector that will contain the parameters describing the state
   else
     state.params=std::vector<double>(config->npu); // Create a vector that will contain the parameters describing the state
-  int wavelet = rand() % config->nWavelets; // Draw wavelet in the range 0 to config->nWavelets -1
+  int wavelet = countedRand() % config->nWavelets; // Draw wavelet in the range 0 to config->nWavelets -1
   if (config->verbose2 && config->mpiConfig.rank == 0 && config->useAllWavelets)
     std::cout<< "  Wavelet drawn: " << config->listOfWavelets[wavelet] << "..." << std::endl;
   state.wavelet=wavelet;
@@ -1417,6 +1600,10 @@ Run init_run(Configuration* config)
 // Initialize the run, create each chain at each temperature and the first state of each one.
 {
   Run run;
+  run.accumulatorsDifference=0.0;
+  run.lastFlush=0;
+  run.lastFlushTime=time(NULL);
+  run.stopped=false;
   std::vector<long double> line(config->nbt-1); // This will contain the first line of the matrix of importance weights
   for(int iz=0;iz<config->data.nzFilt-1;iz++) {
     run.averageP.push_back(0.0);
@@ -1434,8 +1621,10 @@ Run init_run(Configuration* config)
     initialState=init_state(config);        // And initialize it
     Chain* chain = new Chain();            // Create a pointer on a Chain
     chain->states.push_back(initialState); // Put the initialState on it
+    chain->iterations.push_back(0);
     chain->nc=config->nc[i];               // Copy from the config the nb of component to modify in a MH iteration for this chain
     chain->T=config->T[i];                 // Copy from the config the temperature of this chain
+    chain->workspace=createWorkspace(config); // Allocate the grids used by the energy computations of this chain
     chain->i=i;                            // Store the index of the chain
     // Initialize the statistics of the chain :
     chain->at=0;
@@ -1479,6 +1668,8 @@ Run init_run(Configuration* config)
     run.chains[i]->states[0].E=energy(&initialState,chain,config); // Compute the energy of the first state of the chain
     mpfr_set_default_prec(PREC); // Set default precision to PREC
     mpfr_init_set_d(run.chains[i]->sumOfweights,0.0,RND); // Set that also to 0;
+    run.chains[i]->logScale=0.0;
+    run.chains[i]->scaledSumOfWeights=0.0;
     for(int iz=0;iz<config->data.nzFilt-1;iz++) {
       run.chains[i]->minP.push_back(run.chains[i]->profilesP[iz].back()); // When there is just one profile it is the minimum and the maximum :
       run.chains[i]->maxP.push_back(run.chains[i]->profilesP[iz].back());
@@ -1490,21 +1681,32 @@ Run init_run(Configuration* config)
       run.chains[i]->varP.push_back(0.);
       run.chains[i]->qInfP.push_back(0.);
       run.chains[i]->qSupP.push_back(0.);
+      run.chains[i]->sortedProfilesP.push_back(std::vector<double>());
+      run.chains[i]->sketchP.push_back(QuantileSketch());
+      run.chains[i]->sketchP.back().count = 0;
       mpfr_init_set_d(run.chains[i]->dotProductP[iz],0.0,RND); // Set that also to 0;
       mpfr_init_set_d(run.chains[i]->dotProductVarP[iz],0.0,RND); // Set that also to 0;
       run.chains[i]->weightedAverageP.push_back(0.);
       run.chains[i]->weightedVarP.push_back(0.);
+      run.chains[i]->scaledDotProductP.push_back(0.);
+      run.chains[i]->scaledDotProductVarP.push_back(0.);
       if (config->swaves) {
         run.chains[i]->averageS.push_back(run.chains[i]->profilesS[iz].back());
         run.chains[i]->varS.push_back(0.);
         run.chains[i]->qInfS.push_back(0.);
         run.chains[i]->qSupS.push_back(0.);
+        run.chains[i]->sortedProfilesS.push_back(std::vector<double>());
+        run.chains[i]->sketchS.push_back(QuantileSketch());
+        run.chains[i]->sketchS.back().count = 0;
         mpfr_init_set_d(run.chains[i]->dotProductS[iz],0.0,RND); // Set that also to 0;
         mpfr_init_set_d(run.chains[i]->dotProductVarS[iz],0.0,RND); // Set that also to 0;
         mpfr_init_set_d(run.chains[i]->dotProductVarVpVs[iz],0.0,RND); // Set that also to 0;
         run.chains[i]->weightedAverageS.push_back(0.);
         run.chains[i]->weightedVarS.push_back(0.);
         run.chains[i]->weightedVarVpVs.push_back(0.);
+        run.chains[i]->scaledDotProductS.push_back(0.);
+        run.chains[i]->scaledDotProductVarS.push_back(0.);
+        run.chains[i]->scaledDotProductVarVpVs.push_back(0.);
       }
     }
 
@@ -1539,11 +1741,21 @@ Run init_run(Configuration* config)
       }
     }
   }
-  run.bestE.push_back(run.chains[0]->states[0].E); // We do that just to put something in that vector (we will fill it with writeBestProfiles)
-  run.idxE.push_back(0);
-  run.chainBestE.push_back(0);
+  for(int i=0;i<config->nbt;i++) // The initial states are the first candidates of the list of the best models (see updateBestModels)
+    considerBestModel(&run,config,i,0);
 
-  run.SCI.push_back(line);
+  int historyLength=config->nit+1; // Maximum number of states kept by a chain (see pruneHistory)
+  if (config->historyPolicy == 1)
+    historyLength=config->nit/config->historyThinning+2;
+  else if (config->historyPolicy == 2)
+    historyLength=std::min(config->historySize+1,config->nit+1);
+  run.SCI.resize(config->nbt-1); // The matrix is stored column by column : run.SCI[i][n] is the importance weight of the n th state of chain i+1
+  for(int i=0;i<config->nbt-1;i++) {
+    run.SCI[i].reserve(historyLength); // One line per state kept : the columns stay contiguous and are not reallocated
+    run.SCI[i].push_back(line[i]);
+  }
+  if (config->waveletConvolution == 2 && config->mpiConfig.rank == 0) // The FFTs of all the inverse wavelet transforms have been planned
+    export_fft_wisdom(NAME_OF_WISDOM_FILE);                              // Save the measurements for the next runs
   return run;
 }
 
@@ -40,6 +40,8 @@ void generate_profiles_from_prior(Configuration* config);
 // Generate config.nPriorProfiles profiles from a priori space in config.outputDir/priorProfilesXXX/
 void designSmallGrid(Configuration* config);
 // Calculate optimum nx,ny,nzFilt,dx,dy,dzFilt to reduce computation time
+void designAxisymmetricGrid(Configuration* config);
+// Calculate nr and dr, the size of the 2D grid (depth,offset) used if EIKONAL_MODE = 1
 void calculateTimesForFirstGuess(Configuration* config);
 // Runs the eikonal for first guess(es) curves
 void findOptimumGrid(double xmaxGrid, double ymaxGrid, double dxmin, double dymin, Configuration* config);
@@ -0,0 +1,116 @@
+!
+!   fteikBatch.f90
+!
+!   Batched calls to the eikonal solver FTeik (fteik.f90) used by the Python bindings (utils/fteik.py).
+!   It is not part of the program : it is compiled with fteik.f90 in the shared library utils/libfteik.so
+!   by "make python". The couples (model, shot) are spread over the OpenMP threads.
+!
+!________________________________________________________________________
+!     call fteik_batch(vel,nz,nx,ny,nModels,sources,nShots,receivers,nReceivers,dzin,dxin,dyin,nsweep,epsin,nThreads,times)
+!
+!     integer - nz,nx,ny             :Dimensions of the time field arrays (see FTeik)
+!     real*8  - vel                  :Velocity models : vel(nz-1,nx-1,ny-1,nModels)
+!     real*8  - sources              :Sources coordinates (z,x,y) relative to the grid of each shot : sources(3,nShots)
+!     real*8  - receivers            :Receivers coordinates (z,x,y) relative to the grid of each shot : receivers(3,nReceivers,nShots)
+!     real    - dzin,dxin,dyin       :Mesh spacing along the 3 axis
+!     integer - nsweep, epsin        :See FTeik
+!     integer - nThreads             :Number of threads used (0 : OpenMP default)
+!     real*8  - times                :Travel times at the receivers : times(nReceivers,nShots,nModels)
+!
+!     call fteik_batch_grids(vel,nz,nx,ny,nModels,sources,nShots,dzin,dxin,dyin,nsweep,epsin,nThreads,tt)
+!
+!     real*8  - tt                   :Travel time fields : tt(nz,nx,ny,nShots,nModels)
+!________________________________________________________________________
+!
+subroutine fteik_batch(vel,nz,nx,ny,nModels,sources,nShots,receivers,nReceivers,dzin,dxin,dyin,nsweep,epsin,nThreads,times)
+
+   implicit none
+   integer,intent(in)   ::   nz,nx,ny,nModels,nShots,nReceivers,nsweep,nThreads
+   real,intent(in)   ::   dzin,dxin,dyin,epsin
+   real*8,intent(in),dimension(nz-1,nx-1,ny-1,nModels)   ::   vel
+   real*8,intent(in),dimension(3,nShots)   ::   sources
+   real*8,intent(in),dimension(3,nReceivers,nShots)   ::   receivers
+   real*8,intent(out),dimension(nReceivers,nShots,nModels)   ::   times
+
+   real*8,allocatable,dimension(:,:,:)   ::   tt
+   real   ::   zsin,xsin,ysin
+   real*8   ::   trilinear
+   integer   ::   n,iModel,iShot,iReceiver
+
+   if (nThreads > 0) call omp_set_num_threads(nThreads)
+!$omp parallel private(tt,zsin,xsin,ysin,iModel,iShot,iReceiver)
+   allocate(tt(nz,nx,ny)) ! One time field per thread
+!$omp do schedule(dynamic)
+   do n=0,nModels*nShots-1
+      iModel=n/nShots+1
+      iShot=mod(n,nShots)+1
+      zsin=real(sources(1,iShot))
+      xsin=real(sources(2,iShot))
+      ysin=real(sources(3,iShot))
+      call FTeik(vel(:,:,:,iModel),tt,nz,nx,ny,zsin,xsin,ysin,dzin,dxin,dyin,nsweep,epsin)
+      do iReceiver=1,nReceivers
+         times(iReceiver,iShot,iModel)=trilinear(tt,nz,nx,ny,receivers(:,iReceiver,iShot),dzin,dxin,dyin)
+      enddo
+   enddo
+!$omp end do
+   deallocate(tt)
+!$omp end parallel
+
+end subroutine fteik_batch
+
+subroutine fteik_batch_grids(vel,nz,nx,ny,nModels,sources,nShots,dzin,dxin,dyin,nsweep,epsin,nThreads,tt)
+
+   implicit none
+   integer,intent(in)   ::   nz,nx,ny,nModels,nShots,nsweep,nThreads
+   real,intent(in)   ::   dzin,dxin,dyin,epsin
+   real*8,intent(in),dimension(nz-1,nx-1,ny-1,nModels)   ::   vel
+   real*8,intent(in),dimension(3,nShots)   ::   sources
+   real*8,intent(out),dimension(nz,nx,ny,nShots,nModels)   ::   tt
+
+   real   ::   zsin,xsin,ysin
+   integer   ::   n,iModel,iShot
+
+   if (nThreads > 0) call omp_set_num_threads(nThreads)
+!$omp parallel do schedule(dynamic) private(zsin,xsin,ysin,iModel,iShot)
+   do n=0,nModels*nShots-1
+      iModel=n/nShots+1
+      iShot=mod(n,nShots)+1
+      zsin=real(sources(1,iShot))
+      xsin=real(sources(2,iShot))
+      ysin=real(sources(3,iShot))
+      call FTeik(vel(:,:,:,iModel),tt(:,:,:,iShot,iModel),nz,nx,ny,zsin,xsin,ysin,dzin,dxin,dyin,nsweep,epsin)
+   enddo
+!$omp end parallel do
+
+end subroutine fteik_batch_grids
+
+real*8 function trilinear(tt,nz,nx,ny,coord,dzin,dxin,dyin)
+! Time at coord (z,x,y) interpolated between the corners of its cell (same as getTime in functions.cpp)
+
+   implicit none
+   integer,intent(in)   ::   nz,nx,ny
+   real*8,intent(in),dimension(nz,nx,ny)   ::   tt
+   real*8,intent(in),dimension(3)   ::   coord
+   real,intent(in)   ::   dzin,dxin,dyin
+
+   real*8   ::   z,x,y,dz1,dx1,dy1,dz2,dx2,dy2
+   integer   ::   iz,ix,iy
+
+   z=coord(1)/dzin+1.d0
+   x=coord(2)/dxin+1.d0
+   y=coord(3)/dyin+1.d0
+   iz=min(max(floor(z),1),nz-1) ! (On the last point of the grid the last cell is used)
+   ix=min(max(floor(x),1),nx-1)
+   iy=min(max(floor(y),1),ny-1)
+   dz1=z-iz
+   dx1=x-ix
+   dy1=y-iy
+   dz2=1.d0-dz1
+   dx2=1.d0-dx1
+   dy2=1.d0-dy1
+   trilinear = dz2*dx2*dy2*tt(iz,ix,iy)     + dz1*dx2*dy2*tt(iz+1,ix,iy)   &
+             + dz2*dx1*dy2*tt(iz,ix+1,iy)   + dz2*dx2*dy1*tt(iz,ix,iy+1)   &
+             + dz2*dx1*dy1*tt(iz,ix+1,iy+1) + dz1*dx2*dy1*tt(iz+1,ix,iy+1) &
+             + dz1*dx1*dy2*tt(iz+1,ix+1,iy) + dz1*dx1*dy1*tt(iz+1,ix+1,iy+1)
+
+end function trilinear
@@ -10,9 +10,12 @@
 
 #include <iostream>
 #include <vector>
+#include <map>
+#include <list>
 #include <stdio.h>
 #include <stdlib.h>
 #include <string>
+#include <time.h>
 #include <mpfr.h>
 #include "defines.h"
 #include "tab3d.hpp"
@@ -23,8 +26,16 @@ typedef struct{       // To store a Markov chain state
   double E;                                  // To store the energy E of the state
 }State;
 
+typedef struct{       // To estimate the quantiles of a sequence of positive values without keeping them (QUANTILE_ESTIMATOR = 2)
+  std::map<int,long> buckets;               // Number of values in each bucket : the bucket k contains the values in ]gamma^(k-1),gamma^k]
+  long count;                               // Number of values added
+}QuantileSketch;
+
+struct Workspace;     // Buffers used by the energy computations of a chain (defined below)
+
 typedef struct{       // To store a Markov chain
-  std::vector<State> states;
+  std::vector<State> states;                // States kept (see HISTORY_POLICY). states.back() is the actual state
+  std::vector<int> iterations;              // Iteration number of each state kept (0 : initial state)
   int i;                                    // To store the number of the chain
   double T;                                 // To store the temperature of the chain
   int nc;                                   // Number of components that will be modified at each iteration
@@ -46,6 +57,9 @@ typedef struct{       // To store a Markov chain
   // Ex : profilesP[15] is a vector of size "n" that contains the history of the P wave velocity at the point 15 of the profile
   std::vector<double> averageP, varP, qInfP, qSupP; // To save the medium value of P wave velocity, the variance and the quantiles
   std::vector<double> averageS, varS, qInfS, qSupS; // To save the medium value of S wave velocity, the variance and the quantiles
+  std::vector<std::vector<double> > sortedProfilesP; // QUANTILE_ESTIMATOR = 1 : the values of profilesP[iz] kept sorted
+  std::vector<std::vector<double> > sortedProfilesS; // QUANTILE_ESTIMATOR = 1 : the values of profilesS[iz] kept sorted
+  std::vector<QuantileSketch> sketchP, sketchS; // QUANTILE_ESTIMATOR = 2 : sketches of profilesP[iz] and profilesS[iz]
   mpfr_t sumOfweights; // Used to calculate global average and variance
   std::vector<double> weightedAverageP,weightedAverageS; // Used to calculate global averages
   mpfr_t* dotProductP; // Used to calculate global averages
@@ -54,17 +68,36 @@ typedef struct{       // To store a Markov chain
   mpfr_t* dotProductVarP; // Used to calculate global variances
   mpfr_t* dotProductVarS; // Used to calculate global variances
   mpfr_t* dotProductVarVpVs; // Used to calculate global variances
+  long double logScale;      // WEIGHTS_ACCUMULATOR = 0 or 2 : the sums below are those of the weights and dot products divided by exp(logScale)
+  long double scaledSumOfWeights; // Used to calculate global average and variance (divided by exp(logScale))
+  std::vector<long double> scaledDotProductP, scaledDotProductS; // Used to calculate global averages (divided by exp(logScale))
+  std::vector<long double> scaledDotProductVarP, scaledDotProductVarS, scaledDotProductVarVpVs; // Used to calculate global variances (idem)
+  Workspace* workspace; // Grids reused by all the energy computations of the chain (see createWorkspace)
 }Chain;
 
 typedef struct{       // To store the features of a swap
   int idxChain;                             // Index of the chain which has swapped (0 : lowest temperature chain...)
-  int idxState;                             // Index of the state of the chain who has been swapped
-  int sp;                                   // Index of the state of the higher temperature chain who has been chosen for the swap
+  int idxState;                             // Iteration of the state of the chain who has been swapped
+  int sp;                                   // Iteration of the state of the higher temperature chain who has been chosen for the swap
 }SwapFeatures;
 
+typedef struct{       // To store one of the best models met (see considerBestModel)
+  double E;                                 // Energy of the model (at T=1)
+  int idx;                                  // Iteration of the state
+  int chain;                                // Chain of the state
+  std::vector<double> profileP, profileS;   // Profiles of the model (copied : the state may leave the history)
+}BestModel;
+
+typedef struct{       // A file the run appends lines to. It stays open until the end of the run (see outputFile in filesAndControl.cpp)
+  FILE* file;                               // Stream of the file, fully buffered
+  std::vector<char> buffer;                 // Buffer of the stream (OUTPUT_BUFFER_SIZE bytes)
+  int nColumns;                             // Number of values of the lines of a .npy file, whose header counts the lines (0 : other file)
+  long nLines;                              // Number of lines of the .npy file
+}OutputFile;
+
 typedef struct{       // To store parallel Markov chains
   std::vector<Chain*> chains;                 // To store the Markov chains
-  std::vector<std::vector<long double> > SCI; // To store the matrix of importance weights
+  std::vector<std::vector<long double> > SCI; // To store the matrix of importance weights, column by column : SCI[i][n] (chain i, n th state kept of chain i+1)
   std::vector<SwapFeatures> swapHist;         // To store the history of the swaps
   std::vector<double> maxP;                 // To keep maximum P wave velocity values investigated by the algorithm
   std::vector<double> maxS;                 // To keep maximum S wave velocity values investigated by the algorithm
@@ -73,9 +106,13 @@ typedef struct{       // To store parallel Markov chains
   std::vector<double> averageP, averageS;   // To keep the global mean model
   std::vector<double> varP, varS, varVpVs;  // To keep the global variances
   // std::vector<double> qInfP, qSupP, qInfS, qSupS; // To keep the global quantiles TODO
-  std::vector<int> idxE;  // To keep indices of best models
-  std::vector<double> bestE;  // To keep energies of best models
-  std::vector<int> chainBestE;  // To keep best models chains
+  std::vector<BestModel> bestModels;        // The N_BEST_PROFILES (at least 1) best models met : heap whose first element is the worst of them
+  double accumulatorsDifference;            // WEIGHTS_ACCUMULATOR = 2 : maximum relative difference met between the weighted statistics of
+                                            // the log-sum-exp and of the MPFR accumulators
+  std::map<std::string,OutputFile> outputFiles; // Files the run appends lines to, by name (see outputFile)
+  int lastFlush;                            // Iteration of the last flush of the output files (see flushOutputFiles)
+  time_t lastFlushTime;                     // Time of the last flush of the output files
+  bool stopped;                             // The run has been stopped by a signal (see catchSignal)
 }Run;
 
 typedef struct{       // To store coordinates expressed in meters
@@ -90,11 +127,31 @@ typedef struct{       // To store coordinates expressed in meters
   double z;
 }Coordinate;
 
+typedef struct{       // Trilinear interpolation of a travel times grid at a point (see makeStencil in functions.cpp)
+  int index[8];                             // Positions of the 8 corners of the cell containing the point in the values of the grid
+  double weight[8];                         // Corresponding weights (0 for the corners out of the grid)
+}Stencil;
+
 typedef struct{       // To store the arrival times at a receiver
   std::vector<double> timesP;               // First arrival times P at each receiver : 1-32 shot 1, 33-65 shot 2 ...
   std::vector<double> timesS;               // First arrival times S at each receiver : 1-32 shot 1, 33-65 shot 2 ...
 }ArrivalTimes;
 
+typedef struct{       // Travel times at the stations computed for a velocity model (see lookupTimes in functions.cpp)
+  unsigned long key;                        // Hash of the profiles
+  std::vector<double> profiles;             // P (and S) profiles of the model (two models can have the same key)
+  int firstEikonal;                         // The times are those of the eikonals firstEikonal, firstEikonal+eikonalStep... (they
+  int eikonalStep;                          // depend on the number of processes, see energy())
+  ArrivalTimes times;                       // Arrival times at the stations
+}CachedTimes;
+
+typedef struct{       // Cache of the travel times of the last models used (the least recently used is removed when it is full)
+  std::list<CachedTimes> entries;           // From the most recently used to the least recently used
+  std::map<unsigned long,std::list<CachedTimes>::iterator> index; // Key -> entry
+  long hits;                                // Number of energy computations that have found their travel times in the cache
+  long misses;                              // Number of energy computations that have run the eikonal
+}TimesCache;
+
 typedef struct{       // 3D arrays to store the velocity model (P and S waves velocities at each point)
   tab3d<double>* velP;
   tab3d<double>* velS;
@@ -112,6 +169,20 @@ typedef struct{       // 3D arrays to store the velocity model (P and S waves ve
   double averageDiff;
 }VelocityModel;
 
+typedef struct Workspace{ // Buffers reused by all the energy computations of a chain (see createWorkspace in functions.cpp)
+  VelocityModel velModel;                   // Velocity grids and shift of the grid for each shot
+  std::vector<tab3d<double>*> times;        // Travel times grids : one per thread (EIKONAL_THREADS)
+  std::vector<double> synthesisParams;      // Parameters of the last profiles synthesized (WAVELET_SYNTHESIS = 1, see synthesizeProfiles)
+  int synthesisWavelet;                     // Wavelet of these parameters (-1 : nothing synthesized yet)
+  int synthesisUpdates;                     // Number of incremental updates of these profiles since they have been computed entirely
+  std::vector<double> synthesisP, synthesisS; // Downsampled profiles (nzFilt-1 points) of these parameters
+}Workspace;
+
+typedef struct{       // Linear map from the wavelet coefficients kept to the downsampled profile (WAVELET_SYNTHESIS = 1)
+  std::vector<std::vector<double> > columns; // columns[j] : profile (nzFilt-1 points) given by the coefficient j alone equal to 1, restricted to its support
+  std::vector<int> first;                    // Point of the profile of columns[j][0] (the profile is 0 out of [first[j],first[j]+columns[j].size()[)
+}SynthesisOperator;
+
 typedef struct{       // To store all that is related with MPI
   int rc;
   int len;
@@ -127,6 +198,8 @@ typedef struct{       // To store data characteristics
   ArrivalTimes times;                    // Arrival times at each station for each shot : 1-32 shot 1, 33-65 shot 2 ...
   std::vector<Coordinate> coordStations; // Coordinates of the stations
   std::vector<Coordinate> coordShots;    // Coordinates of the shots
+  std::vector<std::vector<Stencil> > stencils; // stencils[ishot][istation] : interpolation of the travel times of the shot at the station
+  std::vector<int> tableOfShot;          // Travel times of the shot i = those of the shot tableOfShot[i] (EIKONAL_MODE = 1 : same depth)
   std::vector<double> firstGuessP;       // FirstGuess for P waves (size nz-1)
   std::vector<double> firstGuessS;       // FirstGuess for S waves (size nz-1)
   std::vector<std::vector<double> > filtFirstGuessP; // Filtered First guess for P waves velocity (size nz-1)
@@ -154,6 +227,8 @@ typedef struct{       // To store data characteristics
   float dz;                              // Interval in direction z for the first guesses (and the real profiles)
   float dzFilt;                          // Interval in direction z for the filtered profiles > dz (we need less 
                                          // points to describe the filtered profiles properly)
+  int nr;                                // Number of points in offset of the 2D grid (EIKONAL_MODE = 1)
+  float dr;                              // Interval in offset of the 2D grid (EIKONAL_MODE = 1)
   double xminGridGlob;                   // minimum of x coordinate (depending on the position of all the source/receiver and on the profiles)
   double yminGridGlob;                   // minimum of x coordinate (depending on the position of all the source/receiver and on the profiles)
   double zminGridGlob;                   // minimum of x coordinate (depending on the position of all the source/receiver and on the profiles)
@@ -173,6 +248,17 @@ typedef struct{       // To store the configuration of the run
   int nit;                    // Number of iterations
   int nSweeps;                // Number of sweeps in the Eikonal
   float epsin;                // For the Eikonal, radius in number of grid points arround source where spherical approximation will be used
+  int eikonalMode;            // 0 : 3D eikonal on the (nzFilt,nx,ny) grid, 1 : 2D eikonal in (depth,offset) on the (nzFilt,nr) grid
+  int eikonalThreads;         // Number of threads computing the eikonals of each process at the same time
+  int parallelChains;         // 0 : the chains are iterated one after the other. Otherwise number of threads computing the energies of the chains
+  int historyPolicy;          // States kept in the history of the chains. 0 : all, 1 : one every historyThinning iterations, 2 : reservoir
+  int historyThinning;        // HISTORY_POLICY = 1 : iterations between two states kept
+  int historySize;            // HISTORY_POLICY = 2 : number of states of the reservoir of each chain
+  int checkpointIterations;   // Every how many iterations the state of the run is saved in checkpoint.XXX.bin (0 : never)
+  int flushIterations;        // Every how many iterations the lines appended to the output files are flushed
+  int flushSeconds;           // Maximum time (in seconds) between two flushes of the output files (0 : no limit)
+  std::string restartFile;    // Checkpoint the run restarts from (argument of the program, empty for a new run)
+  int firstIteration;         // First iteration of the main loop (0, or the iteration of the checkpoint the run restarts from)
   double di,df;               // Control the amplitude of the steps (At T=Tmax deltaState=L/DI and at T=1 deltaState=L/DF)
   double tmax ;               // Temperature max
   double pee;                 // Probability of allowing swapping
@@ -188,6 +274,7 @@ typedef struct{       // To store the configuration of the run
   std::string code;                         // To store a combination used to distinguish files from different runs
   std::string filesDir;                     // Directory where the data files are stored
   std::string outputDir;                    // Path to the output directory
+  std::string runStoreDir;                  // Path to the binary run store (outputDir/runStoreXXX/, read by utils/runStore.py)
   std::string confFile;                     // Path to the configuration file (ex : /home/abottero/charon.conf)
   std::string name_of_real_profile_P;
   std::string name_of_real_profile_S;
@@ -199,6 +286,9 @@ typedef struct{       // To store the configuration of the run
   std::string name_of_first_guess_S_file;
   /************Quantile Options***************/
   double qp;                                // Ratio of the values on the quantile chosen (ex : 0.95 -> 95%)
+  int quantileEstimator;                    // 0 : sort the whole history at each iteration, 1 : keep the history sorted, 2 : sketch
+  double quantileAccuracy;                  // Relative accuracy of the quantiles given by the sketch (QUANTILE_ESTIMATOR = 2)
+  int weightsAccumulator;                   // Weighted averages and variances. 0 : log-sum-exp in long double, 1 : MPFR, 2 : both (compared)
   /************Parameterization variables*****/
   int waveletParameterization; // If set to 1 the program will use a parameterization based on wavelets. Otherwise it uses a layer based parameterization
   /************Layer variables**************/
@@ -213,6 +303,9 @@ typedef struct{       // To store the configuration of the run
   int nWavelets;
   std::string listOfWavelets[NUMBER_OF_WAVELETS] = {LIST_OF_WAVELETS};  // That will contain the list of all wavelets
   int ndwts;                             // Number of DWT stages for the wavelet transform
+  int waveletConvolution;                // Convolutions of the inverse wavelet transforms. 0 : direct for the short filters, 1 : FFT, 2 : FFT with measured plans
+  int waveletSynthesis;                  // If 1 the profiles are computed with the precomputed synthesis operators instead of inverse wavelet transforms
+  std::vector<SynthesisOperator> synthesisP, synthesisS; // Synthesis operators of each wavelet (see buildSynthesisOperators)
   std::vector<std::vector<double> > coeffsP, flagP;    // For the wavelet transform (coeffsP is used to store temporary coefficients)
   std::vector<std::vector<int> > lengthP;              // For the wavelet transform
   std::vector<std::vector<double> > coeffsS, flagS;    // For the wavelet transform
@@ -245,8 +338,13 @@ typedef struct{       // To store the configuration of the run
   int computeResiduals;
   int iterationsResiduals;
   int iterationsBestProfiles;
+  int iterationsAverages;     // Every how many iterations the average, variance, quantiles and min/max profiles files are rewritten
   int calculateTimesForFirstGuess;
   int resample;
+  int writeRunStore;                     // If 1 the outputs are also written in binary format (.npy) in runStoreDir
+  int writeProfilesHistory;              // If 1 the profiles of the chains are written at each iteration in runStoreDir (profilesPI.npy)
+  int timesCacheSize;                    // Number of models whose travel times are kept in the cache (0 : no cache)
+  TimesCache timesCache;                 // Travel times of the last models used (see lookupTimes in functions.cpp)
 }Configuration;
 
 /*
@@ -29,6 +29,7 @@
 #include <string>
 #include <cmath>
 #include <algorithm>
+#include <map>
 #include "fftw3.h"
 using namespace std;
 
@@ -36,6 +37,102 @@ extern "C" int _get_output_format( void ){ return 0; }
 fftw_plan plan_forward_inp,plan_forward_filt, plan_backward;
 static unsigned int transient_size_of_fft = 0;
 
+// Convolutions of the synthesis filter bank (idwt1, see set_convolution_mode)
+
+#define DIRECT_CONV_MAX_TAPS 32 // Longest filter convolved directly in the automatic mode (the filters have 2 to 30 taps)
+
+struct fft_workspace { // Buffers and plans of convfft for one size of FFT
+    fftw_complex *inp_data, *filt_data, *inp_fft, *filt_fft, *temp_data, *temp_ifft;
+    fftw_plan plan_forward_inp, plan_forward_filt, plan_backward;
+};
+
+static int convolution_mode = 0; // 0 : direct convolution of the short filters, FFT otherwise. 1 : FFT. 2 : FFT with measured plans
+static map<unsigned int, fft_workspace> fft_workspaces; // Size of FFT -> buffers and plans
+static map<pair<unsigned int, vector<double> >, vector<double> > filter_spectra; // (Size of FFT, filter) -> spectrum of the filter
+static map<string, pair<vector<double>, vector<double> > > synthesis_filters; // Wavelet -> (lpr, hpr)
+
+static fft_workspace* get_fft_workspace(unsigned int sz) {
+    // Return the buffers and plans of the FFTs of size sz (created the first time)
+    map<unsigned int, fft_workspace>::iterator it = fft_workspaces.find(sz);
+    if (it != fft_workspaces.end())
+        return &it->second;
+    fft_workspace ws;
+    unsigned int flags = (convolution_mode == 2) ? FFTW_MEASURE : FFTW_ESTIMATE;
+    ws.inp_data = ( fftw_complex* ) fftw_malloc( sizeof( fftw_complex ) * sz );
+    ws.filt_data = ( fftw_complex* ) fftw_malloc( sizeof( fftw_complex ) * sz );
+    ws.inp_fft = ( fftw_complex* ) fftw_malloc( sizeof( fftw_complex ) * sz );
+    ws.filt_fft = ( fftw_complex* ) fftw_malloc( sizeof( fftw_complex ) * sz );
+    ws.temp_data = ( fftw_complex* ) fftw_malloc( sizeof( fftw_complex ) * sz );
+    ws.temp_ifft = ( fftw_complex* ) fftw_malloc( sizeof( fftw_complex ) * sz );
+    ws.plan_forward_inp  = fftw_plan_dft_1d( sz, ws.inp_data, ws.inp_fft, FFTW_FORWARD, flags );
+    ws.plan_forward_filt  = fftw_plan_dft_1d( sz, ws.filt_data, ws.filt_fft, FFTW_FORWARD, flags );
+    ws.plan_backward = fftw_plan_dft_1d( sz, ws.temp_data, ws.temp_ifft, FFTW_BACKWARD, flags );
+    return &(fft_workspaces[sz] = ws);
+}
+
+void clear_convolution_cache() {
+    // Free the buffers and plans of convfft and forget the spectra of the filters
+    for (map<unsigned int, fft_workspace>::iterator it = fft_workspaces.begin(); it != fft_workspaces.end(); ++it) {
+        fft_workspace &ws = it->second;
+        fftw_destroy_plan(ws.plan_forward_inp);
+        fftw_destroy_plan(ws.plan_forward_filt);
+        fftw_destroy_plan(ws.plan_backward);
+        fftw_free(ws.inp_data);
+        fftw_free(ws.filt_data);
+        fftw_free(ws.inp_fft);
+        fftw_free(ws.filt_fft);
+        fftw_free(ws.temp_data);
+        fftw_free(ws.temp_ifft);
+    }
+    fft_workspaces.clear();
+    filter_spectra.clear();
+}
+
+void set_convolution_mode(int mode) {
+    // Choose how idwt1 convolves : 0 (automatic) direct convolution if the filter has at most DIRECT_CONV_MAX_TAPS taps, FFT
+    // otherwise. 1 always FFT (planned with FFTW_ESTIMATE, like the original convfft). 2 always FFT, planned with FFTW_MEASURE
+    // (use import_fft_wisdom and export_fft_wisdom to keep the measurements from one run to another)
+    if (mode != convolution_mode)
+        clear_convolution_cache(); // The plans have to be created again with the new flags
+    convolution_mode = mode;
+}
+
+int import_fft_wisdom(const char* file) {
+    // Load the FFTW wisdom saved in file. Return 0 if it could not be read
+    return fftw_import_wisdom_from_filename(file);
+}
+
+int export_fft_wisdom(const char* file) {
+    // Save the FFTW wisdom accumulated (by the plans measured) in file. Return 0 if it could not be written
+    return fftw_export_wisdom_to_filename(file);
+}
+
+double convdirect(vector<double> &a, vector<double> &b, vector<double> &c) {
+    // Direct convolution of a and b, appended to c. The zeros of a are skipped : after upsampling (upsamp) only one out of two
+    // samples contributes, each output sample gets its taps from one polyphase component of the filter
+    unsigned int sz = a.size() + b.size() - 1;
+    unsigned int offset = c.size();
+    unsigned int len_filt = b.size();
+    c.resize(offset + sz, 0.0);
+    double *out = &c[offset];
+    const double *filt = &b[0];
+    for (unsigned int i = 0; i < a.size(); i++) {
+        double val = a[i];
+        if (val == 0.0)
+            continue;
+        for (unsigned int j = 0; j < len_filt; j++)
+            out[i + j] += val * filt[j];
+    }
+    return 0;
+}
+
+double convsynth(vector<double> &a, vector<double> &b, vector<double> &c) {
+    // Convolution of the synthesis filter bank : direct or FFT depending on the mode (see set_convolution_mode)
+    if (convolution_mode == 0 && b.size() <= DIRECT_CONV_MAX_TAPS)
+        return convdirect(a, b, c);
+    return convfft(a, b, c);
+}
+
 
 
 void* per_ext2d(vector<vector<double> > &signal,vector<vector<double> > &temp2, int a) {
@@ -1308,23 +1405,30 @@ void* freq(vector<double> &sig, vector<double> &freq_resp) {
 }
 
 double convfft(vector<double> &a, vector<double> &b, vector<double> &c) {
-    fftw_complex *inp_data, *filt_data, *inp_fft, *filt_fft, *temp_data, *temp_ifft;
-    fftw_plan plan_forward_inp,plan_forward_filt, plan_backward;
-
+    // The buffers and plans are kept from one call to another for each size of FFT (see get_fft_workspace) and the spectrum of
+    // each filter is computed once for each size
     unsigned int sz = a.size() + b.size() - 1;
-    inp_data = ( fftw_complex* ) fftw_malloc( sizeof( fftw_complex ) * sz );
-    filt_data = ( fftw_complex* ) fftw_malloc( sizeof( fftw_complex ) * sz );
-
-    inp_fft = ( fftw_complex* ) fftw_malloc( sizeof( fftw_complex ) * sz );
-    filt_fft = ( fftw_complex* ) fftw_malloc( sizeof( fftw_complex ) * sz );
-
-    temp_data = ( fftw_complex* ) fftw_malloc( sizeof( fftw_complex ) * sz );
-    temp_ifft = ( fftw_complex* ) fftw_malloc( sizeof( fftw_complex ) * sz );
-
-    plan_forward_inp  = fftw_plan_dft_1d( sz, inp_data, inp_fft, FFTW_FORWARD, FFTW_ESTIMATE );
-    plan_forward_filt  = fftw_plan_dft_1d( sz, filt_data, filt_fft, FFTW_FORWARD, FFTW_ESTIMATE );
-    plan_backward = fftw_plan_dft_1d( sz, temp_data, temp_ifft, FFTW_BACKWARD, FFTW_ESTIMATE );
-
+    fft_workspace *ws = get_fft_workspace(sz);
+    fftw_complex *inp_data = ws->inp_data, *inp_fft = ws->inp_fft, *temp_data = ws->temp_data, *temp_ifft = ws->temp_ifft;
+
+    vector<double> &spectrum = filter_spectra[make_pair(sz, b)];
+    if (spectrum.empty()) {
+        fftw_complex *filt_data = ws->filt_data, *filt_fft = ws->filt_fft;
+        for (unsigned int i =0; i < sz; i++) {
+            if (i < b.size()) {
+                filt_data[i][0] = b[i];
+            } else {
+                filt_data[i][0] = 0.0;
+            }
+            filt_data[i][1] = 0.0;
+        }
+        fftw_execute(ws->plan_forward_filt);
+        spectrum.resize(2 * sz);
+        for (unsigned int i =0; i < sz; i++) {
+            spectrum[2 * i] = filt_fft[i][0];
+            spectrum[2 * i + 1] = filt_fft[i][1];
+        }
+    }
 
     for (unsigned int i =0; i < sz; i++) {
          if (i < a.size()) {
@@ -1334,49 +1438,26 @@ double convfft(vector<double> &a, vector<double> &b, vector<double> &c) {
 
          }
         inp_data[i][1] = 0.0;
-        if (i < b.size()) {
-                filt_data[i][0] = b[i];
-           } else {
-                filt_data[i][0] = 0.0;
-
-           }
-        filt_data[i][1] = 0.0;
-
     }
 
-
-
-    fftw_execute(plan_forward_inp);
-
-    fftw_execute(plan_forward_filt);
+    fftw_execute(ws->plan_forward_inp);
 
     for (unsigned int i =0; i < sz; i++){
-         temp_data[i][0] = inp_fft[i][0]*filt_fft[i][0] - inp_fft[i][1]*filt_fft[i][1];
-
-         temp_data[i][1] = inp_fft[i][0]*filt_fft[i][1] + inp_fft[i][1]*filt_fft[i][0];
-
+         temp_data[i][0] = inp_fft[i][0]*spectrum[2 * i] - inp_fft[i][1]*spectrum[2 * i + 1];
 
+         temp_data[i][1] = inp_fft[i][0]*spectrum[2 * i + 1] + inp_fft[i][1]*spectrum[2 * i];
 
     }
 
+    fftw_execute(ws->plan_backward);
 
-    fftw_execute(plan_backward);
-
+    c.reserve(c.size() + sz);
     for (unsigned int i = 0; i < sz; i++) {
         double temp1;
         temp1 = temp_ifft[i][0] / (double) sz;
         c.push_back(temp1);
 
     }
-    fftw_free(inp_data);
-    fftw_free(filt_data);
-    fftw_free(inp_fft);
-    fftw_free(filt_fft);
-    fftw_free(temp_data);
-    fftw_free(temp_ifft);
-    fftw_destroy_plan(plan_forward_inp);
-    fftw_destroy_plan(plan_forward_filt);
-    fftw_destroy_plan(plan_backward);
 
     return 0;
 }
@@ -1941,9 +2022,14 @@ void* idwt1_m(string wname, vector<double> &X, vector<double> &cA, vector<double
 }
 
 void* idwt1(string wname, vector<double> &X, vector<double> &cA, vector<double> &cD) {
-        vector<double> lpd1,hpd1, lpr1, hpr1;
-
-        filtcoef(wname,lpd1,hpd1,lpr1,hpr1);
+        map<string, pair<vector<double>, vector<double> > >::iterator filters = synthesis_filters.find(wname);
+        if (filters == synthesis_filters.end()) { // The filters of each wavelet are built once
+            vector<double> lpd1,hpd1, lpr1, hpr1;
+            filtcoef(wname,lpd1,hpd1,lpr1,hpr1);
+            filters = synthesis_filters.insert(make_pair(wname, make_pair(lpr1, hpr1))).first;
+        }
+        vector<double> &lpr1 = filters->second.first;
+        vector<double> &hpr1 = filters->second.second;
         int len_lpfilt = lpr1.size();
         int len_hpfilt = hpr1.size();
         int len_avg = (len_lpfilt + len_hpfilt) / 2;
@@ -1960,7 +2046,7 @@ void* idwt1(string wname, vector<double> &X, vector<double> &cA, vector<double>
         per_ext(cA_up,len_avg/2);
 
 
-        convfft(cA_up, lpr1, X_lp);
+        convsynth(cA_up, lpr1, X_lp);
 
 
         // Operations in the High Frequency branch of the Synthesis Filter Bank
@@ -1971,7 +2057,7 @@ void* idwt1(string wname, vector<double> &X, vector<double> &cA, vector<double>
         per_ext(cD_up,len_avg/2);
 
 
-        convfft(cD_up, hpr1, X_hp);
+        convsynth(cD_up, hpr1, X_hp);
 
    // Remove periodic extension
 
@@ -122,6 +122,18 @@ using namespace std;
 
  double convfftm(vector<double> &, vector<double> &, vector<double> &);
 
+ double convdirect(vector<double> &, vector<double> &, vector<double> &);
+
+ double convsynth(vector<double> &, vector<double> &, vector<double> &);
+
+ void set_convolution_mode(int);
+
+ void clear_convolution_cache();
+
+ int import_fft_wisdom(const char *);
+
+ int export_fft_wisdom(const char *);
+
  void* fft(vector<complex<double> > &,int ,unsigned int);
 
  void* bitreverse(vector<complex<double> > &);
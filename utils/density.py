@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Density images used to represent the uncertainties on the velocity profiles (see pdense in
+watchResults.py). Each line of the image corresponds to a depth, each column to a velocity :
+  - gaussianDensity  : Gaussian density of mean y[i] and standard deviation sigma[i] at depth i
+  - histogramDensity : histogram at each depth of a set of profiles (ex : the prior profiles)
+The images are computed with broadcasting (no Python loop on the depths), optionally in
+single precision, with a number of columns M that can be adapted to the size of the axes
+in pixels (adaptiveM). The Gaussian images are cached : drawing the same profile twice
+(ex : --results and --paper) computes it once.
+
+"""
+### --- MODULES AND PACKAGES --- ###
+import hashlib # To identify the profiles in the cache
+import numpy as np # NumPy (multidimensional arrays, linear algebra, ...)
+
+cache = {} # (profile hash, M, dtype) -> (image, ymin, ymax)
+
+def adaptiveM(ax, M=1000):
+    """ Return the number of columns needed to fill the axes ax (its width in pixels), at most M """
+    width = int(np.ceil(ax.get_window_extent().width))
+    return max(2,min(M,width))
+
+def profileHash(*arrays):
+    """ Return a key identifying the content of the arrays """
+    h = hashlib.sha1()
+    for array in arrays:
+        h.update(np.ascontiguousarray(array,dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+def gaussianDensity(y, sigma, M=1000, dtype=np.float64):
+    """ Return the image (shape (len(y),M)) of the Gaussian densities of means y and standard
+    deviations sigma, and the velocity range (ymin,ymax) it covers : [min(y-2sigma),max(y+2sigma)]
+    """
+    y = np.asarray(y,dtype=dtype)
+    sigma = np.asarray(sigma,dtype=dtype)
+    key = (profileHash(y,sigma),M,np.dtype(dtype).str)
+    if key not in cache:
+        ymin, ymax = (y-2*sigma).min(), (y+2*sigma).max()
+        yy = np.linspace(ymin,ymax,M).astype(dtype)
+        image = np.exp(-((y[:,np.newaxis]-yy[np.newaxis,:])/sigma[:,np.newaxis])**2)/sigma[:,np.newaxis]
+        cache[key] = (image,float(ymin),float(ymax))
+    return cache[key]
+
+def histogramDensity(profiles, M=1000, ymin=None, ymax=None, dtype=np.float64):
+    """ Return the image (shape (nz,M)) of the histograms at each depth of the profiles
+    (shape (nProfiles,nz)) normalized by the number of profiles, and the velocity range
+    (ymin,ymax) it covers (the range of the profiles by default)
+    """
+    profiles = np.asarray(profiles,dtype=np.float64)
+    nProfiles,nz = profiles.shape
+    if ymin is None:
+        ymin = profiles.min()
+    if ymax is None:
+        ymax = profiles.max()
+    if ymax <= ymin: # All the profiles are constant and equal
+        ymin,ymax = ymin-0.5,ymax+0.5
+    # Column of each value, then all the depths are counted at once (one bincount on depth*M+column) :
+    columns = np.clip(((profiles-ymin)/(ymax-ymin)*M).astype(int),0,M-1)
+    cells = (np.arange(nz)[np.newaxis,:]*M+columns).ravel()
+    image = np.bincount(cells,minlength=nz*M).reshape(nz,M).astype(dtype)/nProfiles
+    return image,ymin,ymax
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Live monitoring of a running inversion (watchResults.py --follow). The files written line by
+line by the program (chainI, statsI, sci and ll) are tailed : each update reads only the bytes
+appended since the previous one (the program writes them every FLUSH_ITERATIONS iterations or
+FLUSH_SECONDS seconds, kill -USR1 forces it). The global average profiles, rewritten entirely by
+the program every ITERATIONS_AVERAGES iterations, are read again only when they have been modified. The figure (energies of the chains,
+acceptance and swapping rates, importance weights and global average profiles) is updated in
+place every interval seconds until the run ends (when "Final time" is written in config.XXX.dat).
+
+"""
+### --- MODULES AND PACKAGES --- ###
+import os, sys
+import time
+import numpy as np # NumPy (multidimensional arrays, linear algebra, ...)
+import matplotlib.pyplot as plt # Matplotlib's pyplot: MATLAB-like syntax
+
+class TextTail(object):
+    """ Numerical text file growing by lines. update() parses the lines appended since the
+    previous call (an incomplete last line is kept for the next call)
+    """
+    def __init__(self, nameOfFile):
+        self.nameOfFile = nameOfFile
+        self.offset = 0    # Number of bytes already read
+        self.rest = b""    # Last line not complete yet
+        self.chunks = []   # Arrays of the lines read
+        self.nLines = 0
+
+    def update(self):
+        """ Read the new lines. Return the number of lines read """
+        if not os.path.isfile(self.nameOfFile):
+            return 0
+        with open(self.nameOfFile,"rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+        self.offset += len(data)
+        lines = (self.rest+data).split(b"\n")
+        self.rest = lines.pop() # Empty if the data end by a new line
+        values = [[float(v) for v in line.split()] for line in lines if line.strip()]
+        if values:
+            self.chunks.append(np.array(values,ndmin=2))
+            self.nLines += len(values)
+        return len(values)
+
+    def values(self):
+        """ Return all the lines read as an array (shape (nLines,nColumns)) """
+        if not self.chunks:
+            return np.zeros((0,0))
+        if len(self.chunks) > 1: # The chunks are merged once
+            self.chunks = [np.concatenate(self.chunks)]
+        return self.chunks[0]
+
+class RunMonitor(object):
+    """ State of a running inversion, updated incrementally """
+    def __init__(self, pathToDir, code, config):
+        self.pathToDir = pathToDir
+        self.code = code
+        self.config = config
+        def name(output):
+            return os.path.join(pathToDir,output+"."+code+".dat")
+        self.chains = [TextTail(name("chain"+str(i))) for i in np.arange(config.nbt)]
+        self.stats = [TextTail(name("stats"+str(i))) for i in np.arange(config.nbt)]
+        self.sci = TextTail(name("sci"))
+        self.ll = TextTail(name("ll"))
+        self.averages = {"P":[name("globalAverageP"),0,None]} # file, modification time, values
+        if config.swaves:
+            self.averages["S"] = [name("globalAverageS"),0,None]
+        self.configFile = name("config")
+
+    def update(self):
+        """ Read what has been written since the last update. Return True if something changed """
+        changed = False
+        for tail in self.chains+self.stats+[self.sci,self.ll]:
+            changed = tail.update() > 0 or changed
+        for wave in self.averages:
+            nameOfFile,mtime = self.averages[wave][:2]
+            if os.path.isfile(nameOfFile) and os.path.getmtime(nameOfFile) != mtime:
+                self.averages[wave][1] = os.path.getmtime(nameOfFile)
+                try:
+                    self.averages[wave][2] = np.loadtxt(nameOfFile)
+                    changed = True
+                except ValueError: # The file is being rewritten : it will be read next time
+                    self.averages[wave][1] = 0
+        return changed
+
+    def finished(self):
+        """ Return True if the run is over : "Final time" is written in config.XXX.dat after the last
+        restart (a run stopped then restarted from a checkpoint has a "Final time" before its restart)
+        """
+        try:
+            with open(self.configFile) as f:
+                content = f.read()
+        except IOError: # The program has not created the file yet
+            return False
+        return "Final time" in content.split("Restarted from iteration")[-1]
+
+def follow(pathToDir, code, config, interval=10.0, figuresDir=None, verbose=False):
+    """ Monitor the run until it ends (or until the window is closed). If figuresDir is given
+    nothing is displayed and the figure is saved in figuresDir/follow.XXX.png at each update
+    """
+    monitor = RunMonitor(pathToDir,code,config)
+    fig = plt.figure(figsize=(12,9))
+    axEnergies = fig.add_subplot(2,2,1)
+    axRates = fig.add_subplot(2,2,2)
+    axSci = fig.add_subplot(2,2,3)
+    axAverages = fig.add_subplot(2,2,4)
+    colors = [plt.cm.jet(float(i)/max(1,config.nbt-1)) for i in np.arange(config.nbt)]
+    energyLines = [axEnergies.semilogy([],[],color=colors[i])[0] for i in np.arange(config.nbt)]
+    acceptanceLines = [axRates.plot([],[],color=colors[i],label="Chain "+str(i))[0] for i in np.arange(config.nbt)]
+    swappingLines = [axRates.plot([],[],'--',color=colors[i])[0] for i in np.arange(config.nbt)]
+    sciLines = [axSci.semilogy([],[],color=colors[i])[0] for i in np.arange(config.nbt-1)]
+    averageLines = {}
+    for wave,color in zip(sorted(monitor.averages),[(0,0,0.5),(0,0.5,0)]):
+        averageLines[wave] = axAverages.plot([],[],color=color,linewidth=2,label=wave+" waves")[0]
+    axEnergies.set_xlabel('Iteration number')
+    axEnergies.set_ylabel('Energy')
+    axRates.set_xlabel('Iteration number')
+    axRates.set_ylabel('Acceptance (-) and swapping (--) rates (%)')
+    axRates.legend(loc='best',fontsize=10)
+    axSci.set_xlabel('Iteration number')
+    axSci.set_ylabel('Importance weights (SCI)')
+    axAverages.set_xlabel('Global average velocity (m/s)')
+    axAverages.set_ylabel('Depth (m)')
+    axAverages.legend(loc='best',fontsize=10)
+    while True:
+        finished = monitor.finished() # Checked before the update : the last lines are read
+        if monitor.update():
+            for i in np.arange(config.nbt):
+                chain = monitor.chains[i].values()
+                if len(chain):
+                    energyLines[i].set_data(np.arange(len(chain)),chain[:,-1]*config.T[i])
+                stats = monitor.stats[i].values()
+                if len(stats):
+                    acceptanceLines[i].set_data(np.arange(len(stats)),stats[:,6])
+                    swappingLines[i].set_data(np.arange(len(stats)),stats[:,7])
+            sci = monitor.sci.values()
+            for k in np.arange(min(len(sciLines),sci.shape[1])):
+                sciLines[k].set_data(np.arange(len(sci)),sci[:,k])
+            for wave in averageLines:
+                average = monitor.averages[wave][2]
+                if average is not None:
+                    averageLines[wave].set_data(average[:,1],average[:,0])
+            for ax in [axEnergies,axRates,axSci,axAverages]:
+                ax.relim()
+                ax.autoscale_view()
+            if not axAverages.yaxis_inverted():
+                axAverages.invert_yaxis()
+            nit = min([tail.nLines for tail in monitor.chains])
+            fig.suptitle("Run "+code+" : "+str(nit)+" iterations, "+str(monitor.ll.nLines)+" swaps")
+            if verbose:
+                print(time.strftime("%H:%M:%S")+" : "+str(nit)+" iterations")
+                sys.stdout.flush()
+            if figuresDir is not None:
+                fig.savefig(os.path.join(figuresDir,"follow."+code+".png"))
+        if finished:
+            if verbose:
+                print("The run is over")
+            break
+        if figuresDir is None:
+            plt.pause(interval)
+            if not plt.fignum_exists(fig.number): # The window has been closed
+                break
+        else:
+            time.sleep(interval)
+    if figuresDir is None and plt.fignum_exists(fig.number):
+        plt.show()
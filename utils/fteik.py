@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Python bindings to the eikonal solver FTeik (src/fteik.f90) through ctypes. The shared library
+has to be built first (in the main directory) :
+    make python    -> utils/libfteik.so
+
+The arrays are used in place by the solver (no copies) when they are already Fortran ordered
+float64 arrays. The GIL is released during the calls (ctypes), so the solver can also run in
+Python threads. Like in the program, velocities are defined at the centers of the cells and
+times on the corners : a velocity model of shape (nz-1,nx-1,ny-1) gives a time field of shape
+(nz,nx,ny). The coordinates are (z,x,y), in meters, relative to the first corner of the grid.
+  - solve      : time field of one source in one model
+  - solveBatch : times of many shots in many models in one call (the couples (model,shot) are
+                 spread over OpenMP threads), at receivers or on the whole grids
+  - layeredModel and stationTimes build the models of 1D profiles and compute the times at the
+    stations with the grid shifts of the program (see calculateShiftForEachShot and getTime in
+    src/functions.cpp) : they can be used to compute the residuals of any saved profile
+
+Usage :
+    import fteik
+    tt = fteik.solve(vel,(zs,xs,ys),(dz,dx,dy))
+"""
+### --- MODULES AND PACKAGES --- ###
+import os
+import ctypes # Foreign functions (releases the GIL during the calls)
+import numpy as np # NumPy (multidimensional arrays, linear algebra, ...)
+
+LIBRARY = os.path.join(os.path.dirname(os.path.abspath(__file__)),"libfteik.so")
+
+_library = None
+
+def library():
+    """ Return the shared library (loaded the first time). Raise an OSError if it has not been built """
+    global _library
+    if _library is None:
+        if not os.path.isfile(LIBRARY):
+            raise OSError(LIBRARY+" not found : run \"make python\" in the main directory")
+        _library = ctypes.CDLL(LIBRARY)
+    return _library
+
+def available():
+    """ Return True if the shared library can be loaded """
+    try:
+        library()
+        return True
+    except OSError:
+        return False
+
+def _int(value):
+    return ctypes.byref(ctypes.c_int(int(value)))
+
+def _float(value):
+    return ctypes.byref(ctypes.c_float(float(value)))
+
+def _pointer(array):
+    return array.ctypes.data_as(ctypes.POINTER(ctypes.c_double))
+
+def _fortranArray(array, ndim):
+    """ Return array as a Fortran ordered float64 array (not copied if it is already one) """
+    array = np.asfortranarray(array,dtype=np.float64)
+    if array.ndim != ndim:
+        raise ValueError("Array of dimension "+str(ndim)+" expected (dimension "+str(array.ndim)+" given)")
+    return array
+
+def solve(vel, source, spacing, nSweeps=1, epsin=5.0, out=None):
+    """ Return the time field (shape (nz,nx,ny)) of the source (zs,xs,ys) in the velocity model
+    vel (shape (nz-1,nx-1,ny-1)) with the mesh spacing (dz,dx,dy). If out (Fortran ordered
+    float64 array of shape (nz,nx,ny)) is given the times are written in it
+    """
+    vel = _fortranArray(vel,3)
+    nz,nx,ny = vel.shape[0]+1,vel.shape[1]+1,vel.shape[2]+1
+    if min(nz,nx,ny) < 3:
+        raise ValueError("No dimension of the time field may be lower than 3")
+    if out is None:
+        out = np.empty((nz,nx,ny),dtype=np.float64,order='F')
+    elif out.shape != (nz,nx,ny) or out.dtype != np.float64 or not out.flags.f_contiguous:
+        raise ValueError("out must be a Fortran ordered float64 array of shape "+str((nz,nx,ny)))
+    library().fteik_(_pointer(vel),_pointer(out),_int(nz),_int(nx),_int(ny),
+                     _float(source[0]),_float(source[1]),_float(source[2]),
+                     _float(spacing[0]),_float(spacing[1]),_float(spacing[2]),
+                     _int(nSweeps),_float(epsin))
+    return out
+
+def solveBatch(vels, sources, spacing, receivers=None, nSweeps=1, epsin=5.0, nThreads=0):
+    """ Compute the times of all the sources (shape (nShots,3)) in all the velocity models
+    (shape (nz-1,nx-1,ny-1,nModels), Fortran ordered to avoid a copy) in one call.
+    If receivers is given (shape (nShots,nReceivers,3) : the receivers of each shot) return
+    the times at the receivers (shape (nModels,nShots,nReceivers)). Otherwise return the
+    time fields (shape (nz,nx,ny,nShots,nModels), Fortran ordered).
+    nThreads is the number of OpenMP threads (0 : OMP_NUM_THREADS or number of cores)
+    """
+    vels = _fortranArray(vels,4)
+    nz,nx,ny,nModels = vels.shape[0]+1,vels.shape[1]+1,vels.shape[2]+1,vels.shape[3]
+    if min(nz,nx,ny) < 3:
+        raise ValueError("No dimension of the time field may be lower than 3")
+    sources = np.ascontiguousarray(sources,dtype=np.float64).reshape(-1,3) # C ordered (nShots,3) = Fortran (3,nShots)
+    nShots = len(sources)
+    if receivers is None:
+        tt = np.empty((nz,nx,ny,nShots,nModels),dtype=np.float64,order='F')
+        library().fteik_batch_grids_(_pointer(vels),_int(nz),_int(nx),_int(ny),_int(nModels),
+                                     _pointer(sources),_int(nShots),
+                                     _float(spacing[0]),_float(spacing[1]),_float(spacing[2]),
+                                     _int(nSweeps),_float(epsin),_int(nThreads),_pointer(tt))
+        return tt
+    receivers = np.ascontiguousarray(receivers,dtype=np.float64)
+    if receivers.ndim != 3 or receivers.shape[0] != nShots or receivers.shape[2] != 3:
+        raise ValueError("receivers must be of shape (nShots,nReceivers,3)")
+    nReceivers = receivers.shape[1]
+    times = np.empty((nModels,nShots,nReceivers),dtype=np.float64) # C ordered = Fortran (nReceivers,nShots,nModels)
+    library().fteik_batch_(_pointer(vels),_int(nz),_int(nx),_int(ny),_int(nModels),
+                           _pointer(sources),_int(nShots),_pointer(receivers),_int(nReceivers),
+                           _float(spacing[0]),_float(spacing[1]),_float(spacing[2]),
+                           _int(nSweeps),_float(epsin),_int(nThreads),_pointer(times))
+    return times
+
+def layeredModel(profiles, nx, ny):
+    """ Return the velocity models (shape (nz-1,nx-1,ny-1,nModels), Fortran ordered) made of the
+    1D profiles (shape (nModels,nz-1) or (nz-1,) : velocities at the centers of the cells)
+    """
+    profiles = np.atleast_2d(np.asarray(profiles,dtype=np.float64))
+    vels = np.empty((profiles.shape[1],nx-1,ny-1,len(profiles)),dtype=np.float64,order='F')
+    vels[...] = profiles.T[:,np.newaxis,np.newaxis,:]
+    return vels
+
+def gridShifts(coordShots, origin, spacing):
+    """ Return the first corner (zmin,xmin,ymin) of the grid of each shot (shape (nShots,3)) :
+    the grid starting at origin (zmin,xmin,ymin) is shifted so that the shot is on a grid point
+    (see calculateShiftForEachShot in src/functions.cpp). coordShots is of shape (nShots,3) (x,y,z)
+    """
+    shots = np.atleast_2d(coordShots)[:,[2,0,1]] # (z,x,y)
+    origin = np.asarray(origin,dtype=np.float64)
+    spacing = np.asarray(spacing,dtype=np.float64)
+    epsilon = shots-origin-np.floor((shots-origin)/spacing)*spacing
+    return origin+epsilon
+
+def stationTimes(profiles, coordShots, coordStats, origin, spacing, nx, ny, nSweeps=1, epsin=5.0, nThreads=0):
+    """ Return the times (shape (nModels,nShots,nStations)) at the stations coordStats (shape
+    (nStations,3) : x,y,z) for the shots coordShots (shape (nShots,3) : x,y,z) in the layered
+    models made of the profiles (shape (nModels,nz-1)). origin (zmin,xmin,ymin) and spacing
+    (dz,dx,dy) define the grid before its shift for each shot (ex : zminGlob, xminGlob, yminGlob
+    and dzFilt, dx, dy in config.XXX.dat)
+    """
+    shifts = gridShifts(coordShots,origin,spacing)
+    sources = np.atleast_2d(coordShots)[:,[2,0,1]]-shifts
+    stations = np.atleast_2d(coordStats)[:,[2,0,1]]
+    receivers = stations[np.newaxis,:,:]-shifts[:,np.newaxis,:]
+    return solveBatch(layeredModel(profiles,nx,ny),sources,spacing,receivers,nSweeps,epsin,nThreads)
@@ -0,0 +1,134 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Reference implementation of the quantile estimators of the program (QUANTILE_ESTIMATOR in
+config.cfg, see updateQuantiles in src/functions.cpp) :
+  0, 1 : exact quantiles. The history of the velocity at each depth is sorted (0) or kept
+         sorted (1), the quantiles are the values of rank idxInf and idxSup (quantileIndices)
+  2    : sketch. The values are counted in the buckets k = ceil(log(v)/log(gamma)) with
+         gamma = (1+accuracy)/(1-accuracy). The value returned for the bucket k is
+         2*gamma^k/(gamma+1) : its relative error is lower than QUANTILE_ACCURACY, whatever
+         the number of values (the number of buckets only depends on the velocity range)
+
+Used as a script it validates the quantiles of a run (qInfPI, qSupPI...) against the exact
+quantiles recomputed from the profiles history (written if WRITE_PROFILES_HISTORY = 1) :
+    ./quantiles.py OUTPUT_FILES/XXX
+
+"""
+### --- MODULES AND PACKAGES --- ###
+import os, sys
+import numpy as np # NumPy (multidimensional arrays, linear algebra, ...)
+import runStore # Binary run store (falls back on text files)
+import runConfig # Configuration of the run (config.cfg and config.XXX.dat)
+
+TEXT_PRECISION = 1e-5 # Relative precision of the values written in the text files (6 significant digits)
+
+def quantileIndices(nPoints, qp):
+    """ Return the ranks (0 : lowest value) of the lower and upper quantiles among nPoints
+    values, computed as in the program
+    """
+    nOut = int(nPoints*(1.0-qp)) # Number of points out of the quantile
+    idxInf = int(np.floor(nOut/2.0))
+    idxSup = min(nPoints-int(np.ceil(nOut/2.0)),nPoints-1)
+    return idxInf,idxSup
+
+def exactQuantiles(history, qp):
+    """ Return the exact quantiles (qInf,qSup) at each depth of the history of the profiles
+    (shape (nProfiles,nz))
+    """
+    history = np.asarray(history,dtype=float)
+    idxInf,idxSup = quantileIndices(len(history),qp)
+    sortedHistory = np.sort(history,axis=0)
+    return sortedHistory[idxInf],sortedHistory[idxSup]
+
+class QuantileSketch(object):
+    """ Sketch of a sequence of strictly positive values (see the header of this file) """
+    def __init__(self, accuracy):
+        self.gamma = (1.0+accuracy)/(1.0-accuracy)
+        self.buckets = {} # bucket -> number of values
+        self.count = 0
+
+    def add(self, values):
+        """ Add the values (a number or an array) """
+        values = np.atleast_1d(np.asarray(values,dtype=float))
+        keys,counts = np.unique(np.ceil(np.log(values)/np.log(self.gamma)).astype(int),return_counts=True)
+        for k,n in zip(keys,counts):
+            self.buckets[k] = self.buckets.get(k,0)+n
+        self.count += len(values)
+
+    def value(self, rank):
+        """ Return an estimation of the value of rank "rank" (0 : lowest value) """
+        keys = np.array(sorted(self.buckets))
+        cumulated = np.cumsum([self.buckets[k] for k in keys])
+        k = keys[np.searchsorted(cumulated,rank,side='right')]
+        return 2.0*self.gamma**k/(self.gamma+1.0)
+
+def sketchQuantiles(history, qp, accuracy):
+    """ Return the quantiles (qInf,qSup) at each depth of the history of the profiles
+    (shape (nProfiles,nz)) estimated with a sketch of relative accuracy "accuracy"
+    """
+    history = np.asarray(history,dtype=float)
+    idxInf,idxSup = quantileIndices(len(history),qp)
+    qInf = np.zeros(history.shape[1])
+    qSup = np.zeros(history.shape[1])
+    for iz in np.arange(history.shape[1]):
+        sketch = QuantileSketch(accuracy)
+        sketch.add(history[:,iz])
+        qInf[iz],qSup[iz] = sketch.value(idxInf),sketch.value(idxSup)
+    return qInf,qSup
+
+def referenceQuantiles(history, qp, estimator=2, accuracy=0.001):
+    """ Return the quantiles (qInf,qSup) that the estimator of the program should give """
+    if estimator == 2:
+        return sketchQuantiles(history,qp,accuracy)
+    return exactQuantiles(history,qp)
+
+def validate(pathToDir, code=None, verbose=False):
+    """ Compare the last quantiles written by the run with the reference and the exact quantiles
+    recomputed from its profiles history. Return a list of dictionaries (one per chain and wave
+    type) giving the maximum relative differences and whether they are acceptable ("ok")
+    """
+    config = runConfig.load(pathToDir,code)
+    code = config.code
+    estimator = 2 if config.quantileEstimator is None else config.quantileEstimator
+    accuracy = 0.001 if config.quantileAccuracy is None else config.quantileAccuracy
+    qp = config.qp
+    tolerance = TEXT_PRECISION # Precision of the outputs
+    if estimator == 2:
+        tolerance += accuracy
+    results = []
+    for wave in ["P","S"] if config.swaves else ["P"]:
+        for i in np.arange(config.nbt):
+            if not os.path.isfile(runStore.storeFile(pathToDir,code,"profiles"+wave+str(i))):
+                raise IOError("No profiles history in "+runStore.storeDir(pathToDir,code)+" (WRITE_PROFILES_HISTORY = 1 is needed)")
+            history = runStore.load(pathToDir,code,"profiles"+wave+str(i),mmap=True)
+            qInf = runStore.load(pathToDir,code,"qInf"+wave+str(i))[:,1]
+            qSup = runStore.load(pathToDir,code,"qSup"+wave+str(i))[:,1]
+            exactInf,exactSup = exactQuantiles(history,qp)
+            refInf,refSup = referenceQuantiles(history,qp,estimator,accuracy)
+            result = {"wave":wave,"chain":i,"nProfiles":len(history)}
+            result["errorReference"] = max(np.max(np.abs(qInf-refInf)/refInf),np.max(np.abs(qSup-refSup)/refSup))
+            result["errorExact"] = max(np.max(np.abs(qInf-exactInf)/exactInf),np.max(np.abs(qSup-exactSup)/exactSup))
+            result["ok"] = result["errorReference"] <= TEXT_PRECISION and result["errorExact"] <= tolerance
+            results.append(result)
+            if verbose:
+                print("  Chain "+str(i)+" ("+wave+" waves, "+str(len(history))+" profiles) : relative error %.3e (reference), %.3e (exact) -> " % (result["errorReference"],result["errorExact"])+("OK" if result["ok"] else "WRONG"))
+    return results
+
+if __name__ == '__main__':
+    import argparse # To deal with arguments :
+    # https://docs.python.org/2/library/argparse.html
+    parser = argparse.ArgumentParser(description='Validate the quantiles computed by a run against its profiles history')
+    parser.add_argument("pathToDir",
+                        help="Path to result directory (ex : OUTPUT_FILES/XXX)")
+    args = parser.parse_args()
+    if not os.path.isdir(args.pathToDir): # If the path does not exist
+        print("Directory "+args.pathToDir+" not found.")
+        parser.print_help()
+        sys.exit(0)
+    results = validate(args.pathToDir,verbose=True)
+    if all([result["ok"] for result in results]):
+        print("The quantiles are correct")
+    else:
+        print("Some quantiles are wrong")
+        sys.exit(1)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized downsampling (or upsampling) of curves defined as :
+  |       v[0]       |       v[1]       |        ...        |      v[nz-1]      |
+z[0]               z[1]               z[2]                z[nz-1]             z[nz]
+           |                  |        ...        |                   |
+           v                  v                   v                   v
+         zp[0]              zp[1]              zp[nz-2]              zp[nz-1]
+
+To obtain :
+  |         vp[0]         |         vp[0]        |  ... |     vp[nzFilt-1]      |
+zFilt[0]                zFilt[1]               zFilt[2] zFilt[nzFilt-1]      zFilt[nzFilt]
+              |                       |     ...      |              |
+              v                       v              v              v
+           zFiltp[0]                 zFiltp[1]  zFiltp[nzFilt-2] zFiltp[nzFilt-1]
+
+Two modes are available :
+  - "linear"  : vp is intrapolated linearly between the points zp (same as downSampleProfile
+                in src/functions.cpp)
+  - "average" : vp is the mean of v over the cell [zFilt[i],zFilt[i+1]] (v being constant on
+                each cell [z[i],z[i+1]])
+
+Every function works on whole arrays : v can be a single profile (shape (nz,)) or a batch of
+profiles sharing the same depths (shape (nProfiles,nz), or more generally (...,nz)).
+The intervals are found by binary search (np.searchsorted) : resampling is O(n log n).
+"""
+
+import numpy as np  # NumPy (multidimensional arrays, linear algebra, ...)
+
+def midPoints(z):
+    """ Return the middles of the cells defined by the borders z : zp[i] = (z[i]+z[i+1])/2 """
+    z = np.asarray(z,dtype=float)
+    return (z[1:]+z[:-1])/2.0
+
+def borders(zp):
+    """ Return the borders of the cells whose middles are zp (inverse of midPoints if the cells
+    are regular). The first and the last borders are at half a cell from zp[0] and zp[-1]
+    """
+    zp = np.asarray(zp,dtype=float)
+    if len(zp) < 2:
+        raise ValueError("At least two points are needed to define the borders")
+    z = np.empty(len(zp)+1)
+    z[1:-1] = midPoints(zp)
+    z[0] = zp[0]-(zp[1]-zp[0])/2.0
+    z[-1] = zp[-1]+(zp[-1]-zp[-2])/2.0
+    return z
+
+def findIntervals(array, values):
+    """ Returns the indices idxInf and idxSup of the sorted array verifying :
+        array[idxInf] < values <= array[idxSup]
+    for all the values at once (same result than find_interval in howWeIntrapolate.py and
+    findInterval in src/generalFunctions.cpp). For the values out of the array idxInf=idxSup=-1
+    """
+    array = np.asarray(array,dtype=float)
+    values = np.asarray(values,dtype=float)
+    idxSup = np.clip(np.searchsorted(array,values,side='left'),1,len(array)-1)
+    idxInf = idxSup-1
+    outside = (values < array[0]) | (values > array[-1])
+    idxInf[outside] = -1
+    idxSup[outside] = -1
+    return idxInf,idxSup
+
+def interpolate(zp, v, zNew):
+    """ Intrapolate linearly the profile(s) v defined at the points zp (increasing) on the points
+    zNew. v can be a batch of profiles (shape (...,len(zp))). The values out of [zp[0],zp[-1]]
+    are NaN
+    """
+    zp = np.asarray(zp,dtype=float)
+    v = np.asarray(v,dtype=float)
+    zNew = np.asarray(zNew,dtype=float)
+    idxInf,idxSup = findIntervals(zp,zNew)
+    outside = idxInf < 0
+    idxInf[outside] = 0
+    idxSup[outside] = 1
+    weights = (zNew-zp[idxInf])/(zp[idxSup]-zp[idxInf])
+    vNew = v[...,idxInf]+(v[...,idxSup]-v[...,idxInf])*weights
+    vNew[...,outside] = np.nan
+    return vNew
+
+def cellAverage(z, v, zFilt):
+    """ Average the piecewise constant profile(s) v (v[...,i] on [z[i],z[i+1]]) over the cells
+    [zFilt[j],zFilt[j+1]]. Return an array of shape (...,len(zFilt)-1). The cells of zFilt must
+    be inside [z[0],z[-1]] (NaN otherwise)
+    """
+    z = np.asarray(z,dtype=float)
+    v = np.asarray(v,dtype=float)
+    zFilt = np.asarray(zFilt,dtype=float)
+    # Integral of v from z[0] to z[i] (exactly linear between the borders) :
+    integral = np.zeros(v.shape[:-1]+(len(z),))
+    integral[...,1:] = np.cumsum(v*np.diff(z),axis=-1)
+    integralFilt = interpolate(z,integral,zFilt)
+    return np.diff(integralFilt,axis=-1)/np.diff(zFilt)
+
+def reSample(zp, v, nzFilt, mode="linear"):
+    """ Downsample (or upsample) the profile(s) v defined at the points zp on nzFilt-1 regular
+    cells between zp.min() and zp.max(). Return zFiltp (the middles of the new cells) and vFilt
+    (shape (...,nzFilt-1)). See the header of this file for the modes ("linear" or "average")
+    If nzFilt < nz => downsample
+    If nzFilt > nz => upsample
+    """
+    zp = np.asarray(zp,dtype=float)
+    zFilt = np.linspace(zp.min(),zp.max(),nzFilt)
+    zFiltp = midPoints(zFilt)
+    if mode == "linear":
+        return zFiltp,interpolate(zp,v,zFiltp)
+    elif mode == "average":
+        return zFiltp,cellAverage(borders(zp),v,zFilt)
+    raise ValueError("Unknown resampling mode : "+str(mode)+" (linear or average)")
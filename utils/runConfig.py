@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Configuration of a run read from OUTPUT_FILES/XXX/config.cfg and OUTPUT_FILES/XXX/config.XXX.dat.
+The keys of config.cfg are stored in the attributes of the Configuration structure of
+src/structures.h (ex : SWAVES -> config.swaves, NAME_OF_TIMES_FILE -> config.name_of_times_file)
+with the type used by the program. From config.XXX.dat are read : the energy of the prior (Ep),
+the number of temperatures (nbt), the maximum temperature (tmax) and the temperature ladder (T).
+
+The result of the parsing is cached in the cache directory of the user ($XDG_CACHE_HOME/IMCMCrun,
+~/.cache/IMCMCrun by default) with the modification times and sizes of the two files and of this
+module : they are parsed again only when one of them changes. Nothing is written in the run
+directories (they may be read-only, or examples under version control).
+
+Usage :
+    import runConfig
+    config = runConfig.load("OUTPUT_FILES/XXX")
+    if config.swaves:
+        ...
+"""
+### --- MODULES AND PACKAGES --- ###
+import os
+import re # Regular expressions
+import json # To store the cache
+import hashlib # To name the cache of each run
+import glob # Unix style pathname pattern expansion
+import numpy as np # NumPy (multidimensional arrays, linear algebra, ...)
+
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"),".cache"),"IMCMCrun")
+SOURCE = os.path.splitext(os.path.abspath(__file__))[0]+".py" # This module : the cache changes with the parsing (not the .pyc)
+if not os.path.isfile(SOURCE):
+    SOURCE = os.path.abspath(__file__)
+
+# Keys of config.cfg -> (attribute of the Configuration structure, type). See readConfFile in src/initializations.cpp
+KEYS = {"DATA_DIRECTORY" : ("filesDir",str),
+        "NPU" : ("npu",int),
+        "A_PRIOR" : ("A",float),
+        "N_PRIOR_PROFILES" : ("nPriorProfiles",int),
+        "SIGMAP" : ("sigmaP",float),
+        "SIGMAS" : ("sigmaS",float),
+        "DI" : ("di",float),
+        "DF" : ("df",float),
+        "QP" : ("qp",float),
+        "QUANTILE_ESTIMATOR" : ("quantileEstimator",int),
+        "QUANTILE_ACCURACY" : ("quantileAccuracy",float),
+        "WEIGHTS_ACCUMULATOR" : ("weightsAccumulator",int),
+        "HISTORY_POLICY" : ("historyPolicy",int),
+        "HISTORY_THINNING" : ("historyThinning",int),
+        "HISTORY_SIZE" : ("historySize",int),
+        "CHECKPOINT_ITERATIONS" : ("checkpointIterations",int),
+        "FLUSH_ITERATIONS" : ("flushIterations",int),
+        "FLUSH_SECONDS" : ("flushSeconds",int),
+        "WAVELET_PARAMETERIZATION" : ("waveletParameterization",bool),
+        "USE_ALL_WAVELETS" : ("useAllWavelets",bool),
+        "KEEP_FIRST_VALUES" : ("keep_first_values",int),
+        "NAME_OF_REAL_PROFILE_FILE_P" : ("name_of_real_profile_P",str),
+        "NAME_OF_REAL_PROFILE_FILE_S" : ("name_of_real_profile_S",str),
+        "NAME_OF_FIRST_GUESS_P_FILE" : ("name_of_first_guess_P_file",str),
+        "NAME_OF_FIRST_GUESS_S_FILE" : ("name_of_first_guess_S_file",str),
+        "NAME_OF_TIMES_FILE" : ("name_of_times_file",str),
+        "NAME_OF_STATIONS_FILE" : ("name_of_stations_file",str),
+        "NAME_OF_SHOTS_FILE" : ("name_of_shots_file",str),
+        "NAME_OF_PRIOR_FEATURES_FILE" : ("name_of_prior_features_file",str),
+        "NSWEEPS" : ("nSweeps",int),
+        "EPSIN" : ("epsin",float),
+        "EIKONAL_MODE" : ("eikonalMode",int),
+        "EIKONAL_THREADS" : ("eikonalThreads",int),
+        "NBT" : ("nbt",int),
+        "PARALLEL_CHAINS" : ("parallelChains",int),
+        "TMAX" : ("tmax",float),
+        "NIT" : ("nit",int),
+        "PEE" : ("pee",float),
+        "NC" : ("nc",list),
+        "WAVELET" : ("wavelet",str),
+        "NDWTS" : ("ndwts",int),
+        "WAVELET_CONVOLUTION" : ("waveletConvolution",int),
+        "WAVELET_SYNTHESIS" : ("waveletSynthesis",bool),
+        "SWAVES" : ("swaves",bool),
+        "VERBOSE1" : ("verbose1",bool),
+        "VERBOSE2" : ("verbose2",bool),
+        "VIEW" : ("view",int),
+        "COORD_TOL" : ("coordTol",float),
+        "BUILD_PRIOR" : ("buildPrior",bool),
+        "FIND_OPTIMUM_GRID" : ("findOptimumGrid",bool),
+        "SHOT_NUMBER_REF" : ("shotNumberRef",int),
+        "NXREF" : ("nxref",int),
+        "NYREF" : ("nyref",int),
+        "NX_DEFAULT" : ("nxDefault",int),
+        "NY_DEFAULT" : ("nyDefault",int),
+        "NZFILT_DEFAULT" : ("nzfiltDefault",int),
+        "ANALYTICAL_RUN" : ("analyticalRun",bool),
+        "RECALCULATE_T0" : ("recalculateT0",bool),
+        "USE_DEFAULT_SEED" : ("useDefaultSeed",bool),
+        "DEFAULT_SEED" : ("defaultSeed",int),
+        "TEST" : ("test",bool),
+        "MIN_E_TEST" : ("minEtest",float),
+        "MAX_E_TEST" : ("maxEtest",float),
+        "N_BEST_PROFILES" : ("nBestProfiles",int),
+        "COMPUTE_RESIDUALS" : ("computeResiduals",bool),
+        "ITERATIONS_RESIDUALS" : ("iterationsResiduals",int),
+        "ITERATIONS_BEST_PROFILES" : ("iterationsBestProfiles",int),
+        "ITERATIONS_AVERAGES" : ("iterationsAverages",int),
+        "ONLY_CALCULATE_TIMES_FOR_FIRST_GUESS" : ("calculateTimesForFirstGuess",bool),
+        "RESAMPLE" : ("resample",bool),
+        "WRITE_RUN_STORE" : ("writeRunStore",bool),
+        "WRITE_PROFILES_HISTORY" : ("writeProfilesHistory",bool),
+        "TIMES_CACHE_SIZE" : ("timesCacheSize",int),
+        "NXVEC" : ("nxVec",list),
+        "NYVEC" : ("nyVec",list),
+        "NZFILTVEC" : ("nzFiltVec",list)}
+
+class RunConfig(object):
+    """ Configuration of a run (see the header of this file). The keys missing in config.cfg
+    are None
+    """
+    def __init__(self, values):
+        for attribute,kind in KEYS.values():
+            setattr(self,attribute,None)
+        self.code = None
+        self.Ep = None
+        self.nbt = None
+        self.tmax = None
+        self.T = np.zeros(0)
+        for attribute,value in values.items():
+            setattr(self,attribute,value)
+        self.T = np.array(self.T,dtype=float)
+
+    def values(self):
+        """ Return the attributes as a dictionary that can be stored in json """
+        values = dict(self.__dict__)
+        values["T"] = [float(t) for t in self.T]
+        return values
+
+def convert(value, kind):
+    """ Convert the string value read in config.cfg to the type kind (like atoi/atof do in the
+    program). Return None if it is not possible
+    """
+    try:
+        if kind is bool:
+            return int(value) == 1
+        if kind is int:
+            return int(value)
+        if kind is float:
+            return float(value)
+        if kind is list: # Comma separated values
+            return [float(v) for v in value.split(",") if v.strip()]
+    except ValueError:
+        return None
+    return value
+
+def parseConfigCfg(nameOfFile):
+    """ Parse config.cfg (same rules than src/configFileParser.h : KEY = value # comment).
+    Return a dictionary attribute -> value
+    """
+    values = {}
+    with open(nameOfFile) as configFile:
+        for line in configFile:
+            line = line.split("#")[0]
+            if "=" not in line:
+                continue
+            key,value = line.split("=",1)
+            key = key.strip()
+            if key in KEYS:
+                attribute,kind = KEYS[key]
+                values[attribute] = convert(value.strip(),kind)
+    return values
+
+def parseConfigDat(nameOfFile):
+    """ Parse config.XXX.dat. Return a dictionary containing Ep, nbt, tmax and T (the values that
+    have not been written yet are missing)
+    """
+    values = {}
+    with open(nameOfFile) as outConfigFile:
+        for line in outConfigFile:
+            if 'Energy of the prior : ' in line:
+                values["Ep"] = convert(line.split(":")[1].strip(),float)
+            elif 'temperatures : ' in line:
+                values["nbt"] = convert(line.split(":")[-1].strip(),int)
+            elif 'Temperature max : ' in line:
+                values["tmax"] = convert(line.split(":")[-1].strip(),float)
+            elif 'Temperature ladder : ' in line: # T[0] = 1  T[1] = 14.1421  T[2] = 200
+                ladder = re.findall(r"T\[(\d+)\] = (\S+)",line)
+                T = [0.0]*len(ladder)
+                for i,t in ladder:
+                    T[int(i)] = float(t)
+                values["T"] = T
+    return values
+
+def findCode(pathToDir):
+    """ Return the code XXX of the run whose results are in pathToDir (None if
+    it can not be found)
+    """
+    files = glob.glob1(pathToDir,"config.*.dat")
+    if files:
+        return files[0].split('.')[1]
+    return None
+
+def cacheFile(pathToDir, code):
+    """ Path to the cache of the configuration of the run XXX (named after the absolute path of
+    its config.XXX.dat)
+    """
+    path = os.path.abspath(os.path.join(pathToDir,"config."+code+".dat"))
+    if not isinstance(path,bytes):
+        path = path.encode("utf-8")
+    return os.path.join(CACHE_DIR,"runConfig."+code+"."+hashlib.sha1(path).hexdigest()+".json")
+
+def fileStamps(pathToDir, code):
+    """ Modification times and sizes of config.cfg, config.XXX.dat and of this module (used to
+    validate the cache)
+    """
+    stamps = []
+    for name in [os.path.join(pathToDir,"config.cfg"),os.path.join(pathToDir,"config."+code+".dat"),SOURCE]:
+        stat = os.stat(name)
+        stamps.append([os.path.basename(name),stat.st_mtime,stat.st_size])
+    return stamps
+
+def load(pathToDir, code=None, useCache=True):
+    """ Return the RunConfig of the run whose results are in pathToDir. The cache is used if it
+    is up to date, otherwise the files are parsed and the cache is (re)written
+    """
+    if code is None:
+        code = findCode(pathToDir)
+        if code is None:
+            raise IOError("No config.XXX.dat found in "+pathToDir)
+    stamps = fileStamps(pathToDir,code)
+    if useCache and os.path.isfile(cacheFile(pathToDir,code)):
+        try:
+            with open(cacheFile(pathToDir,code)) as f:
+                cache = json.load(f)
+            if cache["stamps"] == stamps:
+                return RunConfig(cache["values"])
+        except (ValueError,KeyError): # Corrupted cache : it is rewritten
+            pass
+    values = parseConfigCfg(os.path.join(pathToDir,"config.cfg"))
+    values.update(parseConfigDat(os.path.join(pathToDir,"config."+code+".dat")))
+    values["code"] = code
+    config = RunConfig(values)
+    if useCache:
+        try:
+            if not os.path.isdir(CACHE_DIR):
+                os.makedirs(CACHE_DIR)
+            with open(cacheFile(pathToDir,code),"w") as f:
+                json.dump({"stamps":stamps,"values":config.values()},f)
+        except (IOError,OSError): # The cache directory is not writable : no cache
+            pass
+    return config
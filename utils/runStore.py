@@ -0,0 +1,229 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Access to the binary run store written by the program in OUTPUT_FILES/XXX/runStoreXXX/
+(if WRITE_RUN_STORE = 1 in config.cfg). Each output of the run is stored as a NumPy .npy
+file (double precision) named as the text file without the run code :
+    chain0.XXX.dat -> runStoreXXX/chain0.npy
+    minP.1.XXX.dat -> runStoreXXX/minP.1.npy
+    sci.XXX.dat    -> runStoreXXX/sci.npy
+The arrays have the same shape than the ones given by np.loadtxt on the text files.
+For the runs that do not have a store, load() falls back on the text files.
+
+The histories of the chains are stored together in runStoreXXX/chains.bin : a header of
+CHAINS_HEADER_SIZE bytes (magic string "IMCHAINS", version, npu, nbt and swaves as 4 bytes
+integers and the dtype of the values) followed by a C ordered array of shape
+(number of iterations, nbt, number of parameters + 1). chainsHistory() memory maps it so
+that only the pages corresponding to the iterations and columns asked are read :
+    energies = chainsHistory(pathToDir,code)[1000:,2,-1] # Energies of chain 2 from iteration 1000
+
+Used as a script it creates the store of an old run from its text files :
+    ./runStore.py OUTPUT_FILES/XXX
+
+"""
+### --- MODULES AND PACKAGES --- ###
+import os, sys
+import glob # Unix style pathname pattern expansion
+import re # Regular expressions
+import numpy as np # NumPy (multidimensional arrays, linear algebra, ...)
+import runConfig # Configuration of the run (config.cfg and config.XXX.dat)
+
+CHAINS_HEADER_SIZE = 64 # Size (in bytes) of the header of chains.bin (see src/defines.h)
+
+class LazyList(object):
+    """ List of n outputs : the element i is loaded by load(i) the first time it is used
+    (ex : LazyList(lambda i: load(pathToDir,code,"averageP"+str(i)),nbt))
+    """
+    def __init__(self, load, n):
+        self.load = load
+        self.values = [None]*n
+        self.loaded = [False]*n
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        if not self.loaded[i]:
+            self.values[i] = self.load(i)
+            self.loaded[i] = True
+        return self.values[i]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+class LazyFiles(object):
+    """ Set of outputs : the output associated to an attribute is loaded the first time the
+    attribute is used (ex : files.add("ll",lambda: load(pathToDir,code,"ll")) then files.ll)
+    """
+    def __init__(self):
+        self.loaders = {}
+
+    def add(self, name, load):
+        """ Register the function loading the attribute name """
+        self.loaders[name] = load
+
+    def __getattr__(self, name): # Called only if the attribute has not been loaded yet
+        if name == "loaders" or name not in self.loaders:
+            raise AttributeError(name)
+        value = self.loaders[name]()
+        setattr(self,name,value)
+        return value
+
+def numberOfIterations(pathToDir,code):
+    """ Return the number of iterations done by the run XXX without loading the chains """
+    if os.path.isfile(chainsFile(pathToDir,code)):
+        return len(chainsHistory(pathToDir,code))
+    with open(textFile(pathToDir,code,"chain0")) as f:
+        return sum(1 for line in f)
+
+def findCode(pathToDir):
+    """ Return the code XXX of the run whose results are in pathToDir (None if
+    it can not be found)
+    """
+    for pattern in ["stats0.*","calculatedTimes.*","config.*.dat"]:
+        files = glob.glob1(pathToDir,pattern)
+        if files:
+            return files[0].split('.')[1]
+    return None
+
+def storeDir(pathToDir,code):
+    """ Path to the binary run store of the run XXX """
+    return os.path.join(pathToDir,"runStore"+code)
+
+def storeFile(pathToDir,code,name):
+    """ Path to the .npy file storing the output "name" (ex: "chain0") """
+    return os.path.join(storeDir(pathToDir,code),name+".npy")
+
+def textFile(pathToDir,code,name):
+    """ Path to the text file storing the output "name" (ex: "chain0") """
+    return os.path.join(pathToDir,name+"."+code+".dat")
+
+def exists(pathToDir,code,name):
+    """ Return True if the output "name" has been written (in binary or text format) """
+    return os.path.isfile(storeFile(pathToDir,code,name)) or \
+           os.path.isfile(textFile(pathToDir,code,name))
+
+def chainsFile(pathToDir,code):
+    """ Path to the file storing the histories of the chains """
+    return os.path.join(storeDir(pathToDir,code),"chains.bin")
+
+def readChainsHeader(pathToDir,code):
+    """ Return the header of chains.bin as a dictionary (keys : version, npu, nbt, swaves, dtype)
+    """
+    with open(chainsFile(pathToDir,code),"rb") as f:
+        header = f.read(CHAINS_HEADER_SIZE)
+    if len(header) < CHAINS_HEADER_SIZE or header[:8] != b"IMCHAINS":
+        raise IOError(chainsFile(pathToDir,code)+" is not a chains history file")
+    dtype = np.dtype(header[24:32].split(b"\0")[0].decode("ascii"))
+    version,npu,nbt,swaves = np.frombuffer(header[8:24],dtype=dtype.byteorder+"i4")
+    return {"version":int(version),"npu":int(npu),"nbt":int(nbt),"swaves":bool(swaves),"dtype":dtype}
+
+def loadChainsTexts(pathToDir,code):
+    """ Load the text files chainI.XXX.dat. Return the list of the histories of the chains
+    """
+    chains = []
+    while os.path.isfile(textFile(pathToDir,code,"chain"+str(len(chains)))):
+        chains.append(np.loadtxt(textFile(pathToDir,code,"chain"+str(len(chains))),ndmin=2))
+    return chains
+
+def stackChains(chains):
+    """ Stack the histories of the chains in an array of shape (number of iterations, nbt,
+    number of parameters + 1). The longer histories are truncated to the shortest one
+    """
+    nit = min([len(chain) for chain in chains])
+    return np.ascontiguousarray(np.stack([chain[:nit] for chain in chains],axis=1),dtype=np.float64)
+
+def chainsHistory(pathToDir,code):
+    """ Memory map the histories of the chains of the run XXX. Return a read-only array of shape
+    (number of iterations, nbt, number of parameters + 1), the last column being the energy :
+    nothing is read before the array is sliced. For the runs without chains.bin the text files
+    are loaded instead (None is returned if there are none)
+    """
+    if not os.path.isfile(chainsFile(pathToDir,code)):
+        chains = loadChainsTexts(pathToDir,code)
+        if not chains:
+            return None
+        return stackChains(chains)
+    header = readChainsHeader(pathToDir,code)
+    nColumns = header["npu"]*(2 if header["swaves"] else 1)+1
+    lineSize = header["nbt"]*nColumns*header["dtype"].itemsize
+    nit = (os.path.getsize(chainsFile(pathToDir,code))-CHAINS_HEADER_SIZE)//lineSize # (A line partially written is ignored)
+    if nit == 0:
+        return np.zeros((0,header["nbt"],nColumns),dtype=header["dtype"])
+    return np.memmap(chainsFile(pathToDir,code),dtype=header["dtype"],mode='r',
+                     offset=CHAINS_HEADER_SIZE,shape=(nit,header["nbt"],nColumns))
+
+def load(pathToDir,code,name,mmap=False):
+    """ Load the output "name" of the run XXX (ex: "averageP2", "minP.1", "sci").
+    The .npy file of the store is used if it exists, otherwise the text file.
+    If mmap is True the .npy file is memory mapped instead of being read
+    """
+    isChain = re.match(r"^chain(\d+)$",name)
+    if isChain and os.path.isfile(chainsFile(pathToDir,code)):
+        history = chainsHistory(pathToDir,code)[:,int(isChain.group(1)),:]
+        if mmap:
+            return history
+        return np.array(history)
+    npyFile = storeFile(pathToDir,code,name)
+    if os.path.isfile(npyFile):
+        if mmap:
+            return np.load(npyFile,mmap_mode='r')
+        return np.load(npyFile)
+    return np.loadtxt(textFile(pathToDir,code,name))
+
+def writeChainsHistory(pathToDir,code,chains,npu,swaves):
+    """ Write chains.bin from the list of the histories of the chains (the longer ones are
+    truncated to the shortest)
+    """
+    history = stackChains(chains)
+    byteOrder = "<" if sys.byteorder == "little" else ">"
+    header = np.zeros(CHAINS_HEADER_SIZE,dtype=np.uint8)
+    header[:8] = np.frombuffer(b"IMCHAINS",dtype=np.uint8)
+    header[8:24] = np.frombuffer(np.array([1,npu,len(chains),int(swaves)],dtype=byteOrder+"i4").tobytes(),dtype=np.uint8)
+    header[24:27] = np.frombuffer((byteOrder+"f8").encode("ascii"),dtype=np.uint8)
+    with open(chainsFile(pathToDir,code),"wb") as f:
+        f.write(header.tobytes())
+        f.write(history.tobytes())
+
+def createStore(pathToDir,code,verbose=False):
+    """ Create the binary run store of the run XXX from its text files
+    """
+    if not os.path.isdir(storeDir(pathToDir,code)):
+        os.makedirs(storeDir(pathToDir,code))
+    suffix = "."+code+".dat"
+    chains = loadChainsTexts(pathToDir,code)
+    if chains:
+        swaves = runConfig.load(pathToDir,code).swaves
+        npu = (chains[0].shape[1]-1)//(2 if swaves else 1)
+        if verbose:
+            print("  chain[0-"+str(len(chains)-1)+"]"+suffix+" -> "+os.path.basename(chainsFile(pathToDir,code)))
+        writeChainsHistory(pathToDir,code,chains,npu,swaves)
+    for fileName in sorted(glob.glob1(pathToDir,"*"+suffix)):
+        name = fileName[:-len(suffix)]
+        if name == "config" or (name.startswith("best") and name != "bestModelTimes") or re.match(r"^chain\d+$",name):
+            continue
+        if verbose:
+            print("  "+fileName+" -> "+os.path.basename(storeFile(pathToDir,code,name)))
+        np.save(storeFile(pathToDir,code,name),np.loadtxt(os.path.join(pathToDir,fileName)))
+
+if __name__ == '__main__':
+    import argparse # To deal with arguments :
+    # https://docs.python.org/2/library/argparse.html
+    parser = argparse.ArgumentParser(description='Create the binary run store of a run from its text files')
+    parser.add_argument("pathToDir",
+                        help="Path to result directory (ex : OUTPUT_FILES/XXX)")
+    parser.add_argument("-v","--verbose", help="Increase output verbosity",
+                        action="store_true")
+    args = parser.parse_args()
+    if not os.path.isdir(args.pathToDir): # If the path does not exist
+        print("Directory "+args.pathToDir+" not found.")
+        parser.print_help()
+        sys.exit(0)
+    code = findCode(args.pathToDir)
+    if code is None:
+        print("Directory "+args.pathToDir+" does not seem to be a correct IMCMC directory...")
+        sys.exit(0)
+    createStore(args.pathToDir,code,args.verbose)
+    if args.verbose:
+        print("Store created in "+storeDir(args.pathToDir,code))
@@ -19,22 +19,28 @@ import numpy as np # NumPy (multidimensional arrays, linear algebra, ...)
 import glob # Unix style pathname pattern expansion
 from mpl_toolkits.mplot3d import Axes3D
 import matplotlib.pyplot as plt # Matplotlib's pyplot: MATLAB-like syntax
+import runStore # Binary run store (falls back on text files)
+import runConfig # Configuration of the run (config.cfg and config.XXX.dat)
+import density # Density images (see density.py)
 
 def pdense(x, y, sigma, M=1000):
     """ Plot probability density of y with known stddev sigma
+    (M is the maximum number of points used along the velocity axis, see density.adaptiveM)
     """
     assert len(x) == len(y) and len(x) == len(sigma)
-    N = len(x)
     # TODO: better y ranging
-    ymin, ymax = min(y - 2 * sigma), max(y + 2 * sigma)
-    yy = np.linspace(ymin, ymax, M)
-    a = [np.exp(-((Y - yy) / s) ** 2) / s for Y, s in zip(y, sigma)]
-    A = np.array(a)
-    A = A.reshape(N, M)
+    A, ymin, ymax = density.gaussianDensity(y, sigma, density.adaptiveM(plt.gca(), M), densityType)
     plt.imshow(-A, cmap='gray', aspect='auto',
                origin='upper', extent=(ymin,ymax,max(x),min(x)))
    # plt.title('Density plot')
 
+def phist(x, profiles, M=1000):
+    """ Plot the density of a set of profiles (list of arrays of the same size than x)
+    """
+    A, ymin, ymax = density.histogramDensity(profiles, density.adaptiveM(plt.gca(), M), dtype=densityType)
+    plt.imshow(-A, cmap='gray', aspect='auto',
+               origin='upper', extent=(ymin,ymax,max(x),min(x)))
+
 def representsInt(s):
     try:
         int(s)
@@ -72,6 +78,13 @@ parser.add_argument("--show_averages", help="Show average models on plots",
                     action="store_true", default=False)
 parser.add_argument("--no_density_plots", help="Represent uncertainties by a range",
                     action="store_true", default=False)
+parser.add_argument("--float32_density", help="Compute the density plots in single precision (faster)",
+                    action="store_true", default=False)
+parser.add_argument("--profiles_density", help="Represent the prior profiles by their density instead of lines",
+                    action="store_true", default=False)
+parser.add_argument("--posterior_histogram", help="Represent the uncertainties of each chain by the histogram of its profiles \
+(stored if WRITE_PROFILES_HISTORY = 1) instead of its quantiles",
+                    action="store_true", default=False)
 parser.add_argument("-r","--results", help="Plot the results from the inversion",
                     action="store_true", default=False)
 parser.add_argument("--resultsChain",type=int,
@@ -90,8 +103,34 @@ parser.add_argument("--filtering", help="Show optimum filtering",
                     action="store_true")
 parser.add_argument("--paper", help="Plot the figures for the paper",
                     action="store_true")
+parser.add_argument("--batch", help="pathToDir contains many runs (ex : OUTPUT_FILES) : write a \
+comparison table and a figure per run (see watchRuns.py)",
+                    action="store_true")
+parser.add_argument("-j","--jobs",type=int,
+                    help="Number of processes used in batch mode (default : number of cores)",default=None)
+parser.add_argument("--headless",metavar="FIGURES_DIR",
+                    help="Don't display anything : each group of plots is drawn by its own process (without LaTeX) \
+and the figures are saved in FIGURES_DIR as group.XXX.N.png",default=None)
+parser.add_argument("-f","--follow", help="Monitor a running inversion : the energies, rates, importance weights \
+and global average profiles are updated every INTERVAL seconds until the run ends (see follow.py)",
+                    action="store_true")
+parser.add_argument("--interval",type=float,
+                    help="Time between two updates in seconds for --follow",default=10.0)
 args = parser.parse_args()
 
+plotGroups=["energies","geometry","data","results","best","vpvs","filtering","swaps","paper"] # Plotted by different processes in headless mode
+useTex=True # LaTeX is used to render the texts (mathtext in headless mode)
+percent="\%" # To write a % sign with usetex=True
+densityType=np.float64 # Precision of the density plots
+if args.float32_density:
+    densityType=np.float32
+if args.headless:
+    plt.switch_backend('Agg') # No display
+    useTex=False
+    percent="%"
+    if not os.path.isdir(args.headless):
+        os.makedirs(args.headless)
+
 ### --- Test arguments --- ###
 
 if not os.path.isdir(args.pathToDir): # If the path does not exist
@@ -100,6 +139,10 @@ if not os.path.isdir(args.pathToDir): # If the path does not exist
     sys.exit(0)
 if args.pathToDir[-1:] != '/': # add a / at the end of the path if necessary
     args.pathToDir+='/'
+if args.batch:
+    import watchRuns
+    watchRuns.watchRuns(args.pathToDir,args.jobs,True,args.verbose)
+    sys.exit(0)
 code = glob.glob1(args.pathToDir,"stats0.*")[0].split('.')[1]
 #args.pathToDir.split("/")[-2] # just keep the name of the directory
 if not representsInt(code):
@@ -107,88 +150,33 @@ if not representsInt(code):
 directory... (no stats0 found)"
     sys.exit(0)
 
-if not (args.all or args.data or args.geometry or args.energies or args.results or args.best or (args.resultsChain != -1) or args.filtering or args.swaps or args.vpvs or args.paper):
+if not (args.all or args.data or args.geometry or args.energies or args.results or args.best or (args.resultsChain != -1) or args.filtering or args.swaps or args.vpvs or args.paper or args.follow):
     print "Nothing has to be done!"
     sys.exit(0)
 
 ### --- Load files --- ###
 
-# Extract informations from config.XXX.dat :
-# TODO : read the cfg file
-
-T = np.zeros(0)
-with open(args.pathToDir+'config.cfg') as configFile:
-    for line in configFile:
-        if line.split('#')[0].strip(): # If the line is not a comment
-            if 'SWAVES' in line:
-                if line.split(" = ")[1].split("#")[0].strip() == "1":
-                    swaves=True
-                else:
-                    swaves=False
-            if 'ANALYTICAL_RUN' in line:
-                if line.split(" = ")[1].split("#")[0].strip() == "1":
-                    analytical=True
-                else:
-                    analytical=False
-            if 'RECALCULATE_T0' in line:
-                if line.split(" = ")[1].split("#")[0].strip() == "1":
-                    recalculate_t0=True
-                else:
-                    recalculate_t0=False
-            if 'QP =' in line:
-                qp = line.split(" = ")[1].split("#")[0].strip()
-            if 'NAME_OF_FIRST_GUESS_P_FILE' in line:
-                nameOfFirstGuessP = line.split(" = ")[1].split("#")[0].strip()
-            if 'NAME_OF_FIRST_GUESS_S_FILE' in line:
-                nameOfFirstGuessS = line.split(" = ")[1].split("#")[0].strip()
-            if 'NAME_OF_REAL_PROFILE_FILE_P' in line:
-                nameOfrealP = line.split(" = ")[1].split("#")[0].strip()
-            if 'NAME_OF_REAL_PROFILE_FILE_S' in line:
-                nameOfrealS = line.split(" = ")[1].split("#")[0].strip()
-            if 'N_PRIOR_PROFILES' in line:
-                nPriorProfiles = line.split(" = ")[1].split("#")[0].strip()
-                if representsInt(nPriorProfiles): # Verify that the string extracted is a int
-                    nPriorProfiles = int(nPriorProfiles)
-            if 'NAME_OF_STATIONS_FILE' in line:
-                nameOfStationsFile = line.split(" = ")[1].split("#")[0].strip()
-            if 'NAME_OF_SHOTS_FILE' in line:
-                nameOfShotsFile = line.split(" = ")[1].split("#")[0].strip()
-            if 'NAME_OF_TIMES_FILE =' in line:
-                nameOfTimesFile = line.split(" = ")[1].split("#")[0].strip()
-            if 'SIGMAP =' in line:
-                sigmaP = line.split(" = ")[1].split("#")[0].strip()
-                if representsFloat(sigmaP): # Verify that the string extracted is a int
-                    sigmaP = float(sigmaP)
-            if 'SIGMAS =' in line:
-                sigmaS = line.split(" = ")[1].split("#")[0].strip()
-                if representsFloat(sigmaS): # Verify that the string extracted is a int
-                    sigmaS = float(sigmaS)
-            if 'COORD_TOL =' in line:
-                coord_tol = line.split(" = ")[1].split("#")[0].strip()
-                if representsFloat(coord_tol): # Verify that the string extracted is a int
-                    coord_tol = float(coord_tol)
-
-with open(args.pathToDir+'config.'+code+'.dat') as outConfigFile:
-    for line in outConfigFile:
-        if 'Energy of the prior : ' in line:
-            ep=line.split(":")[1].strip("\n").strip()
-            if representsFloat(ep): # Verify that the string extracted is a int
-                ep = float(ep)
-        if 'temperatures : ' in line:
-            # Extract the number of temperatures from the line :
-            nbt=(line.split(":")[-1]).split("\n")[0].strip()
-            if representsInt(nbt): # Verify that the string extracted is a int
-                nbt = int(nbt)
-                T=np.resize(T,nbt)
-        if 'Temperature max : ' in line:
-            # Extract temperature max from the line :
-            tmax=(line.split(":")[-1]).split("\n")[0].strip()
-            if representsInt(tmax): # Verify that the string extracted is a int
-                tmax = int(tmax)
-        if 'Temperature ladder : ' in line: # Extract temperature ladder from line
-            T[nbt-1]=line.split("T["+str(nbt-1)+"] = ")[1].strip("\n").strip()
-            for i in np.arange(nbt-1):
-                T[i]=line.split("T["+str(i)+"] = ")[1].split("T["+str(i+1)+"] = ")[0].strip()
+# Extract informations from config.cfg and config.XXX.dat (see runConfig.py) :
+config=runConfig.load(args.pathToDir,code)
+swaves=config.swaves
+analytical=config.analyticalRun
+recalculate_t0=config.recalculateT0
+qp=str(config.qp)
+nameOfFirstGuessP=config.name_of_first_guess_P_file
+nameOfFirstGuessS=config.name_of_first_guess_S_file
+nameOfrealP=config.name_of_real_profile_P
+nameOfrealS=config.name_of_real_profile_S
+nPriorProfiles=config.nPriorProfiles
+nameOfStationsFile=config.name_of_stations_file
+nameOfShotsFile=config.name_of_shots_file
+nameOfTimesFile=config.name_of_times_file
+sigmaP=config.sigmaP
+sigmaS=config.sigmaS
+coord_tol=config.coordTol
+ep=config.Ep
+nbt=config.nbt
+tmax=config.tmax
+T=config.T
 
 if args.verbose:
     print "Watching the results of run : ",code,"..."
@@ -200,86 +188,66 @@ if args.verbose:
     for i in np.arange(nbt):
         print " T[",i,"] = ",T[i],
     print
-    print "Loading files ..."
+    if not args.follow:
+        print "Loading files ..."
+
+if args.follow: # Live monitoring : the files are tailed instead of being loaded
+    import follow
+    follow.follow(args.pathToDir,code,config,args.interval,args.headless,args.verbose)
+    sys.exit(0)
 
 ### --- Load files --- ###
-# declare empty list to store files :
+# The files are loaded the first time they are used (see LazyList and LazyFiles in runStore.py) :
+# the plots not asked don't read anything
 M=1000 # For density plot
-averagesP=[0]*nbt # declare empty list to store files :
-averagesS=[0]*nbt
-chains=[0]*nbt
-varPs=[0]*nbt
-varSs=[0]*nbt
-qInfPs=[0]*nbt
-qSupPs=[0]*nbt
-qInfSs=[0]*nbt
-qSupSs=[0]*nbt
-minP=[0]*nbt
-minS=[0]*nbt
-maxP=[0]*nbt
-maxS=[0]*nbt
-priorP=[0]*nPriorProfiles
-priorS=[0]*nPriorProfiles
-timesData=[0]
-nFiltered=len(glob.glob1(args.pathToDir,"filteredFirstGuessP.*"))
-filteredPcurve=[0]*nFiltered
-waveletFiltered=[""]*nFiltered
-filteredScurve=[0]*nFiltered
-
-# Loop on temperature chains
-for i in np.arange(nbt):
-    averagesP[i]=np.loadtxt(args.pathToDir+"averageP"+str(i)+"."+code+".dat")
-    chains[i]=np.loadtxt(args.pathToDir+"chain"+str(i)+"."+code+".dat")
-    varPs[i]=np.loadtxt(args.pathToDir+"varP"+str(i)+"."+code+".dat")
-    qSupPs[i]=np.loadtxt(args.pathToDir+"qSupP"+str(i)+"."+code+".dat")
-    qInfPs[i]=np.loadtxt(args.pathToDir+"qInfP"+str(i)+"."+code+".dat")
-    minP[i]=np.loadtxt(args.pathToDir+"minP."+str(i)+"."+code+".dat")
-    maxP[i]=np.loadtxt(args.pathToDir+"maxP."+str(i)+"."+code+".dat")
-    if swaves:
-        averagesS[i]=np.loadtxt(args.pathToDir+"averageS"+str(i)+"."+code+".dat")
-        varSs[i]=np.loadtxt(args.pathToDir+"varS"+str(i)+"."+code+".dat")
-        qSupSs[i]=np.loadtxt(args.pathToDir+"qSupS"+str(i)+"."+code+".dat")
-        qInfSs[i]=np.loadtxt(args.pathToDir+"qInfS"+str(i)+"."+code+".dat")
-        minS[i]=np.loadtxt(args.pathToDir+"minS."+str(i)+"."+code+".dat")
-        maxS[i]=np.loadtxt(args.pathToDir+"maxS."+str(i)+"."+code+".dat")
-for i,filteredGuessPCurve in enumerate(glob.glob1(args.pathToDir,"filteredFirstGuessP.*")):
-  waveletFiltered[i]=filteredGuessPCurve.split('.')[1]
-  filteredPcurve[i] = np.loadtxt(args.pathToDir+filteredGuessPCurve)
-for i,filteredGuessSCurve in enumerate(glob.glob1(args.pathToDir,"filteredFirstGuessS.*")):
-  filteredScurve[i] = np.loadtxt(args.pathToDir+filteredGuessSCurve)
-globalAverageP=np.loadtxt(args.pathToDir+"globalAverageP."+code+".dat")
-globalVarP=np.loadtxt(args.pathToDir+"globalVarP."+code+".dat")
-globalMaxP=np.loadtxt(args.pathToDir+"maxP."+code+".dat") #TODO don't forget them
-globalMinP=np.loadtxt(args.pathToDir+"minP."+code+".dat")
-if swaves:
-    globalMaxS=np.loadtxt(args.pathToDir+"maxS."+code+".dat")
-    globalMinS=np.loadtxt(args.pathToDir+"minS."+code+".dat")
-    globalAverageS=np.loadtxt(args.pathToDir+"globalAverageS."+code+".dat")
-    globalVarS=np.loadtxt(args.pathToDir+"globalVarS."+code+".dat")
-    globalVarVpVs=np.loadtxt(args.pathToDir+"globalVarVpVs."+code+".dat")
+def lazyOutputs(name,wave=True):
+    """ Outputs name+str(i) of the chains (None if it is an S wave output and S waves were not calculated) """
+    return runStore.LazyList(lambda i: runStore.load(args.pathToDir,code,name+str(i)) if wave else None,nbt)
+averagesP=lazyOutputs("averageP")
+averagesS=lazyOutputs("averageS",swaves)
+varPs=lazyOutputs("varP")
+varSs=lazyOutputs("varS",swaves)
+qInfPs=lazyOutputs("qInfP")
+qSupPs=lazyOutputs("qSupP")
+qInfSs=lazyOutputs("qInfS",swaves)
+qSupSs=lazyOutputs("qSupS",swaves)
+minP=lazyOutputs("minP.")
+minS=lazyOutputs("minS.",swaves)
+maxP=lazyOutputs("maxP.")
+maxS=lazyOutputs("maxS.",swaves)
+def lazyHistories(name,wave=True):
+    """ Profiles of the chains at each iteration (None if they have not been stored, see WRITE_PROFILES_HISTORY) """
+    return runStore.LazyList(lambda i: runStore.load(args.pathToDir,code,name+str(i),mmap=True) \
+                             if wave and runStore.exists(args.pathToDir,code,name+str(i)) else None,nbt)
+profilesPs=lazyHistories("profilesP")
+profilesSs=lazyHistories("profilesS",swaves)
+priorP=runStore.LazyList(lambda i: np.loadtxt(args.pathToDir+"priorProfiles"+code+"/priorProfileP."+code+"."+str(i)+".dat"),nPriorProfiles)
+priorS=runStore.LazyList(lambda i: np.loadtxt(args.pathToDir+"priorProfiles"+code+"/priorProfileS."+code+"."+str(i)+".dat"),nPriorProfiles)
+filteredPfiles=glob.glob1(args.pathToDir,"filteredFirstGuessP.*")
+filteredSfiles=glob.glob1(args.pathToDir,"filteredFirstGuessS.*")
+waveletFiltered=[filteredGuessPCurve.split('.')[1] for filteredGuessPCurve in filteredPfiles]
+filteredPcurve=runStore.LazyList(lambda i: np.loadtxt(args.pathToDir+filteredPfiles[i]),len(filteredPfiles))
+filteredScurve=runStore.LazyList(lambda i: np.loadtxt(args.pathToDir+filteredSfiles[i]),len(filteredSfiles))
+files=runStore.LazyFiles()
+files.add("chains",lambda: runStore.chainsHistory(args.pathToDir,code)) # chains[iteration,chain,column] (memory mapped: only the slices used are read)
+for name in ["globalAverageP","globalVarP","globalAverageS","globalVarS","globalVarVpVs","ll"]:
+    files.add(name,lambda name=name: runStore.load(args.pathToDir,code,name))
+for name in ["MaxP","MinP","MaxS","MinS"]: # (maxP.XXX.dat -> files.globalMaxP)
+    files.add("global"+name,lambda name=name: runStore.load(args.pathToDir,code,name[:3].lower()+name[3]))
+files.add("realP",lambda: np.loadtxt(args.pathToDir+nameOfrealP))
+files.add("realS",lambda: np.loadtxt(args.pathToDir+nameOfrealS))
+if analytical:
+    files.add("timesData",lambda: runStore.load(args.pathToDir,code,"calculatedTimes"))
+else:
+    files.add("timesData",lambda: np.loadtxt(args.pathToDir+nameOfTimesFile))
+bestModelCalculated=runStore.exists(args.pathToDir,code,"bestModelTimes")
+files.add("bestModelTimes",lambda: runStore.load(args.pathToDir,code,"bestModelTimes"))
 coordShots=np.loadtxt(args.pathToDir+nameOfShotsFile)
 coordStats=np.loadtxt(args.pathToDir+nameOfStationsFile)
 firstGuessP=np.loadtxt(args.pathToDir+nameOfFirstGuessP)
 firstGuessS=np.loadtxt(args.pathToDir+nameOfFirstGuessS)
-if analytical:
-    realP=np.loadtxt(args.pathToDir+nameOfrealP)
-    realS=np.loadtxt(args.pathToDir+nameOfrealS)
-    timesData=np.loadtxt(args.pathToDir+"calculatedTimes."+code+".dat")
-else:
-    timesData=np.loadtxt(args.pathToDir+nameOfTimesFile)
-if os.path.isfile(args.pathToDir+"bestModelTimes."+code+".dat"):
-    bestModelCalculated=True
-    bestModelTimes=np.loadtxt(args.pathToDir+"bestModelTimes."+code+".dat")
-else:
-    bestModelCalculated=False
-ll=np.loadtxt(args.pathToDir+"ll."+code+".dat")
 
-if nPriorProfiles > 0:
-    for i in np.arange(nPriorProfiles):
-        priorP[i]=np.loadtxt(args.pathToDir+"priorProfiles"+code+"/priorProfileP."+code+"."+str(i)+".dat")
-        priorS[i]=np.loadtxt(args.pathToDir+"priorProfiles"+code+"/priorProfileS."+code+"."+str(i)+".dat")
-
-nit=len(chains[0])
+nit=runStore.numberOfIterations(args.pathToDir,code)
 
 if args.verbose:
     print "Loading done !"
@@ -353,6 +321,38 @@ if args.all:
         args.vpvs=True
    # args.swaps=True
 
+if args.headless: # Fork a process for each group of plots asked (they share the files loaded)
+    groups=[group for group in plotGroups if getattr(args,group)]
+    if (args.resultsChain >= 0) or args.all:
+        groups.append("chains")
+    workers=[]
+    for group in groups:
+        pid=os.fork()
+        if pid == 0: # Child process : just draw the plots of this group
+            for otherGroup in plotGroups:
+                setattr(args,otherGroup,otherGroup == group)
+            if group != "chains":
+                args.all=False
+                args.resultsChain=-1
+            headlessGroup=group
+            break
+        workers.append(pid)
+    else: # Parent process : wait for the children
+        failed=False
+        for group,pid in zip(groups,workers):
+            status=os.waitpid(pid,0)[1]
+            if os.WIFSIGNALED(status):
+                print "The plots of the group",group,"failed (killed by signal",str(os.WTERMSIG(status))+")"
+                failed=True
+            elif os.WEXITSTATUS(status) != 0:
+                print "The plots of the group",group,"failed (exit status",str(os.WEXITSTATUS(status))+")"
+                failed=True
+        if failed:
+            sys.exit(1)
+        if args.verbose:
+            print "Figures saved in ",args.headless
+        sys.exit(0)
+
 if args.energies:
     plt.hold(True)
     ii=0
@@ -379,22 +379,18 @@ if args.energies:
     chain=[chain[i] for i in np.arange(nBest) if iterationBest[i] > args.treshold]
     iterationBest=[i for i in iterationBest if i>args.treshold]
     iteration=np.arange(nit)
-    for i in np.arange(nbt):
-        if len(iteration) == len(chains[i][:,-1]):
-            plt.semilogy(iteration,chains[i][:,-1]*T[i])
-        else:
-            miniIteration = min(len(iteration),len(chains[i][:,-1]))
-            plt.semilogy(iteration[:miniIteration],chains[i][:miniIteration,-1]*T[i])
-    plt.rc('text', usetex=True)
+    for i in np.arange(nbt): # Just the energies after the treshold are read
+        plt.semilogy(iteration[args.treshold:],files.chains[args.treshold:,i,-1]*T[i])
+    plt.rc('text', usetex=useTex)
     plt.rc('font', family='serif')
     flagForLabel=True
     for j in np.arange(len(iterationBest)):
         if flagForLabel:
-            plt.semilogy(iteration[iterationBest[j]], T[chain[j]]*chains[chain[j]][:,-1][iterationBest[j]], 'bD', label="Best models saved")
+            plt.semilogy(iteration[iterationBest[j]], T[chain[j]]*files.chains[iterationBest[j],chain[j],-1], 'bD', label="Best models saved")
             flagForLabel=False
         else:
-            plt.semilogy(iteration[iterationBest[j]], T[chain[j]]*chains[chain[j]][:,-1][iterationBest[j]], 'bD')
-    plt.semilogy(itBestE, T[chainBest]*chains[chainBest][:,-1][itBestE], 'rD', label="Best model")
+            plt.semilogy(iteration[iterationBest[j]], T[chain[j]]*files.chains[iterationBest[j],chain[j],-1], 'bD')
+    plt.semilogy(itBestE, T[chainBest]*files.chains[itBestE,chainBest,-1], 'rD', label="Best model")
     if recalculate_t0 is True:
         if swaves:
             plt.semilogy(iteration,np.zeros(nit)+nStats*nShots+ep,'b--',linewidth=2,label=r'Behind that line every model can be acceptable ($1\sigma$ misfit for each measurement)')
@@ -419,7 +415,7 @@ if args.geometry:
     ax.set_xlim3d(xmin,xmax)
     ax.set_ylim3d(ymin,ymax)
     ax.set_zlim3d(zmin,zmax)
-    plt.rc('text', usetex=True)
+    plt.rc('text', usetex=useTex)
     plt.rc('font', family='serif')
     ax.set_xlabel('X (m)')
     ax.set_ylabel('Y (m)')
@@ -434,10 +430,10 @@ if args.data:
     if (swaves):
         plt.plot(firstGuessS[:,1],z,color=(0.5,0.95,0.5))
     if analytical:
-        plt.plot(realP[:,1],z,color=(0,0,0.5),linewidth=4)
+        plt.plot(files.realP[:,1],z,color=(0,0,0.5),linewidth=4)
         if swaves:
-            plt.plot(realS[:,1],z,color=(0,0.5,0),linewidth=4)
-    plt.rc('text', usetex=True)
+            plt.plot(files.realS[:,1],z,color=(0,0.5,0),linewidth=4)
+    plt.rc('text', usetex=useTex)
     plt.rc('font', family='serif')
     plt.xlabel(r'Wave speed ($m.s^{-1}$)',fontsize='14')
     plt.ylabel(r'Depth ($m$)',fontsize='14')
@@ -452,10 +448,13 @@ if args.data:
         plt.hold(True)
         plt.plot(firstGuessP[:,1],z,color=(0.5,0.5,0.95))
         if analytical:
-            plt.plot(realP[:,1],z,color=(0,0,0.5),linewidth=4)
-        for i in np.arange(nPriorProfiles):
-            plt.plot(priorP[i][:,1],z)
-        plt.rc('text', usetex=True)
+            plt.plot(files.realP[:,1],z,color=(0,0,0.5),linewidth=4)
+        if args.profiles_density:
+            phist(priorP[0][:,0],[priorP[i][:,1] for i in np.arange(nPriorProfiles)],M)
+        else:
+            for i in np.arange(nPriorProfiles):
+                plt.plot(priorP[i][:,1],z)
+        plt.rc('text', usetex=useTex)
         plt.rc('font', family='serif')
         plt.xlabel(r'P wave velocity profiles from prior ($m.s^{-1}$)',fontsize='14')
         plt.ylabel(r'Depth ($m$)',fontsize='14')
@@ -466,10 +465,13 @@ if args.data:
             plt.hold(True)
             plt.plot(firstGuessS[:,1],z,color=(0.5,0.95,0.5))
             if analytical:
-                plt.plot(realS[:,1],z,color=(0,0.5,0),linewidth=4)
-            for i in np.arange(nPriorProfiles):
-                plt.plot(priorS[i][:,1],z)
-            plt.rc('text', usetex=True)
+                plt.plot(files.realS[:,1],z,color=(0,0.5,0),linewidth=4)
+            if args.profiles_density:
+                phist(priorS[0][:,0],[priorS[i][:,1] for i in np.arange(nPriorProfiles)],M)
+            else:
+                for i in np.arange(nPriorProfiles):
+                    plt.plot(priorS[i][:,1],z)
+            plt.rc('text', usetex=useTex)
             plt.rc('font', family='serif')
             plt.xlabel(r'S wave velocity profiles from prior ($m.s^{-1}$)',fontsize='14')
             plt.ylabel(r'Depth ($m$)',fontsize='14')
@@ -487,11 +489,13 @@ elif args.resultsChain >= 0:
     chainsToPlot=np.array([args.resultsChain])
 
 if (args.resultsChain >= 0) or args.all:
-    lb=qp+"\% confidence interval"
-    maxiP=globalMaxP[:,1].max()
-    miniP=globalMinP[:,1].min()
-    maxiS=globalMaxS[:,1].max()
-    miniS=globalMinS[:,1].min()
+    lb=qp+percent+" confidence interval"
+    if args.posterior_histogram and not runStore.exists(args.pathToDir,code,"profilesP0"):
+        print "No profiles history in this run (WRITE_PROFILES_HISTORY = 0) : the quantiles are shown instead of the histograms"
+    maxiP=files.globalMaxP[:,1].max()
+    miniP=files.globalMinP[:,1].min()
+    maxiS=files.globalMaxS[:,1].max()
+    miniS=files.globalMinS[:,1].min()
     dp=(maxiP-miniP)/10
     ds=(maxiS-miniS)/10
     for i in chainsToPlot:
@@ -503,11 +507,14 @@ if (args.resultsChain >= 0) or args.all:
         if not args.dont_show_guess:
             plt.plot(firstGuessP[:,1],z,color=(0.5,0.5,0.95),linewidth=4,label="First guess velocity profile")
         if analytical:
-            plt.plot(realP[:,1],z,color=(0,0,0.5),linewidth=4,label="Real velocity profile")
+            plt.plot(files.realP[:,1],z,color=(0,0,0.5),linewidth=4,label="Real velocity profile")
         plt.plot(averagesP[i][:,1],zFilt,color=(0.5,0.5,0),linewidth=4,label="Average profile")
         if not args.no_density_plots:
             #pdense(zFilt,averagesP[i][:,1],np.sqrt(varPs[i][:,1]),M)
-            pdense(zFilt,(qSupPs[i][:,1]+qInfPs[i][:,1])/2,(qSupPs[i][:,1]-qInfPs[i][:,1])/2,M)
+            if args.posterior_histogram and profilesPs[i] is not None: # Profiles generated after the treshold
+                phist(zFilt,profilesPs[i][args.treshold:],M)
+            else:
+                pdense(zFilt,(qSupPs[i][:,1]+qInfPs[i][:,1])/2,(qSupPs[i][:,1]-qInfPs[i][:,1])/2,M)
         else:
             #plt.plot(averagesP[i][:,1]+np.sqrt(varPs[i][:,1]),zFilt,color=(0.5,0.5,0),label="Standard deviation")
             #plt.plot(averagesP[i][:,1]-np.sqrt(varPs[i][:,1]),zFilt,color=(0.5,0.5,0))
@@ -517,9 +524,9 @@ if (args.resultsChain >= 0) or args.all:
             plt.plot(averagesP[i][:,1],zFilt,label="Average model")
 
         if args.show_ranges:
-            plt.plot(globalMaxP[:,1],zFilt,color=(1,0,0),label="Range investigated by all chains")
-            plt.plot(globalMinP[:,1],zFilt,color=(1,0,0))
-        plt.rc('text', usetex=True)
+            plt.plot(files.globalMaxP[:,1],zFilt,color=(1,0,0),label="Range investigated by all chains")
+            plt.plot(files.globalMinP[:,1],zFilt,color=(1,0,0))
+        plt.rc('text', usetex=useTex)
         plt.rc('font', family='serif')
         plt.title(r'Chain '+str(i),fontsize='14')
         plt.xlabel(r'P waves velocity ($m.s^{-1}$)',fontsize='14')
@@ -536,11 +543,14 @@ if (args.resultsChain >= 0) or args.all:
             if not args.dont_show_guess:
                 plt.plot(firstGuessS[:,1],z,color=(0.5,0.95,0.5),linewidth=4,label="First guess velocity profile")
             if analytical:
-                plt.plot(realS[:,1],z,color=(0,0.5,0),linewidth=4,label="Real velocity profile")
+                plt.plot(files.realS[:,1],z,color=(0,0.5,0),linewidth=4,label="Real velocity profile")
             plt.plot(averagesS[i][:,1],zFilt,color=(0.5,0.5,0),linewidth=4,label="Average profile")
             if not args.no_density_plots:
                 #pdense(zFilt,averagesS[i][:,1],np.sqrt(varSs[i][:,1]),M)
-                pdense(zFilt,(qSupSs[i][:,1]+qInfSs[i][:,1])/2,(qSupSs[i][:,1]-qInfSs[i][:,1])/2,M)
+                if args.posterior_histogram and profilesSs[i] is not None:
+                    phist(zFilt,profilesSs[i][args.treshold:],M)
+                else:
+                    pdense(zFilt,(qSupSs[i][:,1]+qInfSs[i][:,1])/2,(qSupSs[i][:,1]-qInfSs[i][:,1])/2,M)
             else:
                 #plt.plot(averagesS[i][:,1]+np.sqrt(varSs[i][:,1]),zFilt,color=(0.5,0.5,0),label="Standard deviation")
                 #plt.plot(averagesS[i][:,1]-np.sqrt(varSs[i][:,1]),zFilt,color=(0.5,0.5,0))
@@ -551,9 +561,9 @@ if (args.resultsChain >= 0) or args.all:
 
 
             if args.show_ranges:
-                plt.plot(globalMaxS[:,1],zFilt,color=(1,0,0),label="Range investigated by all chains")
-                plt.plot(globalMinS[:,1],zFilt,color=(1,0,0))
-            plt.rc('text', usetex=True)
+                plt.plot(files.globalMaxS[:,1],zFilt,color=(1,0,0),label="Range investigated by all chains")
+                plt.plot(files.globalMinS[:,1],zFilt,color=(1,0,0))
+            plt.rc('text', usetex=useTex)
             plt.rc('font', family='serif')
             plt.title(r'Chain '+str(i),fontsize='14')
             plt.xlabel(r'S waves velocity ($m.s^{-1}$)',fontsize='14')
@@ -564,28 +574,28 @@ if (args.resultsChain >= 0) or args.all:
             plt.ylim(ymax=zFilt.min())
 
 if args.results:
-    maxiP=globalMaxP[:,1].max()
-    miniP=globalMinP[:,1].min()
-    maxiS=globalMaxS[:,1].max()
-    miniS=globalMinS[:,1].min()
+    maxiP=files.globalMaxP[:,1].max()
+    miniP=files.globalMinP[:,1].min()
+    maxiS=files.globalMaxS[:,1].max()
+    miniS=files.globalMinS[:,1].min()
     dp=(maxiP-miniP)/10
     ds=(maxiS-miniS)/10
     plt.figure()
     plt.hold(True)
     if not args.dont_show_guess:
         plt.plot(firstGuessP[:,1],z,color=(0.5,0.5,0.95),linewidth=4,label="First guess velocity profile")
-        plt.plot(globalAverageP[:,1],zFilt,color=(0.5,0.5,0),linewidth=4,label="Global average")
+        plt.plot(files.globalAverageP[:,1],zFilt,color=(0.5,0.5,0),linewidth=4,label="Global average")
     if analytical:
-        plt.plot(realP[:,1],z,color=(0,0,0.5),linewidth=4,label="Real velocity profile")
+        plt.plot(files.realP[:,1],z,color=(0,0,0.5),linewidth=4,label="Real velocity profile")
     if not args.no_density_plots:
-        pdense(zFilt,globalAverageP[:,1],np.sqrt(globalVarP[:,1]),M)
+        pdense(zFilt,files.globalAverageP[:,1],np.sqrt(files.globalVarP[:,1]),M)
     else:
-        plt.plot(globalAverageP[:,1]+np.sqrt(globalVarP[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7),label="Standard deviation")
-        plt.plot(globalAverageP[:,1]-np.sqrt(globalVarP[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7))
+        plt.plot(files.globalAverageP[:,1]+np.sqrt(files.globalVarP[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7),label="Standard deviation")
+        plt.plot(files.globalAverageP[:,1]-np.sqrt(files.globalVarP[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7))
     if args.show_ranges:
-        plt.plot(globalMaxP[:,1],zFilt,color=(1,0,0),label="Range investigated by all chains")
-        plt.plot(globalMinP[:,1],zFilt,color=(1,0,0))
-    plt.rc('text', usetex=True)
+        plt.plot(files.globalMaxP[:,1],zFilt,color=(1,0,0),label="Range investigated by all chains")
+        plt.plot(files.globalMinP[:,1],zFilt,color=(1,0,0))
+    plt.rc('text', usetex=useTex)
     plt.rc('font', family='serif')
     plt.title('Global results',fontsize=18)
     plt.xlabel('P waves velocity (m.s$^{-1}$)',fontsize=18)
@@ -598,18 +608,18 @@ if args.results:
         plt.figure()
         if not args.dont_show_guess:
             plt.plot(firstGuessS[:,1],z,color=(0.5,0.95,0.5),linewidth=4,label="First guess velocity profile")
-            plt.plot(globalAverageS[:,1],zFilt,color=(0.5,0.5,0),linewidth=4,label="Global average")
+            plt.plot(files.globalAverageS[:,1],zFilt,color=(0.5,0.5,0),linewidth=4,label="Global average")
         if analytical:
-            plt.plot(realS[:,1],z,color=(0,0.5,0),linewidth=4,label="Real velocity profile")
+            plt.plot(files.realS[:,1],z,color=(0,0.5,0),linewidth=4,label="Real velocity profile")
         if not args.no_density_plots:
-            pdense(zFilt,globalAverageS[:,1],np.sqrt(globalVarS[:,1]),M)
+            pdense(zFilt,files.globalAverageS[:,1],np.sqrt(files.globalVarS[:,1]),M)
         else:
-            plt.plot(globalAverageS[:,1]+np.sqrt(globalVarS[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7),label="Standard deviation")
-            plt.plot(globalAverageS[:,1]-np.sqrt(globalVarS[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7))
+            plt.plot(files.globalAverageS[:,1]+np.sqrt(files.globalVarS[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7),label="Standard deviation")
+            plt.plot(files.globalAverageS[:,1]-np.sqrt(files.globalVarS[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7))
         if args.show_ranges:
-            plt.plot(globalMaxS[:,1],zFilt,color=(1,0,0),label="Range investigated by all chains")
-            plt.plot(globalMinS[:,1],zFilt,color=(1,0,0))
-        plt.rc('text', usetex=True)
+            plt.plot(files.globalMaxS[:,1],zFilt,color=(1,0,0),label="Range investigated by all chains")
+            plt.plot(files.globalMinS[:,1],zFilt,color=(1,0,0))
+        plt.rc('text', usetex=useTex)
         plt.rc('font', family='serif')
         plt.title('Global results',fontsize=18)
         plt.xlabel('S waves velocity (m.s$^{-1}$)',fontsize=18)
@@ -621,22 +631,22 @@ if args.results:
 
 if args.best:
     if bestModelCalculated:
-        diffDataBestModel=bestModelTimes-timesData
+        diffDataBestModel=files.bestModelTimes-files.timesData
         if recalculate_t0 or args.recalculate_t0:
             for i in np.arange(nShots):
-                diffPshoti=diffDataBestModel[i*nStats:(i+1)*nStats,0][timesData[i*nStats:(i+1)*nStats,0]>0]
+                diffPshoti=diffDataBestModel[i*nStats:(i+1)*nStats,0][files.timesData[i*nStats:(i+1)*nStats,0]>0]
                 t0ShotsPi=diffPshoti.mean()
                 if args.verbose:
                     print "t0P[",i,"] = ",t0ShotsPi
                 diffDataBestModel[i*nStats:(i+1)*nStats,0]=diffDataBestModel[i*nStats:(i+1)*nStats,0]-t0ShotsPi
                 if swaves:
-                    diffSshoti=diffDataBestModel[i*nStats:(i+1)*nStats,1][timesData[i*nStats:(i+1)*nStats,1]>0]
+                    diffSshoti=diffDataBestModel[i*nStats:(i+1)*nStats,1][files.timesData[i*nStats:(i+1)*nStats,1]>0]
                     t0ShotsSi=diffSshoti.mean()
                     if args.verbose:
                         print "t0S[",i,"] = ",t0ShotsSi
                     diffDataBestModel[i*nStats:(i+1)*nStats,1]=diffDataBestModel[i*nStats:(i+1)*nStats,1]-t0ShotsSi
-        diffP=diffDataBestModel[:,0][timesData[:,0]>0]
-        diffS=diffDataBestModel[:,1][timesData[:,1]>0]
+        diffP=diffDataBestModel[:,0][files.timesData[:,0]>0]
+        diffS=diffDataBestModel[:,1][files.timesData[:,1]>0]
         fig = plt.figure()
         plt.hold(True)
         plt.plot(np.arange(len(diffP)),np.zeros(len(diffP))+sigmaP,'b--',linewidth=2)
@@ -648,7 +658,7 @@ if args.best:
         plt.plot(np.arange(len(diffP)),diffP,'g+')
         plt.ylim([-20*sigmaP,20*sigmaP])
         plt.xlim([0,len(diffP)-1])
-        plt.rc('text', usetex=True)
+        plt.rc('text', usetex=useTex)
         plt.rc('font', family='serif')
         plt.text(0.6666*len(diffP), 1.1*sigmaP, r'$1\sigma$',fontsize='30',color='b')
         plt.text(0.7708*len(diffP), 2.1*sigmaP, r'$2\sigma$',fontsize='30',color=(0.3,0.3,1))
@@ -669,7 +679,7 @@ if args.best:
             plt.plot(np.arange(len(diffS)),diffS,'g+')
             plt.ylim([-20*sigmaP,20*sigmaP])
             plt.xlim([0,len(diffS)-1])
-            plt.rc('text', usetex=True)
+            plt.rc('text', usetex=useTex)
             plt.rc('font', family='serif')
             plt.text(0.6666*len(diffS), 1.1*sigmaS, r'$1\sigma$',fontsize='30',color='b')
             plt.text(0.7708*len(diffS), 2.1*sigmaS, r'$2\sigma$',fontsize='30',color=(0.3,0.3,1))
@@ -711,10 +721,10 @@ if args.best:
         bestS[ii-1]=np.loadtxt(args.pathToDir+bestModel)
         if args.verbose:
             print "Model number : ",ii, " -> ",bestModel," generated by chain ",chain," at iteration ",idx," (energy "+str(ES[ii-1])+")"
-    maxiP=globalMaxP[:,1].max()
-    miniP=globalMinP[:,1].min()
-    maxiS=globalMaxS[:,1].max()
-    miniS=globalMinS[:,1].min()
+    maxiP=files.globalMaxP[:,1].max()
+    miniP=files.globalMinP[:,1].min()
+    maxiS=files.globalMaxS[:,1].max()
+    miniS=files.globalMinS[:,1].min()
     dp=(maxiP-miniP)/10
     ds=(maxiS-miniS)/10
     from operator import itemgetter
@@ -722,7 +732,7 @@ if args.best:
     idxBestS=min(enumerate(ES), key=itemgetter(1))[0] # index of best S model (it is the same one!)
     plt.figure()
     if analytical:
-        plt.plot(realP[:,1],z,color=(0,0,0.5),linewidth=4,label="Real velocity profile")
+        plt.plot(files.realP[:,1],z,color=(0,0,0.5),linewidth=4,label="Real velocity profile")
     if args.verbose:
         print "Models kept after iteration : "+str(args.treshold)+" will be shown"
 
@@ -733,7 +743,7 @@ if args.best:
                 plt.plot(bestP[i][:,1],zFilt,linewidth=4,label="Best model")
             else:
                 plt.plot(bestP[i][:,1],zFilt)
-            plt.rc('text', usetex=True)
+            plt.rc('text', usetex=useTex)
             plt.rc('font', family='serif')
             plt.xlabel(r'Best P wave velocity models in ($m.s^{-1}$)',fontsize='14')
             plt.ylabel(r'Depth ($m$)',fontsize='14')
@@ -744,7 +754,7 @@ if args.best:
     if swaves:
         plt.figure()
         if analytical:
-            plt.plot(realS[:,1],z,color=(0,0,0.5),linewidth=4,label="Real velocity profile")
+            plt.plot(files.realS[:,1],z,color=(0,0,0.5),linewidth=4,label="Real velocity profile")
         for i in np.arange(nBest):
             if iterationBest[i] > args.treshold:
                 plt.hold(True)
@@ -752,7 +762,7 @@ if args.best:
                     plt.plot(bestS[i][:,1],zFilt,linewidth=4,label="Best model")
                 else:
                     plt.plot(bestS[i][:,1],zFilt)
-                plt.rc('text', usetex=True)
+                plt.rc('text', usetex=useTex)
                 plt.rc('font', family='serif')
                 plt.xlabel(r'Best S wave velocity models in ($m.s^{-1}$)',fontsize='14')
                 plt.ylabel(r'Depth ($m$)',fontsize='14')
@@ -804,7 +814,7 @@ if args.vpvs:
             # End of loading best profiles
             if EP:
                 plt.plot(bestP[idxBestP][:,1]/bestS[idxBestS][:,1],zFilt,linewidth=4,label="Vp/Vs of the best model")
-            plt.rc('text', usetex=True)
+            plt.rc('text', usetex=useTex)
             plt.rc('font', family='serif')
             plt.xlabel(r'Ratio Vp/Vs',fontsize='14')
             plt.ylabel(r'Depth ($m$)',fontsize='14')
@@ -814,13 +824,13 @@ if args.vpvs:
             plt.legend()
         plt.figure()
         plt.hold(True)
-        vpFractionalUncertainty = 100*np.sqrt(globalVarP[:,1])/globalAverageP[:,1] # Ex: is vp=2500+/-100m/s -> fractional uncertainty 4% vp = 2500+/-4%
-        vsFractionalUncertainty = 100*np.sqrt(globalVarS[:,1])/globalAverageS[:,1] # Ex: is vs=2500+/-100m/s -> fractional uncertainty 4% vs = 2500+/-4%
+        vpFractionalUncertainty = 100*np.sqrt(files.globalVarP[:,1])/files.globalAverageP[:,1] # Ex: is vp=2500+/-100m/s -> fractional uncertainty 4% vp = 2500+/-4%
+        vsFractionalUncertainty = 100*np.sqrt(files.globalVarS[:,1])/files.globalAverageS[:,1] # Ex: is vs=2500+/-100m/s -> fractional uncertainty 4% vs = 2500+/-4%
         ratioFractionalUncertainty = vpFractionalUncertainty + vsFractionalUncertainty
-        meanRatio = globalAverageP[:,1]/globalAverageS[:,1]
+        meanRatio = files.globalAverageP[:,1]/files.globalAverageS[:,1]
         numericalUncertainty = meanRatio*(vpFractionalUncertainty + vsFractionalUncertainty)/100
-        plt.plot(meanRatio + np.sqrt(globalVarVpVs[:,1])/3,zFilt,linestyle='--',color=(0.3,0.5,0.7),label="Real standard deviation")
-        plt.plot(meanRatio - np.sqrt(globalVarVpVs[:,1])/3,zFilt,linestyle='--',color=(0.3,0.5,0.7))
+        plt.plot(meanRatio + np.sqrt(files.globalVarVpVs[:,1])/3,zFilt,linestyle='--',color=(0.3,0.5,0.7),label="Real standard deviation")
+        plt.plot(meanRatio - np.sqrt(files.globalVarVpVs[:,1])/3,zFilt,linestyle='--',color=(0.3,0.5,0.7))
         plt.plot(meanRatio + numericalUncertainty,zFilt,linestyle='--',color=(0.3,0.3,0.7),label="Approx standard deviation")
         plt.plot(meanRatio - numericalUncertainty,zFilt,linestyle='--',color=(0.3,0.3,0.7))
         plt.plot(meanRatio,zFilt,label="Global average Vp/Vs")
@@ -851,8 +861,8 @@ if args.vpvs:
         if EP:
             plt.plot(bestP[idxBestP][:,1]/bestS[idxBestS][:,1],zFilt,linewidth=4,label="Vp/Vs of the best model")
         if analytical:
-            plt.plot(realP[:,1]/realS[:,1],z,color=(0,0,0.5),linewidth=4,label="Real Vp/Vs")
-        plt.rc('text', usetex=True)
+            plt.plot(files.realP[:,1]/files.realS[:,1],z,color=(0,0,0.5),linewidth=4,label="Real Vp/Vs")
+        plt.rc('text', usetex=useTex)
         plt.rc('font', family='serif')
         plt.xlabel(r'Ratio Vp/Vs',fontsize='14')
         plt.ylabel(r'Depth ($m$)',fontsize='14')
@@ -868,9 +878,9 @@ if args.filtering:
         plt.hold(True)
         plt.plot(firstGuessP[:,1],z,color=(0.5,0.5,0.95))
         #if analytical:
-        #    plt.plot(realP[:,1],z,color=(0,0,0.5),linewidth=4)
+        #    plt.plot(files.realP[:,1],z,color=(0,0,0.5),linewidth=4)
         plt.plot(filteredCurve[:,1],z,color=(0.5,0,0),linewidth=4,label=waveletFiltered[i])
-        plt.rc('text', usetex=True)
+        plt.rc('text', usetex=useTex)
         plt.rc('font', family='serif')
         plt.xlabel(r'Wave speed (m.s$^{-1}$)',fontsize=16)
         plt.ylabel(r'Depth (m)',fontsize=16)
@@ -887,7 +897,7 @@ if args.filtering:
 if args.swaps:
     print "Not implemented for now"
     plt.figure()
-    plt.plot(ll[ll[:,2]==3,1],ll[ll[:,1]==4,2])
+    plt.plot(files.ll[files.ll[:,2]==3,1],files.ll[files.ll[:,1]==4,2])
     #plot(exch(exch(:,2)==3,1),exch(exch(:,2)==3,3),'k')
 # plot(exch(exch(:,2)==3,1),exch(exch(:,2)==3,3),'y')
 # plot(exch(exch(:,2)==2,1),exch(exch(:,2)==2,3),'c')
@@ -909,7 +919,7 @@ if args.paper:
     ax.set_xlim3d(xmin,xmax)
     ax.set_ylim3d(ymin,ymax)
     ax.set_zlim3d(zmin,zmax)
-    plt.rc('text', usetex=True)
+    plt.rc('text', usetex=useTex)
     plt.rc('font', family='serif')
     ax.set_xlabel('X (m)')
     ax.set_ylabel('Y (m)')
@@ -925,10 +935,10 @@ if args.paper:
     if (swaves):
         plt.plot(firstGuessS[:,1],z,color=(0.5,0.95,0.5))
     if analytical:
-        plt.plot(realP[:,1],z,color=(0,0,0.5),linewidth=4)
+        plt.plot(files.realP[:,1],z,color=(0,0,0.5),linewidth=4)
         if swaves:
-            plt.plot(realS[:,1],z,color=(0,0.5,0),linewidth=4)
-    plt.rc('text', usetex=True)
+            plt.plot(files.realS[:,1],z,color=(0,0.5,0),linewidth=4)
+    plt.rc('text', usetex=useTex)
     plt.rc('font', family='serif')
     plt.xlabel('Wave speed (m.s$^{-1}$)',fontsize=fontsize)
     plt.ylabel('Depth (m)',fontsize=fontsize)
@@ -947,7 +957,7 @@ if args.paper:
                     plt.plot(priorP[i][:,1],z,'m',label="P wave velocity profiles from prior")
                 else:
                     plt.plot(priorP[i][:,1],z,'m')
-        plt.rc('text', usetex=True)
+        plt.rc('text', usetex=useTex)
         plt.rc('font', family='serif')
         plt.xlabel('Velocity (m.s$^{-1}$)',fontsize=fontsize)
         plt.ylabel('Depth (m)',fontsize=fontsize)
@@ -967,7 +977,7 @@ if args.paper:
                         plt.plot(priorS[i][:,1],z,'y',label="S wave velocity profiles from prior")
                     else:
                         plt.plot(priorS[i][:,1],z,'y')
-            plt.rc('text', usetex=True)
+            plt.rc('text', usetex=useTex)
             plt.rc('font', family='serif')
             plt.xlabel('Velocity (m.s$^{-1}$)',fontsize=fontsize)
             plt.ylabel('Depth (m)',fontsize=fontsize)
@@ -1000,17 +1010,13 @@ if args.paper:
     chain=[chain[i] for i in np.arange(nBest) if iterationBest[i] > args.treshold]
     iterationBest=[i for i in iterationBest if i>args.treshold]
     iteration=np.arange(nit)
-    for i in np.arange(nbt):
+    for i in np.arange(nbt): # Just the energies after the treshold are read
         if i<20:
-            if len(iteration) == len(chains[i][:,-1]):
-                plt.semilogy(iteration,chains[i][:,-1]*T[i])
-            else:
-                miniIteration = min(len(iteration),len(chains[i][:,-1]))
-                plt.semilogy(iteration[:miniIteration],chains[i][:miniIteration,-1]*T[i])
-    plt.rc('text', usetex=True)
+            plt.semilogy(iteration[args.treshold:],files.chains[args.treshold:,i,-1]*T[i])
+    plt.rc('text', usetex=useTex)
     plt.rc('font', family='serif')
     flagForLabel=True
-    plt.semilogy(itBestE, T[chainBest]*chains[chainBest][:,-1][itBestE], 'rD', label="Best model")
+    plt.semilogy(itBestE, T[chainBest]*files.chains[itBestE,chainBest,-1], 'rD', label="Best model")
     if recalculate_t0 is True:
         if swaves:
             plt.semilogy(iteration,np.zeros(nit)+nStats*nShots+ep,'b--',linewidth=2) #,label=r'Behind that line every model can be acceptable ($1\sigma$ misfit for each measurement)')
@@ -1030,15 +1036,15 @@ if args.paper:
     plt.figure(figsize=(8,10))
     plt.hold(True)
     plt.plot(firstGuessP[:,1]/firstGuessS[:,1],z,color=(0.95,0.9,0.9),linewidth=1,label="Sonic logs Vp/Vs", zorder=1)
-    vpFractionalUncertainty = 100*np.sqrt(globalVarP[:,1])/globalAverageP[:,1] # Ex: is vp=2500+/-100m/s -> fractional uncertainty 4% vp = 2500+/-4%
-    vsFractionalUncertainty = 100*np.sqrt(globalVarS[:,1])/globalAverageS[:,1] # Ex: is vs=2500+/-100m/s -> fractional uncertainty 4% vs = 2500+/-4%
+    vpFractionalUncertainty = 100*np.sqrt(files.globalVarP[:,1])/files.globalAverageP[:,1] # Ex: is vp=2500+/-100m/s -> fractional uncertainty 4% vp = 2500+/-4%
+    vsFractionalUncertainty = 100*np.sqrt(files.globalVarS[:,1])/files.globalAverageS[:,1] # Ex: is vs=2500+/-100m/s -> fractional uncertainty 4% vs = 2500+/-4%
     ratioFractionalUncertainty = vpFractionalUncertainty + vsFractionalUncertainty
-    meanRatio = globalAverageP[:,1]/globalAverageS[:,1]
+    meanRatio = files.globalAverageP[:,1]/files.globalAverageS[:,1]
     numericalUncertainty = meanRatio*(vpFractionalUncertainty + vsFractionalUncertainty)/100
     #pdense(zFilt,meanRatio,numericalUncertainty,M)
-    pdense(zFilt,meanRatio,np.sqrt(globalVarVpVs[:,1])/3,M)
-    plt.plot(meanRatio + np.sqrt(globalVarVpVs[:,1])/3,zFilt,linestyle='--',color=(0.3,0.3,0.7),label="Standard deviation")
-    plt.plot(meanRatio - np.sqrt(globalVarVpVs[:,1])/3,zFilt,linestyle='--',color=(0.3,0.3,0.7))
+    pdense(zFilt,meanRatio,np.sqrt(files.globalVarVpVs[:,1])/3,M)
+    plt.plot(meanRatio + np.sqrt(files.globalVarVpVs[:,1])/3,zFilt,linestyle='--',color=(0.3,0.3,0.7),label="Standard deviation")
+    plt.plot(meanRatio - np.sqrt(files.globalVarVpVs[:,1])/3,zFilt,linestyle='--',color=(0.3,0.3,0.7))
     #plt.plot(meanRatio + numericalUncertainty,zFilt,linestyle='--',color=(0.3,0.3,0.7),label="Standard deviation")
     #plt.plot(meanRatio - numericalUncertainty,zFilt,linestyle='--',color=(0.3,0.3,0.7))
     plt.plot(meanRatio,zFilt,label="Average Vp/Vs")
@@ -1063,7 +1069,7 @@ if args.paper:
     idxBestS=min(enumerate(ES), key=itemgetter(1))[0] # index of best S model (it is the same one!)
     # End of loading best profiles
     plt.plot(bestP[idxBestP][:,1]/bestS[idxBestS][:,1],zFilt,'g',linewidth=2,label="Vp/Vs of the best model")
-    plt.rc('text', usetex=True)
+    plt.rc('text', usetex=useTex)
     plt.rc('font', family='serif')
     plt.xlabel(r'Ratio Vp/Vs',fontsize=18)
     plt.ylabel(r'Depth (m)',fontsize=18)
@@ -1077,18 +1083,18 @@ if args.paper:
 
     ### RESIDUALS ###
     if bestModelCalculated:
-        diffDataBestModel=bestModelTimes-timesData
+        diffDataBestModel=files.bestModelTimes-files.timesData
         if recalculate_t0 or args.recalculate_t0:
             for i in np.arange(nShots):
-                diffPshoti=diffDataBestModel[i*nStats:(i+1)*nStats,0][timesData[i*nStats:(i+1)*nStats,0]>0]
+                diffPshoti=diffDataBestModel[i*nStats:(i+1)*nStats,0][files.timesData[i*nStats:(i+1)*nStats,0]>0]
                 t0ShotsPi=diffPshoti.mean()
                 diffDataBestModel[i*nStats:(i+1)*nStats,0]=diffDataBestModel[i*nStats:(i+1)*nStats,0]-t0ShotsPi
                 if swaves:
-                    diffSshoti=diffDataBestModel[i*nStats:(i+1)*nStats,1][timesData[i*nStats:(i+1)*nStats,1]>0]
+                    diffSshoti=diffDataBestModel[i*nStats:(i+1)*nStats,1][files.timesData[i*nStats:(i+1)*nStats,1]>0]
                     t0ShotsSi=diffSshoti.mean()
                     diffDataBestModel[i*nStats:(i+1)*nStats,1]=diffDataBestModel[i*nStats:(i+1)*nStats,1]-t0ShotsSi
-        diffP=diffDataBestModel[:,0][timesData[:,0]>0]
-        diffS=diffDataBestModel[:,1][timesData[:,1]>0]
+        diffP=diffDataBestModel[:,0][files.timesData[:,0]>0]
+        diffS=diffDataBestModel[:,1][files.timesData[:,1]>0]
         fig = plt.figure()
         plt.hold(True)
         plt.plot(np.arange(len(diffP)),np.zeros(len(diffP))+sigmaP,'b--',linewidth=2)
@@ -1100,7 +1106,7 @@ if args.paper:
         plt.plot(np.arange(len(diffP)),diffP,'g+')
         plt.ylim([-10*sigmaP,10*sigmaP])
         plt.xlim([0,len(diffP)-1])
-        plt.rc('text', usetex=True)
+        plt.rc('text', usetex=useTex)
         plt.rc('font', family='serif')
         plt.text(0.6666*len(diffP), 1.1*sigmaP, r'$1\sigma$',fontsize=30,color='b')
         plt.text(0.7708*len(diffP), 2.1*sigmaP, r'$2\sigma$',fontsize=30,color=(0.3,0.3,1))
@@ -1122,7 +1128,7 @@ if args.paper:
             plt.plot(np.arange(len(diffS)),diffS,'g+')
             plt.ylim([-10*sigmaP,10*sigmaP])
             plt.xlim([0,len(diffS)-1])
-            plt.rc('text', usetex=True)
+            plt.rc('text', usetex=useTex)
             plt.rc('font', family='serif')
             plt.text(0.6666*len(diffS), 1.1*sigmaS, r'$1\sigma$',fontsize=30,color='b')
             plt.text(0.7708*len(diffS), 2.1*sigmaS, r'$2\sigma$',fontsize=30,color=(0.3,0.3,1))
@@ -1139,24 +1145,24 @@ if args.paper:
 
     ### RESULTS ###
 #    lb=qp+"\% confidence interval"
-#    maxiP=globalMaxP[:,1].max()
-#    miniP=globalMinP[:,1].min()
-#    maxiS=globalMaxS[:,1].max()
-#    miniS=globalMinS[:,1].min()
+#    maxiP=files.globalMaxP[:,1].max()
+#    miniP=files.globalMinP[:,1].min()
+#    maxiS=files.globalMaxS[:,1].max()
+#    miniS=files.globalMinS[:,1].min()
 #    plt.figure(figsize=(8,10))
 #    plt.hold(True)
 #    plt.plot(firstGuessP[:,1],z,color=(0.5,0.5,0.95),linewidth=1,label="Sonic log", alpha=0.4, zorder=1)
 #    if analytical:
-#        plt.plot(realP[:,1],z,color=(0,0,0.5),linewidth=4,label="Real velocity profile")
-#    plt.plot(globalAverageP[:,1],zFilt,linewidth=4,label="Global average")
-#    pdense(zFilt,globalAverageP[:,1],np.sqrt(globalVarP[:,1]),M)
-#    plt.plot(globalAverageP[:,1]+np.sqrt(globalVarP[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7),label="Standard deviation")
-#    plt.plot(globalAverageP[:,1]-np.sqrt(globalVarP[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7))
+#        plt.plot(files.realP[:,1],z,color=(0,0,0.5),linewidth=4,label="Real velocity profile")
+#    plt.plot(files.globalAverageP[:,1],zFilt,linewidth=4,label="Global average")
+#    pdense(zFilt,files.globalAverageP[:,1],np.sqrt(files.globalVarP[:,1]),M)
+#    plt.plot(files.globalAverageP[:,1]+np.sqrt(files.globalVarP[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7),label="Standard deviation")
+#    plt.plot(files.globalAverageP[:,1]-np.sqrt(files.globalVarP[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7))
 #    plt.plot(bestP[idxBestP][:,1],zFilt,linewidth=4,label="Best model")
 #    if args.show_ranges:
-#        plt.plot(globalMaxP[:,1],zFilt,color=(1,0,0),label="Range investigated by all chains")
-#        plt.plot(globalMinP[:,1],zFilt,color=(1,0,0))
-#    plt.rc('text', usetex=True)
+#        plt.plot(files.globalMaxP[:,1],zFilt,color=(1,0,0),label="Range investigated by all chains")
+#        plt.plot(files.globalMinP[:,1],zFilt,color=(1,0,0))
+#    plt.rc('text', usetex=useTex)
 #    plt.rc('font', family='serif')
 #    plt.xlabel('P wave velocity (m.s$^{-1}$)',fontsize=18)
 #    plt.ylabel('Depth (m)',fontsize=18)
@@ -1169,17 +1175,17 @@ if args.paper:
 #    if swaves:
 #        plt.figure(figsize=(8,10))
 #        if args.show_ranges:
-#            plt.plot(globalMaxP[:,1],zFilt,color=(1,0,0),label="Range investigated by all chains")
-#            plt.plot(globalMinP[:,1],zFilt,color=(1,0,0))
+#            plt.plot(files.globalMaxP[:,1],zFilt,color=(1,0,0),label="Range investigated by all chains")
+#            plt.plot(files.globalMinP[:,1],zFilt,color=(1,0,0))
 #        plt.plot(firstGuessS[:,1],z,color=(0.5,0.95,0.5),linewidth=1,label="Sonic log", alpha=0.4, zorder=1)
 #        if analytical:
-#            plt.plot(realS[:,1],z,color=(0,0.5,0),linewidth=4,label="Real velocity profile")
-#        plt.plot(globalAverageS[:,1],zFilt,linewidth=4,label="Global average")
-#        pdense(zFilt,globalAverageS[:,1],np.sqrt(globalVarS[:,1]),M)
-#        plt.plot(globalAverageS[:,1]+np.sqrt(globalVarS[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7),label="Standard deviation")
-#        plt.plot(globalAverageS[:,1]-np.sqrt(globalVarP[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7))
+#            plt.plot(files.realS[:,1],z,color=(0,0.5,0),linewidth=4,label="Real velocity profile")
+#        plt.plot(files.globalAverageS[:,1],zFilt,linewidth=4,label="Global average")
+#        pdense(zFilt,files.globalAverageS[:,1],np.sqrt(files.globalVarS[:,1]),M)
+#        plt.plot(files.globalAverageS[:,1]+np.sqrt(files.globalVarS[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7),label="Standard deviation")
+#        plt.plot(files.globalAverageS[:,1]-np.sqrt(files.globalVarP[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7))
 #        plt.plot(bestS[idxBestS][:,1],zFilt,linewidth=4,label="Best model")
-#        plt.rc('text', usetex=True)
+#        plt.rc('text', usetex=useTex)
 #        plt.rc('font', family='serif')
 #        plt.xlabel('S wave velocity (m.s$^{-1}$)',fontsize=18)
 #        plt.ylabel('Depth (m)',fontsize=18)
@@ -1192,29 +1198,29 @@ if args.paper:
 
 
     ### RESULTS ###
-    lb=qp+"\% confidence interval"
-    maxiP=globalMaxP[:,1].max()
-    miniP=globalMinP[:,1].min()
-    maxiS=globalMaxS[:,1].max()
-    miniS=globalMinS[:,1].min()
+    lb=qp+percent+" confidence interval"
+    maxiP=files.globalMaxP[:,1].max()
+    miniP=files.globalMinP[:,1].min()
+    maxiS=files.globalMaxS[:,1].max()
+    miniS=files.globalMinS[:,1].min()
     plt.figure(figsize=(8,10))
     plt.hold(True)
     plt.plot(firstGuessP[:,1],z,color=(0.9,0.9,0.99),linewidth=1,label="Sonic log", zorder=1)
     #plt.plot(firstGuessP[:,1],z,color=(0.5,0.5,0.95),linewidth=1,label="Sonic log", alpha=0.2, zorder=1)
     if analytical:
-        plt.plot(realP[:,1],z,color=(0,0,0.5),linewidth=4,label="Real velocity profile")
-    pdense(zFilt,globalAverageP[:,1],np.sqrt(globalVarP[:,1]),M)
+        plt.plot(files.realP[:,1],z,color=(0,0,0.5),linewidth=4,label="Real velocity profile")
+    pdense(zFilt,files.globalAverageP[:,1],np.sqrt(files.globalVarP[:,1]),M)
     #pdense(zFilt,(qSupPs[i][:,1]+qInfPs[i][:,1])/2,(qSupPs[i][:,1]-qInfPs[i][:,1])/2,M)
     #plt.plot(qSupPs[i][:,1],zFilt,linestyle='--',color=(0.3,0.3,0.7),label=lb)
     #plt.plot(qInfPs[i][:,1],zFilt,linestyle='--',color=(0.3,0.3,0.7))
-    plt.plot(globalAverageP[:,1],zFilt,linewidth=2,label="Average model")
+    plt.plot(files.globalAverageP[:,1],zFilt,linewidth=2,label="Average model")
     plt.plot(bestP[idxBestP][:,1],zFilt,linewidth=2,label="Best model")
-    plt.plot(globalAverageP[:,1]+np.sqrt(globalVarP[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7),label="Standard deviation")
-    plt.plot(globalAverageP[:,1]-np.sqrt(globalVarP[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7))
+    plt.plot(files.globalAverageP[:,1]+np.sqrt(files.globalVarP[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7),label="Standard deviation")
+    plt.plot(files.globalAverageP[:,1]-np.sqrt(files.globalVarP[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7))
     if args.show_ranges:
-        plt.plot(globalMaxP[:,1],zFilt,color=(1,0,0),label="Range investigated by all chains")
-        plt.plot(globalMinP[:,1],zFilt,color=(1,0,0))
-    plt.rc('text', usetex=True)
+        plt.plot(files.globalMaxP[:,1],zFilt,color=(1,0,0),label="Range investigated by all chains")
+        plt.plot(files.globalMinP[:,1],zFilt,color=(1,0,0))
+    plt.rc('text', usetex=useTex)
     plt.rc('font', family='serif')
     plt.xlabel('P wave velocity (m.s$^{-1}$)',fontsize=18)
     plt.ylabel('Depth (m)',fontsize=18)
@@ -1231,16 +1237,16 @@ if args.paper:
             plt.plot(minS[i][:,1],zFilt,color=(0.4,0.8,0.8))
         plt.plot(firstGuessS[:,1],z,color=(0.89,0.98,0.89),linewidth=1,label="Sonic log",zorder=1)
         if analytical:
-            plt.plot(realS[:,1],z,color=(0,0.5,0),linewidth=4,label="Real velocity profile")
+            plt.plot(files.realS[:,1],z,color=(0,0.5,0),linewidth=4,label="Real velocity profile")
         #pdense(zFilt,(qSupSs[i][:,1]+qInfSs[i][:,1])/2,(qSupSs[i][:,1]-qInfSs[i][:,1])/2,M)
-        pdense(zFilt,globalAverageS[:,1],np.sqrt(globalVarS[:,1]),M)
+        pdense(zFilt,files.globalAverageS[:,1],np.sqrt(files.globalVarS[:,1]),M)
         #plt.plot(qSupSs[i][:,1],zFilt,linestyle='--',color=(0.3,0.3,0.7),label=lb)
         #plt.plot(qInfSs[i][:,1],zFilt,linestyle='--',color=(0.3,0.3,0.7))
-        plt.plot(globalAverageS[:,1],zFilt,linewidth=2,label="Average model")
+        plt.plot(files.globalAverageS[:,1],zFilt,linewidth=2,label="Average model")
         plt.plot(bestS[idxBestS][:,1],zFilt,linewidth=2,label="Best model")
-        plt.plot(globalAverageS[:,1]+np.sqrt(globalVarS[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7),label="Standard deviation")
-        plt.plot(globalAverageS[:,1]-np.sqrt(globalVarS[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7))
-        plt.rc('text', usetex=True)
+        plt.plot(files.globalAverageS[:,1]+np.sqrt(files.globalVarS[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7),label="Standard deviation")
+        plt.plot(files.globalAverageS[:,1]-np.sqrt(files.globalVarS[:,1]),zFilt,linestyle='--',color=(0.3,0.3,0.7))
+        plt.rc('text', usetex=useTex)
         plt.rc('font', family='serif')
         plt.xlabel('S wave velocity (m.s$^{-1}$)',fontsize=18)
         plt.ylabel('Depth (m)',fontsize=18)
@@ -1258,9 +1264,9 @@ if args.paper:
         plt.hold(True)
         plt.plot(firstGuessP[:,1],z,color=(0.5,0.5,0.95))
         #if analytical:
-        #    plt.plot(realP[:,1],z,color=(0,0,0.5),linewidth=4)
+        #    plt.plot(files.realP[:,1],z,color=(0,0,0.5),linewidth=4)
         plt.plot(filteredCurve[:,1],z,color=(0.5,0,0),linewidth=4,label=waveletFiltered[i])
-        plt.rc('text', usetex=True)
+        plt.rc('text', usetex=useTex)
         plt.rc('font', family='serif')
         plt.xlabel(r'Wave speed (m.s$^{-1}$)',fontsize=18)
         plt.ylabel(r'Depth (m)',fontsize=18)
@@ -1271,21 +1277,26 @@ if args.paper:
         plt.tick_params(axis='y', labelsize=16)
         plt.locator_params(nbins=5)
 
+if args.headless: # Save the figures drawn by this process (in their order of creation) and quit
+    for i,figureNumber in enumerate(plt.get_fignums()):
+        plt.figure(figureNumber).savefig(os.path.join(args.headless,headlessGroup+"."+code+"."+str(i)+".png"))
+    sys.stdout.flush()
+    os._exit(0)
 plt.show()
 
 
 #    ### RESULTS ###
 #    lb=qp+"\% confidence interval"
-#    maxiP=globalMaxP[:,1].max()
-#    miniP=globalMinP[:,1].min()
-#    maxiS=globalMaxS[:,1].max()
-#    miniS=globalMinS[:,1].min()
+#    maxiP=files.globalMaxP[:,1].max()
+#    miniP=files.globalMinP[:,1].min()
+#    maxiS=files.globalMaxS[:,1].max()
+#    miniS=files.globalMinS[:,1].min()
 #    for i in [2]:
 #        plt.figure(figsize=(8,10))
 #        plt.hold(True)
 #        plt.plot(firstGuessP[:,1],z,color=(0.5,0.5,0.95),linewidth=1,label="Sonic log", alpha=0.4, zorder=1)
 #        if analytical:
-#            plt.plot(realP[:,1],z,color=(0,0,0.5),linewidth=4,label="Real velocity profile")
+#            plt.plot(files.realP[:,1],z,color=(0,0,0.5),linewidth=4,label="Real velocity profile")
 #        pdense(zFilt,(qSupPs[i][:,1]+qInfPs[i][:,1])/2,(qSupPs[i][:,1]-qInfPs[i][:,1])/2,M)
 #        plt.plot(qSupPs[i][:,1],zFilt,linestyle='--',color=(0.3,0.3,0.7),label=lb)
 #        plt.plot(qInfPs[i][:,1],zFilt,linestyle='--',color=(0.3,0.3,0.7))
@@ -1294,9 +1305,9 @@ plt.show()
 #     #   plt.plot(averagesP[i][:,1]+np.sqrt(varPs[i][:,1]),zFilt,color=(0.5,0.5,0),label="Standard deviation")
 #     #   plt.plot(averagesP[i][:,1]-np.sqrt(varPs[i][:,1]),zFilt,color=(0.5,0.5,0))
 #        if args.show_ranges:
-#            plt.plot(globalMaxP[:,1],zFilt,color=(1,0,0),label="Range investigated by all chains")
-#            plt.plot(globalMinP[:,1],zFilt,color=(1,0,0))
-#        plt.rc('text', usetex=True)
+#            plt.plot(files.globalMaxP[:,1],zFilt,color=(1,0,0),label="Range investigated by all chains")
+#            plt.plot(files.globalMinP[:,1],zFilt,color=(1,0,0))
+#        plt.rc('text', usetex=useTex)
 #        plt.rc('font', family='serif')
 #        plt.xlabel('P wave velocity (m.s$^{-1}$)',fontsize=18)
 #        plt.ylabel('Depth (m)',fontsize=18)
@@ -1313,7 +1324,7 @@ plt.show()
 #                plt.plot(minS[i][:,1],zFilt,color=(0.4,0.8,0.8))
 #            plt.plot(firstGuessS[:,1],z,color=(0.5,0.95,0.5),linewidth=1,label="Sonic log", alpha=0.4, zorder=1)
 #            if analytical:
-#                plt.plot(realS[:,1],z,color=(0,0.5,0),linewidth=4,label="Real velocity profile")
+#                plt.plot(files.realS[:,1],z,color=(0,0.5,0),linewidth=4,label="Real velocity profile")
 #            pdense(zFilt,(qSupSs[i][:,1]+qInfSs[i][:,1])/2,(qSupSs[i][:,1]-qInfSs[i][:,1])/2,M)
 #            plt.plot(qSupSs[i][:,1],zFilt,linestyle='--',color=(0.3,0.3,0.7),label=lb)
 #            plt.plot(qInfSs[i][:,1],zFilt,linestyle='--',color=(0.3,0.3,0.7))
@@ -1321,7 +1332,7 @@ plt.show()
 #            plt.plot(bestS[idxBestS][:,1],zFilt,linewidth=4,label="Best model")
 #     #       plt.plot(averagesS[i][:,1]+np.sqrt(varSs[i][:,1]),zFilt,color=(0.5,0.5,0),label="Standard deviation")
 #      #      plt.plot(averagesS[i][:,1]-np.sqrt(varSs[i][:,1]),zFilt,color=(0.5,0.5,0))
-#            plt.rc('text', usetex=True)
+#            plt.rc('text', usetex=useTex)
 #            plt.rc('font', family='serif')
 #            plt.xlabel('S wave velocity (m.s$^{-1}$)',fontsize=18)
 #            plt.ylabel('Depth (m)',fontsize=18)
@@ -0,0 +1,159 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Script to compare the results of many runs (ex : a parameter sweep). The runs contained in
+a directory (ex : OUTPUT_FILES/) are loaded in parallel, their summaries are written in a
+table (runsSummary.txt) and a figure is drawn for each run (summaryXXX.png in its directory) :
+    ./watchRuns.py OUTPUT_FILES/ -j 8
+It is also used by watchResults.py --batch.
+
+For each run the table gives : the number of chains and of iterations, the best energy found
+(with the chain and the iteration), the final acceptance and swapping rates of each chain
+(from statsI.XXX.dat) and the depth averages of the global average and standard deviation
+profiles (globalAverageP, globalVarP and their S equivalents).
+
+"""
+### --- MODULES AND PACKAGES --- ###
+import os, sys
+import argparse # To deal with arguments :
+# https://docs.python.org/2/library/argparse.html
+import multiprocessing # To load the runs in parallel
+import numpy as np # NumPy (multidimensional arrays, linear algebra, ...)
+import runStore # Binary run store (falls back on text files)
+import runConfig # Configuration of the run (config.cfg and config.XXX.dat)
+
+def findRuns(pathToRuns):
+    """ Return the list of the directories of pathToRuns containing a run (a config.XXX.dat) """
+    runs = []
+    for name in sorted(os.listdir(pathToRuns)):
+        pathToDir = os.path.join(pathToRuns,name)
+        if os.path.isdir(pathToDir) and runConfig.findCode(pathToDir) is not None:
+            runs.append(pathToDir)
+    return runs
+
+def summarize(pathToDir, plot=True):
+    """ Compute the summary of the run contained in pathToDir (and draw its figure if plot is
+    True). Return a dictionary (with a key "error" if the run could not be read)
+    """
+    summary = {"pathToDir":pathToDir}
+    try:
+        config = runConfig.load(pathToDir)
+        code = config.code
+        summary["code"] = code
+        summary["nbt"] = config.nbt
+        chains = runStore.chainsHistory(pathToDir,code) # Memory mapped : just the energies are read
+        energies = chains[:,:,-1]*config.T # Energies of the chains (iteration,chain)
+        summary["nit"] = len(chains)
+        itBest,chainBest = np.unravel_index(np.argmin(energies),energies.shape)
+        summary["bestE"] = energies[itBest,chainBest]
+        summary["itBest"] = itBest
+        summary["chainBest"] = chainBest
+        lastStats = [runStore.load(pathToDir,code,"stats"+str(i),mmap=True)[-1] for i in np.arange(config.nbt)] # Each file is read once
+        summary["acceptance"] = [float(stats[6]) for stats in lastStats]
+        summary["swapping"] = [float(stats[7]) for stats in lastStats]
+        profiles = {"P":(runStore.load(pathToDir,code,"globalAverageP"),runStore.load(pathToDir,code,"globalVarP"))}
+        if config.swaves:
+            profiles["S"] = (runStore.load(pathToDir,code,"globalAverageS"),runStore.load(pathToDir,code,"globalVarS"))
+        for wave in profiles:
+            summary["mean"+wave] = np.mean(profiles[wave][0][:,1])
+            summary["std"+wave] = np.mean(np.sqrt(profiles[wave][1][:,1]))
+        if plot:
+            plotRun(pathToDir,config,energies,profiles,summary)
+    except Exception as error: # A corrupted or unfinished run should not stop the others
+        summary["error"] = str(error)
+    return summary
+
+def plotRun(pathToDir, config, energies, profiles, summary):
+    """ Draw the energies of the chains and the global profiles of the run in
+    pathToDir/summaryXXX.png. Matplotlib is used without pyplot so that it can run in the
+    processes of the pool without display
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=(12,5))
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1,len(profiles)+1,1)
+    iteration = np.arange(len(energies))
+    for i in np.arange(config.nbt):
+        ax.semilogy(iteration,energies[:,i])
+    ax.semilogy(summary["itBest"],summary["bestE"],'rD',label="Best model")
+    if config.Ep is not None:
+        ax.semilogy(iteration,np.zeros(len(iteration))+config.Ep,label="Prior's energy")
+    ax.set_xlabel('Iteration number')
+    ax.set_ylabel('Energy')
+    ax.legend(numpoints=1)
+    for k,wave in enumerate(sorted(profiles)):
+        average,var = profiles[wave]
+        ax = fig.add_subplot(1,len(profiles)+1,k+2)
+        ax.plot(average[:,1],average[:,0],color=(0.2,0.2,0.5))
+        ax.fill_betweenx(average[:,0],average[:,1]-np.sqrt(var[:,1]),average[:,1]+np.sqrt(var[:,1]),color=(0.8,0.8,0.9))
+        ax.invert_yaxis()
+        ax.set_xlabel(wave+' waves velocity (m/s)')
+        ax.set_ylabel('Depth (m)')
+    fig.suptitle("Run "+summary["code"])
+    canvas.print_figure(os.path.join(pathToDir,"summary"+summary["code"]+".png"))
+
+def summarizeNoPlot(pathToDir):
+    """ Same as summarize without the figure (it has to be a module function to be used by the pool) """
+    return summarize(pathToDir,plot=False)
+
+def writeTable(summaries, nameOfFile):
+    """ Write the comparison table of the runs in nameOfFile (one line per run, sorted by best energy) """
+    waves = ["P","S"]
+    with open(nameOfFile,"w") as table:
+        table.write("# code nbt nit bestE chainBest itBest meanP stdP meanS stdS acceptance(chain0,...) swapping(chain0,...) path\n")
+        for summary in sorted(summaries,key=lambda s: s.get("bestE",np.inf)):
+            if "error" in summary:
+                table.write("# "+summary["pathToDir"]+" : "+summary["error"]+"\n")
+                continue
+            line = "%s %d %d %.4f %d %d" % (summary["code"],summary["nbt"],summary["nit"],summary["bestE"],summary["chainBest"],summary["itBest"])
+            for wave in waves:
+                if "mean"+wave in summary:
+                    line += " %.2f %.2f" % (summary["mean"+wave],summary["std"+wave])
+                else:
+                    line += " nan nan"
+            line += " "+",".join(["%.2f" % a for a in summary["acceptance"]])
+            line += " "+",".join(["%.2f" % a for a in summary["swapping"]])
+            table.write(line+" "+summary["pathToDir"]+"\n")
+
+def watchRuns(pathToRuns, nProcesses=None, plot=True, verbose=False):
+    """ Summarize all the runs of pathToRuns with a pool of nProcesses processes (one per core by
+    default), write pathToRuns/runsSummary.txt. Return the list of the summaries
+    """
+    runs = findRuns(pathToRuns)
+    if verbose:
+        print(str(len(runs))+" runs found in "+pathToRuns)
+    if not runs:
+        return []
+    worker = summarize if plot else summarizeNoPlot
+    if nProcesses == 1:
+        summaries = [worker(pathToDir) for pathToDir in runs]
+    else:
+        pool = multiprocessing.Pool(nProcesses)
+        summaries = pool.map(worker,runs)
+        pool.close()
+        pool.join()
+    writeTable(summaries,os.path.join(pathToRuns,"runsSummary.txt"))
+    if verbose:
+        for summary in summaries:
+            if "error" in summary:
+                print("  Problem with "+summary["pathToDir"]+" : "+summary["error"])
+        print("Summary written in "+os.path.join(pathToRuns,"runsSummary.txt"))
+    return summaries
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the results of the runs contained in a directory')
+    parser.add_argument("pathToRuns",
+                        help="Path to the directory containing the runs (ex : OUTPUT_FILES)")
+    parser.add_argument("-v","--verbose", help="Increase output verbosity",
+                        action="store_true")
+    parser.add_argument("-j","--jobs",type=int,
+                        help="Number of processes used (default : number of cores)",default=None)
+    parser.add_argument("--no_figures", help="Just write the table",
+                        action="store_true")
+    args = parser.parse_args()
+    if not os.path.isdir(args.pathToRuns): # If the path does not exist
+        print("Directory "+args.pathToRuns+" not found.")
+        parser.print_help()
+        sys.exit(0)
+    watchRuns(args.pathToRuns,args.jobs,not args.no_figures,args.verbose)
@@ -19,6 +19,9 @@ import numpy as np # NumPy (multidimensional arrays, linear algebra, ...)
 import glob # Unix style pathname pattern expansion
 from mpl_toolkits.mplot3d import Axes3D
 import matplotlib.pyplot as plt # Matplotlib's pyplot: MATLAB-like syntax
+import runStore # Binary run store (falls back on text files)
+import runConfig # Configuration of the run (config.cfg and config.XXX.dat)
+import fteik # Python bindings to the eikonal solver (needs utils/libfteik.so : make python)
 
 def representsInt(s):
     try:
@@ -50,7 +53,8 @@ parser.add_argument("-t","--times", help="Plot the calculated times",
                     action="store_true")
 parser.add_argument("-g","--geometry", help="Plot the geometry used (sources and receivers)",
                     action="store_true")
-parser.add_argument("--homogeneousVelocityModel", help="Consider that the velocity model is constant",
+parser.add_argument("--homogeneousVelocityModel", help="Compare the calculated times with the times computed by the eikonal \
+                    in the first guess model (with libfteik.so, otherwise the velocity model is considered constant)",
                     action="store_true")
 args = parser.parse_args()
 
@@ -75,53 +79,20 @@ if not (args.all or args.data or args.geometry or args.times):
 
 ### --- Load files --- ###
 
-# Extract informations from config.XXX.dat :
-# TODO : read the cfg file
-
-T = np.zeros(0)
-with open(args.pathToDir+'config.cfg') as configFile:
-    for line in configFile:
-        if line.split('#')[0].strip(): # If the line is not a comment
-            if 'SWAVES' in line:
-                if line.split(" = ")[1].split("#")[0].strip() == "1":
-                    swaves=True
-                else:
-                    swaves=False
-            if 'ANALYTICAL_RUN' in line:
-                if line.split(" = ")[1].split("#")[0].strip() == "1":
-                    analytical=True
-                else:
-                    analytical=False
-            if 'NAME_OF_FIRST_GUESS_P_FILE' in line:
-                nameOfFirstGuessP = line.split(" = ")[1].split("#")[0].strip()
-            if 'NAME_OF_FIRST_GUESS_S_FILE' in line:
-                nameOfFirstGuessS = line.split(" = ")[1].split("#")[0].strip()
-            if 'NAME_OF_STATIONS_FILE' in line:
-                nameOfStationsFile = line.split(" = ")[1].split("#")[0].strip()
-            if 'NAME_OF_SHOTS_FILE' in line:
-                nameOfShotsFile = line.split(" = ")[1].split("#")[0].strip()
-            if 'NAME_OF_TIMES_FILE =' in line:
-                nameOfTimesFile = line.split(" = ")[1].split("#")[0].strip()
-            if 'SIGMAP =' in line:
-                sigmaP = line.split(" = ")[1].split("#")[0].strip()
-                if representsFloat(sigmaP): # Verify that the string extracted is a int
-                    sigmaP = float(sigmaP)
-            if 'SIGMAS =' in line:
-                sigmaS = line.split(" = ")[1].split("#")[0].strip()
-                if representsFloat(sigmaS): # Verify that the string extracted is a int
-                    sigmaS = float(sigmaS)
-            if 'NX_DEFAULT' in line:
-                nx = line.split(" = ")[1].split("#")[0].strip()
-                if representsInt(nx): # Verify that the string extracted is a int
-                    nx = int(nx)
-            if 'NY_DEFAULT' in line:
-                ny = line.split(" = ")[1].split("#")[0].strip()
-                if representsInt(ny): # Verify that the string extracted is a int
-                    ny = int(ny)
-            if 'COORD_TOL =' in line:
-                coord_tol = line.split(" = ")[1].split("#")[0].strip()
-                if representsFloat(coord_tol): # Verify that the string extracted is a int
-                    coord_tol = float(coord_tol)
+# Extract informations from config.cfg (see runConfig.py) :
+config=runConfig.load(args.pathToDir,code)
+swaves=config.swaves
+analytical=config.analyticalRun
+nameOfFirstGuessP=config.name_of_first_guess_P_file
+nameOfFirstGuessS=config.name_of_first_guess_S_file
+nameOfStationsFile=config.name_of_stations_file
+nameOfShotsFile=config.name_of_shots_file
+nameOfTimesFile=config.name_of_times_file
+sigmaP=config.sigmaP
+sigmaS=config.sigmaS
+nx=config.nxDefault
+ny=config.nyDefault
+coord_tol=config.coordTol
 if args.verbose:
     print "Watching the results of run : ",code,"..."
     if analytical:
@@ -139,7 +110,7 @@ coordStats=np.loadtxt(args.pathToDir+nameOfStationsFile)
 firstGuessP=np.loadtxt(args.pathToDir+nameOfFirstGuessP)
 if swaves:
     firstGuessS=np.loadtxt(args.pathToDir+nameOfFirstGuessS)
-calculatedTimes=np.loadtxt(args.pathToDir+"calculatedTimes."+code+".dat")
+calculatedTimes=runStore.load(args.pathToDir,code,"calculatedTimes")
 if not analytical:
     timesData=np.loadtxt(args.pathToDir+nameOfTimesFile)
 
@@ -214,6 +185,8 @@ if args.verbose:
     print "nx : ",nx," ny : ",ny," nz : ",nz
     print "dx : ",dx," dy : ",dy," dz : ",dz
 
+origin = (zmin,xmin,ymin) # First corner of the grid before its shift for each shot
+
 epsilonX = 0
 epsilonY = 0
 epsilonZ = 0
@@ -259,8 +232,14 @@ if args.geometry:
         timesP=calculatedTimes
     if args.homogeneousVelocityModel:
         speed = firstGuessP[0,1]
-        realTimes=np.sqrt((coordStats - coordShots)**2)/speed
-        realTimes=realTimes[realTimes!=0]
+        if fteik.available(): # Times in the first guess model (same grid than the program)
+            nSweeps = config.nSweeps if config.nSweeps is not None else 1
+            epsin = config.epsin if config.epsin is not None else 5.0
+            realTimes=fteik.stationTimes(firstGuessP[:,1],coordShots,coordStats,origin,(dz,dx,dy),nx,ny,nSweeps,epsin)[0].ravel()
+        else:
+            print "libfteik.so not found (make python) : the velocity model is considered constant"
+            realTimes=np.sqrt((coordStats - coordShots)**2)/speed
+            realTimes=realTimes[realTimes!=0]
         residuals=timesP-realTimes
     fig = plt.figure()
     ax = fig.gca(projection='3d') #Axes3D(fig)